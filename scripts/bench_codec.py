@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark cache/pubsub payload codecs (pickle, orjson, msgpack if installed)
+on the value dicts of the example ingesters, as cached and published by
+actions.store.store.
+
+Usage: python scripts/bench_codec.py [number]
+"""
+
+import pickle
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from random import Random
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401,E402  # settle import cycles
+from src.proxies import IngesterConfigProxy  # noqa: E402
+from src.utils import codec  # noqa: E402
+
+ROOT = Path(__file__).parent.parent
+
+
+def ingester_values() -> list[dict]:
+  rng = Random(42)
+  ts = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+  values = []
+  for path in sorted((ROOT / "examples").glob("*.yml")):
+    for ing in IngesterConfigProxy.load_config(str(path)).ingesters:
+      for f in ing.fields:
+        if f.type == "timestamp":
+          f.value = ts
+        elif f.type == "string":
+          f.value = f"{f.name}-{rng.randint(0, 999)}"
+        elif f.type == "bool":
+          f.value = rng.random() > 0.5
+        elif "int" in f.type:
+          f.value = rng.randint(0, 2**31)
+        else:
+          f.value = rng.uniform(0, 1e5)
+      values.append(ing.get_field_values())
+  return values
+
+
+def main():
+  number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  values = ingester_values()
+  cells = sum(len(v) for v in values)
+  print(f"{len(values)} ingester dicts, {cells} fields")
+  codecs = {"pickle": (pickle.dumps, pickle.loads)}
+  for name in ("orjson", "msgpack"):
+    if name == "msgpack" and not codec.msgpack:
+      print("msgpack not installed, skipped")
+      continue
+    codecs[name] = (lambda v, name=name: codec.encode(v, name), codec.decode)
+
+  for name, (encode, decode) in codecs.items():
+    payloads = [encode(v) for v in values]
+    assert [decode(p) for p in payloads] == values
+    enc = timeit(lambda: [encode(v) for v in values], number=number)
+    dec = timeit(lambda: [decode(p) for p in payloads], number=number)
+    size = sum(len(p) for p in payloads)
+    n = number * len(values)
+    print(f"{name:<8} encode {enc / n * 1e6:6.2f}us  "
+          f"decode {dec / n * 1e6:6.2f}us  size {size / len(values):7.1f}B")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark format_table JSON serialization against the former
+`df.to_numpy().tolist()` path on 1M-cell frames.
+
+Usage: python scripts/bench_format_table.py [rows] [repeat]
+"""
+
+import sys
+from pathlib import Path
+from timeit import repeat
+
+import numpy as np
+import orjson
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401,E402  # settle import cycles
+from src.server.responses import ORJSON_OPTIONS  # noqa: E402
+from src.services.loader import _ts_to_ms, format_table  # noqa: E402
+
+
+def legacy(df: pl.DataFrame, orient: str) -> bytes:
+  df = _ts_to_ms(df)
+  arr = df.to_numpy()
+  return orjson.dumps(
+      {
+          'columns': df.columns,
+          'types': [str(t).lower() for t in df.dtypes],
+          'data': (arr if orient == "row" else arr.T).tolist()
+      },
+      option=ORJSON_OPTIONS)
+
+
+def frames(rows: int) -> dict[str, pl.DataFrame]:
+  rng = np.random.default_rng(42)
+  ts = pl.Series("ts", 1704067200000 + np.arange(rows) * 300_000,
+                 pl.Int64).cast(pl.Datetime("ms"))
+  numeric = pl.DataFrame(
+      [ts] + [pl.Series(f"f{i}",
+                        rng.random(rows) * 10**i)
+              for i in range(4)] + [pl.Series("n", np.arange(rows), pl.Int32)])
+  mixed = numeric.with_columns(
+      pl.Series("sym", rng.choice(["BTC", "ETH", "SOL"], rows)))
+  return {"numeric": numeric, "mixed": mixed}
+
+
+def main():
+  rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000 // 6
+  runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+  for name, df in frames(rows).items():
+    for fmt in ("json:row", "json:column"):
+      orient = fmt.split(":")[1]
+      assert format_table(df, "polars", fmt) == legacy(df, orient)
+      before = min(repeat(lambda: legacy(df, orient), number=1, repeat=runs))
+      after = min(
+          repeat(lambda: format_table(df, "polars", fmt),
+                 number=1,
+                 repeat=runs))
+      print(f"{name:<8} {fmt:<12} {df.height * df.width:>9} cells  "
+            f"tolist {before * 1e3:8.1f}ms  native {after * 1e3:8.1f}ms  "
+            f"x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+  main()
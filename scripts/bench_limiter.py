@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark request admission through the Redis sliding window limiter
+(RateLimiter.check_and_increment, one EVALSHA per request) against the local
+token-bucket pre-admission (RateLimiter.admit, usage recorded in batches).
+
+Runs against an in-process fakeredis with Lua scripting (uv pip install
+'fakeredis[lua]'), each command paying a simulated network round trip.
+
+Usage: python scripts/bench_limiter.py [requests] [users] [rtt_ms]
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from time import perf_counter
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401,E402  # settle import cycles
+from src.models import RateLimitConfig, User  # noqa: E402
+from src.services import limiter  # noqa: E402
+from src.services.limiter import RateLimiter  # noqa: E402
+from src.utils.deps import safe_import  # noqa: E402
+
+fakeredis = safe_import("fakeredis")
+
+
+class RoundTrips:
+  """Redis client paying `rtt` seconds per command or pipeline"""
+
+  def __init__(self, redis, rtt: float):
+    self.redis, self.rtt, self.count = redis, rtt, 0
+
+  async def _trip(self):
+    self.count += 1
+    await asyncio.sleep(self.rtt)
+
+  async def evalsha(self, *args):
+    await self._trip()
+    return await self.redis.evalsha(*args)
+
+  async def script_load(self, script):
+    await self._trip()
+    return await self.redis.script_load(script)
+
+  def pipeline(self, *args, **kwargs):
+    pipe = self.redis.pipeline(*args, **kwargs)
+    execute = pipe.execute
+
+    async def timed_execute(*args, **kwargs):
+      await self._trip()
+      return await execute(*args, **kwargs)
+
+    pipe.execute = timed_execute
+    return pipe
+
+
+class State:
+
+  def __init__(self, redis: RoundTrips):
+    self.redis, self.server_config = redis, None
+
+
+async def run(admit, users: list[User], requests: int) -> tuple[float, int]:
+  """Admit `requests` spread over `users` (one client task per user)"""
+  per_user = requests // len(users)
+
+  async def client(user: User) -> int:
+    admitted = 0
+    for _ in range(per_user):
+      result = await admit(user, "/last", 512)
+      admitted += not result.get("limited")
+    return admitted
+
+  start = perf_counter()
+  admitted = sum(await asyncio.gather(*(client(u) for u in users)))
+  return perf_counter() - start, admitted
+
+
+async def main():
+  if not fakeredis:
+    print("fakeredis not installed (uv pip install 'fakeredis[lua]')")
+    return
+  requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+  rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0005
+  limits = RateLimitConfig(rpm=10**9,
+                           rph=10**9,
+                           rpd=10**9,
+                           spm=10**12,
+                           sph=10**12,
+                           spd=10**12,
+                           ppm=10**9,
+                           pph=10**9,
+                           ppd=10**9)
+
+  print(f"{requests} requests, {n_users} users, "
+        f"{rtt * 1e3:.2f}ms redis round trips")
+  for name in ("check_and_increment", "admit"):
+    state = State(RoundTrips(fakeredis.FakeAsyncRedis(), rtt))
+    users = [
+        User(uid=f"user{i}", rate_limits=limits, status="public")
+        for i in range(n_users)
+    ]
+    with patch.object(limiter, "state", state):
+      elapsed, admitted = await run(getattr(RateLimiter, name), users,
+                                    requests)
+      await RateLimiter.stop_sync()
+      # every admitted request got recorded in Redis (daily window)
+      res = await RateLimiter._eval_windows(
+          users[0], RateLimiter._active_limits(users[0]), {}, limiter.PEEK)
+      assert limits.rpd - res[5] == requests // n_users
+    print(f"{name:<20} {admitted / elapsed:>10.0f} req/s  "
+          f"{state.redis.count:>6} redis round trips")
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
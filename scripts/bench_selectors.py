@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark http_api/ws_api field extraction: the former per-field
+`select_nested` walk (selector parsed and regex compiled on every call)
+against the compiled selector plan (all the fields of a route extracted in a
+single walk of the document).
+
+Payloads mimic wide real-world responses: CoinGecko simple prices, OKX
+tickers and a Binance order book.
+
+Usage: python scripts/bench_selectors.py [number]
+"""
+
+import re
+import sys
+from pathlib import Path
+from random import Random
+from timeit import timeit
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.reflexion import compile_selectors, select_nested  # noqa: E402
+
+
+def legacy_select(selector: str, data: Any) -> Any:
+  """select_nested as of before the compiled plans (logging aside)"""
+  if not selector or [".", "root"].count(selector.lower()) > 0:
+    return data
+  if selector.startswith("."):
+    selector = selector[1:]
+  current = data
+  segment_pattern = re.compile(r'([^.\[\]]+)(?:\[(\d+)\])?')
+  for match in segment_pattern.finditer(selector):
+    key, index = match.groups()
+    if key and key.isnumeric() and not index:
+      key, index = None, key
+    if key and isinstance(current, dict):
+      current = current.get(key)
+    if current is None:
+      return None
+    if index is not None:
+      index_int = int(index)
+      if not isinstance(current, list) or index_int >= len(current):
+        return None
+      current = current[index_int]
+  return current
+
+
+def payloads() -> dict[str, tuple[Any, list[str]]]:
+  rng = Random(42)
+  coins = [f"coin-{i}" for i in range(2000)]
+  gecko = {
+      c: {
+          "usd": rng.uniform(0, 1e4),
+          "eur": rng.uniform(0, 1e4),
+          "usd_24h_vol": rng.uniform(0, 1e9)
+      }
+      for c in coins
+  }
+  okx = {
+      "code":
+      "0",
+      "data": [{
+          "instId": f"T{i}-USDT",
+          "last": str(rng.uniform(0, 1e4)),
+          "bidPx": str(rng.uniform(0, 1e4)),
+          "askPx": str(rng.uniform(0, 1e4)),
+          "vol24h": str(rng.uniform(0, 1e9)),
+          "ts": "1717243200000"
+      } for i in range(800)]
+  }
+  depth = {
+      "lastUpdateId":
+      1027024,
+      "bids":
+      [[f"{67000 - i * 0.1:.2f}", f"{rng.random():.4f}"] for i in range(5000)],
+      "asks":
+      [[f"{67000 + i * 0.1:.2f}", f"{rng.random():.4f}"] for i in range(5000)]
+  }
+  return {
+      "coingecko":
+      (gecko, [f".{c}.{q}" for c in coins[:40] for q in ("usd", "eur")]),
+      "okx": (okx, [
+          f".data[{i}].{k}" for i in range(0, 800, 20)
+          for k in ("last", "bidPx", "askPx")
+      ]),
+      "binance": (depth, [
+          f".{side}[{i}][{j}]" for side in ("bids", "asks") for i in range(10)
+          for j in (0, 1)
+      ]),
+  }
+
+
+def main():
+  number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  for name, (doc, selectors) in payloads().items():
+    pairs = tuple((s, s) for s in selectors)
+    expected = [legacy_select(s, doc) for s in selectors]
+    assert compile_selectors(pairs).select(doc) == expected
+    assert [select_nested(s, doc) for s in selectors] == expected
+
+    legacy = timeit(lambda: [legacy_select(s, doc) for s in selectors],
+                    number=number)
+    cached = timeit(lambda: [select_nested(s, doc) for s in selectors],
+                    number=number)
+    plan = timeit(lambda: compile_selectors(pairs).select(doc), number=number)
+    print(f"{name:<10} {len(selectors):>3} fields  "
+          f"per-field {legacy / number * 1e6:7.1f}us  "
+          f"cached per-field {cached / number * 1e6:7.1f}us  "
+          f"plan {plan / number * 1e6:7.1f}us  x{legacy / plan:.1f}")
+
+  # wildcards: one list per field, the array walked once for all of them
+  doc, _ = payloads()["okx"]
+  keys = ("instId", "last", "bidPx", "askPx", "vol24h")
+  pairs = tuple((f".data[*].{k}", k) for k in keys)
+  assert compile_selectors(pairs).select(doc)[1] == [
+      d["last"] for d in doc["data"]
+  ]
+  rows = range(len(doc["data"]))
+  loop = timeit(lambda: [[legacy_select(f".data[{i}].{k}", doc) for i in rows]
+                         for k in keys],
+                number=number // 20)
+  plan = timeit(lambda: compile_selectors(pairs).select(doc),
+                number=number // 20)
+  print(f"{'okx[*]':<10} {len(keys):>3} fields  "
+        f"per-field {loop / (number // 20) * 1e6:7.1f}us  "
+        f"plan {plan / (number // 20) * 1e6:7.1f}us  x{loop / plan:.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -15,6 +15,8 @@ __all__ = [
 
     # From transform module
     "transform_all",  # noqa: F405
+    "transform_batch",  # noqa: F405
+    "compile_plan",  # noqa: F405
     "transform",  # noqa: F405
     "apply_transformer",  # noqa: F405
     "parse_cached_reference",  # noqa: F405
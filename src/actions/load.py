@@ -1,6 +1,9 @@
+import orjson
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime, timezone
-from typing import Optional, Union, List, Any, Dict
+from typing import AsyncIterator, Optional, Union, List, Any, Dict
 
+from ..models.base import keyset_columns
 from ..models.ingesters import Ingester, UpdateIngester
 from .. import state
 from ..utils import now, Interval, log_error, log_warn
@@ -47,6 +50,15 @@ async def load_resource(
       results = await state.tsdb.fetch_batch_by_ids(table_name, uids)
       return [_format_record(r) for r in results] if results else []
 
+    # Bulk pages are pushed down to the database when supported
+    if not from_date and not to_date and not aggregation_interval:
+      try:
+        columns, results = await state.tsdb.fetch_page(table_name,
+                                                       offset + limit)
+        return [_format_record(row, columns) for row in results[offset:]]
+      except NotImplementedError:
+        pass
+
     # Default to time-series or bulk fetch
     start = from_date or datetime(2020, 1, 1, tzinfo=UTC)
     end = to_date or now()
@@ -68,6 +80,102 @@ async def load_resource(
                   (uid is None and uids is None)) else None
 
 
+def encode_cursor(key: tuple[Any, Any]) -> str:
+  """Opaque pagination token of a (time, uid) keyset"""
+  t, uid = key
+  payload = {
+      "t": t.isoformat(),
+      "d": True
+  } if isinstance(t, datetime) else {
+      "t": t
+  }
+  payload["u"] = uid
+  return urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, Any]:
+  """Keyset of an opaque pagination token"""
+  try:
+    payload = orjson.loads(urlsafe_b64decode(cursor + "=" *
+                                             (-len(cursor) % 4)))
+    t = datetime.fromisoformat(
+        payload["t"]) if payload.get("d") else payload["t"]
+    return t, payload.get("u")
+  except Exception:
+    raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _page_key(columns: List[str], row: Any) -> tuple[Any, Any]:
+  time_col, uid_col = keyset_columns(columns)
+  values = row if isinstance(row, dict) else dict(zip(columns, row))
+  return values.get(time_col), values.get(uid_col) if uid_col else None
+
+
+async def _fetch_page_fallback(
+    table_name: str, limit: int,
+    after: Optional[tuple[Any, Any]]) -> tuple[List[str], list]:
+  """Keyset page sliced from a full fetch, for adapters without `fetch_page`"""
+  columns, results = await state.tsdb.fetch(table_name,
+                                            datetime(2020, 1, 1, tzinfo=UTC),
+                                            now(), "h1", [])
+  if not results:
+    return columns, []
+  time_col, uid_col = keyset_columns(columns)
+  if not time_col:
+    return columns, list(results)[:limit]
+  t, u = columns.index(time_col), columns.index(uid_col) if uid_col else None
+  sort_key = (lambda r: (r[t], r[u] or "")) if u is not None else (lambda r:
+                                                                   (r[t], ""))
+  rows = sorted((r for r in results if r[t] is not None),
+                key=sort_key,
+                reverse=True)
+  if after:
+    bound = (after[0], after[1] or "")
+    rows = [r for r in rows if sort_key(r) < bound]
+  return columns, rows[:limit]
+
+
+async def load_page(table_name: str,
+                    limit: int = 100,
+                    cursor: Optional[str] = None
+                    ) -> tuple[List[Dict[str, Any]], Optional[str]]:
+  """
+  Load a page of records, newest first, with keyset pagination pushed down to the database.
+
+  Args:
+    table_name: Name of the table
+    limit: Maximum number of records
+    cursor: Opaque token returned with the previous page
+
+  Returns:
+    Tuple of (records, next page cursor or None if this is the last page)
+  """
+  after = decode_cursor(cursor) if cursor else None
+  try:
+    columns, rows = await state.tsdb.fetch_page(table_name, limit, after)
+  except NotImplementedError:
+    columns, rows = await _fetch_page_fallback(table_name, limit, after)
+
+  records = [_format_record(row, columns) for row in rows]
+  next_cursor = encode_cursor(_page_key(columns, rows[-1])) \
+    if rows and len(rows) >= limit else None
+  return records, next_cursor
+
+
+async def iter_pages(
+    table_name: str,
+    limit: int = 1000) -> AsyncIterator[tuple[List[str], list]]:
+  """Iterate over all (columns, rows) pages of a table, newest first"""
+  after: Optional[tuple[Any, Any]] = None
+  while True:
+    columns, rows = await state.tsdb.fetch_page(table_name, limit, after)
+    if rows:
+      yield columns, rows
+    if len(rows) < limit:
+      return
+    after = _page_key(columns, rows[-1])
+
+
 async def load_resource_by_time_range(
     table_name: str,
     from_date: Optional[datetime] = None,
@@ -0,0 +1,300 @@
+"""
+Materialized downsampled tiers (rollups) of time series tables.
+
+Every stored value is folded into in-process accumulators, one per tier. When
+a tier bucket closes it is written to `{table}.{tier}`: the last value keeps
+the field's own column name (so the adapters' LAST aggregation reads a tier
+exactly like the raw table) and numeric fields get `_first`, `_min`, `_max`
+and `_mean` columns. The contiguous range materialized per tier is published
+to Redis so readers can route queries to the coarsest tier covering them.
+"""
+
+from asyncio import gather
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from math import ceil, floor
+from os import environ as env
+from typing import Any, Optional, cast
+
+from .. import state
+from ..cache import NS, cache, get_cache
+from ..models.base import ResourceField
+from ..models.ingesters import Ingester, TimeSeriesIngester
+from ..utils import Interval, log_debug, log_warn, rebase_epoch_to_sec
+from ..utils.date import SEC_BY_TF
+from ..utils.decorators import cache as _cache
+from ..utils.types import to_bool
+
+UTC = timezone.utc
+
+ROLLUP = to_bool(env.get("ROLLUP", "true"))
+# tiers must divide a day so that their buckets align with any coarser interval
+TIERS = cast(
+    list[Interval],
+    sorted((t for t in env.get("ROLLUP_TIERS", "m5,h1,D1").replace(
+        " ", "").split(",") if t in SEC_BY_TF and 86400 % SEC_BY_TF[t] == 0),
+           key=lambda t: SEC_BY_TF[t]))
+# max tier buckets rebuilt from the raw table to bridge a restart gap
+CATCH_UP_BUCKETS = int(env.get("ROLLUP_CATCH_UP", 288))
+
+NUMERIC_TYPES = {
+    "int8", "uint8", "int16", "uint16", "int32", "uint32", "int64", "uint64",
+    "float32", "ufloat32", "float64", "ufloat64"
+}
+STATS = ("first", "min", "max", "mean")
+
+
+@dataclass
+class Bucket:
+  """Running aggregates of a single tier bucket"""
+  start: int
+  last: dict[str, Any] = field(default_factory=dict)
+  first: dict[str, float] = field(default_factory=dict)
+  min: dict[str, float] = field(default_factory=dict)
+  max: dict[str, float] = field(default_factory=dict)
+  sum: dict[str, float] = field(default_factory=dict)
+  count: dict[str, int] = field(default_factory=dict)
+
+  def add(self, values: dict[str, Any], numeric: set[str]) -> None:
+    for name, value in values.items():
+      if value is None:
+        continue
+      self.last[name] = value
+      if name not in numeric:
+        continue
+      try:
+        value = float(value)
+      except (TypeError, ValueError):
+        continue
+      if value != value:  # NaN
+        continue
+      if name not in self.count:
+        self.first[name] = self.min[name] = self.max[name] = value
+        self.sum[name], self.count[name] = 0.0, 0
+      self.min[name] = min(self.min[name], value)
+      self.max[name] = max(self.max[name], value)
+      self.sum[name] += value
+      self.count[name] += 1
+
+  def stat(self, name: str, stat: str) -> Optional[float]:
+    if name not in self.count:
+      return None
+    if stat == "mean":
+      return self.sum[name] / self.count[name]
+    return getattr(self, stat)[name]
+
+
+@dataclass
+class Accumulator:
+  """Open bucket and materialized coverage [since, until) of a tier"""
+  bucket: Bucket
+  since: int
+  until: int
+
+
+_accumulators: dict[tuple[str, str], Accumulator] = {}
+
+
+def meta_key(table: str, tier: Interval) -> str:
+  return f"{NS}:rollup:{table}:{tier}"
+
+
+def tier_table(table: str, tier: Interval) -> str:
+  return f"{table}.{tier}"
+
+
+def select_tier(interval: Interval) -> Optional[Interval]:
+  """Coarsest tier whose buckets tile `interval` buckets exactly"""
+  secs = SEC_BY_TF.get(interval)
+  if not ROLLUP or not secs:
+    return None
+  for tier in reversed(TIERS):
+    if secs % SEC_BY_TF[tier] == 0:
+      return tier
+  return None
+
+
+def _epoch(ts: Any) -> float:
+  if isinstance(ts, datetime):
+    return (ts if ts.tzinfo else ts.replace(tzinfo=UTC)).timestamp()
+  return float(rebase_epoch_to_sec(ts))
+
+
+def _persistent_fields(ing: Ingester) -> list[ResourceField]:
+  return [f for f in ing.get_persistent_fields() if f.name != "ts"]
+
+
+def _tier_ingester(ing: Ingester, table: str, tier: Interval,
+                   bucket: Bucket) -> TimeSeriesIngester:
+  """Ingester mirroring `ing`'s schema, loaded with a closed bucket's aggregates"""
+  fields = []
+  for f in _persistent_fields(ing):
+    fields.append(
+        ResourceField(name=f.name, type=f.type, value=bucket.last.get(f.name)))
+  for f in _persistent_fields(ing):
+    if f.type in NUMERIC_TYPES:
+      fields.extend(
+          ResourceField(name=f"{f.name}_{stat}",
+                        type="float64",
+                        value=bucket.stat(f.name, stat)) for stat in STATS)
+  tier_ing = TimeSeriesIngester(name=tier_table(table, tier),
+                                interval=tier,
+                                fields=fields)
+  tier_ing.ts = datetime.fromtimestamp(bucket.start, UTC)
+  return tier_ing
+
+
+async def _flush(ing: Ingester, table: str, tier: Interval,
+                 acc: Accumulator) -> None:
+  """Write the accumulator's bucket to its tier table and extend the coverage"""
+  await state.tsdb.insert(_tier_ingester(ing, table, tier, acc.bucket),
+                          tier_table(table, tier))
+  acc.until = acc.bucket.start + SEC_BY_TF[tier]
+  await cache(meta_key(table, tier), {
+      "since": acc.since,
+      "until": acc.until,
+      "columns": ["ts"] + [f.name for f in _persistent_fields(ing)],
+  },
+              pickled=True,
+              raw_key=True)
+
+
+async def _catch_up(ing: Ingester, table: str, tier: Interval,
+                    start: int) -> Accumulator:
+  """Rebuild the open bucket (and any gap since the last materialized one) from raw rows"""
+  secs = SEC_BY_TF[tier]
+  meta = await get_cache(meta_key(table, tier), pickled=True, raw_key=True)
+  resume = bool(
+      meta) and start - CATCH_UP_BUCKETS * secs <= meta["until"] <= start
+  lo = meta["until"] if resume else start
+  acc = Accumulator(bucket=Bucket(start=lo),
+                    since=meta["since"] if resume else lo,
+                    until=lo)
+
+  names = [f.name for f in _persistent_fields(ing)]
+  numeric = {
+      f.name
+      for f in _persistent_fields(ing) if f.type in NUMERIC_TYPES
+  }
+  columns, rows = await state.tsdb.fetch(table, datetime.fromtimestamp(
+      lo,
+      UTC), (getattr(ing, "ts", None) or datetime.fromtimestamp(start, UTC)) -
+                                         timedelta(microseconds=1),
+                                         ing.interval, ["ts"] + names)
+  for row in reversed(rows or []):  # adapters return newest first
+    if not row or row[0] is None:
+      continue
+    bucket_start = int(_epoch(row[0])) // secs * secs
+    if bucket_start > acc.bucket.start:
+      if acc.bucket.last:
+        await _flush(ing, table, tier, acc)
+      acc.bucket = Bucket(start=bucket_start)
+    acc.bucket.add(dict(zip(columns[1:], row[1:])), numeric)
+
+  if acc.bucket.start < start:
+    if acc.bucket.last:
+      await _flush(ing, table, tier, acc)
+    acc.bucket = Bucket(start=start)
+  return acc
+
+
+async def update(ing: Ingester, table: str = "") -> None:
+  """Fold the ingester's current values into its rollup tiers (store path)"""
+  if not ROLLUP or not TIERS:
+    return
+  table = table or ing.name
+  ts = getattr(ing, "ts", None)
+  if not isinstance(ts, datetime):
+    ts = ing.last_ingested
+  if not ts:
+    return
+  epoch = int(ts.timestamp())
+  values = {f.name: f.value for f in _persistent_fields(ing)}
+  numeric = {
+      f.name
+      for f in _persistent_fields(ing) if f.type in NUMERIC_TYPES
+  }
+
+  for tier in TIERS:
+    secs = SEC_BY_TF[tier]
+    if secs <= ing.interval_sec:
+      continue  # no gain over the raw table
+    start = epoch // secs * secs
+    key = (table, tier)
+    try:
+      acc = _accumulators.get(key)
+      if acc is None:
+        acc = _accumulators[key] = await _catch_up(ing, table, tier, start)
+      elif start > acc.bucket.start:
+        await _flush(ing, table, tier, acc)
+        acc.bucket = Bucket(start=start)
+      elif start < acc.bucket.start:
+        continue  # late value, already materialized
+      acc.bucket.add(values, numeric)
+    except Exception as e:
+      log_warn(f"Failed to update {tier} rollup of {table}: {e}")
+      _accumulators.pop(key, None)  # rebuilt from the raw table on next store
+      continue
+
+  if state.args.verbose:
+    log_debug(f"Updated rollups of {table}")
+
+
+@_cache(ttl=30, maxsize=2048)
+async def get_coverage(table: str, tier: Interval) -> Optional[dict]:
+  """Materialized range of a tier, as published by its ingester"""
+  return await get_cache(meta_key(table, tier), pickled=True, raw_key=True)
+
+
+async def fetch(table: str,
+                from_date: datetime,
+                to_date: datetime,
+                aggregation_interval: Interval = "m5",
+                columns: list[str] = []) -> tuple[list[str], list]:
+  """Drop-in for `state.tsdb.fetch` reading from the coarsest covering tier.
+
+  The part of the range materialized by the tier (aligned to the requested
+  interval) is read from the tier table, the rest from the raw table.
+  """
+  tier = select_tier(aggregation_interval)
+  coverage = None
+  if tier:
+    try:
+      coverage = await get_coverage(table, tier)
+    except Exception as e:
+      log_warn(f"Failed to read {tier} rollup coverage of {table}: {e}")
+
+  step = SEC_BY_TF.get(aggregation_interval, 0)
+  lo = hi = 0
+  if coverage:
+    # whole requested buckets only, so that LAST over the tier equals LAST over raw rows
+    lo = ceil(max(from_date.timestamp(), coverage["since"]) / step) * step
+    hi = floor(min(to_date.timestamp(), coverage["until"]) / step) * step
+  if not tier or lo >= hi:
+    return await state.tsdb.fetch(table, from_date, to_date,
+                                  aggregation_interval, list(columns))
+
+  assert coverage is not None
+  cols = list(columns) or list(coverage["columns"])
+  us = timedelta(microseconds=1)
+  lo_date, hi_date = datetime.fromtimestamp(lo, UTC), datetime.fromtimestamp(
+      hi, UTC)
+  parts = [(tier_table(table, tier), lo_date, hi_date - us)]
+  if to_date >= hi_date:
+    parts.insert(0, (table, hi_date, to_date))
+  if from_date < lo_date:
+    parts.append((table, from_date, lo_date - us))
+
+  result_columns: list[str] = []
+  rows: list = []
+  for part_columns, part_rows in await gather(
+      *(state.tsdb.fetch(part_table, part_from, part_to, aggregation_interval,
+                         list(cols))
+        for part_table, part_from, part_to in parts)):
+    result_columns = result_columns or part_columns
+    rows.extend(part_rows or [])  # parts are ordered newest first
+  if state.args.verbose:
+    log_debug(
+        f"Served {table}.{aggregation_interval} from {tier} rollup [{lo_date} -> {hi_date})"
+    )
+  return result_columns, rows
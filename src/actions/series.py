@@ -0,0 +1,283 @@
+"""
+In-process ring buffers of recent field values for the series operators of
+transformers (`{field::op(window)}`).
+
+A buffer is kept per (ingester, field) read by a series operator, fed by the
+store path. Each window read over a buffer keeps running aggregates updated in
+O(1) per tick (amortized for min and max), so the rolling operators (mean, std,
+var, min, max, sum, ewma, pct_change) never scan the window; other operators
+reduce the buffered window. The TSDB is only queried when a buffer does not
+cover a window yet (cold start) or when the window is longer than the buffer,
+the fetched values seeding the buffer.
+"""
+
+from collections import deque
+from datetime import datetime, timezone
+from math import inf, isfinite, sqrt
+from os import environ as env
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from .. import state
+from ..models.ingesters import Ingester
+from ..utils import interval_to_seconds, now, rebase_epoch_to_sec
+from ..utils.decorators import SingleFlight
+from ..utils.types import to_bool
+
+UTC = timezone.utc
+
+SERIES_STORE = to_bool(env.get("SERIES_STORE", "true"))
+# ticks buffered per (ingester, field)
+CAPACITY = int(env.get("SERIES_BUFFER", 2048))
+
+ROLLING = ("mean", "std", "var", "min", "max", "sum", "ewma", "pct_change")
+
+
+def _epoch(ts: Any) -> float:
+  if isinstance(ts, datetime):
+    return (ts if ts.tzinfo else ts.replace(tzinfo=UTC)).timestamp()
+  return float(rebase_epoch_to_sec(ts))
+
+
+def _number(value: Any) -> Optional[float]:
+  if value is None or isinstance(value, (bool, str)):
+    return None
+  try:
+    value = float(value)
+  except (TypeError, ValueError):
+    return None
+  return value if isfinite(value) else None
+
+
+class Window:
+  """Running aggregates of the ticks of a buffer within `span` seconds"""
+  __slots__ = ("span", "alpha", "tail", "count", "total", "mean", "m2", "mins",
+               "maxs", "ewma", "first", "last")
+
+  def __init__(self, span: float, alpha: float, tail: int = 0):
+    self.span, self.alpha = span, alpha
+    self.tail = tail  # seq of the oldest tick in the window
+    self.count, self.total, self.mean, self.m2 = 0, 0.0, 0.0, 0.0
+    self.mins: deque[tuple[int, float]] = deque()  # increasing values
+    self.maxs: deque[tuple[int, float]] = deque()  # decreasing values
+    self.ewma: Optional[float] = None
+    self.first = self.last = 0.0
+
+  @classmethod
+  def of(cls, values: list[float], alpha: float) -> "Window":
+    w = cls(inf, alpha)
+    for seq, value in enumerate(values):
+      w.add(seq, value)
+    return w
+
+  def add(self, seq: int, value: float) -> None:
+    self.count += 1
+    if self.count == 1:
+      self.first = value
+    self.total += value
+    delta = value - self.mean  # Welford
+    self.mean += delta / self.count
+    self.m2 += delta * (value - self.mean)
+    while self.mins and self.mins[-1][1] >= value:
+      self.mins.pop()
+    self.mins.append((seq, value))
+    while self.maxs and self.maxs[-1][1] <= value:
+      self.maxs.pop()
+    self.maxs.append((seq, value))
+    self.ewma = value if self.ewma is None else self.ewma + self.alpha * (
+        value - self.ewma)
+    self.last = value
+
+  def drop(self, value: float, first: float) -> None:
+    """Expire the tail tick (`value`), `first` being the next one"""
+    if self.mins[0][0] == self.tail:
+      self.mins.popleft()
+    if self.maxs[0][0] == self.tail:
+      self.maxs.popleft()
+    self.tail += 1
+    self.count -= 1
+    if not self.count:  # also resets the rounding drift
+      self.total, self.mean, self.m2, self.ewma = 0.0, 0.0, 0.0, None
+      return
+    self.total -= value
+    delta = value - self.mean
+    self.mean -= delta / self.count
+    self.m2 -= delta * (value - self.mean)
+    self.first = first
+
+  def stat(self, op: str) -> Optional[float]:
+    if not self.count:
+      return None
+    if op == "mean":
+      return self.mean
+    if op == "sum":
+      return self.total
+    if op in ("var", "std"):
+      var = max(self.m2 / self.count, 0.0)  # population, as np.var
+      return var if op == "var" else sqrt(var)
+    if op == "min":
+      return self.mins[0][1]
+    if op == "max":
+      return self.maxs[0][1]
+    if op == "ewma":
+      return self.ewma
+    if op == "pct_change":
+      return self.last / self.first - 1 if self.first else None
+    raise ValueError(f"Unknown rolling operator: {op}")
+
+
+class Series:
+  """Ring buffer of the recent ticks of a field"""
+  __slots__ = ("interval", "ts", "values", "seq", "since", "windows")
+
+  def __init__(self, interval: float):
+    self.interval = interval  # ingestion interval, seconds
+    self.ts = np.zeros(CAPACITY)
+    self.values = np.zeros(CAPACITY)
+    self.seq = 0  # ticks pushed
+    self.since = inf  # every tick after `since` is buffered
+    self.windows: dict[float, Window] = {}
+
+  def value(self, seq: int) -> float:
+    return float(self.values[seq % CAPACITY])
+
+  def covers(self, span: float, at: float) -> bool:
+    return at - span >= self.since
+
+  def push(self, ts: float, value: float) -> None:
+    if self.seq and ts <= self.ts[(self.seq - 1) % CAPACITY]:
+      return  # late or duplicate tick
+    if self.since == inf:
+      self.since = ts
+    i = self.seq % CAPACITY
+    if self.seq >= CAPACITY:  # evict the oldest tick
+      self.since = max(self.since, self.ts[i])
+      for w in self.windows.values():
+        if w.tail == self.seq - CAPACITY:
+          w.drop(self.value(w.tail), self.value(w.tail + 1))
+    self.ts[i], self.values[i] = ts, value
+    for w in self.windows.values():
+      w.add(self.seq, value)
+    self.seq += 1
+    self.expire(ts)
+
+  def expire(self, at: float) -> None:
+    """Drop the ticks out of each window at time `at`"""
+    for w in self.windows.values():
+      while w.count and self.ts[w.tail % CAPACITY] <= at - w.span:
+        w.drop(self.value(w.tail), self.value(w.tail + 1))
+
+  def window(self, span: float, at: float) -> Window:
+    """Rolling window of `span` seconds, tracked from now on"""
+    if (w := self.windows.get(span)) is None:
+      start = max(0, self.seq - CAPACITY)
+      w = self.windows[span] = Window(span, _alpha(span, self.interval), start)
+      for seq in range(start, self.seq):
+        w.add(seq, self.value(seq))
+    self.expire(at)
+    return w
+
+  def tail(self, span: float, at: float) -> np.ndarray:
+    """Buffered values within `span` seconds of `at`"""
+    idx = np.arange(max(0, self.seq - CAPACITY), self.seq) % CAPACITY
+    return self.values[idx][self.ts[idx] > at - span]
+
+  def seed(self, ts: list[float], values: list[float], since: float) -> None:
+    """Prepend values loaded from the TSDB, all ticks after `since`"""
+    idx = np.arange(max(0, self.seq - CAPACITY), self.seq) % CAPACITY
+    head = self.ts[idx[0]] if len(idx) else inf
+    older = [i for i, t in enumerate(ts) if t < head]
+    all_ts = np.concatenate(([ts[i] for i in older], self.ts[idx]))
+    all_values = np.concatenate(([values[i] for i in older], self.values[idx]))
+    if len(all_ts) > CAPACITY:
+      self.since = max(since, all_ts[-CAPACITY - 1])
+      all_ts, all_values = all_ts[-CAPACITY:], all_values[-CAPACITY:]
+    else:
+      self.since = min(self.since, since)
+    self.seq = len(all_ts)
+    self.ts[:self.seq], self.values[:self.seq] = all_ts, all_values
+    self.windows.clear()  # rebuilt on next read
+
+
+_buffers: dict[tuple[str, str], Series] = {}
+_loads = SingleFlight()
+
+
+def _alpha(span: float, interval: float) -> float:
+  """EWMA smoothing of a span of ticks (the window's tick count)"""
+  return 2 / (max(1.0, span / interval) + 1) if interval else 1.0
+
+
+def clear() -> None:
+  _buffers.clear()
+
+
+def update(ing: Ingester) -> None:
+  """Push the ingester's current values to its buffers (store path)"""
+  if not _buffers:
+    return
+  ts = getattr(ing, "ts", None)
+  if not isinstance(ts, datetime):
+    ts = ing.last_ingested or now()
+  epoch = _epoch(ts)
+  for f in ing.fields:
+    buf = _buffers.get((ing.name, f.name))
+    if buf is not None and (value := _number(f.value)) is not None:
+      buf.push(epoch, value)
+
+
+async def _load(ing: Ingester, field: str,
+                since: float) -> tuple[list[float], list[float]]:
+  """Numeric (ts, value) ticks of a field after `since`, from the TSDB"""
+  columns, rows = await state.tsdb.fetch(ing.name,
+                                         datetime.fromtimestamp(since, UTC),
+                                         now(), ing.interval, [field])
+  if not rows or field not in columns:
+    return [], []
+  t, v = columns.index("ts") if "ts" in columns else 0, columns.index(field)
+  ticks = sorted(
+      (_epoch(row[t]), value) for row in rows
+      if row[t] is not None and (value := _number(row[v])) is not None)
+  ticks = [tick for tick in ticks if tick[0] > since]
+  return [tick[0] for tick in ticks], [tick[1] for tick in ticks]
+
+
+async def value(ing: Ingester,
+                field: str,
+                op: str,
+                lookback: str,
+                reduce: Optional[Callable[[np.ndarray], Any]] = None) -> Any:
+  """
+  Series operator `op` over the last `lookback` of a field's values.
+
+  Args:
+    ing: Ingester owning the field
+    field: Field name
+    op: Rolling operator (see ROLLING), or any operator if `reduce` is given
+    lookback: Window interval (e.g. h1)
+    reduce: Reduction of the window's values for non-rolling operators
+
+  Returns:
+    The operator's value, None for an empty window
+  """
+  span = float(interval_to_seconds(lookback))
+  at = now().timestamp()
+  key = (ing.name, field)
+  buf = _buffers.get(key) if SERIES_STORE else None
+  if buf is None or not buf.covers(span, at):
+    ts, values = await _loads.do((key, span),
+                                 lambda: _load(ing, field, at - span))
+    if SERIES_STORE and len(ts) <= CAPACITY:
+      if buf is None:
+        buf = _buffers[key] = Series(float(ing.interval_sec))
+      buf.seed(ts, values, at - span)
+    if buf is None or not buf.covers(span, at):  # longer than the buffer
+      if op in ROLLING:
+        return Window.of(values, _alpha(span, ing.interval_sec)).stat(op)
+      return reduce(np.array(values)) if values and reduce else None
+
+  if op in ROLLING:
+    return buf.window(span, at).stat(op)
+  window = buf.tail(span, at)
+  return reduce(window) if len(window) and reduce else None
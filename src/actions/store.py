@@ -4,7 +4,8 @@ from typing import Optional
 from ..utils import floor_utc, now, log_debug
 from .. import state
 from ..models.ingesters import Ingester, TimeSeriesIngester, UpdateIngester
-from ..cache import cache, pub
+from ..cache import cache_values, pub
+from . import rollup, series
 # Removed import to avoid circular dependency - imported locally where needed
 
 UTC = timezone.utc
@@ -13,16 +14,16 @@ UTC = timezone.utc
 async def store(ing: Ingester,
                 table: str = "",
                 publish: bool = True,
-                jsonify: bool = False,
                 monitor: bool = True):
   """Store ingester data to database, cache, and optionally publish"""
   # Cache ALL field values (including transient ones)
   all_field_values = ing.get_field_values()
 
   # Cache and publish all fields (including transient for Redis)
-  await cache(ing.name, all_field_values, pickled=not jsonify)
+  await cache_values(ing.name, all_field_values)
   if publish:
     await pub(ing.name, all_field_values)
+  series.update(ing)  # series operators' ring buffers
 
   # Insert to database based on ingester type using type-based dispatch
   if isinstance(ing, UpdateIngester):
@@ -30,6 +31,10 @@ async def store(ing: Ingester,
   elif isinstance(ing, TimeSeriesIngester) or getattr(ing, 'resource_type',
                                                       None) == "timeseries":
     result = await state.tsdb.insert(ing, table)
+    await rollup.update(ing, table)
+    if ing.last_ingested:  # late writes drop the settled history cached
+      from ..services import history_cache
+      await history_cache.invalidate(table or ing.name, ing.last_ingested)
   else:
     # Handle update type with fallback UID
     uid = getattr(ing, 'uid', ing.name)
@@ -60,6 +65,8 @@ async def store_batch(ing: Ingester,
     )
   ok = await state.tsdb.insert_many(ing, values, from_date, to_date,
                                     aggregation_interval)
+  from ..services import history_cache
+  await history_cache.invalidate(ing.name, from_date)
   if state.args.verbose:
     log_debug(
         f"Ingested and stored {len(values)} values for {ing.name}-{ing.interval} [{from_date} -> {to_date}]"
@@ -70,14 +77,13 @@ async def store_batch(ing: Ingester,
 async def transform_and_store(ing: Ingester,
                               table="",
                               publish=True,
-                              jsonify=False,
                               monitor=True):
   """Transform all fields and store if any values were transformed"""
   from ..actions.transform import transform_all
 
   if await transform_all(ing) > 0:
     ing.last_ingested = floor_utc(ing.interval)
-    await store(ing, table, publish, jsonify, monitor)
+    await store(ing, table, publish, monitor)
     return True
   elif state.args.verbose:
     log_debug(f"No new values for {ing.name}")
@@ -1,17 +1,18 @@
+import ast
 import re
 import string
 import orjson
 from hashlib import sha256, md5
 from blake3 import blake3
 import numpy as np
-from asyncio import TimeoutError as FutureTimeoutError
-from typing import Callable, Any
-from dataclasses import dataclass
+from asyncio import gather
+from typing import Callable, Any, Optional
+from dataclasses import dataclass, field as dc_field
 
 from .. import state
 from ..models.base import SYS_FIELDS, ResourceField
 from ..models.ingesters import Ingester
-from ..utils import now, safe_eval, interval_to_delta, log_debug, log_error
+from ..utils import safe_eval, log_debug, log_error
 from ..utils.decorators import cache as _cache
 from ..utils.format import safe_str, split_words
 # from ..utils.mitch import (
@@ -21,8 +22,8 @@ from ..utils.format import safe_str, split_words
 #   mitch_orders_transformer
 # )
 from ..server.responses import ORJSON_OPTIONS
-from ..actions.load import load
-from ..cache import get_cache
+from ..cache import get_cache_fields
+from . import series
 
 
 BASE_TRANSFORMERS: dict[str, Callable] = {
@@ -203,7 +204,9 @@ async def get_cached_field_value(ingester_name: str,
   For 'idx' field: Returns the entire idx dict or a specific field within idx
   For other fields: Returns the direct field value
   """
-  cached_data = await get_cache(ingester_name, pickled=True)
+  cached_data = (await get_cache_fields({
+      ingester_name: [field_name]
+  })).get(ingester_name)
   if not cached_data:
     log_error(f"No cached data found for {ingester_name}")
     return None
@@ -236,15 +239,17 @@ async def get_cached_field_values_batch(
   Returns:
     Dict mapping dotted references to their field values
   """
-  from ..cache import get_cache_batch
-
   ref_map = {ref: parse_cached_reference(ref) for ref in dotted_refs}
-  ingester_names = {ingester for ingester, _ in ref_map.values() if ingester}
+  fields_by_ingester: dict[str, list[str]] = {}
+  for ingester, field_name in ref_map.values():
+    if ingester:
+      fields_by_ingester.setdefault(ingester, []).append(field_name)
 
-  if not ingester_names:
+  if not fields_by_ingester:
     return {}
 
-  cached_data_batch = await get_cache_batch(list(ingester_names), pickled=True)
+  # field-level reads: only the referenced fields are transferred and decoded
+  cached_data_batch = await get_cache_fields(fields_by_ingester)
 
   results = {}
   for ref, (ingester_name, field_name) in ref_map.items():
@@ -336,15 +341,10 @@ async def apply_transformer(ing: "Ingester", field: ResourceField,
   if compiled_transformer.series_steps:
     # This part can be further optimized with gather if multiple series ops are common
     for placeholder, target, func, lookback in compiled_transformer.series_steps:
-      from_date = interval_to_delta(lookback, backwards=True)
-      from_datetime = now() + from_date if from_date else now()
-      series = await load(ing, from_datetime, None)
-
-      if (series_func := SERIES_TRANSFORMERS.get(func)) is not None:
-        data[placeholder] = series_func(ing, series)
-      else:
-        log_error(f"Unknown series transformer function: {func}")
+      if not _is_series_op(func):
         return None
+      data[placeholder] = await _series_value(
+          ing, field.name if target == "self" else target, func, lookback)
 
   # 4. Execute
   try:
@@ -360,24 +360,277 @@ async def transform(ing: Ingester, f: ResourceField) -> Any:
   return f.value
 
 
-async def transform_all(ing: Ingester) -> int:
-  """Transform all fields in the ingester"""
-  # Cache clearing now handled automatically by @_cache decorator
-  count = 0
-  for field in ing.fields:  # sequential field transformation ()
-    # Skip transformation for protected technical fields
-    if field.name in SYS_FIELDS:
-      count += 1
-      continue
+# arithmetic only transformers evaluate over numpy columns, their correctly
+# rounded +, -, *, / and signs matching the scalar evaluation (non-finite rows
+# are re-evaluated); ** is left out, numpy's pow keeping signed zeros and ulps
+# python's does not
+VECTOR_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Add, ast.Sub,
+                ast.Mult, ast.Div, ast.USub, ast.UAdd, ast.Constant,
+                ast.Subscript, ast.Name, ast.Load)
+FAILED = object()  # extern value whose fetch raised
 
+
+@dataclass
+class PlanStep:
+  """A field transformer with its references resolved to slots"""
+  slot: int  # field slot read as {self} and written
+  raw: str
+  fn: Callable[[list, Any, list], Any]  # (slot values, self, externs)
+  has_self: bool
+  externs: list[int]  # extern slots, None (or FAILED) short-circuiting
+  broken: bool = False  # references a missing field, keeps its value
+  reads: Optional[list[tuple[str, int]]] = None  # set when vectorizable
+
+
+@dataclass
+class TransformPlan:
+  """
+  An ingester's transformers compiled once, in evaluation order.
+
+  Fields are transformed in declaration order, each transformer chain
+  reading the current value of the fields it references: earlier fields
+  already transformed, later ones not yet. Externs are the values read
+  outside of the ingester (cached fields of other ingesters, series
+  operators), all fetched before the pass.
+  """
+  names: list[str]
+  steps: list[PlanStep]
+  externs: list[tuple] = dc_field(default_factory=list)
+
+  async def fetch_externs(self, ing: Ingester) -> list:
+    """Cached references in a single batch, series operators concurrently"""
+    values: list = [None] * len(self.externs)
+    refs = {e[1]: k for k, e in enumerate(self.externs) if e[0] == "cache"}
+    if refs:
+      try:
+        cached = await get_cached_field_values_batch(set(refs))
+        for ref, k in refs.items():
+          values[k] = cached.get(ref)
+      except Exception as e:
+        log_error(f"{ing.name} cached references error: {e}")
+        for k in refs.values():
+          values[k] = FAILED
+    ops = [(k, e) for k, e in enumerate(self.externs) if e[0] == "series"]
+    if ops:
+      loaded = await gather(*(_series_value(ing, *e[1:]) for _, e in ops),
+                            return_exceptions=True)
+      for (k, _), value in zip(ops, loaded):
+        if isinstance(value, Exception):
+          log_error(f"{ing.name} series transformer error: {value}")
+          value = FAILED
+        values[k] = value
+    return values
+
+  def run_step(self, step: PlanStep, v: list, x: list) -> tuple[Any, bool]:
+    """Scalar evaluation of a step: its value and whether it succeeded"""
+    value = v[step.slot]
+    if value is None and step.has_self:
+      return None, True
+    for k in step.externs:
+      if x[k] is FAILED:
+        return None, False
+      if x[k] is None:
+        kind, *ref = self.externs[k]
+        log_error(f"Could not resolve {kind} reference {ref} for "
+                  f"transformer '{step.raw}'")
+        return None, True
+    if step.broken:
+      return value, True
     try:
-      await transform(ing, field)
-      count += 1
-    except (FutureTimeoutError, Exception) as e:
-      field.value = None
-      log_error(f"{ing.name}.{field.name} transformer error: {str(e)}")
+      return step.fn(v, value, x), True
+    except Exception as e:
+      log_error(f"Error executing compiled transformer for '{step.raw}': {e}")
+      return value, True
+
+  def run(self, values: list, externs: list) -> int:
+    """Evaluate the steps over a row of slot values, in place"""
+    failed = set()
+    for step in self.steps:
+      if step.slot in failed:
+        continue  # a failed chain leaves its field None
+      values[step.slot], ok = self.run_step(step, values, externs)
+      if not ok:
+        failed.add(step.slot)
+    return len(self.names) - len(failed)
+
+  def run_batch(self, rows: list[list], externs: list[list]) -> list[int]:
+    """Evaluate the steps over many rows, vectorizing arithmetic steps"""
+    failed: list[set] = [set() for _ in rows]
+    for step in self.steps:
+      pending = [r for r in range(len(rows)) if step.slot not in failed[r]]
+      if step.reads is not None and len(pending) == len(rows) > 1:
+        pending = self._run_vector(step, rows, externs)
+      for r in pending:
+        rows[r][step.slot], ok = self.run_step(step, rows[r], externs[r])
+        if not ok:
+          failed[r].add(step.slot)
+    return [len(self.names) - len(f) for f in failed]
+
+  def _run_vector(self, step: PlanStep, rows: list[list],
+                  externs: list[list]) -> list[int]:
+    """Evaluate `step` over numpy columns, returning the rows left to do"""
+    v: list = [None] * len(self.names)
+    x: list = [None] * len(self.externs)
+    reads = (step.reads or []) + ([("v", step.slot)] if step.has_self else [])
+    for kind, i in reads:
+      src = rows if kind == "v" else externs
+      col = [row[i] for row in src]
+      if not all(type(c) is float for c in col):
+        return list(range(len(rows)))  # ints, None... keep python semantics
+      (v if kind == "v" else x)[i] = np.array(col)
+    with np.errstate(all="ignore"):
+      try:
+        out = step.fn(v, v[step.slot], x)
+      except Exception:
+        return list(range(len(rows)))
+    if not isinstance(out, np.ndarray) or out.shape != (len(rows), ):
+      return list(range(len(rows)))
+    finite = np.isfinite(out)
+    for r, value in enumerate(out.tolist()):
+      if finite[r]:
+        rows[r][step.slot] = value
+    return np.flatnonzero(~finite).tolist()
+
+
+def _is_series_op(func: str) -> bool:
+  if func in series.ROLLING or func in SERIES_TRANSFORMERS:
+    return True
+  log_error(f"Unknown series transformer function: {func}")
+  return False
+
+
+async def _series_value(ing: Ingester, field: str, func: str,
+                        lookback: str) -> Any:
+  """Series operator over the recent values of a field (see actions.series)"""
+  if not _is_series_op(func):
+    return None
+  reduce = SERIES_TRANSFORMERS.get(func)
+  return await series.value(ing, field, func, lookback,
+                            (lambda s: reduce(ing, s)) if reduce else None)
+
+
+def _vector_reads(body: str) -> Optional[list[tuple[str, int]]]:
+  """Slots read by an arithmetic-only lambda body, None if not vectorizable"""
+  try:
+    tree = ast.parse(body, mode="eval")
+  except SyntaxError:
+    return None
+  reads: list[tuple[str, int]] = []
+  for node in ast.walk(tree):
+    if not isinstance(node, VECTOR_NODES):
+      return None
+    if isinstance(node, ast.Constant) and type(node.value) not in (int, float):
+      return None
+    if isinstance(node, ast.Subscript):
+      target, index = node.value, node.slice
+      if not (isinstance(target, ast.Name) and target.id in ("_v", "_x") and
+              isinstance(index, ast.Constant) and type(index.value) is int):
+        return None
+      reads.append((target.id[1], index.value))
+    elif isinstance(node, ast.Name) and node.id not in ("_v", "_x", "_s"):
+      return None
+  return reads
+
+
+def _compile_step(transformer: str, slot: int, slots: dict[str, int],
+                  externs: list[tuple], field_name: str) -> PlanStep:
+  """Resolve a transformer's references to slots and compile it"""
+  ct = compile_transformer(transformer)
+  if not re.search(r'\{.+\}', transformer):
+    base = ct.steps
+    return PlanStep(slot,
+                    transformer,
+                    lambda _v, _s, _x: base({}, _s),
+                    ct.has_self_reference, [],
+                    reads=None)
+
+  def extern(key: tuple) -> int:
+    if key not in externs:
+      externs.append(key)
+    return externs.index(key)
+
+  body, step_externs, broken = transformer, [], False
+  if ct.has_self_reference:
+    body = body.replace('{self}', '_s')
+  for ref in ct.field_references:
+    if ref not in slots:
+      log_error(f"Field '{ref}' not found for transformer '{transformer}'")
+      broken = True
+    body = body.replace(f'{{{ref}}}', f"_v[{slots.get(ref, -1)}]")
+  for ref in ct.dotted_references:
+    if ref in slots:
+      body = body.replace(f'{{{ref}}}', f"_v[{slots[ref]}]")
+    else:
+      k = extern(("cache", ref))
+      step_externs.append(k)
+      body = body.replace(f'{{{ref}}}', f"_x[{k}]")
+  for _, target, func, lookback in ct.series_steps:
+    k = extern(
+        ("series", field_name if target == "self" else target, func, lookback))
+    step_externs.append(k)
+    body = body.replace(f'{{{target}::{func}({lookback})}}', f"_x[{k}]")
+
+  try:
+    fn = safe_eval(f"lambda _v, _s, _x: {body}", lambda_check=True)
+  except Exception as e:
+    log_error(f"Failed to compile transformer '{transformer}': {e}")
+    fn = lambda _v, _s, _x: _s
+    return PlanStep(slot, transformer, fn, ct.has_self_reference, step_externs,
+                    broken)
+  return PlanStep(slot, transformer, fn, ct.has_self_reference, step_externs,
+                  broken, None if broken else _vector_reads(body))
+
+
+@_cache(ttl=3600, maxsize=256)
+def _compile_plan(
+    schema: tuple[tuple[str, tuple[str, ...]], ...]) -> TransformPlan:
+  # last field wins on duplicate names, as with Ingester.get_field
+  slots = {field_name: i for i, (field_name, _) in enumerate(schema)}
+  plan = TransformPlan(names=[n for n, _ in schema], steps=[])
+  for i, (field_name, transformers) in enumerate(schema):
+    if field_name in SYS_FIELDS:
+      continue  # protected technical fields
+    for t in transformers:
+      if t:
+        plan.steps.append(_compile_step(t, i, slots, plan.externs, field_name))
+  return plan
+
+
+def compile_plan(ing: Ingester) -> TransformPlan:
+  """Transformer plan of an ingester, shared by ingesters of the same schema"""
+  return _compile_plan(
+      tuple((f.name, tuple(f.transformers or ())) for f in ing.fields))
+
+
+async def transform_all(ing: Ingester) -> int:
+  """Transform all fields of the ingester in a single pass of its plan"""
+  plan = compile_plan(ing)
+  values = [f.value for f in ing.fields]
+  count = plan.run(values, await plan.fetch_externs(ing))
+  for f, value in zip(ing.fields, values):
+    f.value = value
 
   if state.args.verbose:
     log_debug(f"Transformed {ing.name} -> {ing.get_field_values()}")
 
   return count
+
+
+async def transform_batch(ings: list[Ingester]) -> list[int]:
+  """Transform many ingesters, those sharing a schema evaluated together"""
+  groups: dict[int, list[int]] = {}
+  plans = [compile_plan(ing) for ing in ings]
+  for i, plan in enumerate(plans):
+    groups.setdefault(id(plan), []).append(i)
+
+  externs = await gather(*(p.fetch_externs(ing)
+                           for p, ing in zip(plans, ings)))
+  counts = [0] * len(ings)
+  for idx in groups.values():
+    rows = [[f.value for f in ings[i].fields] for i in idx]
+    for i, row, count in zip(
+        idx, rows, plans[idx[0]].run_batch(rows, [externs[i] for i in idx])):
+      for f, value in zip(ings[i].fields, row):
+        f.value = value
+      counts[i] = count
+  return counts
@@ -2,7 +2,7 @@
 # Import only basic modules that don't have optional dependencies
 
 # Base classes and utilities that don't require optional dependencies
-from .jsonrpc import JsonRpcClient
+from .jsonrpc import JsonRpcClient, JsonRpcError
 from .evm_rpc import EvmRpcClient
 from .sui_rpc import SuiRpcClient
 from .svm_rpc import SvmRpcClient
@@ -38,6 +38,7 @@ def get_adapter(adapter_name: str):
 
 __all__ = [
     "JsonRpcClient",
+    "JsonRpcError",
     "EvmRpcClient",
     "SuiRpcClient",
     "SvmRpcClient",
@@ -1,9 +1,25 @@
-from typing import Union, Any, Optional
+import re
+from asyncio import FIRST_COMPLETED, Task, create_task, wait, wait_for
+from collections import deque
+from os import environ as env
+from typing import AsyncIterator, Union, Any, Optional
 from .jsonrpc import JsonRpcClient
 import eth_utils  # happy mypy
 import hexbytes  # happy mypy
 import eth_account  # happy mypy
 
+# eth_getLogs block windows: initial and max size, logs aimed at per window
+EVM_LOGS_RANGE = int(env.get("EVM_LOGS_RANGE", 2000))
+EVM_LOGS_MAX_RANGE = int(env.get("EVM_LOGS_MAX_RANGE", 100000))
+EVM_LOGS_TARGET = int(env.get("EVM_LOGS_TARGET", 5000))
+EVM_LOGS_CONCURRENCY = int(env.get("EVM_LOGS_CONCURRENCY", 4))
+# provider errors of windows too large to query (or to answer in time)
+OVERSIZED_ERRORS = ("too many", "more than", "limit", "exceed", "range",
+                    "response size", "timeout", "timed out")
+RATE_LIMITED = ("rate limit", "too many requests", "429")
+SUGGESTED_RANGE = re.compile(
+    r"\[\s*(0x[0-9a-fA-F]+)\s*,\s*(0x[0-9a-fA-F]+)\s*\]")
+
 
 class EvmRpcClient(JsonRpcClient):
 
@@ -182,3 +198,124 @@ class EvmRpcClient(JsonRpcClient):
               )
     except Exception:
       return False
+
+
+def oversized(error: BaseException) -> Optional[int]:
+  """Size of the window suggested by a "too many results" (or timeout) error,
+  0 if none is suggested, None if the error is not about the window size"""
+  if isinstance(error, TimeoutError):
+    return 0
+  message = str(error).lower()
+  if any(e in message
+         for e in RATE_LIMITED) or not any(e in message
+                                           for e in OVERSIZED_ERRORS):
+    return None
+  if match := SUGGESTED_RANGE.search(message):  # eg. Alchemy, Infura
+    return int(match.group(2), 16) - int(match.group(1), 16) + 1
+  return 0
+
+
+class LogWindows:
+  """
+  Adaptive eth_getLogs block window: shrinks on oversized windows (too many
+  results, timeouts), grows while responses are sparse.
+  """
+
+  def __init__(self,
+               size: int = EVM_LOGS_RANGE,
+               max_size: int = EVM_LOGS_MAX_RANGE,
+               target: int = EVM_LOGS_TARGET):
+    self.max_size, self.target = max(max_size, 1), max(target, 1)
+    self.size = min(max(size, 1), self.max_size)
+
+  def shrink(self, blocks: int, suggested: int = 0) -> int:
+    """New size after a window of `blocks` failed"""
+    size = suggested if 0 < suggested < blocks else blocks // 2
+    self.size = max(min(self.size, size), 1)
+    return self.size
+
+  def observe(self, blocks: int, logs: int) -> None:
+    """Fit the size to a window of `blocks` that returned `logs` logs"""
+    if logs > self.target:
+      self.size = max(blocks * self.target // logs, 1)
+    elif logs < self.target // 2 and blocks >= self.size:
+      grown = blocks * 2 if not logs else blocks * self.target // (2 * logs)
+      self.size = min(max(grown, self.size), self.max_size)
+
+
+async def stream_logs(
+    clients: list[EvmRpcClient],
+    log_filter: dict[str, Any],
+    start: int,
+    end: int,
+    windows: Optional[LogWindows] = None,
+    concurrency: int = EVM_LOGS_CONCURRENCY,
+    max_retries: int = 3,
+    timeout: Optional[float] = None
+) -> AsyncIterator[tuple[int, int, list[dict]]]:
+  """
+  Fetch the logs of blocks [start, end] over adaptive windows, several in
+  flight across `clients` (round-robin).
+
+  Args:
+    clients: RPC clients of the chain
+    log_filter: eth_getLogs filter (address, topics)
+    start: First block
+    end: Last block
+    windows: Window sizing, shared across calls to keep what it learnt
+    concurrency: Windows in flight
+    max_retries: Retries of a window failing for other reasons than its size
+    timeout: Seconds before a window is considered oversized
+
+  Yields:
+    (from block, to block, logs) of every window, in completion order
+  """
+  if not clients or start > end:
+    return
+  windows = windows or LogWindows()
+  retries: deque[tuple[int, int, int]] = deque()  # split or failed windows
+  in_flight: dict[Task, tuple[int, int, int]] = {}
+  cursor, calls = start, 0
+
+  def launch(lo: int, hi: int, attempt: int) -> None:
+    nonlocal calls
+    client = clients[calls % len(clients)]
+    calls += 1
+    request = client.get_logs(lo, hi, log_filter.get("address"),
+                              log_filter.get("topics"))
+    in_flight[create_task(wait_for(request, timeout
+                                   or client.timeout))] = (lo, hi, attempt)
+
+  try:
+    while cursor <= end or retries or in_flight:
+      while len(in_flight) < concurrency and (retries or cursor <= end):
+        if retries:
+          launch(*retries.popleft())
+        else:
+          hi = min(end, cursor + windows.size - 1)
+          launch(cursor, hi, 0)
+          cursor = hi + 1
+      done, _ = await wait(in_flight, return_when=FIRST_COMPLETED)
+      for task in done:
+        lo, hi, attempt = in_flight.pop(task)
+        try:
+          logs = task.result()
+        except Exception as e:
+          blocks = hi - lo + 1
+          suggested = oversized(e)
+          if suggested is not None and blocks > 1:
+            size = windows.shrink(blocks, suggested)
+            retries.extendleft(
+                reversed([(b, min(b + size - 1, hi), 0)
+                          for b in range(lo, hi + 1, size)]))
+          elif attempt < max_retries:
+            retries.append((lo, hi, attempt + 1))  # on the next client
+          else:
+            raise Exception(
+                f"Failed to fetch logs of blocks {lo}-{hi}: {e}") from e
+          continue
+        windows.observe(hi - lo + 1, len(logs or []))
+        yield lo, hi, logs or []
+  finally:
+    for task in in_flight:
+      task.cancel()
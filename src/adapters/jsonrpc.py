@@ -1,7 +1,81 @@
 import orjson
-from typing import Any, Optional
+from asyncio import Future, Task, TimerHandle, create_task, gather, get_running_loop
+from itertools import count
+from os import environ as env
+from time import monotonic
+from typing import Any, Callable, Optional
 
 from ..utils.http import post
+from ..utils import log_warn
+from ..utils.types import to_bool
+
+# calls to an endpoint issued within the window are sent as a single batch
+JSONRPC_COALESCE = to_bool(env.get("JSONRPC_COALESCE", "true"))
+COALESCE_WINDOW = float(env.get("JSONRPC_COALESCE_MS", 2)) / 1000
+MAX_BATCH = int(env.get("JSONRPC_MAX_BATCH", 50))
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
+
+_unbatched: set[str] = set()  # endpoints answering batches with an error
+
+
+class JsonRpcError(Exception):
+  """Error answered to a JSON-RPC call"""
+
+  def __init__(self, error: Any):
+    super().__init__(f"JSON-RPC Error: {error}")
+    self.error = error
+    self.code = error.get("code") if isinstance(error, dict) else None
+
+
+class Coalescer:
+  """Pending calls to an endpoint, flushed as a batch after COALESCE_WINDOW
+  or once MAX_BATCH are pending"""
+
+  def __init__(self, client: "JsonRpcClient"):
+    self.client = client
+    self.loop = get_running_loop()
+    self.pending: list[tuple[dict, Future]] = []
+    self.ids = count(1)
+    self.timer: Optional[TimerHandle] = None
+    self.tasks: set[Task] = set()
+
+  def call(self, method: str, params: Optional[Any] = None) -> Future:
+    future = self.loop.create_future()
+    self.pending.append((self.client._payload(method, params,
+                                              next(self.ids)), future))
+    if len(self.pending) >= self.client.max_batch:
+      self.flush()
+    elif self.timer is None:
+      self.timer = self.loop.call_later(self.client.coalesce_window,
+                                        self.flush)
+    return future
+
+  def flush(self) -> None:
+    if self.timer is not None:
+      self.timer.cancel()
+      self.timer = None
+    batch, self.pending = self.pending, []
+    if batch:
+      task = create_task(self.send(batch))
+      self.tasks.add(task)
+      task.add_done_callback(self.tasks.discard)
+
+  async def send(self, batch: list[tuple[dict, Future]]) -> None:
+    try:
+      results = await self.client._send([payload for payload, _ in batch])
+    except Exception as e:  # request failed: every call did
+      results = [e] * len(batch)
+    for (_, future), result in zip(batch, results):
+      if future.done():
+        continue  # cancelled (eg. timed out)
+      if isinstance(result, BaseException):
+        future.set_exception(result)
+      else:
+        future.set_result(result)
+
+
+# by client config, shared by the clients of an endpoint configured alike
+_coalescers: dict[tuple, Coalescer] = {}
 
 
 class JsonRpcClient:
@@ -10,13 +84,22 @@ class JsonRpcClient:
                endpoint: str,
                headers: Optional[dict[str, str]] = None,
                timeout: float = 10.0,
-               jsonrpc_version: str = "2.0"):
+               jsonrpc_version: str = "2.0",
+               coalesce: Optional[bool] = None,
+               coalesce_window: float = COALESCE_WINDOW,
+               max_batch: int = MAX_BATCH):
     self.endpoint = endpoint
     self.headers = headers or {"Content-Type": "application/json"}
     self.timeout = timeout
     self.jsonrpc_version = jsonrpc_version
+    self.coalesce = JSONRPC_COALESCE if coalesce is None else coalesce
+    self.coalesce_window = coalesce_window
+    self.max_batch = max(max_batch, 1)
     self.user: Optional[str] = None
     self.password: Optional[str] = None
+    # called with the latency of every call and its error, if the endpoint
+    # did not answer (eg. to score the endpoint's health)
+    self.monitor: Optional[Callable[[float, Optional[Exception]], None]] = None
 
   def set_auth(self, user: str, password: str) -> None:
     """Set authentication credentials."""
@@ -45,22 +128,19 @@ class JsonRpcClient:
   async def is_connected(self) -> bool:
     return await self.ping()
 
-  async def call(self,
-                 method: str,
-                 params: Optional[Any] = None,
-                 request_id: int = 1,
-                 ensure_connected=True) -> Any:
-    payload = {
+  def _payload(self, method: str, params: Optional[Any],
+               request_id: int) -> dict:
+    return {
         "jsonrpc": self.jsonrpc_version,
         "method": method,
         "params": params or [],
         "id": request_id,
     }
 
+  async def _post(self, payload: Any) -> Any:
+    """Decoded response to a call or batch"""
     # Serialize payload to JSON and calculate Content-Length
-    json_payload = orjson.dumps(payload,
-                                option=orjson.OPT_SERIALIZE_NUMPY
-                                | orjson.OPT_SERIALIZE_DATACLASS)
+    json_payload = orjson.dumps(payload, option=ORJSON_OPTIONS)
     headers = self.headers.copy()
     headers["Content-Length"] = str(len(json_payload))
 
@@ -71,11 +151,96 @@ class JsonRpcClient:
                             user=self.user,
                             password=self.password)
       response.raise_for_status()  # Raise an error for HTTP-level issues
-      data = response.json()
+      return response.json()
     except Exception as e:
       raise Exception(f"Failed to connect to {self.endpoint}: {e}")
 
-    if "error" in data:
-      raise Exception(f"JSON-RPC Error: {data['error']}")
+  def _result(self, answer: Any) -> Any:
+    """Result of a call's answer, its error if it failed (not a JsonRpcError
+    if the endpoint did not answer it)"""
+    if not isinstance(answer, dict):
+      return Exception(
+          f"Invalid or missing response from {self.endpoint}: {answer}")
+    if "error" in answer:
+      return JsonRpcError(answer["error"])
+    return answer.get("result")
+
+  async def _send(self, payloads: list[dict]) -> list[Any]:
+    """Results (or errors) of calls sent as one batch, demultiplexed by id"""
+    if len(payloads) == 1 or self.endpoint in _unbatched:
+      answers = await gather(*(self._post(p) for p in payloads),
+                             return_exceptions=True)
+      return [
+          a if isinstance(a, BaseException) else self._result(a)
+          for a in answers
+      ]
+    answers = await self._post(payloads)
+    if not isinstance(answers, list):
+      log_warn(f"{self.endpoint} does not support JSON-RPC batches "
+               f"({answers}), sending calls one by one...")
+      _unbatched.add(self.endpoint)
+      return await self._send(payloads)
+    by_id = {a.get("id"): a for a in answers if isinstance(a, dict)}
+    return [self._result(by_id.get(p["id"])) for p in payloads]
+
+  def _coalescer(self) -> Coalescer:
+    key = (self.endpoint, self.user, self.password,
+           tuple(sorted(self.headers.items())), self.timeout,
+           self.jsonrpc_version, self.coalesce_window, self.max_batch)
+    coalescer = _coalescers.get(key)
+    if coalescer is None or coalescer.loop is not get_running_loop():
+      coalescer = _coalescers[key] = Coalescer(self)
+    return coalescer
+
+  async def batch(self,
+                  calls: list[tuple[str, Optional[Any]]],
+                  return_exceptions: bool = False) -> list[Any]:
+    """
+    Send (method, params) calls as JSON-RPC batches of up to `max_batch`.
+
+    Args:
+      calls: Calls to send
+      return_exceptions: Return the errors of failed calls in place of their
+        results instead of raising the first one
+
+    Returns:
+      Results of the calls, in order
+    """
+    results: list[Any] = []
+    for i in range(0, len(calls), self.max_batch):
+      results.extend(await self._send([
+          self._payload(method, params, i + k + 1)
+          for k, (method, params) in enumerate(calls[i:i + self.max_batch])
+      ]))
+    if not return_exceptions:
+      for result in results:
+        if isinstance(result, BaseException):
+          raise result
+    return results
+
+  async def call(self,
+                 method: str,
+                 params: Optional[Any] = None,
+                 request_id: int = 1,
+                 ensure_connected=True) -> Any:
+    start = monotonic()
+    try:
+      if self.coalesce:
+        result = await self._coalescer().call(method, params)
+      else:
+        result = self._result(await self._post(
+            self._payload(method, params, request_id)))
+        if isinstance(result, BaseException):
+          raise result
+    except JsonRpcError:
+      self._observe(start)  # answered
+      raise
+    except Exception as e:
+      self._observe(start, e)
+      raise
+    self._observe(start)
+    return result
 
-    return data.get("result")
+  def _observe(self, start: float, error: Optional[Exception] = None) -> None:
+    if self.monitor is not None:
+      self.monitor(monotonic() - start, error)
@@ -3,7 +3,7 @@ from os import environ as env
 from typing import Any, Optional
 
 from ..utils import log_error, log_info, Interval, ago, now
-from ..models.base import Tsdb
+from ..models.base import Tsdb, keyset_columns
 from ..models.ingesters import Ingester, UpdateIngester
 
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -422,6 +422,62 @@ class MongoDb(Tsdb):
       log_error(f"Failed to fetch document with uid {uid} from {table}", e)
       return None
 
+  async def fetch_page(
+      self,
+      table: str,
+      limit: int = 100,
+      after: Optional[tuple[Any,
+                            Any]] = None) -> tuple[list[str], list[tuple]]:
+    """Fetch a keyset-paginated page of documents, newest first."""
+    await self.ensure_connected()
+    if self.database is None:
+      raise RuntimeError("Database connection not established")
+
+    collection = self.database[table]
+
+    try:
+      sample = await collection.find_one({}, {"_id": 0})
+      if not sample:
+        return ([], [])
+      columns = list(sample.keys())
+      time_col, uid_col = keyset_columns(columns)
+      if not time_col:
+        log_error(f"No time column to paginate {table} on")
+        return ([], [])
+
+      query: dict[str, Any] = {}
+      if after:
+        query = {"$or": [{time_col: {"$lt": after[0]}}]}
+        if uid_col:
+          query["$or"].append({time_col: after[0], uid_col: {"$lt": after[1]}})
+      sort = [(time_col, -1)] + ([(uid_col, -1)] if uid_col else [])
+
+      cursor = collection.find(query, {"_id": 0}).sort(sort).limit(limit)
+      rows = [tuple(doc.get(col) for col in columns) async for doc in cursor]
+      return (columns, rows)
+
+    except Exception as e:
+      log_error(f"Failed to fetch page from {table}", e)
+      return ([], [])
+
+  async def delete_range(self,
+                         table: str,
+                         from_date: datetime,
+                         to_date: Optional[datetime] = None):
+    """Delete the documents of a time range."""
+    await self.ensure_connected()
+    if self.database is None:
+      raise RuntimeError("Database connection not established")
+
+    query: dict[str, Any] = {"$gte": from_date}
+    if to_date:
+      query["$lte"] = to_date
+    try:
+      await self.database[table].delete_many({"ts": query})
+    except Exception as e:
+      log_error(f"Failed to delete documents from {table}", e)
+      raise e
+
   async def fetch(self,
                   table: str,
                   from_date: Optional[datetime] = None,
@@ -253,6 +253,13 @@ class QuestDb(SqlAdapter):
           f"Failed to fetch batch records by IDs from QuestDB {table}: {e}")
       return []
 
+  async def delete_range(self,
+                         table: str,
+                         from_date: datetime,
+                         to_date: Optional[datetime] = None):
+    """QuestDB has no DELETE (partitions can only be dropped whole)."""
+    raise NotImplementedError
+
   async def insert(self, ing: Ingester, table: str = ""):
     """QuestDB-specific insert using ILP (InfluxDB Line Protocol) for better performance."""
     await self.ensure_connected()
@@ -1,11 +1,12 @@
 from abc import ABC, abstractmethod
 from asyncio import gather
+from inspect import isawaitable
 from datetime import datetime, timezone
 from os import environ as env
 from typing import Dict, Any, Optional
 
 from ..utils import log_error, log_info, log_warn, Interval, ago, now
-from ..models.base import Tsdb, FieldType
+from ..models.base import Tsdb, FieldType, keyset_columns
 from ..models.ingesters import Ingester, UpdateIngester
 
 UTC = timezone.utc
@@ -259,8 +260,8 @@ class SqlAdapter(Tsdb, ABC):
         try:
           cursor_method = getattr(self.conn, 'cursor', None)
           if cursor_method:
-            self.cursor = await cursor_method() if hasattr(
-                cursor_method, '__await__') else cursor_method()
+            cursor = cursor_method()
+            self.cursor = await cursor if isawaitable(cursor) else cursor
         except Exception:
           pass  # Some databases might not support cursors
 
@@ -395,6 +396,70 @@ class SqlAdapter(Tsdb, ABC):
       log_error(f"Failed to fetch data from {self.db}.{table}", e)
       return ([], [])
 
+  async def fetch_page(
+      self,
+      table: str,
+      limit: int = 100,
+      after: Optional[tuple[Any,
+                            Any]] = None) -> tuple[list[str], list[tuple]]:
+    """Fetch a keyset-paginated page of records, newest first."""
+    await self.ensure_connected()
+
+    columns = await self._get_table_columns(table)
+    time_col, uid_col = keyset_columns(columns)
+    if not time_col:
+      log_error(f"No time column to paginate {self.db}.{table} on")
+      return ([], [])
+
+    order = [time_col] + ([uid_col] if uid_col else [])
+    where, params = "", []
+    if after:
+      p = self._build_placeholders(3).split(", ")
+      t = self._quote_identifier(time_col)
+      if uid_col:
+        u = self._quote_identifier(uid_col)
+        where = f"WHERE {t} < {p[0]} OR ({t} = {p[1]} AND {u} < {p[2]})"
+        params = [after[0], after[0], after[1]]
+      else:
+        where = f"WHERE {t} < {p[0]}"
+        params = [after[0]]
+
+    query = f"""
+    SELECT {', '.join(self._quote_identifier(col) for col in columns)}
+    FROM {self._quote_identifier(table)}
+    {where}
+    ORDER BY {', '.join(f'{self._quote_identifier(col)} DESC' for col in order)}
+    LIMIT {int(limit)}
+    """
+
+    try:
+      return (columns, await self._fetch(query, tuple(params)))
+    except Exception as e:
+      log_error(f"Failed to fetch page from {self.db}.{table}", e)
+      return ([], [])
+
+  async def delete_range(self,
+                         table: str,
+                         from_date: datetime,
+                         to_date: Optional[datetime] = None):
+    """Delete the records of a time range with generic SQL DELETE."""
+    await self.ensure_connected()
+
+    ts = self._quote_identifier("ts")
+    p = self._build_placeholders(2).split(", ")
+    where, params = f"{ts} >= {p[0]}", [from_date]
+    if to_date:
+      where += f" AND {ts} <= {p[1]}"
+      params.append(to_date)
+
+    try:
+      await self._execute(
+          f"DELETE FROM {self._quote_identifier(table)} WHERE {where}",
+          tuple(params))
+    except Exception as e:
+      log_error(f"Failed to delete records from {self.db}.{table}", e)
+      raise e
+
   async def _get_table_columns(self, table: str) -> list[str]:
     """Get column names for a table. Should be overridden by subclasses."""
     try:
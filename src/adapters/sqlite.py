@@ -206,7 +206,8 @@ class SQLite(SqlAdapter):
   async def _get_table_columns(self, table: str) -> list[str]:
     """SQLite-specific column information query."""
     try:
-      result = await self._fetch("PRAGMA table_info(?)", (table, ))
+      result = await self._fetch("SELECT * FROM pragma_table_info(?)",
+                                 (table, ))
       # Return all columns including ts since it's now a proper field
       return [row[1] for row in result]
     except Exception:
@@ -1,16 +1,53 @@
-from asyncio import gather, iscoroutinefunction, iscoroutine, sleep
+from asyncio import CancelledError, Task, create_task, gather, iscoroutinefunction, iscoroutine, sleep
+from copy import copy
 from os import environ as env
-import pickle
+from secrets import token_hex
+from time import monotonic
 from typing import Callable, Any, Optional, Union
 
+from redis.exceptions import ResponseError
+
 from .models.ingesters import Ingester
 from .models.base import Scope
-from .utils import now, log_debug, log_info, log_error, log_warn, YEAR_SECONDS, merge_replace_empty, Interval
+from .utils import now, log_debug, log_info, log_error, log_warn, YEAR_SECONDS, merge_replace_empty, Interval, interval_to_seconds
+from .utils import codec
+from .utils.types import to_bool
 from . import state
-from .utils.decorators import cache as _cache
+from .utils.decorators import SingleFlight, cache as _cache
 
 NS = env.get("REDIS_NS", "chomp")
 
+# in-process L1 of decoded resource values, kept fresh by their pub messages
+CACHE_L1 = to_bool(env.get("CACHE_L1", "true"))
+# upper bound of an L1 entry's lifetime, which defaults to its ingester interval
+L1_MAX_TTL = float(env.get("CACHE_L1_MAX_TTL", 300))
+L1_MAXSIZE = int(env.get("CACHE_L1_SIZE", 4096))
+# also keep ingester values as hashes of encoded fields, for field-level reads
+CACHE_HASH = to_bool(env.get("CACHE_HASH", "false"))
+# discovery indexes are rebuilt by SCAN at most once per interval cluster-wide
+INDEX_REPAIR_INTERVAL = int(env.get("CACHE_INDEX_REPAIR", 3600))
+SCAN_COUNT = int(env.get("CACHE_SCAN_COUNT", 1000))
+# optional Redis Streams transport: pub also appends to a capped stream per topic
+STREAMS = to_bool(env.get("CACHE_STREAMS", "false"))
+STREAM_MAXLEN = int(env.get("CACHE_STREAM_MAXLEN", 1000))
+STREAM_BATCH = int(env.get("CACHE_STREAM_BATCH", 100))
+
+StreamEntry = tuple[str, str, Any]  # topic, entry id, decoded message
+
+# get_or_set_cache misses are filled once per process, and once per cluster
+# while the filler holds its short Redis lock (followers poll the cache)
+CACHE_LOCK = to_bool(env.get("CACHE_LOCK", "true"))
+LOCK_TTL = float(env.get("CACHE_LOCK_TTL", 10))
+_fills = SingleFlight()
+# deletes a lock only if still held by the given token
+RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+# name -> (expires_at, ttl, value)
+_l1: dict[str, tuple[float, float, Any]] = {}
+_l1_gen: dict[str, int] = {}  # bumped on invalidation, guards in-flight reads
+_l1_task: Optional[Task] = None
+_repair_task: Optional[Task] = None
+
 
 async def ping() -> bool:
   try:
@@ -24,6 +61,11 @@ def claim_key(ing: Ingester) -> str:
   return f"{NS}:claim:{ing.name}:{ing.interval}"
 
 
+def index_key(kind: str) -> str:
+  """Discovery index: sorted set of resources, monitors or claims, scored by expiry"""
+  return f"{NS}:index:{kind}"
+
+
 async def claim_task(ing: Ingester, until: int = 0, key: str = "") -> bool:
   if state.args.verbose:
     log_debug(f"Claiming task {ing.name}.{ing.interval}")
@@ -32,9 +74,14 @@ async def claim_task(ing: Ingester, until: int = 0, key: str = "") -> bool:
   key = key or claim_key(ing)
   if await is_task_claimed(ing, True, key):
     return False
-  return await state.redis.setex(
-      key, round(until or (ing.interval_sec + 8)),
-      state.args.proc_id)  # 8 sec overtime buffer for long running tasks
+  # 8 sec overtime buffer for long running tasks
+  expiry = round(until or (ing.interval_sec + 8))
+  async with state.redis.pipeline() as pipe:
+    pipe.setex(key, expiry, state.args.proc_id)
+    pipe.zadd(index_key("claims"),
+              {key.removeprefix(f"{NS}:claim:"): now().timestamp() + expiry})
+    results = await pipe.execute()
+  return bool(results[0])
 
 
 async def ensure_claim_task(ing: Ingester, until: int = 0) -> bool:
@@ -75,7 +122,11 @@ async def is_task_claimed(ing: Ingester,
 
 async def free_task(ing: Ingester, key: str = "") -> bool:
   key = key or claim_key(ing)
-  return bool(await state.redis.delete(key))
+  async with state.redis.pipeline() as pipe:
+    pipe.delete(key)
+    pipe.zrem(index_key("claims"), key.removeprefix(f"{NS}:claim:"))
+    results = await pipe.execute()
+  return bool(results[0])
 
 
 # Monitoring-based discovery implementation
@@ -85,6 +136,123 @@ def cache_key(name: str) -> str:
   return f"{NS}:cache:{name}"
 
 
+def fields_key(name: str) -> str:
+  return f"{NS}:fields:{name}"
+
+
+def _index(pipe: Any, name: str, expiry: float) -> None:
+  """Queue the discovery index updates of a cached resource"""
+  score = now().timestamp() + expiry
+  pipe.zadd(index_key("resources"), {name: score})
+  if name.endswith(".monitor"):
+    pipe.zadd(index_key("monitors"), {name: score})
+
+
+def l1_active() -> bool:
+  """The L1 only serves reads while its invalidation listener is running"""
+  return _l1_task is not None and not _l1_task.done()
+
+
+def l1_invalidate(name: str, value: Any = None) -> None:
+  """Drop (or refresh with `value`) the L1 entry of a resource"""
+  _l1_gen[name] = _l1_gen.get(name, 0) + 1
+  entry = _l1.pop(name, None)
+  if entry is not None and value is not None:
+    _l1[name] = (monotonic() + entry[1], entry[1], value)
+
+
+def clear_l1() -> None:
+  _l1.clear()
+  _l1_gen.clear()
+
+
+def _l1_get(name: str) -> Any:
+  entry = _l1.get(name)
+  if entry is None:
+    return None
+  if entry[0] < monotonic():
+    del _l1[name]
+    return None
+  return copy(entry[2])  # callers decorate the values they read
+
+
+@_cache(ttl=300, maxsize=1)
+async def get_resource_intervals() -> dict[str, int]:
+  """Interval of every registered ingester, in seconds"""
+  return {
+      name: interval_to_seconds(config["interval"])
+      for name, config in (await get_registered_ingesters()).items()
+      if isinstance(config, dict) and config.get("interval")
+  }
+
+
+async def _l1_put(name: str, value: Any, gen: int) -> None:
+  """Hold a value read from Redis unless it was invalidated in the meantime"""
+  try:
+    interval = (await get_resource_intervals()).get(name)
+  except Exception:
+    return
+  if not interval or _l1_gen.get(name, 0) != gen:
+    return  # not an ingester resource (no pub to invalidate it), or stale
+  ttl = min(interval, L1_MAX_TTL)
+  _l1[name] = (monotonic() + ttl, ttl, value)
+  while len(_l1) > L1_MAXSIZE:
+    del _l1[next(iter(_l1))]
+
+
+async def _l1_listen() -> None:
+  """Refresh L1 entries from the values published by `actions.store.store`"""
+  prefix = f"{NS}:"
+  while True:
+    # dedicated connection, the shared pubsub belongs to the ws forwarder
+    pubsub = state.redis.redis.pubsub()
+    try:
+      await pubsub.psubscribe(f"{prefix}*")
+      clear_l1()  # anything published while disconnected was missed
+      async for msg in pubsub.listen():
+        if msg["type"] != "pmessage":
+          continue
+        name = msg["channel"].decode()[len(prefix):]
+        if name not in _l1:
+          l1_invalidate(name)
+          continue
+        try:
+          l1_invalidate(name, codec.decode(msg["data"]))
+        except Exception:
+          l1_invalidate(name)
+    except CancelledError:
+      raise
+    except Exception as e:
+      clear_l1()
+      log_warn(f"Cache L1 listener error: {e}, reconnecting in 5s...")
+      await sleep(5)
+    finally:
+      try:
+        await pubsub.close()
+      except Exception:
+        pass
+
+
+def start_l1() -> None:
+  """Start serving resource reads from the L1 (API workers)"""
+  global _l1_task
+  if CACHE_L1 and not l1_active():
+    clear_l1()
+    _l1_task = create_task(_l1_listen())
+
+
+async def stop_l1() -> None:
+  global _l1_task
+  if _l1_task is not None:
+    _l1_task.cancel()
+    try:
+      await _l1_task
+    except CancelledError:
+      pass
+    _l1_task = None
+  clear_l1()
+
+
 async def cache(name: str,
                 value: Any,
                 expiry: int = YEAR_SECONDS,
@@ -92,16 +260,24 @@ async def cache(name: str,
                 encoding: str = "",
                 pickled: bool = False) -> bool:
   key = name if raw_key else cache_key(name)
-  # use pickle by default for complex objects unless explicitly disabled
+  if not raw_key:
+    l1_invalidate(name)
+  # use the object codec by default for complex objects unless explicitly disabled
   if pickled or (not isinstance(value, (str, int, float, bool, type(None)))
                  and not encoding):
-    value = pickle.dumps(value)
+    value = codec.encode(value)
   elif encoding:
     value = value.encode(encoding) if isinstance(
         value, str) else str(value).encode(encoding)
   else:
     value = str(value)
-  return bool(await state.redis.setex(key, expiry, value))
+  if raw_key:
+    return bool(await state.redis.setex(key, expiry, value))
+  async with state.redis.pipeline() as pipe:
+    pipe.setex(key, expiry, value)
+    _index(pipe, name, expiry)
+    results = await pipe.execute()
+  return bool(results[0])
 
 
 async def cache_batch(data: dict,
@@ -113,30 +289,51 @@ async def cache_batch(data: dict,
   async with state.redis.pipeline() as pipe:
     for name, value in data.items():
       key = name if raw_key else cache_key(name)
+      if not raw_key:
+        l1_invalidate(name)
 
       # Simplified value processing
       if pickled:
-        processed_value = pickle.dumps(value)
+        processed_value = codec.encode(value)
       elif encoding:
         processed_value = (value.encode(encoding) if isinstance(value, str)
                            else str(value).encode(encoding))
       elif isinstance(value, (str, int, float, bool, type(None))):
         processed_value = str(value)
       else:
-        # Non-serializable types default to pickle
-        processed_value = pickle.dumps(value)
+        # Non-serializable types default to the object codec
+        processed_value = codec.encode(value)
 
       pipe.setex(key, expiry, processed_value)
+      if not raw_key:
+        _index(pipe, name, expiry)
 
     await pipe.execute()
 
 
+async def cache_values(name: str,
+                       values: dict[str, Any],
+                       expiry: int = YEAR_SECONDS) -> bool:
+  """Cache an ingester's latest values, plus their field hash if CACHE_HASH is set"""
+  if not CACHE_HASH:
+    return await cache(name, values, expiry, pickled=True)
+  l1_invalidate(name)
+  key = fields_key(name)
+  async with state.redis.pipeline(transaction=True) as pipe:
+    pipe.setex(cache_key(name), expiry, codec.encode(values))
+    pipe.hset(key, mapping={k: codec.encode(v) for k, v in values.items()})
+    pipe.expire(key, expiry)
+    _index(pipe, name, expiry)
+    results = await pipe.execute()
+  return bool(results[0])
+
+
 def decode_cache_value(value: bytes,
                        pickled: bool = False,
                        encoding: str = "") -> Any:
   """Generic cache value decoder for consistent decoding across cache functions"""
   if pickled:
-    return pickle.loads(value)
+    return codec.decode(value)
   elif encoding:
     return value.decode(encoding)
   else:
@@ -147,54 +344,272 @@ async def get_cache(name: str,
                     pickled: bool = False,
                     encoding: str = "",
                     raw_key: bool = False) -> Any:
+  l1 = pickled and not raw_key and l1_active()
+  if l1 and (hit := _l1_get(name)) is not None:
+    return hit
+  gen = _l1_gen.get(name, 0)
   key = name if raw_key else cache_key(name)
   value = await state.redis.get(key)
   if value is None:
     return None
-  return decode_cache_value(value, pickled, encoding)
+  decoded = decode_cache_value(value, pickled, encoding)
+  if l1:
+    await _l1_put(name, decoded, gen)
+    return copy(decoded)
+  return decoded
 
 
 async def get_cache_batch(names: list[str],
                           pickled: bool = False,
                           encoding: str = "",
                           raw_key: bool = False) -> dict[str, Any]:
-  keys = [name if raw_key else cache_key(name) for name in names]
-  values = await state.redis.mget(keys)
-
+  l1 = pickled and not raw_key and l1_active()
+  hits = {
+      name: hit
+      for name in names if (hit := _l1_get(name)) is not None
+  } if l1 else {}
+  missing = [name for name in names if name not in hits]
+  fetched: dict[str, Any] = {}
+  if missing:
+    gens = [_l1_gen.get(name, 0) for name in missing]
+    keys = [name if raw_key else cache_key(name) for name in missing]
+    values = await state.redis.mget(keys)
+    for i, value in enumerate(values):
+      if value is None:
+        continue
+      decoded = decode_cache_value(value, pickled, encoding)
+      if l1:
+        await _l1_put(missing[i], decoded, gens[i])
+        decoded = copy(decoded)
+      fetched[missing[i]] = decoded
+  if not hits:
+    return fetched
   return {
-      names[i]: decode_cache_value(value, pickled, encoding)
-      for i, value in enumerate(values) if value is not None
+      name: hits[name] if name in hits else fetched[name]
+      for name in names if name in hits or name in fetched
   }
 
 
+async def get_cache_fields(
+    fields_by_name: dict[str, list[str]]) -> dict[str, dict[str, Any]]:
+  """Selected fields of cached ingester values.
+
+  Served from the L1 when it holds the whole value, else from the field
+  hashes with pipelined HMGET (only the requested fields are transferred and
+  decoded), else from the whole cached value for resources without a hash.
+
+  Args:
+    fields_by_name: Fields to read per ingester name
+
+  Returns:
+    Dict of {name: {field: value}}, missing fields as None, missing resources omitted
+  """
+  result: dict[str, dict[str, Any]] = {}
+  pending: dict[str, list[str]] = {}
+  l1 = l1_active()
+  for name, fields in fields_by_name.items():
+    if l1 and (hit := _l1_get(name)) is not None:
+      result[name] = {f: hit.get(f) for f in fields}
+    else:
+      pending[name] = list(fields)
+
+  if pending and CACHE_HASH:
+    async with state.redis.pipeline(transaction=False) as pipe:
+      for name, fields in pending.items():
+        pipe.hmget(fields_key(name), fields)
+      rows = await pipe.execute()
+    for (name, fields), row in zip(list(pending.items()), rows):
+      if any(v is not None for v in row):
+        result[name] = {
+            f: codec.decode(v) if v is not None else None
+            for f, v in zip(fields, row)
+        }
+        del pending[name]
+
+  if pending:  # no hash (yet), read whole values
+    values = await get_cache_batch(list(pending), pickled=True)
+    for name, fields in pending.items():
+      if isinstance(value := values.get(name), dict):
+        result[name] = {f: value.get(f) for f in fields}
+  return result
+
+
+async def _run_callback(callback: Any) -> Any:
+  if iscoroutinefunction(callback):
+    return await callback()
+  if iscoroutine(callback):
+    return await callback
+  return callback()
+
+
+def _drop_callback(callback: Any) -> None:
+  if iscoroutine(callback):
+    callback.close()  # created by the caller, never awaited
+
+
+def lock_key(name: str) -> str:
+  return f"{NS}:lock:{name}"
+
+
+async def _acquire_lock(key: str, token: str) -> bool:
+  try:
+    return bool(await state.redis.set(key, token, nx=True, ex=LOCK_TTL))
+  except Exception as e:  # the process-level single-flight still applies
+    log_debug(f"Cache lock {key} unavailable: {e}")
+    return True
+
+
+async def _fill_cache(name: str, callback: Any, expiry: int, pickled: bool,
+                      encoding: str) -> Any:
+  """Fill a cache miss, or wait for the cluster peer already filling it"""
+  key, token = lock_key(name), token_hex(8)
+  if CACHE_LOCK and not await _acquire_lock(key, token):
+    deadline, delay = monotonic() + LOCK_TTL, 0.02
+    while monotonic() < deadline:
+      await sleep(delay)
+      value = await get_cache(name, pickled, encoding)
+      if value is not None:
+        _drop_callback(callback)
+        return value
+      if not await state.redis.exists(key):
+        break  # the filler failed, fill it ourselves
+      delay = min(delay * 2, 0.5)
+  try:
+    value = await _run_callback(callback)
+    await cache(name, value, expiry, pickled=pickled, encoding=encoding)
+    return value
+  finally:
+    if CACHE_LOCK:
+      try:
+        await state.redis.eval(RELEASE_LOCK, 1, key, token)
+      except Exception:
+        pass  # expires anyway
+
+
 async def get_or_set_cache(name: str,
                            callback: Callable,
                            expiry: int = YEAR_SECONDS,
                            pickled: bool = False,
                            encoding: str = "") -> Any:
+  """Cached value of `name`, else the result of `callback` (cached).
+
+  Concurrent misses are coalesced: a single caller per process runs its
+  callback while the others await its result, and peers across the cluster
+  wait for the holder of the Redis lock instead of running theirs.
+  """
   value = await get_cache(name, pickled, encoding)
   if value is not None:
+    _drop_callback(callback)
     return value
-  if iscoroutinefunction(callback):
-    value = await callback()
-  elif iscoroutine(callback):
-    value = await callback
-  else:
-    value = callback()
-  await cache(name, value, expiry, pickled=pickled, encoding=encoding)
-  return value
+  leading = False
+
+  def fill():
+    nonlocal leading
+    leading = True
+    return _fill_cache(name, callback, expiry, pickled, encoding)
+
+  try:
+    return await _fills.do(name, fill)
+  finally:
+    if not leading:  # got the in-flight result
+      _drop_callback(callback)
 
 
 async def pub(topics: Union[list[str], str], msg: Any) -> list[Any]:
   if isinstance(topics, str):
     topics = [topics]
-  tasks = [
-      state.redis.publish(f"{NS}:{topic}", pickle.dumps(msg))
-      for topic in topics
-  ]
+  payload = codec.encode(msg)
+  if STREAMS:  # replayable copy, trimmed to ~STREAM_MAXLEN entries per topic
+    async with state.redis.pipeline(transaction=False) as pipe:
+      for topic in topics:
+        pipe.xadd(stream_key(topic), {"data": payload},
+                  maxlen=STREAM_MAXLEN,
+                  approximate=True)
+      await pipe.execute()
+  tasks = [state.redis.publish(f"{NS}:{topic}", payload) for topic in topics]
   return await gather(*tasks)
 
 
+def stream_key(topic: str) -> str:
+  return f"{NS}:stream:{topic}"
+
+
+def _stream_entries(reply: Any) -> list[StreamEntry]:
+  prefix = len(stream_key(""))
+  return [(key.decode()[prefix:], entry_id.decode(),
+           codec.decode(fields[b"data"])) for key, entries in reply or []
+          for entry_id, fields in entries]
+
+
+async def read_streams(last_ids: dict[str, str],
+                       count: int = STREAM_BATCH,
+                       block: Optional[int] = None) -> list[StreamEntry]:
+  """Stream entries published after the last seen id of each topic.
+
+  Args:
+    last_ids: Last seen entry id by topic ("0" for the whole stream)
+    count: Max entries per topic
+    block: Milliseconds to wait for new entries, None to return at once
+
+  Returns:
+    List of (topic, entry id, message), oldest first per topic
+  """
+  streams = {stream_key(t): i for t, i in last_ids.items()}
+  return _stream_entries(await state.redis.xread(streams,
+                                                 count=count,
+                                                 block=block))
+
+
+async def stream_heads(topics: list[str]) -> dict[str, str]:
+  """Id of the last entry of each topic's stream ("0-0" if empty), to read
+  the entries published from now on"""
+  replies = await gather(*(state.redis.xrevrange(stream_key(t), count=1)
+                           for t in topics))
+  return {
+      t: reply[0][0].decode() if reply else "0-0"
+      for t, reply in zip(topics, replies)
+  }
+
+
+async def ensure_group(topics: list[str],
+                       group: str,
+                       start: str = "$") -> None:
+  """Create a consumer group on the topics' streams, from `start` on"""
+  for topic in topics:
+    try:
+      await state.redis.xgroup_create(stream_key(topic),
+                                      group,
+                                      id=start,
+                                      mkstream=True)
+    except ResponseError as e:
+      if "BUSYGROUP" not in str(e):
+        raise
+
+
+async def read_group(group: str,
+                     consumer: str,
+                     topics: list[str],
+                     count: int = STREAM_BATCH,
+                     block: Optional[int] = None) -> list[StreamEntry]:
+  """Entries not yet delivered to the consumer group, to `ack` once handled"""
+  streams = {stream_key(t): ">" for t in topics}
+  return _stream_entries(await state.redis.xreadgroup(group,
+                                                      consumer,
+                                                      streams,
+                                                      count=count,
+                                                      block=block))
+
+
+async def ack(group: str, entries: list[StreamEntry]) -> None:
+  ids_by_topic: dict[str, list[str]] = {}
+  for topic, entry_id, _ in entries:
+    ids_by_topic.setdefault(topic, []).append(entry_id)
+  async with state.redis.pipeline(transaction=False) as pipe:
+    for topic, ids in ids_by_topic.items():
+      pipe.xack(stream_key(topic), group, *ids)
+    await pipe.execute()
+
+
 async def sub(topics: list[str], handler: Callable) -> None:
   # Use the centralized pubsub
   await state.redis.pubsub.subscribe(*topics)
@@ -206,15 +621,11 @@ async def sub(topics: list[str], handler: Callable) -> None:
 # Monitoring-based discovery functions
 async def get_active_instances() -> dict[str, Any]:
   """Get all active instances from monitoring data, optimized for speed."""
-  instance_keys = await state.redis.keys(f"{NS}:cache:*.monitor")
-  if not instance_keys:
+  # Monitor names (e.g., "my_instance.monitor") from their discovery index
+  monitor_names = await get_index("monitors")
+  if not monitor_names:
     return {}
 
-  # Extract monitor names (e.g., "my_instance.monitor") from Redis keys
-  monitor_names = [
-      ":".join(key.decode().split(":")[2:]) for key in instance_keys
-  ]
-
   # Batch fetch all monitor data in a single transaction
   monitor_data_batch = await get_cache_batch(monitor_names, pickled=True)
 
@@ -342,29 +753,33 @@ async def discover_cluster_state() -> dict[str, Any]:
 
 
 # Registry functions - simplified and generic
+# registries are hashes of encoded items, with per-item versions and a change
+# counter; readers keep the payloads of the last read (see get_registry)
+REGISTRY_EXPIRY = 86400  # refreshed by every registration
+_registries: dict[str, tuple[int, dict[str, int], dict[str, bytes]]] = {}
+
+
 def registry_key(registry_type: str, key: str = "all") -> str:
   """Generic registry key builder"""
   return f"{NS}:registry:{registry_type}:{key}"
 
 
 async def register_item(registry_type: str, item_key: str, data: dict) -> bool:
-  """Generic registration function"""
+  """Set an item of a registry hash, bumping its version and the change counter.
+
+  A single HSET in a MULTI: concurrent registrations never overwrite each
+  other, and only the registered item is serialized.
+  """
+  key, versions = registry_key(registry_type), registry_key(
+      registry_type, "versions")
   try:
-    # Store individual item
-    await cache(
-        registry_key(registry_type, item_key),
-        data,
-        expiry=86400,  # 24 hours instead of 1 year
-        pickled=True)
-
-    # Update aggregated registry
-    registry = await get_cache(registry_key(registry_type), pickled=True) or {}
-    registry[item_key] = data
-    await cache(
-        registry_key(registry_type),
-        registry,
-        expiry=86400,  # 24 hours instead of 1 year
-        pickled=True)
+    async with state.redis.pipeline(transaction=True) as pipe:
+      pipe.hset(key, mapping={item_key: codec.encode(data)})
+      pipe.hincrby(versions, item_key, 1)
+      pipe.incr(registry_key(registry_type, "version"))  # never expires
+      pipe.expire(key, REGISTRY_EXPIRY)
+      pipe.expire(versions, REGISTRY_EXPIRY)
+      await pipe.execute()
     return True
   except Exception as e:
     log_error(f"Failed to register {registry_type} {item_key}: {e}")
@@ -372,14 +787,79 @@ async def register_item(registry_type: str, item_key: str, data: dict) -> bool:
 
 
 async def get_registry(registry_type: str) -> dict[str, Any]:
-  """Generic registry getter"""
+  """Registry items, fetching only the ones changed since the last read.
+
+  An unchanged registry (same change counter and size) costs a GET and an
+  HLEN, otherwise items whose version moved are fetched with HMGET.
+  """
+  key = registry_key(registry_type)
   try:
-    return await get_cache(registry_key(registry_type), pickled=True) or {}
+    async with state.redis.pipeline(transaction=False) as pipe:
+      pipe.get(registry_key(registry_type, "version"))
+      pipe.hlen(key)
+      counter, size = await pipe.execute()
+    counter = int(counter or 0)
+    if not counter and not size:
+      # aggregate blob written by older versions, expiring within a day
+      return await get_cache(key, pickled=True) or {}
+    seen = _registries.get(registry_type)
+    if seen is None or seen[0] != counter or len(seen[2]) != size:
+      versions = {
+          k.decode(): int(v)
+          for k, v in (await state.redis.hgetall(
+              registry_key(registry_type, "versions"))).items()
+      }
+      known, cached = (seen[1], seen[2]) if seen else ({}, {})
+      changed = [k for k, v in versions.items() if known.get(k) != v]
+      fetched = await state.redis.hmget(key, changed) if changed else []
+      payloads = {k: cached[k] for k in versions if k in cached}
+      for k, p in zip(changed, fetched):
+        if p is None:
+          payloads.pop(k, None)  # expired since the versions were read
+        else:
+          payloads[k] = p
+      versions = {k: v for k, v in versions.items() if k in payloads}
+      seen = _registries[registry_type] = (counter, versions, payloads)
+    # decoded per read, callers owning their copies
+    return {k: codec.decode(p) for k, p in seen[2].items()}
   except Exception as e:
     log_error(f"Failed to get {registry_type} registry: {e}")
     return {}
 
 
+def checkpoint_key(name: str) -> str:
+  return f"{NS}:checkpoints:{name}"
+
+
+async def get_checkpoints(name: str) -> dict[str, Any]:
+  """Persisted progress cursors of an ingester by key (eg. evm_logger blocks
+  by chain:contract:topic), kept without expiry across restarts"""
+  try:
+    return {
+        k.decode(): codec.decode(v)
+        for k, v in (await state.redis.hgetall(checkpoint_key(name))).items()
+    }
+  except Exception as e:
+    log_error(f"Failed to get {name} checkpoints: {e}")
+    return {}
+
+
+async def set_checkpoints(name: str, checkpoints: dict[str, Any]) -> bool:
+  """Persist (a subset of) the progress cursors of an ingester"""
+  if not checkpoints:
+    return True
+  try:
+    await state.redis.hset(checkpoint_key(name),
+                           mapping={
+                               k: codec.encode(v)
+                               for k, v in checkpoints.items()
+                           })
+    return True
+  except Exception as e:
+    log_error(f"Failed to persist {name} checkpoints: {e}")
+    return False
+
+
 # Simplified ingester registry functions
 async def register_ingester(ingester: Ingester,
                             scope: Scope = Scope.ALL) -> bool:
@@ -412,9 +892,113 @@ def get_status_key(name: str) -> str:
   return f"{NS}:status:{name}"
 
 
+async def get_index(kind: str) -> list[str]:
+  """Live members of a discovery index, expired ones being pruned on read.
+
+  Costs O(result) rather than the O(keyspace) of KEYS. A missing index
+  (e.g. keys written by older versions) is first rebuilt by `repair_index`.
+  """
+  key = index_key(kind)
+  async with state.redis.pipeline(transaction=False) as pipe:
+    pipe.zremrangebyscore(key, "-inf", now().timestamp())
+    pipe.zrange(key, 0, -1)
+    pipe.exists(index_key("repaired"))
+    _, members, repaired = await pipe.execute()
+  if not repaired:
+    if members:
+      _schedule_repair()
+    elif await repair_index():
+      members = await state.redis.zrange(key, 0, -1)
+  return [m.decode() for m in members]
+
+
+async def _scan_expiries(prefix: str) -> dict[str, float]:
+  """Expiry timestamps of the keys under `prefix`, by incremental SCAN"""
+  keys = [
+      k async for k in state.redis.scan_iter(match=f"{prefix}*",
+                                             count=SCAN_COUNT)
+  ]
+  ts = now().timestamp()
+  expiries: dict[str, float] = {}
+  for i in range(0, len(keys), SCAN_COUNT):
+    chunk = keys[i:i + SCAN_COUNT]
+    async with state.redis.pipeline(transaction=False) as pipe:
+      for k in chunk:
+        pipe.ttl(k)
+      ttls = await pipe.execute()
+    for k, ttl in zip(chunk, ttls):
+      if ttl != -2:  # -2: expired since scanned, -1: no expiry
+        expiries[k.decode()[len(prefix):]] = ts + ttl if ttl >= 0 else float(
+            "inf")
+  return expiries
+
+
+async def _reconcile_index(kind: str, prefix: str,
+                           expiries: dict[str, float]) -> None:
+  """Add scanned members to an index and drop the ones whose key is gone"""
+  key = index_key(kind)
+  unseen = [
+      m for m in await state.redis.zrange(key, 0, -1)
+      if m.decode() not in expiries
+  ]
+  if unseen:  # possibly written after the SCAN cursor went past them
+    async with state.redis.pipeline(transaction=False) as pipe:
+      for m in unseen:
+        pipe.exists(prefix + m.decode())
+      exists = await pipe.execute()
+    unseen = [m for m, e in zip(unseen, exists) if not e]
+  members = list(expiries.items())
+  async with state.redis.pipeline(transaction=False) as pipe:
+    for i in range(0, len(members), SCAN_COUNT):
+      pipe.zadd(key, dict(members[i:i + SCAN_COUNT]))
+    if unseen:
+      pipe.zrem(key, *unseen)
+    await pipe.execute()
+
+
+async def repair_index(force: bool = False) -> bool:
+  """Rebuild the discovery indexes from an incremental SCAN of the keyspace.
+
+  Runs at most once per CACHE_INDEX_REPAIR seconds across workers unless
+  forced, picking up keys the indexes missed and dropping deleted ones.
+
+  Returns:
+    Whether this call ran the repair
+  """
+  try:
+    if not await state.redis.set(
+        index_key("repaired"), 1, ex=INDEX_REPAIR_INTERVAL, nx=not force):
+      return False
+    scanned: dict[str, dict[str, float]] = {}
+    for kind, prefix, suffix in (("resources", cache_key(""), ""),
+                                 ("monitors", cache_key(""), ".monitor"),
+                                 ("claims", f"{NS}:claim:", "")):
+      if prefix not in scanned:
+        scanned[prefix] = await _scan_expiries(prefix)
+      await _reconcile_index(kind, prefix, {
+          m: s
+          for m, s in scanned[prefix].items() if m.endswith(suffix)
+      })
+    log_debug(f"Repaired discovery indexes ({len(scanned)} key prefixes)")
+    return True
+  except Exception as e:
+    log_error(f"Failed to repair discovery indexes: {e}")
+    return False
+
+
+def _schedule_repair() -> None:
+  global _repair_task
+  if _repair_task is None or _repair_task.done():
+    _repair_task = create_task(repair_index())
+
+
 async def get_cached_resources() -> list[str]:
-  r = await state.redis.keys(cache_key("*"))
-  return [key.decode().split(":")[-1] for key in r]
+  return await get_index("resources")
+
+
+async def get_claimed_tasks() -> list[str]:
+  """Claimed tasks as {name}:{interval}, suffixed with :force for force claims"""
+  return await get_index("claims")
 
 
 async def get_topics(
@@ -18,7 +18,7 @@ async def schedule(ing: Ingester) -> list[Task]:
     await ing.pre_ingest()
 
     # Group calls by chain
-    calls_by_chain: Dict[int, Multicall] = {}
+    calls_by_chain: Dict[int, list[Call]] = {}
     unique_calls = set()
 
     for field in ing.fields:
@@ -31,26 +31,26 @@ async def schedule(ing: Ingester) -> list[Task]:
       unique_calls.add(field.target_id)
 
       chain_id, addr = field.chain_addr()
-      if chain_id not in calls_by_chain:
-        client = await state.web3.client(chain_id, roll=True)
-        calls_by_chain[chain_id] = Multicall(calls=[],
-                                             w3=client,
-                                             require_success=False)
-
       returns = [(f"{field.name}:{i}", lambda success, value: value
                   if success else None)
                  for i in range(len(field.selector_outputs))]
-      calls_by_chain[chain_id].calls.append(
+      calls_by_chain.setdefault(chain_id, []).append(
           Call(target=addr,
                function=[field.selector, *field.params],
                returns=returns))
 
-    async def execute_multicall(m: Multicall):
-      # Let Web3Proxy handle RPC rotation and Multicall handle rebatching
-      return await m
+    async def execute_multicall(chain_id: int, calls: list[Call]):
+      # Let Web3Proxy handle RPC rotation (and scoring) and Multicall handle
+      # rebatching
+      async def run(client: Any):
+        return await Multicall(calls=calls, w3=client, require_success=False)
+
+      return await state.web3.run(chain_id, run)
 
     # Execute all chains concurrently
-    tasks = [execute_multicall(m) for m in calls_by_chain.values()]
+    tasks = [
+        execute_multicall(c, calls) for c, calls in calls_by_chain.items()
+    ]
     all_results: Dict[str, Any] = {}
 
     try:
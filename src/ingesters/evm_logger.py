@@ -1,11 +1,31 @@
-from asyncio import Task
+from asyncio import Task, create_task, gather
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from os import environ as env
+from typing import Any, Optional
+
+from eth_abi.abi import default_codec
+from hexbytes import HexBytes
 from web3 import Web3
 
 from ..models.ingesters import Ingester
-from ..utils import log_error, log_info, log_debug, split_chain_addr
+from ..adapters.evm_rpc import LogWindows, stream_logs
+from ..utils import log_error, log_warn, log_debug, split_chain_addr, floor_utc
 from ..actions import scheduler
+from ..cache import cache_values, pub, get_checkpoints, set_checkpoints
 from .. import state
 
+UTC = timezone.utc
+# blocks behind the head tailed (deeper reorgs rewind the cursors as much)
+CONFIRMATIONS = int(env.get("EVM_LOGS_CONFIRMATIONS", 12))
+# blocks backfilled before the head for events without a checkpoint
+BACKFILL = int(env.get("EVM_LOGS_BACKFILL", 0))
+# blocks replayed (and checkpointed) at a time, larger gaps being backfilled
+BACKFILL_CHUNK = int(env.get("EVM_LOGS_BACKFILL_CHUNK", 10000))
+BACKFILL_CONCURRENCY = int(env.get("EVM_LOGS_BACKFILL_CONCURRENCY", 2))
+# block seconds whose event positions are kept (timestamp offsets)
+EVENT_SECONDS = 4096
+
 
 def parse_event_signature(signature: str) -> tuple[str, list[str], list[bool]]:
   event_name, params = signature.split('(')
@@ -15,14 +35,13 @@ def parse_event_signature(signature: str) -> tuple[str, list[str], list[bool]]:
   return event_name.strip(), param_types, indexed
 
 
-def decode_log_data(client: Web3, log: dict, topics_first: list[str],
+def decode_log_data(client: Any, log: dict, topics_first: list[str],
                     indexed: list[bool]) -> tuple:
-  topics = log['topics'][1:]
-  data = bytes()
-  for t in topics:
-    data += t
-  data += log['data']
-  decoded = client.codec.decode(types=topics_first, data=data)
+  """Decode a log's (hex or bytes) topics and data with `client`'s codec"""
+  data = b"".join(HexBytes(t)
+                  for t in log['topics'][1:]) + HexBytes(log['data'])
+  codec = getattr(client, "codec", client)
+  decoded = codec.decode(types=topics_first, data=data)
   return tuple(reorder_decoded_params(list(decoded), indexed))
 
 
@@ -54,34 +73,139 @@ def reorder_decoded_params(decoded: list, indexed: list[bool]) -> list:
   return reordered
 
 
+class Cursor:
+  """Progress of a (chain, contract, topic): last tailed block, its hash to
+  detect reorgs, and the block ranges left to backfill"""
+  __slots__ = ("block", "hash", "gaps")
+
+  def __init__(self,
+               block: int = -1,
+               hash: str = "",
+               gaps: Optional[list[list[int]]] = None):
+    self.block, self.hash = block, hash
+    self.gaps: list[list[int]] = gaps or []
+
+  @classmethod
+  def from_dict(cls, d: dict) -> "Cursor":
+    return cls(int(d.get("block", -1)), d.get("hash", ""),
+               [[int(lo), int(hi)] for lo, hi in d.get("gaps", [])])
+
+  def to_dict(self) -> dict:
+    return {
+        "block": self.block,
+        "hash": self.hash,
+        "gaps": [list(g) for g in self.gaps]
+    }
+
+  def resume(self, safe: int) -> None:
+    """Backfill the blocks missed since the checkpoint if too many to tail"""
+    if self.block < 0:
+      if BACKFILL > 0:
+        self.gaps.append([max(safe - BACKFILL + 1, 0), safe])
+      self.block = safe
+    elif safe - self.block > BACKFILL_CHUNK:
+      self.gaps.append([self.block + 1, safe])
+      self.block, self.hash = safe, ""
+
+  def rewind(self, block: int) -> None:
+    """Re-tail the blocks past `block` (reorged), no longer backfilled"""
+    if self.block > block:
+      self.block, self.hash = block, ""
+    self.gaps = [[lo, min(hi, block)] for lo, hi in self.gaps if lo <= block]
+
+  def ahead(self, done: dict[int, int]) -> "Cursor":
+    """Cursor past the windows `done` (by first block) tailed ahead of it, the
+    blocks before them (streaming or failed) left to backfill"""
+    ahead = Cursor(self.block, self.hash, [list(g) for g in self.gaps])
+    for lo in sorted(done):
+      if done[lo] > ahead.block:
+        if lo > ahead.block + 1:
+          ahead.gaps.append([ahead.block + 1, lo - 1])
+        ahead.block, ahead.hash = done[lo], ""
+    return ahead
+
+
+def block_time(log: dict) -> Optional[datetime]:
+  """Timestamp of a log's block, if the RPC includes it (`blockTimestamp`)"""
+  ts = log.get("blockTimestamp")
+  if ts is None:
+    return None
+  return datetime.fromtimestamp(
+      int(ts, 16) if isinstance(ts, str) else ts, UTC)
+
+
+class EventTimes:
+  """Timestamps of events: their block's, offset by their position (ms) among
+  the events of the block's second, so that those of a block (or of sub-second
+  blocks sharing its time) stay distinct in ts-keyed stores, within that second"""
+  __slots__ = ("seconds", )
+
+  def __init__(self):
+    # positions of the events of the latest block seconds, by event
+    self.seconds: OrderedDict[int, dict[tuple, int]] = OrderedDict()
+
+  def of(self, chain_id: Any, log: dict) -> Optional[datetime]:
+    ts = block_time(log)
+    if ts is None:
+      return None
+    second = int(ts.timestamp())
+    positions = self.seconds.setdefault(second, {})
+    self.seconds.move_to_end(second)
+    while len(self.seconds) > EVENT_SECONDS:
+      self.seconds.popitem(last=False)
+    position = positions.setdefault(
+        (chain_id, str(log.get("blockNumber")), str(log.get("logIndex"))),
+        len(positions))
+    if position == 1000:
+      log_warn(f"Over 1000 events at {ts.isoformat()}, the next ones sharing "
+               "its last millisecond")
+    return ts + timedelta(milliseconds=min(position, 999))
+
+  def forget(self, since: datetime) -> None:
+    """Drop the positions of the seconds from `since` (events deleted)"""
+    for second in [s for s in self.seconds if s >= since.timestamp()]:
+      del self.seconds[second]
+
+
 async def schedule(ing: Ingester) -> list[Task]:
 
-  contracts: set[str] = set()
-  data_by_event: dict[str, dict] = {}
-  index_first_types_by_event: dict[str, list[str]] = {}
-  event_hashes: dict[str, str] = {}
+  contracts: list[str] = []
   events_by_contract: dict[str, set[str]] = {}
+  index_first_types_by_event: dict[str, list[str]] = {}
+  indexed_by_event: dict[str, list[bool]] = {}
+  event_ids: dict[tuple[str, str], str] = {}  # by (contract, event hash)
+  hashes_by_contract: dict[str, list[str]] = {}
+  slots_by_event: dict[str, list[int]] = {}  # fields filled by an event
   filter_by_contract: dict[str, dict] = {}
-  filter_index_by_event: dict[str, int] = {}
-  last_block_by_contract: dict[str, int] = {}
-
-  for field in ing.fields:
-    contracts.add(field.target)
+  windows_by_contract: dict[str, LogWindows] = {}
+  cursors: dict[str, Cursor] = {}  # by checkpoint key chain:contract:topic
+  resumed: set[str] = set()  # contracts whose cursors were resumed
+  backfill_task: Optional[Task] = None
+  event_times = EventTimes()
+  ts_slot = next((i for i, f in enumerate(ing.fields) if f.name == "ts"), None)
+
+  for i, field in enumerate(ing.fields):
+    if not field.target or not field.selector:
+      continue  # eg. ts
+    if field.target not in events_by_contract:
+      contracts.append(field.target)
     events_by_contract.setdefault(field.target, set()).add(field.selector)
+    slots_by_event.setdefault(f"{field.target}:{field.selector}", []).append(i)
 
   for contract in contracts:
 
     chain_id, addr = split_chain_addr(contract)
     addr = Web3.to_checksum_address(addr)  # enforce checksum
+    event_hashes: set[str] = set()
 
-    for event in events_by_contract[contract].copy(
-    ):  # copy to avoid modifying while iterating
+    for event in events_by_contract[contract]:
       event_name, param_types, indexed = parse_event_signature(event)
       event_id = f"{contract}:{event}"
 
-      event_hash = Web3.keccak(text=event.replace('indexed ', '')).hex()
-      event_hashes[event_id] = event_hash
-      event_hashes[event_hash] = event_id
+      event_hash = "0x" + bytes(
+          Web3.keccak(text=event.replace('indexed ', ''))).hex()
+      event_hashes.add(event_hash)
+      event_ids[(contract, event_hash)] = event_id
 
       # Separate indexed and non-indexed types
       index_types = [
@@ -92,86 +216,317 @@ async def schedule(ing: Ingester) -> list[Task]:
           if not is_indexed
       ]
       index_first_types_by_event[event_id] = index_types + non_index_types
+      indexed_by_event[event_id] = indexed
 
-      events_by_contract.setdefault(contract, set()).add(event_id)
-      data_by_event.setdefault(event_id, {})
-
-      # Build filter
-      filter_by_contract.setdefault(
-          contract, {
-              "fromBlock": "latest",
-              "toBlock": "latest",
-              "address": addr,
-              "topics": []
-          })["topics"].append(event_hashes[event_id])
-
-      filter_index_by_event[event_id] = len(
-          filter_by_contract[contract]["topics"]) - 1
-
-    filter_by_contract[contract]["topics"] = list(
-        set(filter_by_contract[contract]["topics"]))  # remove duplicates
-
-  async def poll_events(contract: str):
-    chain_id, addr = split_chain_addr(contract)
-    client = await state.web3.client(chain_id)
-    f = filter_by_contract[contract]
-
-    if not hasattr(client, 'eth'):
-      log_error(f"Non-EVM client for chain {chain_id}, cannot poll events")
-      return
-
-    current_block = client.eth.block_number
-    last_block_by_contract.setdefault(contract, current_block)
-    prev_block = last_block_by_contract[contract]
-
-    for retry_count in range(state.args.max_retries):
-      if state.args.verbose:
-        log_debug(f"Polling for {contract} events...")
-
-      start_block = prev_block
-      end_block = current_block
-      f.update({"fromBlock": hex(start_block), "toBlock": hex(end_block)})
-
-      if start_block >= end_block:
-        log_info(
-            f"No new blocks for {contract}, skipping event polling for {ing.interval}"
+    # any of the contract's events (topic0 alternatives)
+    hashes_by_contract[contract] = sorted(event_hashes)
+    filter_by_contract[contract] = {
+        "address": addr,
+        "topics": [hashes_by_contract[contract]]
+    }
+    windows_by_contract[contract] = LogWindows()
+
+  async def rpc_call(chain_id: Any, method: str, *args) -> Any:
+    """Call the chain's healthiest RPC (hedged, failing over)"""
+    return await state.web3.request(
+        chain_id, lambda client: getattr(client, method)(*args))
+
+  async def block_hash(chain_id: Any, block: int) -> str:
+    return (await rpc_call(chain_id, "get_block", block) or {}).get("hash", "")
+
+  def rows_of(contract: str,
+              logs: list[dict],
+              tick: datetime,
+              after: Optional[dict[str, int]] = None) -> list[list]:
+    """Field values of every event of `logs` (past their topic's `after`
+    block), before transformation"""
+    rows, chain_id = [], split_chain_addr(contract)[0]
+    for log_entry in logs:
+      topics = log_entry.get("topics")
+      topic = str(topics[0]).lower() if topics else ""
+      event_id = event_ids.get((contract, topic))
+      if event_id is None or log_entry.get("removed"):
+        continue
+      if after and int(str(log_entry.get("blockNumber", "0x0")),
+                       16) <= after.get(topic, -1):
+        continue  # tailed before (cursor ahead of the contract's)
+      try:
+        decoded = decode_log_data(default_codec, log_entry,
+                                  index_first_types_by_event[event_id],
+                                  indexed_by_event[event_id])
+      except Exception as e:
+        log_warn(
+            f"Failed to decode {event_id} log of block {log_entry.get('blockNumber')}: {e}"
         )
-        break
-
+        continue
+      row: list[Any] = [None] * len(ing.fields)
+      for i in slots_by_event[event_id]:
+        row[i] = decoded
+      if ts_slot is not None:
+        row[ts_slot] = event_times.of(chain_id, log_entry) or tick
+      rows.append(row)
+    return rows
+
+  async def store_rows(rows: list[list]) -> None:
+    """Transform the rows in a single batch and insert them"""
+    from ..actions.transform import compile_plan
+    plan = compile_plan(ing)
+    externs = await plan.fetch_externs(ing)
+    plan.run_batch(rows, [externs] * len(rows))
+    persistent = [i for i, f in enumerate(ing.fields) if not f.transient]
+    await state.tsdb.insert_many(
+        ing, [tuple(row[i] for i in persistent) for row in rows])
+    if ts_slot is not None:  # backfilled events land in the settled history
+      from ..services import history_cache
+      await history_cache.invalidate(ing.name,
+                                     min(row[ts_slot] for row in rows))
+
+  async def checkpoint(keys: list[str],
+                       done: Optional[dict[int, int]] = None) -> None:
+    await set_checkpoints(
+        ing.name, {k: cursors[k].ahead(done or {}).to_dict()
+                   for k in keys})
+
+  def keys_of(contract: str) -> list[str]:
+    return [f"{contract}:{h}" for h in hashes_by_contract[contract]]
+
+  async def resume(chain_id: Any, safe: int) -> None:
+    """Resume the chain's cursors, rewinding them past any reorg of their
+    checkpointed blocks and deleting the events stored since"""
+    nonlocal backfill_task
+    chain = [c for c in contracts if split_chain_addr(c)[0] == chain_id]
+    if any(c not in resumed for c in chain):
+      stored = await get_checkpoints(ing.name)
+      for k in (k for c in chain if c not in resumed for k in keys_of(c)):
+        cursors[k] = Cursor.from_dict(stored[k]) if k in stored else Cursor()
+    keys = [k for c in chain for k in keys_of(c)]
+
+    expected = {
+        cursors[k].block: cursors[k].hash
+        for k in keys if cursors[k].hash and 0 <= cursors[k].block <= safe
+    }
+    hashes = await gather(*(block_hash(chain_id, b) for b in expected))
+    reorged = [b for b, h in zip(expected, hashes) if h != expected[b]]
+    if reorged:
+      block = max(min(reorged) - max(CONFIRMATIONS, 1), -1)
+      log_warn(f"Reorg at chain {chain_id} block {min(reorged)} "
+               f"({ing.name}), rewinding to block {block}...")
+      if backfill_task is not None and not backfill_task.done():
+        backfill_task.cancel()  # may be replaying orphaned blocks
+      block = await delete_since(chain_id, block)
+      for k in keys:
+        cursors[k].rewind(block)
+      await checkpoint(keys)
+
+    for c in chain:
+      if c not in resumed:
+        for k in keys_of(c):
+          cursors[k].resume(safe)
+        resumed.add(c)
+
+  async def time_of(chain_id: Any, block: int) -> Optional[datetime]:
+    found = await rpc_call(chain_id, "get_block", block)
+    return block_time({"blockTimestamp": (found or {}).get("timestamp")})
+
+  async def delete_since(chain_id: Any, block: int) -> int:
+    """Delete the stored events of the blocks past `block` (orphaned), their
+    rows being keyed by block time, returning the block to re-tail from (before
+    any sharing that time)"""
+    if ts_slot is None or any(
+        split_chain_addr(c)[0] != chain_id for c in contracts):
+      log_warn(f"Cannot delete {ing.name} events orphaned past chain "
+               f"{chain_id} block {block}, keeping them")
+      return block
+    since = await time_of(chain_id, block + 1)
+    if since is None:
+      log_warn(f"Missing chain {chain_id} block {block + 1} time, keeping "
+               f"{ing.name} events orphaned past it")
+      return block
+    while block >= 0 and (ts := await time_of(chain_id, block)) is not None \
+        and ts >= since:
+      block -= 1  # deleted along (same block time)
+    try:
+      await state.tsdb.delete_range(ing.name, since)
+      event_times.forget(since)
+      from ..services import history_cache
+      await history_cache.invalidate(ing.name, since)
+    except NotImplementedError:
+      log_warn(f"Tsdb cannot delete {ing.name} events orphaned past chain "
+               f"{chain_id} block {block}, keeping them")
+    return block
+
+  async def poll_events(contract: str, tick: datetime,
+                        head: tuple[int, str]) -> tuple[int, Optional[list]]:
+    """Stream the events of the confirmed blocks since the contract's cursors
+    into the db, checkpointed as contiguous windows complete, returning their
+    count and the latest"""
+    chain_id, _ = split_chain_addr(contract)
+    safe, safe_hash = head
+    keys = keys_of(contract)
+
+    after = {
+        h: cursors[k].block
+        for h, k in zip(hashes_by_contract[contract], keys)
+    }
+    start = min(after.values()) + 1
+    count, latest, latest_block = 0, None, -1
+    tailed, done = start - 1, {}  # contiguous progress, windows ahead of it
+    if start > safe:
+      if state.args.verbose:
+        log_debug(f"No new blocks for {contract} events ({ing.interval})")
+    else:
       try:
-        logs = client.eth.get_logs(f)
-        for log_entry in logs:
-          event_id = event_hashes[log_entry["topics"][0].hex()]
-          decoded_event = decode_log_data(client, log_entry,
-                                          index_first_types_by_event[event_id],
-                                          indexed)
+        async for lo, hi, logs in stream_logs(
+            await state.web3.rpc_clients(chain_id),
+            filter_by_contract[contract],
+            start,
+            safe,
+            windows_by_contract[contract],
+            max_retries=state.args.max_retries):
+          if ts_slot is not None:
+            await stamp(chain_id, logs)
+          rows = rows_of(contract, logs, tick, after)
+          if rows:
+            await store_rows(rows)
+            count += len(rows)
+            if hi > latest_block:
+              latest, latest_block = rows[-1], hi
           if state.args.verbose:
             log_debug(
-                f"Block: {log_entry['blockNumber']} | Event: {decoded_event}")
-        start_block = end_block + 1
-        break
-      except Exception as error:
-        log_error(
-            f"Failed to poll event logs for contract {contract}: {error}")
-        # RPC rotation is handled automatically by Web3Proxy
+                f"Ingested {len(rows)} {contract} events of blocks {lo}-{hi}"
+                f" (window: {windows_by_contract[contract].size})")
+          done[lo] = hi
+          while tailed + 1 in done:
+            tailed = done.pop(tailed + 1)
+          for k in keys:
+            if cursors[k].block < tailed:
+              cursors[k].block, cursors[k].hash = tailed, ""
+          if tailed < safe:  # else checkpointed with the head's hash below
+            await checkpoint(keys, done)  # stored windows never replayed
+      except Exception:
+        for k in keys:  # the blocks left before the stored windows backfilled
+          cursors[k] = cursors[k].ahead(done)
+        await checkpoint(keys)
+        raise
+    for k in keys:
+      if cursors[k].block <= safe:  # never backwards (eg. more confirmations)
+        cursors[k].block, cursors[k].hash = safe, safe_hash
+    await checkpoint(keys)
+    return count, latest
+
+  async def stamp(chain_id: Any, logs: list[dict]) -> None:
+    """Set the block timestamps the RPC left out of logs (non-standard
+    `blockTimestamp`, missing from most public RPCs)"""
+    missing = list(
+        dict.fromkeys(
+            e["blockNumber"] for e in logs
+            if e.get("blockTimestamp") is None and "blockNumber" in e))
+    times: dict[str, Any] = {}
+    for i in range(0, len(missing), BACKFILL_CONCURRENCY * 16):
+      batch = missing[i:i + BACKFILL_CONCURRENCY * 16]
+      blocks = await gather(*(rpc_call(chain_id, "get_block", b)
+                              for b in batch))
+      times.update((b, (block or {}).get("timestamp"))
+                   for b, block in zip(batch, blocks))
+    for log_entry in logs:
+      if log_entry.get("blockTimestamp") is None:
+        log_entry["blockTimestamp"] = times.get(
+            log_entry.get("blockNumber", ""))
+
+  async def backfill() -> None:
+    """Replay the gaps of every cursor in bounded chunks, checkpointed"""
+    tick = floor_utc(ing.interval)
+    for contract in contracts:
+      chain_id, _ = split_chain_addr(contract)
+      for topic in hashes_by_contract[contract]:
+        key = f"{contract}:{topic}"
+        cursor = cursors.get(key)
+        while cursor and cursor.gaps:
+          gap = cursor.gaps[0]
+          lo, hi = gap[0], min(gap[1], gap[0] + BACKFILL_CHUNK - 1)
+          count = 0
+          async for _, _, logs in stream_logs(
+              await state.web3.rpc_clients(chain_id), {
+                  **filter_by_contract[contract], "topics": [[topic]]
+              },
+              lo,
+              hi,
+              windows_by_contract[contract],
+              concurrency=BACKFILL_CONCURRENCY,
+              max_retries=state.args.max_retries):
+            if ts_slot is not None:
+              await stamp(chain_id, logs)
+            if rows := rows_of(contract, logs, tick):
+              await store_rows(rows)
+              count += len(rows)
+          if hi >= gap[1]:
+            cursor.gaps.pop(0)
+          else:
+            gap[0] = hi + 1
+          await checkpoint([key])
+          if state.args.verbose:
+            log_debug(f"Backfilled {count} {key} events of blocks {lo}-{hi}"
+                      f" ({sum(g[1] - g[0] + 1 for g in cursor.gaps)} left)")
+
+  async def run_backfill() -> None:
+    try:
+      await backfill()
+    except Exception as e:
+      log_error(
+          f"Failed to backfill {ing.name} events, resuming next tick: {e}")
 
   async def ingest(ing: Ingester):
+    nonlocal backfill_task
     await ing.pre_ingest()
-
-    tp = state.thread_pool
-    future_by_contract = {
-        contract: tp.submit(poll_events, contract)
-        for contract in contracts
-    }
-
-    for field in ing.fields:
-      try:
-        field.value = future_by_contract[field.target].result(
-            timeout=state.args.ingestion_timeout)
-      except Exception as e:
-        log_error(f"Failed to poll events for {field.target}: {e}")
-
-    await ing.post_ingest()
+    tick = floor_utc(ing.interval)
+
+    # confirmed head (and its hash) of every chain
+    chains = list(dict.fromkeys(split_chain_addr(c)[0] for c in contracts))
+
+    async def confirmed_head(chain_id: Any) -> tuple[int, str]:
+      safe = max(await rpc_call(chain_id, "get_block_number") - CONFIRMATIONS,
+                 0)
+      return safe, await block_hash(chain_id, safe)
+
+    heads: dict[Any, tuple[int, str]] = {}
+    for chain_id, head in zip(
+        chains, await gather(*(confirmed_head(c) for c in chains),
+                             return_exceptions=True)):
+      if isinstance(head, BaseException):
+        log_error(f"Failed to get chain {chain_id} head: {head}")
+      else:
+        heads[chain_id] = head
+    for chain_id, outcome in zip(
+        list(heads), await gather(*(resume(c, heads[c][0]) for c in heads),
+                                  return_exceptions=True)):
+      if isinstance(outcome, BaseException):
+        log_error(f"Failed to resume chain {chain_id} cursors: {outcome}")
+        del heads[chain_id]
+    results = await gather(*(poll_events(c, tick, heads[chain_id])
+                             for c in contracts
+                             if (chain_id := split_chain_addr(c)[0]) in heads),
+                           return_exceptions=True)
+
+    latest = None
+    for result in results:
+      if isinstance(result, BaseException):
+        log_error(f"Failed to poll {ing.name} events: {result}")
+      elif result[1] is not None:
+        latest = result[1]
+
+    # gaps replayed alongside the tailing
+    if (backfill_task is None or backfill_task.done()) and any(
+        c.gaps for c in cursors.values()):
+      backfill_task = create_task(run_backfill())
+
+    # events are stored as they stream in, the latest one cached/published
+    if latest is not None:
+      for field, value in zip(ing.fields, latest):
+        field.value = value
+      ing.last_ingested = tick
+      values = ing.get_field_values()
+      await cache_values(ing.name, values)
+      await pub(ing.name, values)
 
   task = await scheduler.add_ingester(ing, fn=ingest, start=False)
   return [task] if task is not None else []
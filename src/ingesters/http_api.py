@@ -1,17 +1,24 @@
 from asyncio import Task, gather, sleep
 from hashlib import md5
+from os import environ as env
 import orjson
 from typing import Any, Optional
 
 from ..models.ingesters import Ingester
 from ..models.monitors import ResourceMonitor
-from ..utils import log_error, log_warn, log_debug, select_nested
-from ..utils.http import get
+from ..utils import log_error, log_warn, log_debug, compile_selectors, SelectorPlan
+from ..utils.http import get, stream
+from ..utils.json_stream import SelectorStream, stream_selectable
+from ..utils.types import to_bool
 from .. import state
 from ..cache import get_or_set_cache
 from ..actions.schedule import scheduler
 from ..utils import safe_eval
 
+# stream responses through the field selectors instead of parsing them whole
+HTTP_API_STREAM = to_bool(env.get("HTTP_API_STREAM", "false"))
+STREAM_CHUNK = int(env.get("HTTP_API_STREAM_CHUNK", 65536))
+
 
 async def fetch_json(url: str,
                      retry_delay: float = 2.5,
@@ -58,17 +65,81 @@ async def fetch_json(url: str,
   return ""
 
 
+async def fetch_selected(
+    url: str,
+    plan: SelectorPlan,
+    retry_delay: float = 2.5,
+    max_retries: Optional[int] = None,
+    monitor: Optional[ResourceMonitor] = None) -> Optional[list]:
+  """
+  Stream the JSON response of `url` through the selector plan, only the
+  selected subtrees being materialized, and stop reading the body as soon as
+  every selector is resolved
+  Returns: the plan's values, None on failure
+  """
+  if max_retries is None:
+    max_retries = getattr(state.args, 'max_retries', 3)
+
+  for attempt in range(max_retries):
+    if monitor:
+      monitor.start_timer()
+
+    try:
+      if state.args.verbose:
+        log_debug(f"Streaming {url}" +
+                  (f" (attempt {attempt + 1})" if attempt > 0 else ""))
+
+      async with stream("GET", url) as response:
+        if response.status_code == 200:
+          parser, size = SelectorStream(plan), 0
+          async for chunk in response.aiter_bytes(STREAM_CHUNK):
+            size += len(chunk)
+            if parser.feed(chunk):
+              break  # the rest of the body is never read
+          values = parser.close()
+
+          if monitor:
+            monitor.stop_timer(size, response.status_code)
+
+          return values
+        log_error(f"HTTP error {response.status_code} for {url}")
+
+        if monitor:
+          monitor.stop_timer(0, response.status_code)
+
+    except Exception as e:
+      if monitor:
+        monitor.stop_timer(0, None)
+
+      if attempt < max_retries - 1:
+        log_warn(f"Failed to stream {url} (attempt {attempt + 1}): {str(e)}")
+        await sleep(retry_delay)
+      continue
+  return None
+
+
 async def schedule(ing: Ingester) -> list[Task]:
 
   data_by_route: dict[str, dict] = {}
   hashes: dict[str, str] = {}
   transformed_data_by_route: dict[str, Any] = {}  # Store pre-transformed data
+  selected_by_route: dict[str, list] = {}  # Store streamed field values
 
   async def ingest(ing: Ingester) -> None:
     await ing.pre_ingest()
 
     async def fetch_hashed(url: str) -> dict:
       try:
+        if HTTP_API_STREAM and not ing.pre_transformer:
+          # the selectors are pushed down into the parser (no response cache)
+          fields = fields_by_route.get(hashes[url], [])
+          plan = compile_selectors(tuple((f.selector, f.name) for f in fields))
+          if stream_selectable(plan):
+            values = await fetch_selected(url, plan, monitor=ing.monitor)
+            if values is not None:
+              selected_by_route[hashes[url]] = values
+            return {}
+
         # Create a wrapper for the cache that returns just the data string
         data_str = await get_or_set_cache(hashes[url],
                                           fetch_json(url, monitor=ing.monitor),
@@ -97,6 +168,11 @@ async def schedule(ing: Ingester) -> list[Task]:
         if url not in hashes:
           hashes[url] = md5(f"{url}:{ing.interval}".encode()).hexdigest()
 
+    fields_by_route: dict[str, list] = {}
+    for field in ing.fields:
+      if field.target:
+        fields_by_route.setdefault(hashes[field.target], []).append(field)
+
     for url, hash_key in hashes.items():
       if hash_key not in data_by_route or len(data_by_route[hash_key]) == 0:
         data_by_route[hash_key] = {
@@ -106,13 +182,19 @@ async def schedule(ing: Ingester) -> list[Task]:
     await gather(*fetch_tasks)
 
     missing_fields = []
-    for field in [f for f in ing.fields if f.target]:
-      # use transformed data if available, fallback to raw data
-      source_data = transformed_data_by_route.get(
-          hashes[field.target], data_by_route[hashes[field.target]])
-      field.value = select_nested(field.selector, source_data, field.name)
-      if not field.value:
-        missing_fields.append(field.name)
+    for route, fields in fields_by_route.items():
+      values = selected_by_route.get(route)
+      if values is None:
+        # use transformed data if available, fallback to raw data
+        source_data = transformed_data_by_route.get(route,
+                                                    data_by_route[route])
+        # all the route's selectors extracted in a single walk of the document
+        plan = compile_selectors(tuple((f.selector, f.name) for f in fields))
+        values = plan.select(source_data)
+      for field, value in zip(fields, values):
+        field.value = value
+        if not field.value:
+          missing_fields.append(field.name)
 
     if len(missing_fields) > 0:
       log_warn(f"{ing.name} missing fields: {', '.join(missing_fields)}")
@@ -120,6 +202,7 @@ async def schedule(ing: Ingester) -> list[Task]:
     # reset local parser cache
     data_by_route.clear()
     transformed_data_by_route.clear()
+    selected_by_route.clear()
 
     await ing.post_ingest(response_data=data_by_route)
 
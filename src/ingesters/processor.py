@@ -1,10 +1,11 @@
 from asyncio import Task, gather, sleep
 import importlib.util
 from os import path
+from time import monotonic
 from typing import Callable, Union, Any
 
 from ..actions.schedule import scheduler
-from ..cache import get_cache
+from ..cache import STREAMS, STREAM_BATCH, ack, ensure_group, get_cache, read_group
 
 from ..utils import log_debug, log_error, log_warn, safe_eval
 from .. import state
@@ -45,6 +46,30 @@ async def load_handler(
     raise
 
 
+async def consume_dependencies(ing: "Ingester", deps: list[str],
+                               timeout: float) -> dict[str, Any]:
+  """Latest dependency messages since the previous run, from the processor's
+  consumer group. Waits up to `timeout` seconds for every dependency to publish.
+  """
+  group = f"processor:{ing.name}"
+  await ensure_group(deps, group)
+  latest: dict[str, Any] = {}
+  deadline = monotonic() + timeout
+  while True:
+    left = deadline - monotonic()
+    waiting = len(latest) < len(deps) and left > 0
+    block = max(1, int(left * 1000)) if waiting else None  # 0 blocks forever
+    entries = await read_group(group, state.args.proc_id, deps, STREAM_BATCH,
+                               block)
+    if not entries:
+      if not waiting:
+        return latest
+      continue
+    for topic, _, value in entries:  # oldest first, keep the latest
+      latest[topic] = value
+    await ack(group, entries)
+
+
 async def schedule(ing: "Ingester") -> list[Task]:
   """Schedule processor ingester"""
 
@@ -53,7 +78,11 @@ async def schedule(ing: "Ingester") -> list[Task]:
 
     # Wait for dependencies to be processed (half the interval)
     wait_time = ing.interval_sec // 2
-    if wait_time > 0:
+    deps = ing.dependencies()
+    streamed: dict[str, Any] = {}
+    if STREAMS and deps:  # triggered as soon as every dependency published
+      streamed = await consume_dependencies(ing, deps, wait_time)
+    elif wait_time > 0:
       if state.args.verbose:
         log_debug(f"Waiting {wait_time}s for dependencies to be processed...")
       await sleep(wait_time)
@@ -63,18 +92,16 @@ async def schedule(ing: "Ingester") -> list[Task]:
     if hasattr(ing, 'handler'):
       handler = await load_handler(ing.handler)
 
-    # Get dependency data
+    # Get dependency data, from the cache unless streamed
     inputs = {}
-    deps = ing.dependencies()
-    cache_tasks = [get_cache(dep, pickled=True) for dep in deps]
+    cached = [dep for dep in deps if streamed.get(dep) is None]
+    cache_tasks = [get_cache(dep, pickled=True) for dep in cached]
 
     # Handle empty cache_tasks properly
     if cache_tasks:
       sync_caches = await gather(*cache_tasks)
-      inputs = dict(zip(deps, sync_caches))
-    else:
-      sync_caches = []
-      inputs = {}
+      inputs = dict(zip(cached, sync_caches))
+    inputs = {dep: streamed.get(dep, inputs.get(dep)) for dep in deps}
 
     if not any(inputs.values()):
       log_warn(f"No dependency data available for {ing.name}")
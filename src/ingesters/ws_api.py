@@ -1,101 +1,136 @@
 from collections import deque
 from hashlib import md5
-from asyncio import gather, Task, sleep
-import orjson
-import websockets
-import websockets.protocol
-from typing import Callable, Any
+from asyncio import Task
+from typing import Callable, Any, Optional
 
 from ..models.ingesters import Ingester
 from ..models.base import ResourceField
-from ..utils import log_error, log_warn, log_debug, select_nested, safe_eval
+from ..utils import log_warn, log_debug, compile_selectors, safe_eval
+from ..utils.reducers import Accumulator, parse_reducer
+from ..utils.ws import ws_manager
 from .. import state
-from ..server.responses import ORJSON_OPTIONS
 from ..actions.schedule import scheduler
 
+MAX_EPOCHS = 32  # epochs kept per route for the handlers and lambda reducers
+OTHER = None  # topic value no field routes on
+
+
+def parse_topic(topic: str) -> tuple[str, str]:
+  """(selector, value) of a `selector=value` field topic"""
+  selector, sep, value = topic.partition("=")
+  if not sep or not selector.strip():
+    raise ValueError(f"Invalid topic {topic} (expected selector=value)")
+  return selector.strip(), value.strip()
+
+
+class Route:
+  """Consumers of a topic: the selectors they read, extracted in one walk"""
+  __slots__ = ("handlers", "folds", "plan")
+
+  def __init__(self, fields: list[ResourceField],
+               accumulators: dict[tuple[str, str, str], Accumulator]):
+    selectors: dict[str, int] = {}
+
+    def index(selector: str) -> int:
+      return selectors.setdefault(selector, len(selectors))
+
+    # one handler call per handler+selector
+    handled: dict[tuple[str, Any], tuple[str, Callable[..., Any], int]] = {}
+    for f in fields:
+      if f.handler and callable(f.handler):
+        handler_name = getattr(f.handler, '__name__', str(f.handler))
+        handled.setdefault((handler_name, f.selector),
+                           (f.name, f.handler, index(f.selector)))
+    self.handlers = list(handled.values())
+    # one fold per accumulator, shared by the fields reducing the same values
+    folded = {reduced_key(f) for f in fields}
+    self.folds = [(acc, index(key[1]), index(key[2]) if key[2] else None)
+                  for key, acc in accumulators.items() if key in folded]
+    self.plan = compile_selectors(tuple((s, s) for s in selectors))
+
+
+def reduced_key(field: ResourceField) -> Optional[tuple[str, str, str]]:
+  """(topic, value selector, weight selector) folded by an incremental
+  reducer, fields of other topics never sharing its values"""
+  spec = parse_reducer(field.reducer)
+  return (field.topic or "", field.selector, spec[1]) if spec else None
+
+
+class Dispatcher:
+  """
+  Routes the messages of a connection by topic to the fields consuming them:
+  fields without a topic consume every message, the others the messages
+  whose topic selector yields their value.
+  """
+
+  def __init__(self,
+               fields: list[ResourceField],
+               epochs: Optional[deque] = None,
+               name: str = ""):
+    self.fields, self.name = fields, name
+    self.epochs = deque([{}], maxlen=MAX_EPOCHS) if epochs is None else epochs
+    self.accumulators: dict[tuple[str, str, str], Accumulator] = {}
+    for f in fields:
+      if (key := reduced_key(f)) is not None:
+        self.accumulators.setdefault(key, Accumulator())
+    self.topics: list[tuple[str, str]] = [
+        parse_topic(f.topic) if f.topic else ("", "") for f in fields
+    ]
+    self.selectors = list(dict.fromkeys(s for s, _ in self.topics if s))
+    self.values = [{v
+                    for s, v in self.topics if s == selector}
+                   for selector in self.selectors]
+    self.topic_plan = compile_selectors(tuple(
+        (s, s) for s in self.selectors)) if self.selectors else None
+    self.routes: dict[tuple, Route] = {}
+
+  def topic(self, message: Any) -> tuple:
+    """Topic key of a message, values no field routes on collapsed"""
+    if self.topic_plan is None:
+      return ()
+    keys = []
+    for value, values in zip(self.topic_plan.select(message), self.values):
+      value = None if value is None else str(value)
+      keys.append(value if value in values else OTHER)
+    return tuple(keys)
+
+  def route(self, topic: tuple) -> Route:
+    route = self.routes.get(topic)
+    if route is None:
+      keys = dict(zip(self.selectors, topic))
+      consumers = [
+          f for f, (selector, value) in zip(self.fields, self.topics)
+          if not selector or keys.get(selector) == value
+      ]
+      route = self.routes[topic] = Route(consumers, self.accumulators)
+    return route
+
+  def dispatch(self, message: Any) -> None:
+    route = self.route(self.topic(message))
+    if not route.handlers and not route.folds:
+      return
+    values = route.plan.select(message)
+    for acc, value, weight in route.folds:
+      acc.add(values[value], 1.0 if weight is None else values[weight])
+    for name, handler, i in route.handlers:
+      try:
+        if values[i]:
+          handler(values[i], self.epochs)  # map data with handler
+      except Exception as e:
+        log_warn(
+            f"Failed to handle websocket data from {self.name}.{name}: {e}")
+
 
 async def schedule(ing: Ingester) -> list[Task]:
 
   epochs_by_route: dict[str, deque[dict]] = {}
   default_handler_by_route: dict[str, Callable[..., Any]] = {}
   batched_fields_by_route: dict[str, list[ResourceField]] = {}
-  subscriptions = set()
-
-  # sub function (one per route)
-  async def subscribe(ing: Ingester, field: ResourceField, route_hash: str):
-
-    url = field.target
-    if state.args.verbose:
-      log_debug(
-          f"Subscribing to {url} for {ing.name}.{field.name}.{ing.interval}..."
-      )
-
-    retry_count = 0
-
-    while retry_count <= state.args.max_retries:
-      try:
-        async with websockets.connect(url) as ws:
-          if field.params:
-            await ws.send(
-                orjson.dumps(field.params, option=ORJSON_OPTIONS)
-            )  # send subscription params if any (eg. api key, stream list...)
-          # initialize route state for reducers and transformers to use
-          epochs_by_route.setdefault(url, deque([{}]))
-          while True:
-            if ws.state == websockets.protocol.State.CLOSED:
-              log_error(
-                  f"{url} ws connection closed for {ing.name}.{field.name}...")
-              break
-            res = await ws.recv()  # poll for data
-            res = orjson.loads(res)
-            handled: dict[str, dict[str, bool]] = {}
-            for field in batched_fields_by_route[route_hash]:
-              if field.handler and callable(field.handler):
-                handler_name = getattr(field.handler, '__name__',
-                                       str(field.handler))
-                if not handled.setdefault(handler_name, {}).get(
-                    field.selector, False):
-                  try:
-                    data = select_nested(field.selector, res, field.name)
-                    if data:
-                      field.handler(
-                          data, epochs_by_route[url])  # map data with handler
-                      pass
-                  except Exception as e:
-                    log_warn(
-                        f"Failed to handle websocket data from {url} for {ing.name}.{field.name}: {e}"
-                    )
-                  handled.setdefault(handler_name, {})[field.selector] = True
-
-            # if state.args.verbose: # <-- way too verbose
-            #   log_debug(f"Handled websocket data {data} from {url} for {c.name}, route state:\n{epochs_by_route[url][0]}")
-
-        # If we exit the loop without an exception, reset retry count
-        retry_count = 0
-
-      except (websockets.exceptions.ConnectionClosedError,
-              ConnectionResetError) as e:
-        retry_count += 1
-        log_error(
-            f"Connection error ({e}) occurred. Attempting to reconnect to {url} for {ing.name} (retry {retry_count}/{state.args.max_retries})..."
-        )
-        if retry_count > state.args.max_retries:
-          log_error(
-              f"Exceeded max retries ({state.args.max_retries}). Giving up on {url} for {ing.name}."
-          )
-          break
-        sleep_time = state.args.retry_cooldown * retry_count
-        await sleep(sleep_time)
-      except Exception as e:
-        log_error(f"Unexpected error occurred: {e}")
-        retry_count += 1
-        if retry_count > state.args.max_retries:
-          log_error(
-              f"Exceeded max retries ({state.args.max_retries}). Giving up on {url} for {ing.name}."
-          )
-          break
-        sleep_time = state.args.retry_cooldown * retry_count
-        await sleep(sleep_time)
+  # fields sharing a socket (same route and subscription params)
+  fields_by_connection: dict[tuple[str, str], list[ResourceField]] = {}
+  # incremental reducers, read on the schedule tick
+  reduced: dict[str, tuple[Accumulator, str]] = {}
+  accumulators: list[Accumulator] = []
 
   # collect function (one per ingester)
   async def ingest(ing: Ingester):
@@ -106,24 +141,30 @@ async def schedule(ing: Ingester) -> list[Task]:
     for route_hash, batch in batched_fields_by_route.items():
       url = batch[0].target
       epochs = epochs_by_route.get(url, None)
-      if not epochs or not epochs[0]:
+      has_epoch = bool(epochs and epochs[0])
+      if not has_epoch and not any(reduced[f.name][0].count
+                                   for f in batch if f.name in reduced):
         log_warn(f"Missing state for {ing.name} {url} ingestion, skipping...")
         continue
       collected_batches += 1
       for field in batch:
         # reduce the state to a collectable value
         try:
-          field.value = field.reducer(epochs) if field.reducer and callable(
-              field.reducer) else None
+          if field.name in reduced:
+            acc, op = reduced[field.name]
+            field.value = acc.value(op)
+          elif has_epoch:
+            field.value = field.reducer(epochs) if field.reducer and callable(
+                field.reducer) else None
         except Exception as e:
           log_warn(
               f"Failed to reduce {ing.name}.{field.name} for {url}, epoch attributes maye be missing: {e}"
           )
           continue
-        # Keep only the last 32 epochs to prevent memory accumulation
-        while len(epochs) > 32:
-          epochs.pop()
-      epochs.appendleft({})  # new epoch
+      if epochs and epochs[0]:
+        epochs.appendleft({})  # new epoch, the oldest dropped
+    for acc in accumulators:
+      acc.reset()  # new epoch
     if collected_batches > 0:
       await ing.post_ingest(response_data=epochs_by_route)
     else:
@@ -131,15 +172,15 @@ async def schedule(ing: Ingester) -> list[Task]:
           f"No data collected for {ing.name}, waiting for ws state to aggregate..."
       )
 
-  tasks = []
   for field in ing.fields:
     url = field.target
 
     # Create a unique key using a hash of the URL and interval
     route_hash = md5(f"{url}:{ing.interval}".encode()).hexdigest()
     if url:
+      incremental = parse_reducer(field.reducer) is not None
       # make sure that a field handler is defined if a target url is set
-      if field.selector and not field.handler:
+      if field.selector and not field.handler and not incremental:
         if route_hash not in default_handler_by_route:
           raise ValueError(
               f"Missing handler for field {ing.name}.{field.name} (selector {field.selector})"
@@ -147,29 +188,48 @@ async def schedule(ing: Ingester) -> list[Task]:
         log_warn(
             f"Using {field.target} default field handler for {ing.name}...")
         field.handler = default_handler_by_route[route_hash]
-        batched_fields_by_route[route_hash].append(field)
-        continue
-      if field.handler and isinstance(field.handler, str):
-        field.handler = safe_eval(field.handler, callable_check=True)
-      if field.reducer and isinstance(field.reducer, str):
-        try:
-          field.reducer = safe_eval(field.reducer, callable_check=True)
-        except Exception:
-          continue
+      else:
+        if field.handler and isinstance(field.handler, str):
+          field.handler = safe_eval(field.handler, callable_check=True)
+        if field.reducer and isinstance(field.reducer,
+                                        str) and not incremental:
+          try:
+            field.reducer = safe_eval(field.reducer, callable_check=True)
+          except Exception:
+            continue
+        if route_hash not in default_handler_by_route and field.handler and callable(
+            field.handler):
+          default_handler_by_route[route_hash] = field.handler
       # batch the fields by route given we only need to subscribe once per route
       batched_fields_by_route.setdefault(route_hash, []).append(field)
-      if route_hash not in default_handler_by_route and field.handler and callable(
-          field.handler):
-        default_handler_by_route[route_hash] = field.handler
-      # TODO: make sure that double subscriptions are not made possible since field.name is not part of the hash anymore
-      if field.target_id in subscriptions:
-        continue  # only subscribe once per socket route+selector+params combo
-      subscriptions.add(field.target_id)
-      tasks.append(subscribe(ing, field, route_hash))
-
-  # subscribe all at once, run in the background
-  gather(*tasks)
+      fields_by_connection.setdefault((route_hash, str(field.params or "")),
+                                      []).append(field)
+
+  # one subscription per route+params on the shared sockets, its messages
+  # dispatched by topic (sockets only shared if every field has a topic)
+  sockets: list[Task] = []
+  for fields in fields_by_connection.values():
+    url = fields[0].target
+    # initialize route state for handlers and lambda reducers to use
+    epochs = epochs_by_route.setdefault(url, deque([{}], maxlen=MAX_EPOCHS))
+    dispatcher = Dispatcher(fields, epochs, f"{url} for {ing.name}")
+    for f in fields:
+      if (spec := parse_reducer(f.reducer)) is not None:
+        reduced[f.name] = (dispatcher.accumulators[(f.topic or "", f.selector,
+                                                    spec[1])], spec[0])
+    accumulators.extend(dispatcher.accumulators.values())
+    if state.args.verbose:
+      log_debug(
+          f"Subscribing to {url} for {ing.name}.{fields[0].name}.{ing.interval}..."
+      )
+    sub = await ws_manager.subscribe(url,
+                                     fields[0].params,
+                                     dispatcher.dispatch,
+                                     headers=fields[0].headers,
+                                     shared=all(f.topic for f in fields))
+    if sub.socket and sub.socket.task and sub.socket.task not in sockets:
+      sockets.append(sub.socket.task)
 
   # register/schedule the ingester
   task = await scheduler.add_ingester(ing, fn=ingest, start=False)
-  return [task] if task is not None else []
+  return ([task] if task is not None else []) + sockets
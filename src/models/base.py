@@ -95,6 +95,7 @@ DataFormat = Literal[
     "json:column",
     "row",
     "column",  # json
+    "ndjson",  # streamed json rows
     "csv",
     "tsv",
     "psv",
@@ -115,6 +116,7 @@ UNALIASED_FORMATS: dict[DataFormat, DataFormat] = {
     "row": "json:row",
     "json:column": "json:column",
     "json:row": "json:row",
+    "ndjson": "ndjson",
     "csv": "csv",
     "tsv": "tsv",
     "psv": "psv",
@@ -232,6 +234,7 @@ class Targettable(DictMixin):
                                Any]] = ""  # for streams only (json ws, fix...)
   reducer: Union[str, Callable[...,
                                Any]] = ""  # for streams only (json ws, fix...)
+  topic: str = ""  # for streams only: messages routed by `selector=value`
   actions: list[Any] = field(
       default_factory=list)  # for dynamic scrappers only
   transformers: list[str] = field(default_factory=list)
@@ -448,6 +451,12 @@ class Resource(DictMixin):
     )
 
 
+def keyset_columns(columns: list[str]) -> tuple[Optional[str], Optional[str]]:
+  """Pagination keyset of a table: its time column, and uid as tie-breaker if any"""
+  time_col = next((c for c in ("ts", "updated_at", "created_at") if c in columns), None)
+  return time_col, "uid" if "uid" in columns else None
+
+
 @dataclass
 class Tsdb:
   host: str = "localhost"
@@ -513,11 +522,31 @@ class Tsdb:
                   aggregation_interval: Interval = "m5", columns: list[str] = []):
     raise NotImplementedError
 
+  async def fetch_page(self, table: str, limit: int = 100,
+                       after: Optional[tuple[Any, Any]] = None) -> tuple[list[str], list[tuple]]:
+    """Fetch a page of records in descending keyset order (see `keyset_columns`)
+
+    Args:
+      table: Table name to query
+      limit: Maximum number of records
+      after: Keyset values (time, uid) of the last record of the previous page
+
+    Returns:
+      Tuple of (columns, rows)
+    """
+    raise NotImplementedError
+
   async def fetch_batch(self, tables: list[str], from_date: Optional[datetime] = None,
                         to_date: Optional[datetime] = None, aggregation_interval: Interval = "m5",
                         columns: list[str] = []) -> tuple[list[str], list[tuple]]:
     raise NotImplementedError
 
+  async def delete_range(self, table: str, from_date: datetime,
+                         to_date: Optional[datetime] = None):
+    """Delete the records of `table` timestamped from `from_date` (up to
+    `to_date` included, if any), eg. orphaned by a chain reorg"""
+    raise NotImplementedError
+
   async def commit(self):
     raise NotImplementedError
 
@@ -70,7 +70,7 @@ class Ingester(Resource, Targettable):
     inheritable_attrs = {
         'target': "", 'selector': "", 'method': "GET", 'pre_transformer': "",
         'headers': {}, 'params': [], 'type': "float64", 'handler': "", 'reducer': "",
-        'actions': [], 'transformers': [], 'tags': []
+        'topic': "", 'actions': [], 'transformers': [], 'tags': []
     }
 
     for field in self.fields:
@@ -113,12 +113,12 @@ class Ingester(Resource, Targettable):
       self.monitor.start_timer()
 
   async def _post_ingest(self, response_data=None, status_code=200, table="",
-                        publish=True, jsonify=False, monitor=True):
+                        publish=True, monitor=True):
     """Update timestamps, transform, and store data"""
     pass # implement in subclasses
 
   async def post_ingest(self, response_data=None, status_code=200, table="",
-                        publish=True, jsonify=False, monitor=True):
+                        publish=True, monitor=True):
     """Stop monitoring, transform, cache, and store data"""
 
     self._update_timestamps()
@@ -142,11 +142,11 @@ class Ingester(Resource, Targettable):
         log_debug(f"[TEST MODE] Transformed {self.name} -> {self.get_field_values()}")
       else:
         # Normal mode: transform and store
-        await actions_store.transform_and_store(self, table, publish, jsonify, monitor)
+        await actions_store.transform_and_store(self, table, publish, monitor)
         if state.args.verbose:
           log_debug(f"Ingested {self.name} -> {self.get_field_values()}")
 
-    await self._post_ingest(response_data, status_code, table, publish, jsonify, monitor)
+    await self._post_ingest(response_data, status_code, table, publish, monitor)
 
   def compile_transformers(self):
     """Pre-compile all transformer expressions for optimal performance"""
@@ -1,3 +1,5 @@
+from asyncio import FIRST_COMPLETED, Task, create_task, gather, wait
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 import yamale
 from os import environ as env, path
@@ -5,9 +7,12 @@ from redis.asyncio import Redis, ConnectionPool
 from httpx import Request, Response
 from httpx import AsyncBaseTransport
 import web3
-from typing import Any, Optional, Callable
+from time import monotonic
+from typing import Any, Coroutine, Optional, Callable
 
-from .utils import log_error, log_info, log_warn, is_iterable, PackageMeta
+from .utils import log_error, log_info, log_warn, is_iterable, to_bool, PackageMeta
+from .adapters.evm_rpc import EvmRpcClient
+from .adapters.jsonrpc import JsonRpcClient, JsonRpcError
 from .adapters.sui_rpc import SuiRpcClient
 from .adapters.svm_rpc import SvmRpcClient
 
@@ -62,12 +67,119 @@ class NoCLTransport(AsyncBaseTransport):
     return await super().handle_async_request(request)
 
 
+# RPC pools: endpoints scored by latency and errors, failing ones quarantined
+RPC_HEDGE = to_bool(env.get("RPC_HEDGE", "true"))
+RPC_HEDGE_MIN = float(env.get("RPC_HEDGE_MIN_MS", 50)) / 1000
+RPC_PROBE_INTERVAL = float(env.get("RPC_PROBE_INTERVAL", 30))
+RPC_MAX_FAILURES = int(env.get("RPC_MAX_FAILURES", 3))
+RPC_RECOVERY = float(env.get("RPC_RECOVERY", 5))
+RPC_MAX_RECOVERY = float(env.get("RPC_MAX_RECOVERY", 300))
+# RPCs scoring within this ratio of the healthiest share its load
+RPC_SPREAD = float(env.get("RPC_SPREAD", 0.5))
+LATENCY_SAMPLES = 64  # latencies kept per endpoint
+ERROR_DECAY = 0.9  # weight of the past in an endpoint's error rate
+ERROR_PENALTY = 10  # score (latency) multiplier at a 100% error rate
+PROBES = {"sui": "sui_getChainIdentifier", "solana": "getHealth"}
+# not safe to send twice (hedged or failed over)
+WRITE_METHODS = {
+    "eth_sendRawTransaction", "eth_sendTransaction", "sendTransaction",
+    "sui_executeTransactionBlock"
+}
+
+
+def rpc_url(rpc: str) -> str:
+  return rpc if "://" in rpc else f"https://{rpc}"
+
+
+class RpcEndpoint:
+  """
+  An RPC of a chain's pool: its client (kept warm) and the JSON-RPC client
+  scoring its health from the latency and errors of its calls.
+  """
+
+  def __init__(self, url: str, client: Any, rpc: JsonRpcClient,
+               probe_method: str):
+    self.url, self.client, self.rpc = url, client, rpc
+    self.probe_method = probe_method
+    self.latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+    self.errors = 0.0  # decayed error rate
+    self.failures = 0  # consecutive
+    self.strikes = 0  # consecutive quarantines, doubling their length
+    self.quarantined_until = 0.0  # quarantined if set
+    self.seen = 0.0  # last call observed
+    self.probing: Optional[Task] = None
+    rpc.monitor = self.observe
+
+  @property
+  def available(self) -> bool:
+    return not self.quarantined_until
+
+  def due(self, now: float) -> bool:
+    """Whether to probe the endpoint: stale score or end of quarantine"""
+    if self.quarantined_until:
+      return now >= self.quarantined_until
+    return now - self.seen >= RPC_PROBE_INTERVAL
+
+  def latency(self) -> float:
+    return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+  def p95(self) -> float:
+    if not self.latencies:
+      return 0.0
+    ordered = sorted(self.latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+  def score(self) -> float:
+    """Expected cost of a call, the lower the healthier (unmeasured first)"""
+    return self.latency() * (1 + ERROR_PENALTY * self.errors) + self.errors
+
+  def observe(self, latency: float, error: Optional[Exception] = None) -> None:
+    self.seen = monotonic()
+    if error is None:
+      self.latencies.append(latency)
+      self.errors *= ERROR_DECAY
+      self.failures = 0
+      if self.quarantined_until:
+        self.quarantined_until = 0.0
+        log_info(f"RPC {self.url} recovered")
+      else:
+        self.strikes = 0
+      return
+    self.errors = self.errors * ERROR_DECAY + (1 - ERROR_DECAY)
+    self.failures += 1
+    if self.quarantined_until or self.failures >= RPC_MAX_FAILURES:
+      self.quarantine(error)
+
+  def quarantine(self, error: Optional[Exception] = None) -> None:
+    delay = min(RPC_RECOVERY * 2**self.strikes, RPC_MAX_RECOVERY)
+    self.strikes += 1
+    self.failures = 0
+    self.quarantined_until = monotonic() + delay
+    log_warn(f"RPC {self.url} quarantined for {delay:.0f}s: {error}")
+
+  async def probe(self) -> bool:
+    try:
+      await self.rpc.call(self.probe_method)  # observed
+      return True
+    except Exception:
+      return False
+
+
 class Web3Proxy:
+  """
+  Warm pools of RPC clients by chain, requests routed to the healthiest
+  endpoints (lowest latency and error rate, spread over those scoring within
+  RPC_SPREAD of the best). Endpoints are probed when their
+  score grows stale, quarantined after RPC_MAX_FAILURES consecutive failures
+  and probed again after exponentially growing delays.
+  """
 
-  def __init__(self, rotate_always=True):
-    self._next_index_by_chain = {}
+  def __init__(self):
     self._rpcs_by_chain = {}
-    self.rotate_always = rotate_always
+    self._pools: dict[str | int, list[RpcEndpoint]] = {}
+    self._routed: dict[str | int, RpcEndpoint] = {}
+    self._turns: dict[str | int, int] = {}
+    self._probes: set[Task] = set()
 
   def rpcs(self, chain_id: str | int, load_all=False) -> list[str]:
     if load_all and not self._rpcs_by_chain:
@@ -84,57 +196,169 @@ class Web3Proxy:
       self._rpcs_by_chain[chain_id] = rpc_env.split(",")
     return self._rpcs_by_chain[chain_id]
 
-  def _rotate_to_next_rpc(self, chain_id: str | int) -> None:
-    """Rotate to the next RPC in the list"""
-    rpcs = self.rpcs(chain_id)
-    if len(rpcs) > 1:
-      current_index = self._next_index_by_chain.get(chain_id, 0)
-      self._next_index_by_chain[chain_id] = (current_index + 1) % len(rpcs)
+  def _endpoint(self, chain_id: str | int, url: str) -> RpcEndpoint:
+    from . import state
+    timeout = float(getattr(state.args, "ingestion_timeout", 10))
+    if isinstance(chain_id, int):
+      # Multicall derives its async calls from the provider's endpoint
+      return RpcEndpoint(url, web3.Web3(web3.Web3.HTTPProvider(url)),
+                         EvmRpcClient(url, timeout=timeout), "eth_blockNumber")
+    if chain_id == "sui":
+      client: JsonRpcClient = SuiRpcClient(url, timeout=timeout)
+    elif chain_id == "solana":
+      client = SvmRpcClient(url, timeout=timeout)
+    else:
+      raise ValueError(f"Unsupported chain: {chain_id}")
+    return RpcEndpoint(url, client, client, PROBES[chain_id])
+
+  async def pool(self, chain_id: str | int) -> list[RpcEndpoint]:
+    """The chain's endpoints, probed at once when first requested"""
+    pool = self._pools.get(chain_id)
+    if pool is None:
+      pool = self._pools[chain_id] = [
+          self._endpoint(chain_id, rpc_url(rpc)) for rpc in self.rpcs(chain_id)
+      ]
+      up = sum(await gather(*(e.probe() for e in pool)))
+      log_info(f"Warmed {up}/{len(pool)} RPCs of chain {chain_id}")
+    else:
+      now = monotonic()
+      for e in pool:
+        if e.due(now) and (e.probing is None or e.probing.done()):
+          e.probing = create_task(e.probe())
+          self._probes.add(e.probing)
+          e.probing.add_done_callback(self._probes.discard)
+    return pool
+
+  async def ranked(self, chain_id: str | int) -> list[RpcEndpoint]:
+    """The chain's available endpoints, healthiest first"""
+    pool = await self.pool(chain_id)
+    ranked = sorted((e for e in pool if e.available), key=RpcEndpoint.score)
+    if not ranked:  # recovery probes due, awaited
+      now = monotonic()
+      await gather(*(e.probe() for e in pool if e.due(now)))
+      ranked = sorted((e for e in pool if e.available), key=RpcEndpoint.score)
+    if not ranked:
+      raise Exception(f"All RPCs failed for chain {chain_id}")
+    return ranked
 
   async def client(self, chain_id: str | int, roll=True) -> Any:
-    # Initialize or rotate RPC index
-    if chain_id not in self._next_index_by_chain:
-      self._next_index_by_chain[chain_id] = 0
-    elif roll and self.rotate_always:
-      self._rotate_to_next_rpc(chain_id)
-
-    rpcs = self.rpcs(chain_id)
-    is_evm = isinstance(chain_id, int)
-
-    # Try each RPC until one works
-    for _ in range(len(rpcs)):
-      current_index = self._next_index_by_chain[chain_id]
-      rpc_url = f"https://{rpcs[current_index]}"
-
-      try:
-        from . import state
-
-        # Create client based on chain type
-        if is_evm:
-          client = web3.Web3(web3.Web3.HTTPProvider(rpc_url))
-          if not client.is_connected():
-            raise Exception("Connection failed")
-        elif chain_id == "sui":
-          client = SuiRpcClient(rpc_url,
-                                timeout=float(state.args.ingestion_timeout))
-          if not await client.is_connected():
-            raise Exception("Connection failed")
-        elif chain_id == "solana":
-          client = SvmRpcClient(rpc_url,
-                                timeout=float(state.args.ingestion_timeout))
-          if not await client.is_connected():
-            raise Exception("Connection failed")
-        else:
-          raise ValueError(f"Unsupported chain: {chain_id}")
-
-        log_info(f"Connected to chain {chain_id} using RPC {rpc_url}")
-        return client
-
-      except Exception as e:
-        log_warn(f"RPC {rpc_url} failed for chain {chain_id}: {e}")
-        self._next_index_by_chain[chain_id] = (current_index + 1) % len(rpcs)
-
-    raise Exception(f"All RPCs failed for chain {chain_id}")
+    """
+    Client of the chain's healthiest RPC.
+
+    Args:
+      chain_id: EVM chain id, or "sui"/"solana"
+      roll: Route to the next RPC scoring near the healthiest, else keep the
+        last one routed to while available
+
+    Returns:
+      A web3.Web3 (EVM chains), SuiRpcClient or SvmRpcClient
+    """
+    return (await self._route(chain_id, roll)).client
+
+  async def _route(self, chain_id: str | int, roll=True) -> RpcEndpoint:
+    ranked = await self.ranked(chain_id)
+    routed = self._routed.get(chain_id)
+    if roll or routed not in ranked:
+      routed = self._routed[chain_id] = self._spread(chain_id, ranked)
+    return routed
+
+  async def run(self,
+                chain_id: str | int,
+                fn: Callable[[Any], Coroutine[Any, Any, Any]],
+                roll=True) -> Any:
+    """
+    Result of `fn(client)` on the client of the chain's healthiest RPC (see
+    `client`), its latency and failure scoring the RPC: calls not made through
+    the JSON-RPC clients (eg. Multicall's, derived from the web3 provider) are
+    scored as well.
+    """
+    endpoint = await self._route(chain_id, roll)
+    start = monotonic()
+    try:
+      result = await fn(endpoint.client)
+    except Exception as e:
+      endpoint.observe(monotonic() - start, e)
+      raise
+    endpoint.observe(monotonic() - start)
+    return result
+
+  def _spread(self, chain_id: str | int,
+              ranked: list[RpcEndpoint]) -> RpcEndpoint:
+    """Next of the RPCs scoring within RPC_SPREAD of the healthiest (round
+    robin), public RPCs rate limiting single clients"""
+    limit = ranked[0].score() * (1 + RPC_SPREAD)
+    near = [e for e in ranked if e.score() <= limit]
+    turn = self._turns.get(chain_id, 0)
+    self._turns[chain_id] = turn + 1
+    return near[turn % len(near)]
+
+  async def rpc_clients(self, chain_id: str | int) -> list[Any]:
+    """JSON-RPC clients (EvmRpcClient for EVM chains) of the chain's available
+    RPCs, healthiest first"""
+    return [e.rpc for e in await self.ranked(chain_id)]
+
+  async def request(self,
+                    chain_id: str | int,
+                    fn: Callable[[Any], Coroutine[Any, Any, Any]],
+                    idempotent: bool = True,
+                    hedge: Optional[bool] = None) -> Any:
+    """
+    Result of `fn(client)` on the chain's healthiest RPC (JSON-RPC client),
+    spread over the RPCs scoring near it.
+
+    Idempotent requests fail over to the next healthiest RPCs, and are hedged:
+    sent to the runner-up as well if not answered after the first RPC's p95
+    latency (RPC_HEDGE_MIN at least), the first answer winning.
+    """
+    ranked = await self.ranked(chain_id)
+    first = self._spread(chain_id, ranked)
+    ranked = [first] + [e for e in ranked if e is not first]
+    hedge = RPC_HEDGE if hedge is None else hedge
+    queue = list(ranked) if idempotent else ranked[:1]
+    pending: set[Task] = set()
+    urls: dict[Task, str] = {}
+
+    def send() -> None:
+      endpoint = queue.pop(0)
+      task = create_task(fn(endpoint.rpc))
+      pending.add(task)
+      urls[task] = endpoint.url
+
+    send()
+    delay: Optional[float] = max(RPC_HEDGE_MIN, ranked[0].p95())
+    error: Optional[BaseException] = None
+    try:
+      while pending:
+        hedging = hedge and idempotent and delay is not None and queue
+        done, _ = await wait(pending,
+                             timeout=delay if hedging else None,
+                             return_when=FIRST_COMPLETED)
+        if not done:  # slow: hedged once
+          delay = None
+          send()
+          continue
+        for task in done:
+          pending.discard(task)
+          if (error := task.exception()) is None:
+            return task.result()
+          if isinstance(error, JsonRpcError):
+            raise error  # answered
+          log_warn(f"RPC {urls[task]} failed for chain {chain_id}: {error}")
+        if not pending and queue:
+          send()
+      raise Exception(f"All RPCs failed for chain {chain_id}: {error}")
+    finally:
+      for task in pending:
+        task.cancel()
+
+  async def call(self,
+                 chain_id: str | int,
+                 method: str,
+                 params: Optional[Any] = None) -> Any:
+    """JSON-RPC call to the chain's healthiest RPC, hedged if idempotent"""
+    return await self.request(chain_id,
+                              lambda client: client.call(method, params),
+                              idempotent=method not in WRITE_METHODS)
 
 
 class TsdbProxy:
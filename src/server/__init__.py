@@ -5,6 +5,8 @@ from starlette.middleware.cors import CORSMiddleware
 import uvicorn
 
 from .. import state
+from ..cache import start_l1, stop_l1
+from ..services.limiter import RateLimiter
 from .responses import ROUTER_ERROR_HANDLERS, ApiResponse
 from .routers import auth, forwarder, retriever, admin, config
 from .middlewares.version_resolver import VersionResolver
@@ -16,8 +18,11 @@ from .middlewares.auth import AuthMiddleware
 @asynccontextmanager
 async def lifespan(app: FastAPI):
   # pre-startup
+  start_l1()
   yield
   # post-shutdown
+  await stop_l1()
+  await RateLimiter.stop_sync()
 
 
 async def start():
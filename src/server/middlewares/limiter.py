@@ -34,14 +34,16 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
       response_bytes = int(response.headers.get('Content-Length') or 0)
 
       # Combined rate limit check and increment
-      err, result = await RateLimiter.check_and_increment(
-          user, req.url.path, response_bytes)
+      try:
+        result = await RateLimiter.admit(user, req.url.path, response_bytes)
+      except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
-      if err and result.get("limited"):
+      if result.get("limited"):
         # Rate limit exceeded after processing - unusual but handle gracefully
         raise HTTPException(
             status_code=429,
-            detail=err,
+            detail=f"Rate limit exceeded ({result['exceeded']})",
             headers={"Retry-After": str(result.get("retry_after", 60))})
 
       # Add rate limit headers if not bypassed
@@ -1,8 +1,9 @@
 import re
 from uuid import uuid4
-from typing import Awaitable, Tuple, Any
+from typing import AsyncIterable, AsyncIterator, Awaitable, Tuple, Any
 from functools import lru_cache
 from fastapi import Response
+from fastapi.responses import StreamingResponse
 from fastapi.exceptions import RequestValidationError, ValidationException, HTTPException, WebSocketException
 import orjson
 from ..utils import log_error
@@ -12,6 +13,31 @@ ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
                   | orjson.OPT_SERIALIZE_UUID | orjson.OPT_SERIALIZE_NUMPY)
 
 
+def media_type_of(data_format: DataFormat) -> str:
+  """HTTP media type of a response data format"""
+  match data_format:
+    case "ndjson":
+      return "application/x-ndjson"
+    case "csv":
+      return "text/csv"
+    case "tsv":
+      return "text/plain"
+    case "psv":
+      return "text/pipe-separated-values"
+    case "parquet":
+      return "application/vnd.apache.parquet"
+    case "arrow" | "feather":
+      return "application/vnd.apache.arrow.file"
+    # case "orc":
+    #   return "application/vnd.apache.orc" # not supported
+    case "avro":
+      return "application/vnd.apache.avro"
+    case _:
+      return "application/json" if data_format.startswith(
+          "json"
+      ) else "application/octet-stream"  # Default to binary for unknown formats
+
+
 class ApiResponse(Response):
   media_type = "application/json"
   data_format: DataFormat = "json:row"
@@ -23,23 +49,7 @@ class ApiResponse(Response):
 
     if not data_format.startswith("json"):
       # Set appropriate media type based on format
-      match data_format:
-        case "csv":
-          self.media_type = "text/csv"
-        case "tsv":
-          self.media_type = "text/plain"
-        case "psv":
-          self.media_type = "text/pipe-separated-values"
-        case "parquet":
-          self.media_type = "application/vnd.apache.parquet"
-        case "arrow" | "feather":
-          self.media_type = "application/vnd.apache.arrow.file"
-        # case "orc":
-        #     self.media_type = "application/vnd.apache.orc" # not supported
-        case "avro":
-          self.media_type = "application/vnd.apache.avro"
-        case _:
-          self.media_type = "application/octet-stream"  # Default to binary for unknown formats
+      self.media_type = media_type_of(data_format)
 
     super().__init__(content=content, **kwargs)
     self.headers["Content-Type"] = f"{self.media_type}; charset=utf-8"
@@ -62,6 +72,34 @@ class ApiResponse(Response):
         raise ValueError(f"Unsupported response format: {self.data_format}")
 
 
+class ApiStreamingResponse(StreamingResponse):
+  """Chunked response of pre-serialized frames (NDJSON, CSV or Arrow IPC stream)"""
+
+  def __init__(self,
+               content: AsyncIterable[bytes],
+               data_format: DataFormat = "ndjson",
+               **kwargs) -> None:
+    media_type = "application/vnd.apache.arrow.stream" if data_format == "arrow" \
+      else media_type_of(data_format)
+    super().__init__(content=content, media_type=media_type, **kwargs)
+    self.data_format = data_format
+
+  @classmethod
+  async def from_stream(cls,
+                        stream: AsyncIterator[bytes],
+                        data_format: DataFormat = "ndjson",
+                        **kwargs) -> 'ApiStreamingResponse':
+    """Await the first chunk before responding, so that errors keep their status code"""
+    first = await anext(stream, b"")
+
+    async def chunks():
+      yield first
+      async for chunk in stream:
+        yield chunk
+
+    return cls(chunks(), data_format, **kwargs)
+
+
 _ERROR_PATTERNS = [
     (re.compile(r"(?i)not\s*found|missing|404"), 404),
     (re.compile(r"(?i)unauthorized|forbidden|403"), 403),
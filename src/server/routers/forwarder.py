@@ -2,19 +2,19 @@ import orjson
 from fastapi import APIRouter, HTTPException
 from fastapi.websockets import WebSocketState, WebSocket, WebSocketDisconnect
 from fastapi.concurrency import asynccontextmanager
-from typing import Literal, Optional
+from typing import Any, Literal, Optional, Union
 from asyncio import gather, Task, create_task, CancelledError, sleep
 import fnmatch
-import pickle
 from aiocron import crontab
 from contextlib import suppress
 
-from ...utils import log_debug, log_error, log_info, log_warn, now
+from ...utils import codec, log_debug, log_error, log_info, log_warn, now
 from ... import state
 from ..responses import ORJSON_OPTIONS
 from ...services.limiter import RateLimiter
 from ...services.auth import AuthService
 from ...services.loader import is_resource_protected
+from ...cache import NS, STREAMS, STREAM_BATCH, read_streams, stream_heads
 from ...models import User
 from ...constants import (
     WS_MAX_CLIENTS,
@@ -43,7 +43,8 @@ async def lifespan(router: APIRouter):
   """Manage WebSocket forwarder lifecycle."""
   global redis_listener_task
   log_info("Starting WebSocket forwarder...")
-  redis_listener_task = create_task(handle_redis_messages())
+  redis_listener_task = create_task(
+      handle_stream_messages() if STREAMS else handle_redis_messages())
 
   try:
     yield
@@ -108,10 +109,10 @@ async def get_filtered_data(topic: str, data: dict, user: User) -> dict:
   """Optimized data filtering with caching."""
   current_time = now().timestamp()
 
-  # Check cache first
+  # Check cache first, valid for this very message only
   if topic in _message_cache:
     public_data, admin_data, cache_time = _message_cache[topic]
-    if current_time - cache_time < _cache_ttl:
+    if admin_data is data and current_time - cache_time < _cache_ttl:
       return admin_data if user.status not in ["public", "anonymous"
                                                ] else public_data
 
@@ -155,7 +156,7 @@ async def handle_redis_messages():
           # Only process if we have active subscribers
           if topic in clients_by_topic and clients_by_topic[topic]:
             try:
-              data = pickle.loads(message['data'])
+              data = codec.decode(message['data'])
               await broadcast_message(topic, data)
             except Exception as e:
               log_warn(f"Failed to process message for {topic}: {e}")
@@ -170,7 +171,73 @@ async def handle_redis_messages():
       await sleep(5)
 
 
-async def broadcast_message(topic: str, data: dict):
+async def handle_stream_messages():
+  """Redis Streams reader: every forwarder node reads all the entries of its
+  subscribed topics (broadcast) from in-memory last ids, clients resuming
+  past a node restart with `since` (see `replay_messages`).
+  """
+  last_ids: dict[str, str] = {}
+  while True:
+    try:
+      topics = [t.split(":", 1)[-1] for t, c in clients_by_topic.items() if c]
+      for topic in set(last_ids) - set(topics):
+        del last_ids[topic]  # unsubscribed
+      if not topics:
+        await sleep(0.1)
+        continue
+      if new_topics := [t for t in topics if t not in last_ids]:
+        last_ids.update(await stream_heads(new_topics))
+      # short block so that new subscriptions join the read promptly
+      entries = await read_streams({t: last_ids[t]
+                                    for t in topics},
+                                   STREAM_BATCH,
+                                   block=500)
+      for topic, entry_id, data in entries:
+        last_ids[topic] = entry_id
+        await broadcast_message(f"{NS}:{topic}", data, entry_id)
+
+    except CancelledError:
+      log_info("Redis stream handler stopped")
+      break
+    except Exception as e:
+      log_error(f"Redis stream error: {e}. Reconnecting in 5s...")
+      await sleep(5)
+
+
+async def replay_messages(ws: WebSocket, user: User, topics: list[str],
+                          since: Union[str, dict[str, str]]):
+  """Send a reconnecting client the stream entries after its last seen ids"""
+  last_ids: dict[str, str] = {}
+  for topic in topics:
+    name = topic.split(":", 1)[-1]
+    if last_id := since if isinstance(since, str) else since.get(name):
+      last_ids[name] = last_id
+  if not last_ids:
+    return
+  for topic, entry_id, data in await read_streams(last_ids):
+    await _send_safe(
+        ws, await data_message(f"{NS}:{topic}", data, user, entry_id))
+
+
+async def data_message(topic: str,
+                       data: dict,
+                       user: User,
+                       entry_id: Optional[str] = None,
+                       timestamp: str = "") -> dict[str, Any]:
+  message = {
+      "type": "data",
+      "topic": topic.split(":", 1)[-1],  # Remove namespace for client
+      "data": await get_filtered_data(topic, data, user),
+      "timestamp": timestamp or now().isoformat()
+  }
+  if entry_id:  # resume point of the client, see `since` on subscribe
+    message["id"] = entry_id
+  return message
+
+
+async def broadcast_message(topic: str,
+                            data: dict,
+                            entry_id: Optional[str] = None):
   """Optimized message broadcasting with batch operations and correct error handling."""
   clients = clients_by_topic.get(topic)
   if not clients:
@@ -192,16 +259,8 @@ async def broadcast_message(topic: str, data: dict):
     if not user:
       continue
 
-    # Get filtered data for this user type
-    filtered_data = await get_filtered_data(topic, data, user)
-
-    message = {
-        "type": "data",
-        "topic": topic.split(":", 1)[-1],  # Remove namespace for client
-        "data": filtered_data,
-        "timestamp": timestamp
-    }
-
+    # Filtered data for this user type
+    message = await data_message(topic, data, user, entry_id, timestamp)
     send_tasks.append(_send_safe(ws, message))
 
   # Execute all sends concurrently and check for failures
@@ -305,14 +364,21 @@ async def maintenance():
         f"WS: {len(topics_by_client)} clients, {len(clients_by_topic)} topics")
 
 
-async def handle_subscribe(ws: WebSocket, user: User, topics: list[str]):
-  """Handle subscription with optimized processing."""
+async def handle_subscribe(ws: WebSocket,
+                           user: User,
+                           topics: list[str],
+                           since: Optional[Union[str, dict[str, str]]] = None):
+  """Handle subscription with optimized processing.
+
+  With the streams transport, `since` (a last seen entry id, or one per topic)
+  replays the entries the client missed before live messages.
+  """
   if not topics:
     await _send_safe(ws, {"type": "error", "message": "No topics provided"})
     return
 
   # Add namespace and check authorization
-  prefixed_topics = [f"{state.NS}:{t}" for t in topics]
+  prefixed_topics = [f"{NS}:{t}" for t in topics]
   allowed, rejected = await check_authorization_and_filter(
       user, prefixed_topics)
 
@@ -345,13 +411,17 @@ async def handle_subscribe(ws: WebSocket, user: User, topics: list[str]):
       "topics": [t.split(':', 1)[-1] for t in allowed]
   })
 
+  # subscribed first: a replay may overlap live messages (same ids), never gap
+  if STREAMS and since:
+    await replay_messages(ws, user, allowed, since)
+
 
 async def handle_unsubscribe(ws: WebSocket, topics: list[str]):
   """Handle unsubscription with batch processing."""
   if ws not in topics_by_client:
     return
 
-  prefixed_topics = [f"{state.NS}:{t}" for t in topics]
+  prefixed_topics = [f"{NS}:{t}" for t in topics]
   client_topics = topics_by_client[ws]
 
   for topic in prefixed_topics:
@@ -387,7 +457,8 @@ async def websocket_endpoint(ws: WebSocket):
         action = message.get("action")
 
         if action == "subscribe":
-          await handle_subscribe(ws, user, message.get("topics", []))
+          await handle_subscribe(ws, user, message.get("topics", []),
+                                 message.get("since"))
         elif action == "unsubscribe":
           await handle_unsubscribe(ws, message.get("topics", []))
         elif action == "ping":
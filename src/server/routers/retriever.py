@@ -3,19 +3,26 @@ from fastapi import APIRouter, Request, HTTPException, Query, Path
 from fastapi.responses import HTMLResponse
 import re
 
-from ..responses import ApiResponse
+from ..responses import ApiResponse, ApiStreamingResponse
 from ..routes import Route
 from ...models.base import DataFormat, Interval
 from ...utils.date import fit_date_params, now
-from ...utils.format import load_template
+from ...utils.format import load_template, split
 from ...services import config as config_service, loader as loader_service, converter
 from ...services.limiter import RateLimiter
 from ...services.auth import AuthService
-from ...actions.load import load_resource
+from ...actions.load import load_page, load_resource
 from ... import state
 
 router = APIRouter(tags=["retriever"])
 
+
+def _stream_format(format: DataFormat) -> DataFormat:
+  """JSON formats are streamed as newline-delimited rows"""
+  return "ndjson" if format.startswith("json") or format in (
+      "row", "column") else format
+
+
 _index_html = load_template("index.html")
 _docs_html = load_template("docs.html")
 
@@ -177,9 +184,12 @@ async def get_schema_with_filter(req: Request,
 @router.get(Route.LAST.endpoint)
 async def get_last(req: Request,
                    quote: Optional[str] = None,
-                   precision: int = 6):
+                   precision: int = 6,
+                   fields: Optional[str] = None):
+  selected = [f for f in split(fields) if f not in ("*", "all")] if fields else []
   last_values = await loader_service.get_last_values(req.state.resources,
-                                                     quote, precision)
+                                                     quote, precision,
+                                                     selected or None)
   return ApiResponse(last_values if len(req.state.resources) >
                      1 else last_values[req.state.resources[0]])
 
@@ -193,10 +203,23 @@ async def get_history(req: Request,
                       target_epochs: Optional[int] = None,
                       precision: int = 6,
                       quote: Optional[str] = None,
-                      format: DataFormat = "json:row"):
+                      format: DataFormat = "json:row",
+                      stream: bool = False):
   from_date, to_date, interval, target_epochs = fit_date_params(
       from_date, to_date, interval, target_epochs)
 
+  if stream:
+    return await ApiStreamingResponse.from_stream(
+        loader_service.stream_history(req.state.resources,
+                                      req.state.fields,
+                                      from_date,
+                                      to_date,
+                                      interval,
+                                      quote,
+                                      precision,
+                                      format=_stream_format(format)),
+        _stream_format(format))
+
   data = await loader_service.get_history(req.state.resources,
                                           req.state.fields, from_date, to_date,
                                           interval, quote, precision, format)
@@ -310,18 +333,31 @@ async def get_resource_list(
                        ge=1,
                        le=1000,
                        description="Maximum number of records"),
-    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    offset: int = Query(
+        0, ge=0, description="Offset for pagination (deprecated, use cursor)"),
+    cursor: Optional[str] = Query(
+        None, description="Pagination token returned as next_cursor"),
     include_transient: bool = Query(False,
-                                    description="Include transient fields")
+                                    description="Include transient fields"),
+    stream: bool = Query(False, description="Stream all records"),
+    format: DataFormat = Query("ndjson", description="Stream format")
 ) -> ApiResponse:
-  """Get a list of records for a specific resource with pagination."""
+  """Get a list of records for a specific resource with keyset pagination."""
 
   # Use scope from middleware (already validated)
   scope = req.state.scope
 
+  if stream:
+    return await ApiStreamingResponse.from_stream(
+        loader_service.stream_records([resource], _stream_format(format)),
+        _stream_format(format))  # type: ignore[return-value]
+
   # Load resources with proper scope
-  # Use the unified load_resource function
-  records = await load_resource(resource, limit=limit, offset=offset)
+  next_cursor = None
+  if offset:
+    records = await load_resource(resource, limit=limit, offset=offset)
+  else:
+    records, next_cursor = await load_page(resource, limit, cursor)
 
   # Format response
   total_count = len(records) if isinstance(records, list) else 0
@@ -335,8 +371,10 @@ async def get_resource_list(
       "pagination": {
           "limit": limit,
           "offset": offset,
+          "cursor": cursor,
+          "next_cursor": next_cursor,
           "count": total_count,
-          "has_more": total_count == limit  # Approximate indicator
+          "has_more": bool(next_cursor) if not offset else total_count == limit
       },
       "scope":
       scope.name,
@@ -354,30 +392,49 @@ async def get_batch_resource_list(
                        ge=1,
                        le=1000,
                        description="Maximum number of records per resource"),
-    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    offset: int = Query(
+        0, ge=0,
+        description="Offset for pagination (deprecated, use cursors)"),
+    cursors: Optional[str] = Query(
+        None,
+        description="Comma-separated next_cursor tokens, one per resource"),
     include_transient: bool = Query(False,
-                                    description="Include transient fields")
+                                    description="Include transient fields"),
+    stream: bool = Query(False, description="Stream all records"),
+    format: DataFormat = Query("ndjson", description="Stream format")
 ) -> ApiResponse:
-  """Get lists of records for multiple resources with pagination."""
+  """Get lists of records for multiple resources with keyset pagination."""
 
   resource_names = [r.strip() for r in resources.split(",") if r.strip()]
   if not resource_names:
     raise HTTPException(status_code=400, detail="No resources specified")
 
+  if stream:
+    return await ApiStreamingResponse.from_stream(
+        loader_service.stream_records(resource_names, _stream_format(format)),
+        _stream_format(format))  # type: ignore[return-value]
+
   # Use scope from middleware (already validated)
   scope = req.state.scope
 
   # Load data for each resource
   result = {}
 
-  for resource_name in resource_names:
+  resource_cursors = cursors.split(",") if cursors else []
+  for i, resource_name in enumerate(resource_names):
     # Load resources with proper scope
-    # Use the unified load_resource function
-    records = await load_resource(resource_name, limit=limit, offset=offset)
+    next_cursor = None
+    if offset:
+      records = await load_resource(resource_name, limit=limit, offset=offset)
+    else:
+      cursor = resource_cursors[i] if i < len(resource_cursors) else ""
+      records, next_cursor = await load_page(resource_name, limit, cursor
+                                             or None)
 
     result[resource_name] = {
         "records": records,
-        "count": len(records) if isinstance(records, list) else 0
+        "count": len(records) if isinstance(records, list) else 0,
+        "next_cursor": next_cursor
     }
 
   return ApiResponse({
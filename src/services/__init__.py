@@ -3,12 +3,13 @@ from . import admin
 from . import auth
 from . import config
 from . import converter
+from . import history_cache
 from . import limiter
 from . import loader
 from . import status_checker
 from . import ts_analysis
 
 __all__ = [
-    'admin', 'auth', 'config', 'converter', 'limiter', 'loader',
-    'status_checker', 'ts_analysis'
+    'admin', 'auth', 'config', 'converter', 'history_cache', 'limiter',
+    'loader', 'status_checker', 'ts_analysis'
 ]
@@ -7,11 +7,11 @@ from typing import Optional
 from ..models.base import UserStatus
 from ..models.user import User
 from ..utils import log_error, log_info, log_warn, log_debug
-from ..utils.decorators import service_method
+from ..utils.decorators import service_method, cache_stats
 from ..actions.load import load_resource
 from ..actions.store import store
 from .. import state
-from ..cache import get_registry
+from ..cache import get_registry, repair_index
 from datetime import timezone
 
 UTC = timezone.utc
@@ -248,8 +248,10 @@ class AdminService:
   @staticmethod
   @service_method("Get cache status")
   async def get_cache_status() -> dict:
-    """Get cache (Redis) connection status"""
-    return await _get_system_component_status("redis")
+    """Get cache (Redis) connection status and in-process memoization counters"""
+    status = await _get_system_component_status("redis")
+    status["memoized"] = cache_stats()
+    return status
 
   @staticmethod
   @service_method("Clear cache")
@@ -259,12 +261,13 @@ class AdminService:
 
     try:
       if getattr(state, 'redis', None):
-        # Get keys matching pattern
-        keys = await state.redis.keys(pattern)
+        # Get keys matching pattern, incrementally rather than blocking on KEYS
+        keys = [k async for k in state.redis.scan_iter(match=pattern)]
 
         if keys:
           # Delete keys
           deleted_count = await state.redis.delete(*keys)
+          await repair_index(force=True)  # drop deleted keys from the indexes
           log_info(f"Cleared {deleted_count} cache entries")
           return {"success": True, "deleted_count": deleted_count}
         else:
@@ -0,0 +1,253 @@
+"""
+Bucket-aligned cache for historical TSDB queries.
+
+Aggregated buckets that are fully in the past (settled) never change, so they
+are grouped into fixed-size, interval-aligned segments cached in Redis and in
+an in-process L1. Each query then only hits the TSDB for the open tail of the
+requested range (plus any segment not cached yet).
+
+Rows written (or deleted) late in a settled range bump the table's generation,
+part of every segment key, so that its cached segments are no longer read.
+"""
+
+from asyncio import gather
+from collections import OrderedDict
+from datetime import datetime, timezone
+from os import environ as env
+from typing import Any, Optional
+
+from .. import state
+from ..actions import rollup
+from ..cache import NS, cache_batch, get_cache_batch
+from ..utils import Interval, now, log_debug, log_warn, rebase_epoch_to_sec, parse_date
+from ..utils.date import SEC_BY_TF
+from ..utils.types import to_bool
+
+UTC = timezone.utc
+
+HISTORY_CACHE = to_bool(env.get("HISTORY_CACHE", "true"))
+# buckets per cached segment
+SEGMENT_BUCKETS = int(env.get("HISTORY_CACHE_SEGMENT", 128))
+# delay before a closed bucket is considered settled (late ingestions)
+GRACE_SEC = int(env.get("HISTORY_CACHE_GRACE", 120))
+# redis expiry of settled segments (1 week)
+TTL_SEC = int(env.get("HISTORY_CACHE_TTL", 604800))
+# max segments kept in-process
+L1_MAXSIZE = int(env.get("HISTORY_CACHE_L1_SIZE", 4096))
+
+Segment = tuple[list[str], list[tuple]]
+
+_l1: OrderedDict[str, Segment] = OrderedDict()
+
+
+def is_cacheable(interval: Interval) -> bool:
+  """Only fixed-length intervals aligned on day boundaries (s1..D1) can be segmented"""
+  secs = SEC_BY_TF.get(interval)
+  return bool(secs) and 86400 % secs == 0  # type: ignore[operator]
+
+
+def segment_key(table: str,
+                columns: list[str],
+                interval: Interval,
+                start: int,
+                generation: int = 0) -> str:
+  return f"{NS}:history:{table}:{generation}:{interval}:{','.join(columns) or '*'}:{start}"
+
+
+def generation_key(table: str) -> str:
+  return f"{NS}:history:gen:{table}"
+
+
+async def invalidate(table: str, since: datetime) -> None:
+  """Stop serving the cached segments of `table` if rows were written (or
+  deleted) from `since` in its settled range, by bumping its generation"""
+  if not HISTORY_CACHE or since.timestamp() >= now().timestamp() - GRACE_SEC:
+    return  # still in the open tail, never cached
+  try:
+    await state.redis.incr(generation_key(table))
+  except Exception as e:
+    log_warn(f"History cache invalidation failed for {table}: {e}")
+
+
+def to_epoch(ts: Any) -> float:
+  """Epoch seconds of a row timestamp (datetime, epoch s/ms/us or date string)"""
+  if isinstance(ts, datetime):
+    return (ts if ts.tzinfo else ts.replace(tzinfo=UTC)).timestamp()
+  if isinstance(ts, (int, float)):
+    return float(rebase_epoch_to_sec(ts))
+  parsed = parse_date(ts)
+  return parsed.timestamp() if parsed else 0.0
+
+
+def _l1_get(key: str) -> Optional[Segment]:
+  segment = _l1.get(key)
+  if segment is not None:
+    _l1.move_to_end(key)
+  return segment
+
+
+def _l1_set(key: str, segment: Segment) -> None:
+  _l1[key] = segment
+  _l1.move_to_end(key)
+  while len(_l1) > L1_MAXSIZE:
+    _l1.popitem(last=False)
+
+
+def clear_l1() -> None:
+  _l1.clear()
+
+
+def _slice_rows(rows: list, start: float, end: float) -> list[tuple]:
+  """Rows with start <= ts < end, order preserved"""
+  return [
+      tuple(row) for row in rows
+      if row and row[0] is not None and start <= to_epoch(row[0]) < end
+  ]
+
+
+async def _fetch_segments(table: str, columns: list[str], interval: Interval,
+                          starts: list[int], span: int) -> dict[int, Segment]:
+  """Query the TSDB for contiguous runs of missing segments and split the results"""
+  runs: list[list[int]] = []
+  for start in starts:
+    if runs and runs[-1][-1] + span == start:
+      runs[-1].append(start)
+    else:
+      runs.append([start])
+
+  async def fetch_run(run: list[int]) -> dict[int, Segment]:
+    cols, rows = await rollup.fetch(
+        table, datetime.fromtimestamp(run[0], UTC),
+        datetime.fromtimestamp(run[-1] + span, UTC), interval, list(columns))
+    if not cols:  # adapter error, nothing to cache
+      return {}
+    return {s: (cols, _slice_rows(rows, s, s + span)) for s in run}
+
+  fetched: dict[int, Segment] = {}
+  for result in await gather(*(fetch_run(run) for run in runs)):
+    fetched.update(result)
+  return fetched
+
+
+async def fetch(table: str,
+                from_date: datetime,
+                to_date: datetime,
+                aggregation_interval: Interval = "m5",
+                columns: list[str] = []) -> tuple[list[str], list]:
+  """Drop-in for `state.tsdb.fetch` serving settled segments from cache.
+
+  Rows are returned newest first, matching the adapters' `ORDER BY ts DESC`.
+
+  Args:
+    table: Table (resource) to query
+    from_date: Range start
+    to_date: Range end
+    aggregation_interval: Bucket interval
+    columns: Columns to select, all if empty
+
+  Returns:
+    Tuple of (columns, rows)
+  """
+  if not HISTORY_CACHE or not is_cacheable(aggregation_interval):
+    return await rollup.fetch(table, from_date, to_date, aggregation_interval,
+                              list(columns))
+
+  step = SEC_BY_TF[aggregation_interval]
+  span = step * SEGMENT_BUCKETS
+  from_epoch = int(from_date.timestamp()) // step * step  # bucket-aligned
+  to_epoch_ = to_date.timestamp()
+  settled = int(now().timestamp() - GRACE_SEC) // step * step
+
+  first = from_epoch - from_epoch % span
+  starts = [
+      s for s in range(first, settled - span + 1, span) if s <= to_epoch_
+  ]
+  if not starts:
+    return await rollup.fetch(table, from_date, to_date, aggregation_interval,
+                              list(columns))
+
+  try:
+    generation = int(await state.redis.get(generation_key(table)) or 0)
+  except Exception as e:  # segments possibly stale
+    log_warn(f"History cache generation read failed for {table}: {e}")
+    return await rollup.fetch(table, from_date, to_date, aggregation_interval,
+                              list(columns))
+  keys = {
+      s: segment_key(table, columns, aggregation_interval, s, generation)
+      for s in starts
+  }
+  segments: dict[int, Segment] = {}
+  for s, key in keys.items():
+    if (segment := _l1_get(key)) is not None:
+      segments[s] = segment
+
+  missing = [s for s in starts if s not in segments]
+  if missing:
+    try:
+      cached = await get_cache_batch([keys[s] for s in missing],
+                                     pickled=True,
+                                     raw_key=True)
+    except Exception as e:
+      log_warn(f"History cache read failed for {table}: {e}")
+      cached = {}
+    for s in missing:
+      if (segment := cached.get(keys[s])) is not None:
+        segments[s] = segment
+        _l1_set(keys[s], segment)
+
+  missing = [s for s in starts if s not in segments]
+  closed_end = starts[-1] + span
+  tail_task = rollup.fetch(table, datetime.fromtimestamp(closed_end, UTC),
+                           to_date, aggregation_interval, list(columns))
+  if missing:
+    fetched, (tail_cols, tail_rows) = await gather(
+        _fetch_segments(table, columns, aggregation_interval, missing, span),
+        tail_task)
+    if fetched:
+      for s, segment in fetched.items():
+        segments[s] = segment
+        _l1_set(keys[s], segment)
+      try:
+        await cache_batch({keys[s]: fetched[s]
+                           for s in fetched},
+                          expiry=TTL_SEC,
+                          pickled=True,
+                          raw_key=True)
+      except Exception as e:
+        log_warn(f"History cache write failed for {table}: {e}")
+  else:
+    tail_cols, tail_rows = await tail_task
+
+  if state.args.verbose:
+    log_debug(
+        f"History cache {table}.{aggregation_interval}: {len(starts) - len(missing)}/{len(starts)} segments hit"
+    )
+
+  # newest first: open tail, then settled segments in reverse chronological order
+  rows = _slice_rows(tail_rows or [], closed_end, to_epoch_ + 1)
+  for s in reversed(starts):
+    if s in segments:
+      rows.extend(segments[s][1])
+  rows = [r for r in rows if from_epoch <= to_epoch(r[0]) <= to_epoch_]
+
+  cols = tail_cols or next(
+      (segments[s][0] for s in starts if s in segments and segments[s][0]), [])
+  return cols, rows
+
+
+async def fetch_batch(tables: list[str],
+                      from_date: datetime,
+                      to_date: datetime,
+                      aggregation_interval: Interval = "m5",
+                      columns: list[str] = []) -> tuple[list[str], list]:
+  """Drop-in for `state.tsdb.fetch_batch`, combining tables like the adapters do"""
+  results = await gather(
+      *(fetch(table, from_date, to_date, aggregation_interval, columns)
+        for table in tables))
+  all_columns: list[str] = []
+  all_data: list = []
+  for cols, rows in results:
+    if not all_columns:
+      all_columns = cols
+    all_data.extend(rows)
+  return all_columns, all_data
@@ -1,15 +1,141 @@
+from asyncio import Task, create_task, sleep
 from datetime import timedelta
+from hashlib import sha1
+from os import environ as env
+from time import monotonic
+from typing import Optional
 import fnmatch
-from ..utils import now, fmt_date, secs_to_ceil_date, log_warn
-from ..utils.decorators import service_method, cache
+from redis.exceptions import NoScriptError
+from ..utils import now, fmt_date, log_warn, log_error
+from ..utils.decorators import SingleFlight, service_method, cache
+from ..utils.types import to_bool
 from .. import state
 from ..cache import NS as REDIS_NS
 from ..models import User
 from ..services.auth import AuthService
 
+# Sliding window counters: each window keeps one counter per fixed bucket and
+# weighs the previous bucket by its remaining overlap with the window.
+# KEYS: counter prefixes, ARGV: mode then (window ms, limit, increment, strict)
+# per key, strict windows rejecting when the increment would overflow.
+# Modes: CHECK increments only if no window is exceeded, PEEK reads, RECORD
+# counts usage already admitted locally.
+# Returns {0, index, retry ms} when a window is exceeded (nothing incremented),
+# else {1, remaining, reset ms, ...} per key.
+SLIDING_WINDOW = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local mode = ARGV[1]
+local used, cur_keys = {}, {}
+for i = 1, #KEYS do
+  local o = (i - 1) * 4 + 1
+  local win, limit = tonumber(ARGV[o + 1]), tonumber(ARGV[o + 2])
+  local inc, strict = tonumber(ARGV[o + 3]), ARGV[o + 4] == '1'
+  local start = now - now % win
+  local elapsed = now - start
+  cur_keys[i] = KEYS[i] .. ':' .. start
+  local cur = tonumber(redis.call('GET', cur_keys[i]) or '0')
+  local prev = tonumber(redis.call('GET', KEYS[i] .. ':' .. (start - win)) or '0')
+  used[i] = prev * (win - elapsed) / win + cur
+  if mode == '0' and ((strict and used[i] + inc > limit) or (not strict and used[i] >= limit)) then
+    local room = strict and limit - inc or limit - 1
+    local retry
+    if room < 0 then
+      retry = 2 * win - elapsed
+    elseif cur <= room then
+      retry = win * (1 - (room - cur) / prev) - elapsed
+    else
+      retry = win - elapsed + win * (1 - room / cur)
+    end
+    return {0, i, math.ceil(retry)}
+  end
+end
+local res = {1}
+for i = 1, #KEYS do
+  local o = (i - 1) * 4 + 1
+  local win, limit = tonumber(ARGV[o + 1]), tonumber(ARGV[o + 2])
+  local inc = mode == '1' and 0 or tonumber(ARGV[o + 3])
+  if inc > 0 then
+    redis.call('INCRBY', cur_keys[i], inc)
+    redis.call('PEXPIRE', cur_keys[i], 2 * win)
+  end
+  res[#res + 1] = math.floor(math.max(limit - used[i] - inc, 0))
+  res[#res + 1] = win - now % win
+end
+return res
+"""
+SLIDING_WINDOW_SHA = sha1(SLIDING_WINDOW.encode()).hexdigest()
+CHECK, PEEK, RECORD = 0, 1, 2
+
+# local pre-admission: each worker spends its share of the users' quotas
+# in-process and records its usage in Redis every LIMITER_SYNC_INTERVAL ms,
+# deferring to Redis past its share while the quotas are not spent globally
+LIMITER_LOCAL = to_bool(env.get("LIMITER_LOCAL", "true"))
+SYNC_INTERVAL = int(env.get("LIMITER_SYNC_INTERVAL", 250)) / 1000
+# API workers sharing the quotas, global overshoot is bounded by one sync
+# interval of traffic past each worker's share
+WORKERS = max(int(env.get("LIMITER_WORKERS", 1)), 1)
+QUOTA_IDLE = 60  # seconds before an unused local quota is dropped
+
+
+class LocalQuota:
+  """A worker's share of a user's windows, spent between Redis syncs"""
+  __slots__ = ("user", "limits", "allowance", "remaining", "pending", "resets",
+               "synced_at", "used_at")
+
+  def __init__(self, user: User, limits: dict[str, tuple[int, int]]):
+    self.user = user
+    self.limits = limits
+    self.allowance = dict.fromkeys(limits, 0.0)  # local share left
+    self.remaining = dict.fromkeys(limits, 0)  # global estimate, for headers
+    self.pending = dict.fromkeys(limits, 0)  # admitted, not yet recorded
+    self.resets = dict.fromkeys(limits, 0.0)  # monotonic bucket ends
+    self.synced_at = -SYNC_INTERVAL
+    self.used_at = monotonic()
+
+  def exceeded(self, increments: dict[str, int]) -> Optional[str]:
+    """First window the increments would exceed, with the same rules as Redis"""
+    for name in self.limits:
+      if name[0] == 'p':
+        if self.allowance[name] < increments[name]:
+          return name
+      elif self.allowance[name] <= 0:
+        return name
+    return None
+
+  def spend(self, increments: dict[str, int]) -> None:
+    for name in self.limits:
+      inc = increments[name]
+      self.allowance[name] -= inc
+      self.remaining[name] = max(self.remaining[name] - inc, 0)
+      self.pending[name] += inc
+    self.used_at = monotonic()
+
+  def take_pending(self) -> dict[str, int]:
+    pending, self.pending = self.pending, dict.fromkeys(self.limits, 0)
+    return pending
+
+  def restore_pending(self, pending: dict[str, int]) -> None:
+    for name, inc in pending.items():
+      self.pending[name] += inc
+
+  def update(self, res: list) -> None:
+    """Refresh the shares from a RECORD result, minus usage admitted since"""
+    t = monotonic()
+    for i, name in enumerate(self.limits):
+      remaining = int(res[2 * i + 1])
+      self.remaining[name] = max(remaining - self.pending[name], 0)
+      self.allowance[name] = remaining / WORKERS - self.pending[name]
+      self.resets[name] = t + int(res[2 * i + 2]) / 1000
+    self.synced_at = t
+
 
 class RateLimiter:
-  """Optimized rate limiter with Redis pipelining and config-driven logic"""
+  """Sliding window rate limiter, checked and incremented in a single EVALSHA"""
+
+  _quotas: dict[str, LocalQuota] = {}
+  _fetches = SingleFlight()  # one share fetch per user at a time
+  _sync_task: Optional[Task] = None
 
   @classmethod
   @cache(ttl=-1, maxsize=512)
@@ -47,34 +173,51 @@ class RateLimiter:
     }
 
   @classmethod
-  @service_method("check and increment rate limit")
-  async def check_and_increment(cls,
-                                user: User,
-                                path: str,
-                                response_bytes: int = 0) -> dict:
-    """
-    Atomically checks rate limits and increments counters for a user.
-    This is the core rate limiting logic, optimized for performance.
-    """
+  def _script_args(cls, user: User, limits: dict[str, tuple[int, int]],
+                   increments: dict[str, int], mode: int) -> list:
+    """EVALSHA arguments of the sliding window script over `limits`"""
+    keys = [f"{REDIS_NS}:limiter:{name}:{user.uid}" for name in limits]
+    args: list = [mode]
+    for name, (ttl, limit) in limits.items():
+      args += [ttl * 1000, limit, increments.get(name, 0), int(name[0] == 'p')]
+    return [SLIDING_WINDOW_SHA, len(keys), *keys, *args]
+
+  @classmethod
+  async def _eval_windows(cls,
+                          user: User,
+                          limits: dict[str, tuple[int, int]],
+                          increments: dict[str, int],
+                          mode: int = CHECK) -> list:
+    """Run the sliding window script over `limits`, loading it on NOSCRIPT"""
+    args = cls._script_args(user, limits, increments, mode)
+    try:
+      return await state.redis.evalsha(*args)
+    except NoScriptError:
+      await state.redis.script_load(SLIDING_WINDOW)
+      return await state.redis.evalsha(*args)
+
+  @classmethod
+  def _check_bypass(cls, user: User, path: str) -> bool:
+    """Whether `user` skips rate limiting, raising if blacklisted"""
     config = getattr(state, 'server_config', None)
     if user.uid in getattr(config, 'blacklist', []):
       log_warn(f"Blacklisted user {user.uid} attempted to access {path}")
       raise PermissionError("User is blacklisted")
+    return user.uid in getattr(config, 'whitelist',
+                               []) or user.status == "admin"
 
-    if user.uid in getattr(config, 'whitelist', []) or user.status == "admin":
-      return {"bypass": True}
-
-    points = cls.get_route_points(path)
-    user_limits = cls._get_user_limits_map(user)
-
-    active_limits = {
+  @classmethod
+  def _active_limits(cls, user: User) -> dict[str, tuple[int, int]]:
+    return {
         name: (ttl, limit)
-        for name, (ttl, limit) in user_limits.items() if limit > 0
+        for name, (ttl, limit) in cls._get_user_limits_map(user).items()
+        if limit > 0
     }
-    if not active_limits:
-      return {"bypass": True}
 
-    increments = {
+  @classmethod
+  def _increments(cls, path: str, response_bytes: int) -> dict[str, int]:
+    points = cls.get_route_points(path)
+    return {
         'rpm': 1,
         'rph': 1,
         'rpd': 1,
@@ -86,56 +229,46 @@ class RateLimiter:
         'ppd': points
     }
 
-    keys = [f"{REDIS_NS}:limiter:{name}:{user.uid}" for name in active_limits]
-
-    # Use a Lua script for an atomic check-and-increment operation
-    # to avoid race conditions and reduce network latency.
-    # For now, we use a pipeline to get current values first.
-    current_values = await state.redis.mget(keys)
-    current_counts = [int(val) if val else 0 for val in current_values]
-
-    # Check limits before incrementing
-    for i, (name, (ttl, limit)) in enumerate(active_limits.items()):
-      # For points, we check if the *next* value exceeds the limit
-      is_points = name.startswith('pp')
-      increment = increments[name]
-      current = current_counts[i]
-
-      if (is_points and current + increment > limit) or \
-         (not is_points and current >= limit):
-
-        # Find the tightest window for retry_after
-        retry_after_ttl = min(limit_data[0]
-                              for n, limit_data in active_limits.items()
-                              if n.endswith(name[1:]))
-
-        log_warn(f"Rate limit exceeded for user {user.uid} on {path} ({name})")
-        raise ValueError(
-            f"Rate limit exceeded ({name}). Try again in {retry_after_ttl} seconds."
-        )
-
-    # All checks passed, now increment all counters in a single pipeline
-    pipe = state.redis.pipeline()
-    remaining_info = []
+  @classmethod
+  @service_method("check and increment rate limit")
+  async def check_and_increment(cls,
+                                user: User,
+                                path: str,
+                                response_bytes: int = 0) -> dict:
+    """
+    Atomically checks all sliding windows and increments their counters.
 
-    for i, (name, (ttl, limit)) in enumerate(active_limits.items()):
-      key = keys[i]
-      increment = increments[name]
+    Nothing is counted when any window is exceeded: the result is then flagged
+    `limited` with the exceeded window and a `retry_after` delay in seconds.
+    """
+    if cls._check_bypass(user, path):
+      return {"bypass": True}
 
-      new_value = current_counts[i] + increment
-      remaining = max(limit - new_value, 0)
+    active_limits = cls._active_limits(user)
+    if not active_limits:
+      return {"bypass": True}
 
-      pipe.incrby(key, increment)
-      pipe.expire(key, secs_to_ceil_date(secs=ttl))
-      remaining_info.append(f"{name}={remaining}")
+    increments = cls._increments(path, response_bytes)
+    res = await cls._eval_windows(user, active_limits, increments)
+    return cls._check_result(user, path, list(active_limits), res)
 
-    await pipe.execute()
+  @classmethod
+  def _check_result(cls, user: User, path: str, names: list[str],
+                    res: list) -> dict:
+    """Admission result of a CHECK over the `names` windows"""
+    if not int(res[0]):
+      name, retry_after = names[int(res[1]) - 1], -(-int(res[2]) // 1000)
+      log_warn(f"Rate limit exceeded for user {user.uid} on {path} ({name})")
+      return {
+          "limited": True,
+          "exceeded": name,
+          "retry_after": max(retry_after, 1)
+      }
 
-    return {
-        "limited": False,
-        "remaining": ";".join(remaining_info),
-        "reset": fmt_date(now() + timedelta(seconds=60))
-    }
+    remaining = ";".join(f"{name}={int(rem)}"
+                         for name, rem in zip(names, res[1::2]))
+    reset = now() + timedelta(milliseconds=int(min(res[2::2])))
+    return {"limited": False, "remaining": remaining, "reset": fmt_date(reset)}
 
   @classmethod
   @service_method("get user limits")
@@ -147,39 +280,143 @@ class RateLimiter:
       log_warn(f"Attempted to get limits for non-existent user: {user_id}")
       raise ValueError(f"User {user_id} not found")
 
-    user_limits_map = cls._get_user_limits_map(user)
-    active_limits = {
-        n: (t, limit_val)
-        for n, (t, limit_val) in user_limits_map.items() if limit_val > 0
-    }
-
+    active_limits = cls._active_limits(user)
     if not active_limits:
       return {}
 
-    keys = [f"{REDIS_NS}:limiter:{name}:{user.uid}" for name in active_limits]
-
-    async with state.redis.pipeline(transaction=False) as pipe:
-      for key in keys:
-        pipe.get(key)
-        pipe.ttl(key)
-      results = await pipe.execute()
-
-    limits_data = {}
+    res = await cls._eval_windows(user, active_limits, {}, PEEK)
     current_time = now()
-
-    current_values = [int(v) if v else 0 for v in results[::2]]
-    ttls = [int(t) if t is not None and t > 0 else 0 for t in results[1::2]]
+    limits_data = {}
 
     for i, (name, (ttl_seconds, max_val)) in enumerate(active_limits.items()):
-      current = current_values[i]
-      ttl = ttls[i] or ttl_seconds
-      reset_time = current_time + timedelta(seconds=ttl)
-
+      reset_time = current_time + timedelta(milliseconds=int(res[2 * i + 2]))
       limits_data[name] = {
           "cap": max_val,
-          "remaining": max(max_val - current, 0),
+          "remaining": int(res[2 * i + 1]),
           "ttl": ttl_seconds,
           "reset": fmt_date(reset_time)
       }
 
     return limits_data
+
+  @classmethod
+  @service_method("admit request")
+  async def admit(cls, user: User, path: str, response_bytes: int = 0) -> dict:
+    """
+    Counts a request against the worker's local share of the user's quotas.
+
+    Redis is only hit to fetch a share (first request, or a local denial
+    once the share is SYNC_INTERVAL old), usage being recorded in batches by
+    the sync task. Requests past the share are checked in Redis while the
+    window has quota left globally, so that only spent global quotas are
+    denied. Same results as `check_and_increment`, which it defers to when
+    LIMITER_LOCAL is disabled.
+    """
+    if not LIMITER_LOCAL:
+      return await cls.check_and_increment(user, path, response_bytes)
+    if cls._check_bypass(user, path):
+      return {"bypass": True}
+
+    active_limits = cls._active_limits(user)
+    if not active_limits:
+      return {"bypass": True}
+
+    increments = cls._increments(path, response_bytes)
+    quota = cls._quotas.get(user.uid)
+    if quota is None or quota.limits != active_limits:
+      quota = cls._quotas[user.uid] = LocalQuota(user, active_limits)
+
+    name = quota.exceeded(increments)
+    if name and monotonic() - quota.synced_at >= SYNC_INTERVAL:
+      # share spent (or none yet): record usage and fetch a fresh one
+      await cls._fetches.do(user.uid, lambda: cls._sync([quota]))
+      name = quota.exceeded(increments)
+    if name and quota.remaining[name] > 0:
+      # other workers' shares left: admitted only if Redis confirms it
+      res = await cls._eval_windows(user, active_limits, increments)
+      if int(res[0]):
+        quota.update(res)
+      else:  # denied locally until the next sync
+        quota.remaining[list(active_limits)[int(res[1]) - 1]] = 0
+      return cls._check_result(user, path, list(active_limits), res)
+    if name:
+      log_warn(f"Rate limit exceeded for user {user.uid} on {path} ({name})")
+      return {
+          "limited": True,
+          "exceeded": name,
+          "retry_after": max(int(quota.resets[name] - monotonic()) + 1, 1)
+      }
+
+    quota.spend(increments)
+    cls.start_sync()
+    remaining = ";".join(f"{name}={rem}"
+                         for name, rem in quota.remaining.items())
+    reset = now() + timedelta(seconds=min(quota.resets.values()) - monotonic())
+    return {"limited": False, "remaining": remaining, "reset": fmt_date(reset)}
+
+  @classmethod
+  async def _sync(cls, quotas: list[LocalQuota]) -> None:
+    """Record the quotas' pending usage in one pipeline and refresh shares"""
+    pending = [q.take_pending() for q in quotas]
+    try:
+      try:
+        results = await cls._record(quotas, pending)
+      except NoScriptError:
+        await state.redis.script_load(SLIDING_WINDOW)
+        results = await cls._record(quotas, pending)
+    except Exception:
+      for q, p in zip(quotas, pending):
+        q.restore_pending(p)
+      raise
+    for q, p, res in zip(quotas, pending, results):
+      if isinstance(res, Exception):
+        q.restore_pending(p)
+        log_error(f"Failed to sync rate limits of {q.user.uid}: {res}")
+      else:
+        q.update(res)
+
+  @classmethod
+  async def _record(cls, quotas: list[LocalQuota],
+                    pending: list[dict[str, int]]) -> list:
+    async with state.redis.pipeline(transaction=False) as pipe:
+      for q, p in zip(quotas, pending):
+        pipe.evalsha(*cls._script_args(q.user, q.limits, p, RECORD))
+      results = await pipe.execute(raise_on_error=False)
+    for res in results:
+      if isinstance(res, NoScriptError):
+        raise res  # nothing was recorded
+    return results
+
+  @classmethod
+  async def _sync_loop(cls) -> None:
+    while True:
+      await sleep(SYNC_INTERVAL)
+      t = monotonic()
+      due = []
+      for uid, quota in list(cls._quotas.items()):
+        if any(quota.pending.values()):
+          due.append(quota)
+        elif t - quota.used_at > QUOTA_IDLE:
+          del cls._quotas[uid]
+      if due:
+        try:
+          await cls._sync(due)
+        except Exception as e:
+          log_error(f"Failed to sync rate limits: {e}")
+
+  @classmethod
+  def start_sync(cls) -> None:
+    """Start recording local usage in Redis, if not running"""
+    if cls._sync_task is None or cls._sync_task.done():
+      cls._sync_task = create_task(cls._sync_loop())
+
+  @classmethod
+  async def stop_sync(cls) -> None:
+    """Record pending usage and stop the sync task"""
+    if cls._sync_task is not None:
+      cls._sync_task.cancel()
+      cls._sync_task = None
+    due = [q for q in cls._quotas.values() if any(q.pending.values())]
+    if due:
+      await cls._sync(due)
+    cls._quotas.clear()
@@ -1,19 +1,31 @@
 import orjson
 import math
+import numpy as np
 import polars as pl
-from datetime import datetime
+import pyarrow.ipc as pa_ipc
+from datetime import datetime, timedelta, timezone
 from asyncio import gather, get_running_loop
 from io import BytesIO
-from typing import Any, cast, Optional, Union
+from os import environ as env
+from typing import Any, AsyncIterator, cast, Optional, Union
 from concurrent.futures import Executor
 from fastapi import HTTPException
 
 from ..server.responses import ORJSON_OPTIONS
-from ..cache import get_cache_batch, get_cache, get_resource_status
-from ..utils import round_sigfig, split, Interval, numeric_columns, log_debug, log_warn, log_error
+from ..cache import get_cache_batch, get_cache, get_cache_fields, get_resource_status
+from ..utils import round_sigfig, split, now, Interval, numeric_columns, log_debug, log_warn, log_error
+from ..utils.date import SEC_BY_TF, floor_date
 from .. import state
 from ..models import SCOPES, UNALIASED_FORMATS, FillMode, Scope, DataFormat
-from ..utils.decorators import service_method, cache as _cache
+from ..utils.decorators import service_method, single_flight, cache as _cache
+from ..actions.load import iter_pages
+from . import history_cache
+
+UTC = timezone.utc
+
+# buckets fetched and serialized per streamed /history chunk
+STREAM_CHUNK_BUCKETS = int(env.get("HISTORY_STREAM_CHUNK", 2048))
+STREAM_FORMATS = ("ndjson", "csv", "tsv", "psv", "arrow")
 
 
 @_cache(ttl=300, maxsize=1)
@@ -286,6 +298,47 @@ def _is_empty(data: Any) -> bool:
     return data in [None, "", [], {}, ()]
 
 
+def _ts_to_ms(df: pl.DataFrame) -> pl.DataFrame:
+  """Convert the ts column to milliseconds since epoch (JS Date compatible)"""
+  if 'ts' not in df.columns:
+    return df
+  return df.with_columns([(pl.col('ts').cast(
+      pl.Datetime).dt.timestamp(time_unit="ms")).cast(pl.Int64).alias('ts')])
+
+
+def _json_table(df: pl.DataFrame, orient: str = "row") -> bytes:
+  """Serialize a frame as {columns, types, data} straight from its column buffers.
+
+  Byte-compatible with dumping `df.to_numpy().tolist()` (or its transpose):
+  numeric frames keep the same upcast common dtype but are handed to orjson as
+  a contiguous ndarray, others (or nullable booleans, converted to objects) are
+  assembled per column instead of through a 2D object array.
+  """
+  data: Any = None
+  if all(t.is_numeric() or t == pl.Boolean for t in df.dtypes):
+    arr = df.to_numpy()
+    if arr.dtype.kind == "f" and arr.dtype.itemsize < 8:
+      arr = arr.astype(np.float64)  # tolist() widens to python floats
+    if arr.dtype != object:  # unsupported by orjson
+      data = np.ascontiguousarray(arr if orient == "row" else arr.T)
+  if data is None:
+    cols = [s.to_numpy() for s in df.iter_columns()]
+    if orient == "row":
+      data = list(zip(*(c.tolist() for c in cols)))
+    else:
+      data = [
+          c.astype(np.float64) if c.dtype.kind == "f" and c.dtype.itemsize < 8
+          else c if c.dtype.kind in "biuf" else c.tolist() for c in cols
+      ]
+  return orjson.dumps(
+      {
+          'columns': df.columns,
+          'types': [str(t).lower() for t in df.dtypes],
+          'data': data
+      },
+      option=ORJSON_OPTIONS)
+
+
 def format_table(data,
                  from_format: DataFormat = "py:row",
                  to_format: DataFormat = "py:column",
@@ -359,10 +412,7 @@ def format_table(data,
 
   # Convert timestamps to milliseconds since epoch for (JS Date compatible)
   if to_fmt and not to_fmt.startswith(("py:", "polars", "np:", "pd:")):
-    if 'ts' in df.columns:
-      df = df.with_columns([(pl.col('ts').cast(
-          pl.Datetime).dt.timestamp(time_unit="ms")).cast(pl.Int64).alias('ts')
-                            ])
+    df = _ts_to_ms(df)
 
   # Export from Polars DataFrame
   match to_fmt:
@@ -379,21 +429,11 @@ def format_table(data,
     # case "json:row:labelled": data = orjson.dumps(df.to_dicts(), option=ORJSON_OPTIONS)
     # case "json:column:labelled": data = orjson.dumps({col: df[col].to_list() for col in df.columns}, option=ORJSON_OPTIONS)
     case "json:row":
-      data = orjson.dumps(
-          {
-              'columns': df.columns,
-              'types': [str(t).lower() for t in df.dtypes],
-              'data': df.to_numpy().tolist()
-          },
-          option=ORJSON_OPTIONS)
+      data = _json_table(df, "row")
     case "json:column":
-      data = orjson.dumps(
-          {
-              'columns': df.columns,
-              'types': [str(t).lower() for t in df.dtypes],
-              'data': df.to_numpy().T.tolist()
-          },
-          option=ORJSON_OPTIONS)
+      data = _json_table(df, "column")
+    case "ndjson":
+      data = df.write_ndjson()
     case "csv":
       data = df.write_csv(separator=',',
                           include_header=True,
@@ -438,10 +478,15 @@ def format_table(data,
 @service_method("get last values")
 async def get_last_values(resources: list[str],
                           quote: Optional[str] = None,
-                          precision: int = 6) -> dict:
-  """Get latest values for resources with optional quote conversion"""
-  res = await get_cache_batch(resources, pickled=True) if len(resources) > 1 else \
-        {resources[0]: await get_cache(resources[0], pickled=True)}
+                          precision: int = 6,
+                          fields: Optional[list[str]] = None) -> dict:
+  """Get latest values for resources with optional quote conversion and field selection"""
+  if fields:  # field-level reads, only the selected fields are transferred
+    selected = await get_cache_fields({r: fields for r in resources})
+    res: dict[str, Any] = {r: selected.get(r) for r in resources}
+  else:
+    res = await get_cache_batch(resources, pickled=True) if len(resources) > 1 else \
+          {resources[0]: await get_cache(resources[0], pickled=True)}
 
   missing_resources = [
       resource for resource, value in res.items() if value is None
@@ -488,7 +533,120 @@ async def get_last_values(resources: list[str],
   return res
 
 
+def _process_row(row):
+  """Normalize a database row, None if it has no timestamp"""
+  if isinstance(row, (list, tuple)):
+    return row if row[0] is not None else None
+  elif hasattr(row, '__iter__') and not isinstance(row, (str, bytes)):
+    try:
+      row_list = list(row)
+      return tuple(row_list) if row_list and row_list[0] is not None else None
+    except Exception:
+      return None
+  else:
+    return (row, ) if row is not None else None
+
+
+def _history_frame(columns: list[str], data: list,
+                   fill_mode: FillMode) -> tuple[pl.DataFrame, list[str]]:
+  """Build the history frame from raw rows and fill its numeric columns"""
+  # Filter out rows where ts is null before creating DataFrame
+  filtered_data = [
+      processed_row for row in data
+      if (processed_row := _process_row(row)) is not None
+  ]
+
+  # Explicitly specify orientation and ensure datetime conversion
+  df = pl.DataFrame(filtered_data, schema=columns, orient="row")
+
+  # Get numeric columns for interpolation
+  numeric_cols = numeric_columns(df)
+
+  # Interpolate numeric columns based on fill mode
+  if numeric_cols and fill_mode and fill_mode != "none":
+    df = df.with_columns([
+        getattr(pl.col(col).cast(pl.Float64), fill_mode)().alias(
+            col)  # fails if fill_mode is not a valid Polars method
+        for col in numeric_cols
+    ])
+  return df, numeric_cols
+
+
+async def _quote_frame(df: pl.DataFrame, numeric_cols: list[str], quote: str,
+                       from_date: datetime, to_date: datetime,
+                       interval: Interval, precision: int) -> pl.DataFrame:
+  """Denominate the numeric columns of a history frame in `quote`"""
+  quote_resource, quote_field = quote.split('.', 1)
+  quote_columns, quote_data = await history_cache.fetch(
+      table=quote_resource,
+      from_date=from_date,
+      to_date=to_date,
+      aggregation_interval=interval,
+      columns=['ts', quote_field])
+
+  if not quote_data:
+    log_warn(f"No quote data found for {quote_resource}")
+    raise ValueError("No quote data found")
+
+  filtered_quote_data = [
+      processed_row for row in quote_data
+      if (processed_row := _process_row(row)) is not None
+  ]
+
+  quote_col_id = f'{quote_resource}.{quote_field}'
+  # Create quote DataFrame with prefixed column names
+  quote_df = pl.DataFrame(
+      filtered_quote_data,
+      schema=['ts', quote_col_id],  # Prefix the quote field column
+      orient="row")
+
+  # Interpolate quote values with prefixed name
+  quote_df = quote_df.with_columns([
+      pl.col(quote_col_id).cast(pl.Float64).interpolate().alias(quote_col_id)
+  ])
+
+  # Join the dataframes on timestamp and perform multiplication using prefixed quote column
+  return df.join(quote_df, on="ts", how="left").with_columns([
+      (pl.col(col) / pl.col(quote_col_id)).round(precision).alias(
+          col)  # double inversion to denominate in quote
+      for col in numeric_cols
+  ]).drop(quote_col_id)
+
+
+def _truncate_leading_zeros(df: pl.DataFrame,
+                            numeric_cols: list[str],
+                            keep_empty: bool = True) -> pl.DataFrame:
+  """Drop the rows preceding the first one with a non-null, non-zero numeric value"""
+  non_ts_numeric_cols = [col for col in numeric_cols if col != 'ts']
+  if not non_ts_numeric_cols:
+    return df
+  non_empty_mask = df.select([
+      pl.any_horizontal([(pl.col(col).is_not_null() & (pl.col(col) != 0))
+                         for col in non_ts_numeric_cols]).alias("mask")
+  ])
+  if not keep_empty and df.filter(non_empty_mask["mask"]).height == 0:
+    return df.clear()
+  first_valid_idx = df.filter(non_empty_mask["mask"]).with_row_index().select(
+      "index").row(0)[0] if df.filter(non_empty_mask["mask"]).height > 0 else 0
+  return df.slice(first_valid_idx)
+
+
+def _history_key(resources: list[str],
+                 fields: list[str],
+                 from_date: datetime,
+                 to_date: datetime,
+                 interval: Interval,
+                 *args,
+                 **kwargs) -> tuple:
+  """Flight key of a history query, its dates floored to its interval so that
+  the queries of a bucket (eg. up to `now()`) share one"""
+  return (tuple(resources), tuple(fields or ()),
+          floor_date(from_date, interval), floor_date(to_date, interval),
+          interval, args, tuple(sorted(kwargs.items())))
+
+
 @service_method("get historical data")
+@single_flight(_history_key)  # concurrent queries of a bucket share a round
 async def get_history(resources: list[str],
                       fields: list[str],
                       from_date: datetime,
@@ -501,8 +659,8 @@ async def get_history(resources: list[str],
                       truncate_leading_zeros: bool = True) -> Any:
   """Get historical data for resources with optional quote conversion"""
 
-  # Fetch base data
-  base_columns, base_data = await state.tsdb.fetch_batch(
+  # Fetch base data (settled buckets are served from the history cache)
+  base_columns, base_data = await history_cache.fetch_batch(
       tables=resources,
       from_date=from_date,
       to_date=to_date,
@@ -515,93 +673,189 @@ async def get_history(resources: list[str],
     )
     raise HTTPException(status_code=404, detail="No data found")
 
-  def _process_row(row):
-    """Helper to normalize database row format"""
-    if isinstance(row, (list, tuple)):
-      return row if row[0] is not None else None
-    elif hasattr(row, '__iter__') and not isinstance(row, (str, bytes)):
-      try:
-        row_list = list(row)
-        return tuple(
-            row_list) if row_list and row_list[0] is not None else None
-      except Exception:
-        return None
-    else:
-      return (row, ) if row is not None else None
-
-  # Filter out rows where ts is null before creating DataFrame
-  filtered_base_data = [
-      processed_row for row in base_data
-      if (processed_row := _process_row(row)) is not None
-  ]
-
-  # Explicitly specify orientation and ensure datetime conversion
-  df = pl.DataFrame(filtered_base_data, schema=base_columns, orient="row")
-
-  # Get numeric columns for interpolation
-  numeric_cols = numeric_columns(df)
-
-  # Interpolate numeric columns based on fill mode
-  if numeric_cols:
-    if fill_mode and fill_mode != "none":
-      df = df.with_columns([
-          getattr(pl.col(col).cast(pl.Float64), fill_mode)().alias(
-              col)  # fails if fill_mode is not a valid Polars method
-          for col in numeric_cols
-      ])
+  df, numeric_cols = _history_frame(base_columns, base_data, fill_mode)
 
   # Handle quote conversion if needed
   if quote and quote != "USDC.idx":
-    quote_resource, quote_field = quote.split('.', 1)
-    quote_columns, quote_data = await state.tsdb.fetch(
-        table=quote_resource,
-        from_date=from_date,
-        to_date=to_date,
-        aggregation_interval=interval,
-        columns=['ts', quote_field])
-
-    if not quote_data:
-      log_warn(f"No quote data found for {quote_resource}")
-      raise ValueError("No quote data found")
-
-    filtered_quote_data = [
-        processed_row for row in quote_data
-        if (processed_row := _process_row(row)) is not None
-    ]
-
-    quote_col_id = f'{quote_resource}.{quote_field}'
-    # Create quote DataFrame with prefixed column names
-    quote_df = pl.DataFrame(
-        filtered_quote_data,
-        schema=['ts', quote_col_id],  # Prefix the quote field column
-        orient="row")
-
-    # Interpolate quote values with prefixed name
-    quote_df = quote_df.with_columns([
-        pl.col(quote_col_id).cast(pl.Float64).interpolate().alias(quote_col_id)
-    ])
-
-    # Join the dataframes on timestamp and perform multiplication using prefixed quote column
-    df = df.join(quote_df, on="ts", how="left").with_columns([
-        (pl.col(col) / pl.col(quote_col_id)).round(precision).alias(
-            col)  # double inversion to denominate in quote
-        for col in numeric_cols
-    ]).drop(quote_col_id)
+    df = await _quote_frame(df, numeric_cols, quote, from_date, to_date,
+                            interval, precision)
 
   # Filter out rows where all non-timestamp numeric columns are null/zero
   if numeric_cols and truncate_leading_zeros:
-    non_ts_numeric_cols = [col for col in numeric_cols if col != 'ts']
-    if non_ts_numeric_cols:
-      non_empty_mask = df.select([
-          pl.any_horizontal([(pl.col(col).is_not_null() & (pl.col(col) != 0))
-                             for col in non_ts_numeric_cols]).alias("mask")
-      ])
-      first_valid_idx = df.filter(
-          non_empty_mask["mask"]).with_row_index().select("index").row(
-              0)[0] if df.filter(non_empty_mask["mask"]).height > 0 else 0
-      df = df.slice(first_valid_idx)
+    df = _truncate_leading_zeros(df, numeric_cols)
 
   return format_table(df,
                       from_format="polars",
                       to_format=format,
                       columns=base_columns)
+
+
+class StreamEncoder:
+  """Serializes successive frames of one table as a single NDJSON, CSV or Arrow IPC stream"""
+
+  SEPARATORS = {"csv": ",", "tsv": "\t", "psv": "|"}
+
+  def __init__(self, format: DataFormat):
+    self.format = UNALIASED_FORMATS.get(format, format)
+    if self.format not in STREAM_FORMATS:
+      raise ValueError(f"Unsupported stream format: {format}")
+    self.header = True
+    self.sink: Optional[BytesIO] = None
+    self.writer: Any = None
+    self.schema: Any = None
+
+  def encode(self, df: pl.DataFrame) -> bytes:
+    df = _ts_to_ms(df)
+    match self.format:
+      case "ndjson":
+        return df.write_ndjson().encode()
+      case "csv" | "tsv" | "psv":
+        data = df.write_csv(separator=self.SEPARATORS[self.format],
+                            include_header=self.header,
+                            line_terminator='\n',
+                            float_precision=9)
+        self.header = False
+        return data.encode()
+      case _:  # arrow
+        table = df.to_arrow()
+        if self.writer is None:
+          self.sink, self.schema = BytesIO(), table.schema
+          self.writer = pa_ipc.new_stream(self.sink, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+        return self._drain()
+
+  def close(self) -> bytes:
+    """Stream trailer (Arrow end-of-stream marker)"""
+    if self.writer is None:
+      return b""
+    self.writer.close()
+    return self._drain()
+
+  def _drain(self) -> bytes:
+    assert self.sink is not None
+    data = self.sink.getvalue()
+    self.sink.seek(0)
+    self.sink.truncate()
+    return data
+
+
+async def stream_history(resources: list[str],
+                         fields: list[str],
+                         from_date: datetime,
+                         to_date: datetime,
+                         interval: Interval,
+                         quote: Optional[str] = None,
+                         precision: int = 6,
+                         format: DataFormat = "ndjson",
+                         fill_mode: FillMode = "forward_fill",
+                         truncate_leading_zeros: bool = True,
+                         chunk_buckets: int = 0) -> AsyncIterator[bytes]:
+  """Stream historical data in bounded chunks of `chunk_buckets` buckets.
+
+  Chunks are fetched newest first like `get_history` rows. Forward fill carries
+  over chunk boundaries, other fill modes and quote interpolation are per chunk.
+
+  Raises:
+    HTTPException: 404 if no data is found in the whole range
+  """
+  encoder = StreamEncoder(format)
+  step = SEC_BY_TF.get(interval) or 300
+  span = step * (chunk_buckets or STREAM_CHUNK_BUCKETS)
+  lo = int(from_date.timestamp())
+  hi = to_date.timestamp()
+  carry: Optional[pl.DataFrame] = None
+  truncating = truncate_leading_zeros
+  found = False
+
+  # chunk boundaries are bucket-aligned so that no bucket is split
+  end = hi
+  start = max(lo, int(hi - span) // step * step)
+  while end >= lo:
+    chunk_from = datetime.fromtimestamp(start, UTC)
+    chunk_to = datetime.fromtimestamp(end, UTC)
+    columns, data = await history_cache.fetch_batch(
+        tables=resources,
+        from_date=chunk_from,
+        to_date=chunk_to,
+        aggregation_interval=interval,
+        columns=fields or [])
+    end, start = start - 1e-6, max(lo, start - span)
+    if not data:
+      continue
+
+    if carry is not None and fill_mode == "forward_fill":
+      df, numeric_cols = _history_frame(columns, [carry.row(0)] + data,
+                                        fill_mode)
+      df = df.slice(1)
+    else:
+      df, numeric_cols = _history_frame(columns, data, fill_mode)
+    if df.is_empty():
+      continue
+    carry = df.tail(1)
+
+    if quote and quote != "USDC.idx":
+      df = await _quote_frame(df, numeric_cols, quote, chunk_from, chunk_to,
+                              interval, precision)
+    if numeric_cols and truncating:
+      df = _truncate_leading_zeros(df, numeric_cols, keep_empty=False)
+      if df.is_empty():
+        continue
+      truncating = False
+
+    found = True
+    yield encoder.encode(df)
+
+  if not found:
+    log_warn(
+        f"No data found for resources {resources} from {from_date} to {to_date}"
+    )
+    raise HTTPException(status_code=404, detail="No data found")
+  if trailer := encoder.close():
+    yield trailer
+
+
+async def _windowed_pages(
+    resource: str,
+    window_days: int = 30) -> AsyncIterator[tuple[list[str], list]]:
+  """Pages of a resource in bounded time windows, for adapters without keyset pagination"""
+  first = datetime(2020, 1, 1, tzinfo=UTC)  # same range as load_resource
+  span = timedelta(days=window_days)
+  end = now()
+  while end >= first:
+    start = max(first, end - span)
+    columns, data = await state.tsdb.fetch(resource, start, end, "h1", [])
+    end = start - timedelta(microseconds=1)
+    if data:
+      yield columns, data
+
+
+async def stream_records(resources: list[str],
+                         format: DataFormat = "ndjson",
+                         page_size: int = 1000) -> AsyncIterator[bytes]:
+  """Stream all records of resources page by page, newest first.
+
+  Multi-resource streams tag each record with its resource and are NDJSON only,
+  since the resources' schemas differ.
+  """
+  encoder = StreamEncoder(format)
+  if len(resources) > 1 and encoder.format != "ndjson":
+    raise ValueError("Multi-resource streams only support ndjson")
+  for resource in resources:
+    pages = iter_pages(resource, page_size)
+    try:
+      page = await anext(pages, None)
+    except NotImplementedError:
+      pages = _windowed_pages(resource)
+      page = await anext(pages, None)
+    while page is not None:
+      columns, data = page
+      df = pl.DataFrame([tuple(row) for row in data],
+                        schema=columns,
+                        orient="row",
+                        strict=False)
+      if len(resources) > 1:
+        df = df.select(pl.lit(resource).alias("resource"), pl.all())
+      yield encoder.encode(df)
+      page = await anext(pages, None)
+  if trailer := encoder.close():
+    yield trailer
@@ -40,7 +40,7 @@ async def init(_args: Any):
   thread_pool = ThreadPoolProxy()
   tsdb = TsdbProxy()
   redis = RedisProxy()
-  web3 = Web3Proxy()  # Uses rotate_always=True by default
+  web3 = Web3Proxy()  # RPC pools, warmed on first use
 
   from .models import Instance
 
@@ -115,6 +115,9 @@ __all__ = [  # noqa: F405
     "run_async_in_thread",
     "submit_to_threadpool",
     "select_nested",
+    "parse_selector",
+    "compile_selectors",
+    "SelectorPlan",
     "merge_replace_empty",
     "DictMixin",
     "cache",
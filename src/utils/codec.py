@@ -0,0 +1,242 @@
+"""
+Versioned binary codec for cache and pubsub payloads.
+
+Every payload starts with a 4 bytes header: magic, format version, codec id
+and flags. Values are encoded with orjson (default) or msgpack, both restoring
+datetimes, dates, times, tuples and non-finite floats on decode (NumPy values
+come back as python scalars and lists). Values neither can represent, such as
+arbitrary objects, fall back to pickle. Headerless payloads are legacy pickles,
+readable while CACHE_PICKLE is enabled.
+"""
+
+import pickle
+from datetime import date, datetime, time
+from os import environ as env
+from typing import Any, Callable, Union
+
+import numpy as np
+import orjson
+
+from .deps import safe_import
+from .format import log_warn
+from .types import to_bool
+
+msgpack = safe_import("msgpack")
+
+MAGIC = 0xC1  # never starts a pickle (0x80) nor a JSON document, unused by msgpack
+VERSION = 1
+ORJSON, MSGPACK, PICKLE = 1, 2, 3
+CODECS = {"orjson": ORJSON, "msgpack": MSGPACK, "pickle": PICKLE}
+TAGGED = 0x01  # flag: the payload holds tagged values to restore on decode
+
+# allows pickle for values other codecs cannot represent and for legacy payloads
+PICKLE_ENABLED = to_bool(env.get("CACHE_PICKLE", "true"))
+CODEC = env.get("CACHE_CODEC", "orjson").lower()
+if CODEC not in CODECS or (CODEC == "msgpack" and not msgpack):
+  log_warn(f"Cache codec {CODEC} unavailable, falling back to orjson")
+  CODEC = "orjson"
+
+# orjson tags, single-key objects
+DATETIME, DATE, TIME, TUPLE, FLOAT = "$dt", "$d", "$t", "$tu", "$f"
+TAGS = {DATETIME, DATE, TIME, TUPLE, FLOAT}
+
+# msgpack extension types
+EXT_DATETIME, EXT_DATE, EXT_TIME, EXT_TUPLE = 1, 2, 3, 4
+
+
+def _header(codec: int, flags: int = 0) -> bytes:
+  return bytes((MAGIC, VERSION, codec, flags))
+
+
+def _plain(value: Any) -> bool:
+  """Whether orjson round-trips `value` as is, temporal values aside"""
+  t = type(value)
+  if t is float:
+    return value - value == 0  # not NaN/inf, which orjson writes as null
+  if t is str or t is int or t is bool or value is None:
+    return True
+  if t is dict:
+    if len(value) == 1 and next(iter(value)) in TAGS:
+      return False
+    for k, v in value.items():
+      if type(k) is not str or not _plain(v):
+        return False
+    return True
+  if t is list:
+    for v in value:
+      if not _plain(v):
+        return False
+    return True
+  return t is datetime or t is date or t is time
+
+
+def _pack(value: Any) -> Any:
+  """Tag the values orjson would lose, raising TypeError on unsupported ones"""
+  t = type(value)
+  if t is float:
+    return value if value - value == 0 else {FLOAT: repr(value)}
+  if t is str or t is int or t is bool or value is None:
+    return value
+  if t is dict:
+    if len(value) == 1 and next(iter(value)) in TAGS:
+      raise TypeError("dict clashing with a codec tag")
+    packed = {}
+    for k, v in value.items():
+      if type(k) is not str:
+        raise TypeError(f"non-str key {k!r}")
+      packed[k] = _pack(v)
+    return packed
+  if t is list:
+    return [_pack(v) for v in value]
+  if t is tuple:
+    return {TUPLE: [_pack(v) for v in value]}
+  if isinstance(value, (datetime, date, time)):
+    return value  # tagged by _orjson_default
+  if isinstance(value, (np.generic, np.ndarray)):
+    return _pack(value.tolist())
+  raise TypeError(f"unsupported type {t.__name__}")
+
+
+def _orjson_default(tagged: list[bool]) -> Callable[[Any], Any]:
+
+  def default(obj: Any) -> Any:
+    tagged[0] = True
+    if isinstance(obj, datetime):
+      return {DATETIME: obj.isoformat()}
+    if isinstance(obj, date):
+      return {DATE: obj.isoformat()}
+    if isinstance(obj, time):
+      return {TIME: obj.isoformat()}
+    raise TypeError(f"unsupported type {type(obj).__name__}")
+
+  return default
+
+
+def _restore(value: Any) -> Any:
+  """Rebuild tagged values in place"""
+  t = type(value)
+  if t is dict:
+    if len(value) == 1:
+      tag, v = next(iter(value.items()))
+      if tag == DATETIME:
+        return datetime.fromisoformat(v)
+      if tag == DATE:
+        return date.fromisoformat(v)
+      if tag == TIME:
+        return time.fromisoformat(v)
+      if tag == TUPLE:
+        return tuple(_restore(x) for x in v)
+      if tag == FLOAT:
+        return float(v)
+    for k, v in value.items():
+      if type(v) is dict or type(v) is list:
+        value[k] = _restore(v)
+  elif t is list:
+    for i, v in enumerate(value):
+      if type(v) is dict or type(v) is list:
+        value[i] = _restore(v)
+  return value
+
+
+def _encode_orjson(value: Any) -> bytes:
+  tagged = [False]
+  if _plain(value):
+    data = orjson.dumps(value,
+                        default=_orjson_default(tagged),
+                        option=orjson.OPT_PASSTHROUGH_DATETIME)
+  else:
+    data = orjson.dumps(_pack(value),
+                        default=_orjson_default(tagged),
+                        option=orjson.OPT_PASSTHROUGH_DATETIME)
+    tagged[0] = True
+  return _header(ORJSON, TAGGED if tagged[0] else 0) + data
+
+
+def _msgpack_default(obj: Any) -> Any:
+  if isinstance(obj, datetime):
+    return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+  if isinstance(obj, date):
+    return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+  if isinstance(obj, time):
+    return msgpack.ExtType(EXT_TIME, obj.isoformat().encode())
+  if isinstance(obj, tuple):
+    return msgpack.ExtType(EXT_TUPLE, _msgpack_pack(list(obj)))
+  if isinstance(obj, (np.generic, np.ndarray)):
+    return obj.tolist()
+  raise TypeError(f"unsupported type {type(obj).__name__}")
+
+
+def _msgpack_pack(value: Any) -> bytes:
+  # strict_types routes tuples and subclasses (datetime...) to the default hook
+  return msgpack.packb(value,
+                       default=_msgpack_default,
+                       use_bin_type=True,
+                       strict_types=True)
+
+
+def _msgpack_ext(code: int, data: bytes) -> Any:
+  if code == EXT_DATETIME:
+    return datetime.fromisoformat(data.decode())
+  if code == EXT_DATE:
+    return date.fromisoformat(data.decode())
+  if code == EXT_TIME:
+    return time.fromisoformat(data.decode())
+  if code == EXT_TUPLE:
+    return tuple(_msgpack_unpack(data))
+  return msgpack.ExtType(code, data)
+
+
+def _msgpack_unpack(data: Union[bytes, memoryview]) -> Any:
+  return msgpack.unpackb(data,
+                         raw=False,
+                         ext_hook=_msgpack_ext,
+                         strict_map_key=False)
+
+
+def encode(value: Any, codec: str = "") -> bytes:
+  """Serialize `value` into a versioned payload.
+
+  Args:
+    value: Value to serialize
+    codec: orjson, msgpack or pickle, CACHE_CODEC if empty
+
+  Returns:
+    Header-prefixed payload
+  """
+  codec = codec or CODEC
+  try:
+    if codec == "orjson":
+      return _encode_orjson(value)
+    if codec == "msgpack":
+      return _header(MSGPACK) + _msgpack_pack(value)
+  except (TypeError, orjson.JSONEncodeError, OverflowError, ValueError):
+    if not PICKLE_ENABLED:
+      raise TypeError(
+          f"{type(value).__name__} value not supported by the {codec} codec")
+  if not PICKLE_ENABLED:
+    raise TypeError("pickle codec disabled (CACHE_PICKLE=false)")
+  return _header(PICKLE) + pickle.dumps(value,
+                                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode(data: bytes) -> Any:
+  """Deserialize a payload written by `encode` (or a legacy pickle)"""
+  if not data or data[0] != MAGIC:
+    if not PICKLE_ENABLED:
+      raise ValueError("legacy pickle payload (CACHE_PICKLE=false)")
+    return pickle.loads(data)
+  if len(data) < 4 or data[1] > VERSION:
+    raise ValueError(f"unsupported payload version {data[1:2]!r}")
+  codec, flags, body = data[2], data[3], memoryview(data)[4:]
+  if codec == ORJSON:
+    value = orjson.loads(body)
+    return _restore(value) if flags & TAGGED else value
+  if codec == MSGPACK:
+    if not msgpack:
+      raise ValueError("msgpack payload but msgpack is not installed")
+    return _msgpack_unpack(body)
+  if codec == PICKLE:
+    if not PICKLE_ENABLED:
+      raise ValueError("pickle payload (CACHE_PICKLE=false)")
+    return pickle.loads(body)
+  raise ValueError(f"unknown payload codec {codec}")
@@ -4,19 +4,25 @@ Leverages FastAPI's native exception handling instead of custom HTTP wrappers.
 """
 
 from functools import wraps
-from typing import Any, Callable, Optional, OrderedDict as TOrderedDict, Union
+from typing import Any, Awaitable, Callable, Optional, OrderedDict as TOrderedDict
 import asyncio
-from collections import OrderedDict
-from .date import now
+from collections import OrderedDict, deque
+from math import inf
+from time import monotonic
 
 
 # === CACHING DECORATORS ===
 
+# cache_info of every function decorated with `cache`
+_caches: dict[str, Callable[[], dict[str, Any]]] = {}
+
 def _make_cache_key(args: tuple, kwargs: dict) -> Any:
   """Create a cache key from function arguments, handling both hashable and non-hashable objects."""
   try:
     # Attempt to create a key from hashable arguments directly.
-    return tuple(args), tuple(sorted(kwargs.items()))
+    key = tuple(args), tuple(sorted(kwargs.items()))
+    hash(key)  # tuples of lists only fail when hashed
+    return key
   except TypeError:
     # Fallback to a string-based key for non-hashable arguments.
     return str(args) + str(sorted(kwargs.items()))
@@ -27,11 +33,14 @@ def cache(ttl: int = 300, maxsize: Optional[int] = 512, key_func: Optional[Calla
   Universal cache decorator for both sync and async functions.
 
   Features:
-  - Time-to-live (TTL) expiration for cached items.
+  - Time-to-live (TTL) expiration for cached items, on a monotonic clock.
   - Maximum cache size (maxsize) with LRU (Least Recently Used) eviction.
+  - Amortized O(1) expiry: with a single TTL per function, write order is expiry
+    order, so expired items are popped from the head of a FIFO queue.
+  - Single-flight for coroutines: concurrent misses of a key await one call.
   - Custom key generation function (key_func).
   - Handles object-based keys (e.g., Web3 instances).
-  - Automatically detects and handles both synchronous and asynchronous functions.
+  - Hit, miss, eviction and expiration counters, see `cache_info()` and `cache_stats()`.
 
   Args:
     ttl: Cache lifetime in seconds. -1 for infinite TTL.
@@ -39,60 +48,171 @@ def cache(ttl: int = 300, maxsize: Optional[int] = 512, key_func: Optional[Calla
     key_func: Optional function to generate a custom cache key from function arguments.
   """
   def decorator(func: Callable) -> Callable:
-    cache_storage: Union[dict, TOrderedDict[Any, tuple[Any, float]]] = OrderedDict() if maxsize is not None else {}
+    # key -> (value, expires_at), in LRU order
+    storage: TOrderedDict[Any, tuple[Any, float]] = OrderedDict()
+    expiries: deque[tuple[float, Any]] = deque()  # (expires_at, key), in write order
+    stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+    flights = SingleFlight()
     is_async = asyncio.iscoroutinefunction(func)
 
-    def _get_key(*args, **kwargs):
+    def _get_key(args: tuple, kwargs: dict) -> Any:
       if key_func:
         return key_func(*args, **kwargs)
       return (func.__name__, _make_cache_key(args, kwargs))
 
-    def _evict():
-      if maxsize is not None and len(cache_storage) > maxsize:
-        # First, remove any expired items to make space.
-        if ttl != -1:
-          current_time = now().timestamp()
-          expired_keys = [k for k, (_, ts) in cache_storage.items() if current_time - ts > ttl]
-          for k in expired_keys:
-            if k in cache_storage: # Check if not already removed/updated
-              del cache_storage[k]
-        # If still over maxsize, evict LRU items.
-        while len(cache_storage) > maxsize:
-          cache_storage.popitem(last=False)
+    def _lookup(key: Any) -> tuple[bool, Any]:
+      entry = storage.get(key)
+      if entry is not None:
+        if entry[1] > monotonic():
+          storage.move_to_end(key)
+          stats["hits"] += 1
+          return True, entry[0]
+        del storage[key]  # Expired
+        stats["expirations"] += 1
+      stats["misses"] += 1
+      return False, None
+
+    def _expire(current_time: float) -> None:
+      nonlocal expiries
+      while expiries and expiries[0][0] <= current_time:
+        expires_at, key = expiries.popleft()
+        entry = storage.get(key)
+        if entry is not None and entry[1] == expires_at:  # Not rewritten since
+          del storage[key]
+          stats["expirations"] += 1
+      # Drop the queue items of overwritten and evicted keys once they dominate
+      if len(expiries) > 2 * len(storage) + 64:
+        expiries = deque(item for item in expiries
+                         if storage.get(item[1], (None, None))[1] == item[0])
+
+    def _store(key: Any, value: Any) -> None:
+      if ttl == -1:
+        expires_at = inf
+      else:
+        current_time = monotonic()
+        _expire(current_time)
+        expires_at = current_time + ttl
+        expiries.append((expires_at, key))
+      storage[key] = (value, expires_at)
+      storage.move_to_end(key)
+      if maxsize is not None:
+        while len(storage) > maxsize:
+          storage.popitem(last=False)
+          stats["evictions"] += 1
+
+    def cache_info() -> dict[str, Any]:
+      lookups = stats["hits"] + stats["misses"]
+      return {
+          **stats,
+          "size": len(storage),
+          "maxsize": maxsize,
+          "ttl": ttl,
+          "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+      }
+
+    def cache_clear() -> None:
+      storage.clear()
+      expiries.clear()
 
     @wraps(func)
     def sync_wrapper(*args, **kwargs):
-      key = _get_key(*args, **kwargs)
-      if key in cache_storage:
-        result, timestamp = cache_storage[key]
-        if ttl == -1 or now().timestamp() - timestamp < ttl:
-          if maxsize is not None:
-            cache_storage.move_to_end(key)
-          return result
-        del cache_storage[key] # Expired
-
+      key = _get_key(args, kwargs)
+      hit, result = _lookup(key)
+      if hit:
+        return result
       result = func(*args, **kwargs)
-      cache_storage[key] = (result, now().timestamp())
-      _evict()
+      _store(key, result)
       return result
 
     @wraps(func)
     async def async_wrapper(*args, **kwargs):
-      key = _get_key(*args, **kwargs)
-      if key in cache_storage:
-        result, timestamp = cache_storage[key]
-        if ttl == -1 or now().timestamp() - timestamp < ttl:
-          if maxsize is not None:
-            cache_storage.move_to_end(key)
-          return result
-        del cache_storage[key] # Expired
-
-      result = await func(*args, **kwargs)
-      cache_storage[key] = (result, now().timestamp())
-      _evict()
+      key = _get_key(args, kwargs)
+      hit, result = _lookup(key)
+      if hit:
+        return result
+
+      async def fill():
+        result = await func(*args, **kwargs)
+        _store(key, result)
+        return result
+
+      if key in flights:
+        stats["coalesced"] += 1
+      return await flights.do(key, fill)
+
+    wrapper: Any = async_wrapper if is_async else sync_wrapper
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    _caches[f"{func.__module__}.{func.__qualname__}"] = cache_info
+    return wrapper
+  return decorator
+
+
+def cache_stats() -> dict[str, dict[str, Any]]:
+  """Counters of every function decorated with `cache`, by qualified name"""
+  return {name: info() for name, info in _caches.items()}
+
+
+# === CONCURRENCY ===
+
+class SingleFlight:
+  """
+  Coalesces concurrent calls sharing a key: the first caller (leader) runs the
+  call, later callers await its result instead of running it again.
+  Nothing is cached once the call settled.
+  """
+
+  def __init__(self):
+    self._inflight: dict[Any, asyncio.Future] = {}
+
+  def __contains__(self, key: Any) -> bool:
+    return key in self._inflight
+
+  async def do(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `fn` unless a call for `key` is in flight, in which case await it"""
+    while (flight := self._inflight.get(key)) is not None:
+      try:
+        return await asyncio.shield(flight)
+      except asyncio.CancelledError:
+        if not flight.cancelled():
+          raise  # the follower itself was cancelled
+        # the leader was cancelled, retry (possibly leading)
+
+    flight = asyncio.get_running_loop().create_future()
+    self._inflight[key] = flight
+    try:
+      result = await fn()
+      flight.set_result(result)
       return result
+    except asyncio.CancelledError:
+      flight.cancel()
+      raise
+    except BaseException as e:
+      flight.set_exception(e)
+      flight.exception()  # retrieved by the leader, even without followers
+      raise
+    finally:
+      if self._inflight.get(key) is flight:
+        del self._inflight[key]
 
-    return async_wrapper if is_async else sync_wrapper
+
+def single_flight(key_func: Optional[Callable] = None):
+  """
+  Coalesces concurrent calls of an async function with the same arguments.
+
+  Args:
+    key_func: Optional function to generate a custom key from function arguments.
+  """
+  def decorator(func: Callable) -> Callable:
+    flights = SingleFlight()
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+      key = key_func(*args, **kwargs) if key_func else _make_cache_key(args, kwargs)
+      return await flights.do(key, lambda: func(*args, **kwargs))
+
+    wrapper.flights = flights  # type: ignore[attr-defined]
+    return wrapper
   return decorator
 
 
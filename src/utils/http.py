@@ -1,4 +1,5 @@
-from typing import Optional, Any, Dict
+from contextlib import asynccontextmanager
+from typing import Optional, Any, AsyncIterator, Dict
 import httpx
 from ..utils.decorators import cache
 from .format import log_error, log_warn
@@ -115,6 +116,14 @@ async def put(url: str, user: Optional[str] = None, password: Optional[str] = No
   return await request("PUT", url, user, password, **kwargs)
 
 
+@asynccontextmanager
+async def stream(method: str, url: str, user: Optional[str] = None, password: Optional[str] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+  """Stream an HTTP response (body read incrementally) using the singleton HTTP client."""
+  client = await _http_client.get_client()
+  async with client.stream(method, url, auth=get_auth(user, password), **kwargs) as response:
+    yield response
+
+
 async def close_http_client() -> None:
   """Close the singleton HTTP client."""
   await _http_client.close()
@@ -0,0 +1,138 @@
+"""
+Streaming JSON extraction of compiled field selectors (see reflexion.SelectorPlan).
+
+The document is fed in chunks to ijson's event parser (optional dependency,
+C backend when available). Only the subtrees the selectors need are
+materialized: objects and arrays off every selector path are skipped event by
+event, and parsing stops as soon as every selector is resolved, so memory
+scales with what is kept rather than with the payload.
+"""
+
+from typing import Any, Optional
+
+from .deps import require_dependency, safe_import
+from .reflexion import INDEX, KEY, SelectorNode, SelectorPlan
+
+ijson = safe_import("ijson")
+
+SKIP, NAVIGATE, BUILD = 0, 1, 2
+
+
+class SelectorStream:
+  """Push parser resolving a SelectorPlan over JSON chunks"""
+
+  def __init__(self, plan: SelectorPlan):
+    require_dependency("ijson", "stream", ijson)
+    self.plan = plan
+    self.out: dict[int, Any] = {}
+    self.done: set[int] = set(plan.invalid)
+    self.events = ijson.sendable_list()
+    self.parser = ijson.basic_parse_coro(self.events, use_float=True)
+    # navigated containers: [node, is_map, next array index, last map key]
+    self.frames: list[list] = []
+    self.skip = 0  # depth inside a skipped value
+    self.builder: Any = None
+    self.build_depth = 0
+    self.build_node: Optional[SelectorNode] = None
+    self._by_index: dict[int, dict[int, SelectorNode]] = {}
+
+  @property
+  def complete(self) -> bool:
+    return len(self.done) == len(self.plan.names)
+
+  def feed(self, chunk: bytes) -> bool:
+    """Parse a chunk, returning whether every selector is resolved"""
+    self.parser.send(chunk)
+    self._handle()
+    return self.complete
+
+  def close(self) -> list[Any]:
+    """Values of every selector, None where missing"""
+    if not self.complete:
+      self.parser.close()  # raises on truncated documents
+      self._handle()
+    return [self.out.get(i) for i in range(len(self.plan.names))]
+
+  def _handle(self) -> None:
+    for event, value in self.events:
+      if self.complete:
+        break
+      if self.skip:
+        if event in ("start_map", "start_array"):
+          self.skip += 1
+        elif event in ("end_map", "end_array"):
+          self.skip -= 1
+      elif self.builder is not None:
+        self._build(event, value)
+      elif event == "map_key":
+        self.frames[-1][3] = value
+      elif event in ("end_map", "end_array"):
+        self.done.update(self.frames.pop()[0].indices)  # the rest is missing
+      else:
+        self._value(event, value)
+    del self.events[:]
+
+  def _value(self, event: str, value: Any) -> None:
+    """A value starts: skip, navigate or materialize it"""
+    node = self._node()
+    is_map, is_array = event == "start_map", event == "start_array"
+    if self.frames and not self.frames[-1][1]:
+      self.frames[-1][2] += 1
+    if node is None or (mode := self._mode(node, is_map, is_array)) == SKIP:
+      self.skip = int(is_map or is_array)
+    elif mode == NAVIGATE:
+      self.frames.append([node, is_map, 0, None])
+    elif is_map or is_array:
+      self.builder, self.build_node = ijson.ObjectBuilder(), node
+      self.build_depth = 0
+      self._build(event, value)
+    else:
+      self._resolve(node, value)
+
+  def _node(self) -> Optional[SelectorNode]:
+    """Selector node of the value starting at the current position"""
+    if not self.frames:
+      return self.plan.root
+    node, is_map, index, key = self.frames[-1]
+    if is_map:
+      return node.children.get((KEY, key))
+    by_index = self._by_index.get(id(node))
+    if by_index is None:
+      by_index = self._by_index[id(node)] = {
+          step[1]: child
+          for step, child in node.children.items()
+      }
+    return by_index.get(index)
+
+  @staticmethod
+  def _mode(node: SelectorNode, is_map: bool, is_array: bool) -> int:
+    """Navigate containers whose children are plain keys (objects) or
+    indexes (arrays), materialize the others and scalars"""
+    if node.outputs or not (is_map or is_array):
+      return BUILD
+    for step in node.children:
+      if not (step[0] == KEY and step[1] if is_map else step[0] == INDEX):
+        return BUILD
+    return NAVIGATE if node.children else SKIP
+
+  def _build(self, event: str, value: Any) -> None:
+    self.builder.event(event, value)
+    if event in ("start_map", "start_array"):
+      self.build_depth += 1
+    elif event in ("end_map", "end_array"):
+      self.build_depth -= 1
+      if not self.build_depth:
+        node, built = self.build_node, self.builder.value
+        self.builder = self.build_node = None
+        if node is not None:
+          self._resolve(node, built)
+
+  def _resolve(self, node: SelectorNode, value: Any) -> None:
+    """Walk the rest of the selectors in the materialized value"""
+    self.plan._walk(node, value, self.out, True)
+    self.done.update(node.indices)
+
+
+def stream_selectable(plan: SelectorPlan) -> bool:
+  """Whether streaming can push the plan's selectors down (not only root)"""
+  return bool(ijson) and not plan.root.outputs and bool(plan.root.children)
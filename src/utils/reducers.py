@@ -0,0 +1,96 @@
+"""
+Incremental reducers of stream messages (ws_api field `reducer: <op>`).
+
+Each message routed to a field folds its selected value (and weight) into an
+O(1) accumulator, read and reset once per epoch on the ingester's schedule
+tick, instead of the epoch's messages being kept and reduced on collection.
+
+Operators: last, open, high, low, close, count, sum, mean, vwap(<weight>),
+volume(<weight>), weighted by the value selected by <weight> (eg. `vwap(q)`
+for a trade's quantity).
+"""
+
+import re
+from math import inf, isfinite
+from typing import Any, Optional
+
+REDUCER_OPS = ("last", "open", "high", "low", "close", "count", "sum", "mean",
+               "vwap", "volume")
+REDUCER_PATTERN = re.compile(r"^\s*([a-z]+)\s*(?:\(\s*([^()]*?)\s*\))?\s*$")
+
+
+def parse_reducer(spec: Any) -> Optional[tuple[str, str]]:
+  """(operator, weight selector) of an incremental reducer spec, None if the
+  spec is not one (eg. a lambda over the epochs)"""
+  if not isinstance(spec, str):
+    return None
+  match = REDUCER_PATTERN.match(spec)
+  if not match or match.group(1) not in REDUCER_OPS:
+    return None
+  return match.group(1), match.group(2) or ""
+
+
+def _number(value: Any) -> Optional[float]:
+  if value is None or isinstance(value, bool):
+    return None
+  try:
+    value = float(value)
+  except (TypeError, ValueError):
+    return None
+  return value if isfinite(value) else None
+
+
+class Accumulator:
+  """Running aggregates of a value (and weight) over an epoch"""
+  __slots__ = ("count", "total", "weights", "weighted", "open", "high", "low",
+               "close", "last")
+
+  def __init__(self):
+    self.last: Optional[float] = None  # carried over epochs
+    self.reset()
+
+  def reset(self) -> None:
+    self.count, self.total, self.weights, self.weighted = 0, 0.0, 0.0, 0.0
+    self.open: Optional[float] = None
+    self.close: Optional[float] = None
+    self.high, self.low = -inf, inf
+
+  def add(self, value: Any, weight: Any = 1.0) -> bool:
+    """Fold a message's value, returning whether it was numeric"""
+    v, w = _number(value), _number(weight)
+    if v is None or w is None:
+      return False
+    if not self.count:
+      self.open = v
+    self.count += 1
+    self.total += v
+    self.weights += w
+    self.weighted += v * w
+    if v > self.high:
+      self.high = v
+    if v < self.low:
+      self.low = v
+    self.close = self.last = v
+    return True
+
+  def value(self, op: str) -> Optional[float]:
+    """Operator's value over the current epoch (`last` over all epochs)"""
+    if op == "last":
+      return self.last
+    if op == "count":
+      return self.count
+    if not self.count:
+      return None
+    if op in ("open", "close"):
+      return self.open if op == "open" else self.close
+    if op in ("high", "low"):
+      return self.high if op == "high" else self.low
+    if op == "sum":
+      return self.total
+    if op == "mean":
+      return self.total / self.count
+    if op == "volume":
+      return self.weights
+    if op == "vwap":
+      return self.weighted / self.weights if self.weights else None
+    raise ValueError(f"Unknown reducer: {op}")
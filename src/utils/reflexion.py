@@ -1,9 +1,10 @@
 from pathlib import Path
 import re
 from asyncio import iscoroutinefunction, new_event_loop
+from functools import lru_cache
 from importlib import metadata, resources
 import tomli
-from typing import Coroutine, Any, Optional, Union
+from typing import Callable, Coroutine, Any, Optional, Union
 from datetime import datetime
 
 from .format import log_error, log_warn
@@ -68,47 +69,134 @@ def submit_to_threadpool(executor, fn, *args, **kwargs):
   return executor.submit(fn, *args, **kwargs)
 
 
-def select_nested(selector: Optional[str],
-                  data: dict,
-                  name: Optional[str] = None) -> Any:
+# selector segments eg. ".key", ".key[index]", ".key[*]" or ".*"
+SELECTOR_SEGMENT = re.compile(r'([^.\[\]]+)(?:\[(\d+|\*)\])?')
+WILDCARD = "*"
+KEY, INDEX, EACH = 0, 1, 2  # selector steps
 
-  # invalid selectors
-  if selector and not isinstance(selector, str):
-    log_error("Invalid selector. Please use a valid path string")
-    return None
-
-  if not selector or [".", "root"].count(selector.lower()) > 0:
-    return data
 
-  # optional starting dot and "root" keyword (case-insensitive)
-  if selector.startswith("."):
-    selector = selector[1:]
+def is_root_selector(selector: Optional[str]) -> bool:
+  return not selector or selector.lower() in (".", "root")
 
-  current: Any = data  # base access
-  segment_pattern = re.compile(
-      r'([^.\[\]]+)(?:\[(\d+)\])?'
-  )  # match selector segments eg. ".key" or ".key[index]"
 
-  # loop through segments
-  for match in segment_pattern.finditer(selector):
+@lru_cache(maxsize=4096)
+def parse_selector(selector: str) -> tuple[tuple, ...]:
+  """Steps of a selector path: (KEY, key), (INDEX, index, key) or (EACH,)"""
+  if is_root_selector(selector):
+    return ()
+  steps: list[tuple] = []
+  for match in SELECTOR_SEGMENT.finditer(selector.removeprefix(".")):
     key, index = match.groups()
     if key and key.isnumeric() and not index:
-      key, index = None, key  # Keep as string for now
-    # dict access
-    if key and isinstance(current, dict):
-      current = current.get(key)
-    if current is None:
-      log_warn(f"Key not found in {name} dict: {key}")
-      return None
-    # list access
-    if index is not None:
-      if current is None:
-        return log_error("Cannot access index on None value")
-      index_int = int(index)
-      if not isinstance(current, list) or index_int >= len(current):
-        return log_error(f"Index out of range in {name} dict.{key}: {index}")
-      current = current[index_int]
-  return current
+      key, index = None, key
+    steps.append((EACH, ) if key == WILDCARD else (KEY, key))
+    if index == WILDCARD:
+      steps.append((EACH, ))
+    elif index is not None:
+      steps.append((INDEX, int(index), key))
+  return tuple(steps)
+
+
+class SelectorNode:
+  """Step of a selector tree, shared by the selectors going through it"""
+  __slots__ = ("step", "children", "outputs", "indices")
+
+  def __init__(self, step: tuple = ()):
+    self.step = step
+    self.children: dict[tuple, SelectorNode] = {}
+    self.outputs: list[int] = []  # selectors ending at this step
+    self.indices: list[int] = []  # selectors ending at or below this step
+
+
+class SelectorPlan:
+  """
+  Field selectors compiled into a single path tree, walked once per document:
+  selectors sharing a prefix share its lookups. Wildcard steps ([*] on arrays,
+  .* on arrays or object values) select a list of the matches of the rest of
+  the path.
+  """
+
+  def __init__(self, selectors: tuple[tuple[Any, Optional[str]], ...]):
+    self.names = [name for _, name in selectors]
+    self.root = SelectorNode()
+    self.invalid: list[int] = []
+    for i, (selector, _) in enumerate(selectors):
+      if selector and not isinstance(selector, str):
+        self.invalid.append(i)
+        continue
+      node = self.root
+      node.indices.append(i)
+      for step in parse_selector(selector or ""):
+        node = node.children.setdefault(step, SelectorNode(step))
+        node.indices.append(i)
+      node.outputs.append(i)
+
+  def select(self, data: Any) -> list[Any]:
+    """Values of every selector in `data`, None where missing"""
+    out: dict[int, Any] = {}
+    if self.invalid:
+      log_error("Invalid selector. Please use a valid path string")
+    self._walk(self.root, data, out, True)
+    return [out.get(i) for i in range(len(self.names))]
+
+  def _miss(self, node: SelectorNode, log: Callable, message: str) -> None:
+    for i in node.indices:
+      log(message.replace("{name}", str(self.names[i])))
+
+  def _walk(self, node: SelectorNode, current: Any, out: dict[int, Any],
+            logs: bool) -> None:
+    for i in node.outputs:
+      out[i] = current
+    for child in node.children.values():
+      step, value = child.step, current
+      if step[0] == KEY:
+        if step[1] and isinstance(value, dict):
+          value = value.get(step[1])
+        if value is None:
+          if logs:
+            self._miss(child, log_warn,
+                       f"Key not found in {{name}} dict: {step[1]}")
+          continue
+      elif step[0] == INDEX:
+        if not isinstance(value, list) or step[1] >= len(value):
+          if logs:
+            self._miss(
+                child, log_error,
+                f"Index out of range in {{name}} dict.{step[2]}: "
+                f"{step[1]}")
+          continue
+        value = value[step[1]]
+      else:  # EACH, no logs for the (often sparse) elements
+        if isinstance(value, dict):
+          value = list(value.values())
+        elif not isinstance(value, list):
+          if logs:
+            self._miss(child, log_warn, "No array to iterate in {name} dict")
+          continue
+        matches: list[dict[int, Any]] = [{} for _ in value]
+        for item, match in zip(value, matches):
+          self._walk(child, item, match, False)
+        for i in child.indices:
+          out[i] = [m.get(i) for m in matches]
+        continue
+      self._walk(child, value, out, logs)
+
+
+@lru_cache(maxsize=1024)
+def compile_selectors(
+    selectors: tuple[tuple[Any, Optional[str]], ...]) -> SelectorPlan:
+  """Extraction plan of (selector, field name) pairs"""
+  return SelectorPlan(selectors)
+
+
+def select_nested(selector: Optional[str],
+                  data: Any,
+                  name: Optional[str] = None) -> Any:
+  """Value at a selector path in `data` (see SelectorPlan), None if missing"""
+  if selector and not isinstance(selector, str):
+    log_error("Invalid selector. Please use a valid path string")
+    return None
+  return compile_selectors(((selector, name), )).select(data)[0]
 
 
 def merge_replace_empty(dest: dict, src: dict) -> dict:
@@ -0,0 +1,234 @@
+"""
+Shared websocket connections: the subscriptions of every ws_api ingester to an
+endpoint are multiplexed over as few sockets as possible.
+
+Sockets are keyed by (url, auth headers) and carry up to WS_MAX_CHANNELS
+channels. The subscribe messages of a socket's subscribers are merged (list
+payloads such as Binance's `params` or OKX's `args` concatenated), each frame
+is decoded once and handed to every subscriber to demultiplex (ws_api routes
+by topic), and reconnects resubscribe every channel at once.
+"""
+
+from asyncio import CancelledError, Task, create_task, sleep
+from os import environ as env
+from typing import Any, Callable, Optional
+
+import orjson
+import websockets
+
+from .format import log_debug, log_error, log_warn
+
+# channels subscribed per socket (eg. Binance caps streams at 1024)
+WS_MAX_CHANNELS = int(env.get("WS_MAX_CHANNELS", 100))
+# request ids, not part of what a subscribe message subscribes to
+REQUEST_IDS = ("id", "req_id", "reqId")
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS
+
+Headers = tuple[tuple[str, str], ...]
+
+
+def channels_of(params: Any) -> tuple[Optional[str], list]:
+  """(key, channels) of a subscribe message listing its channels, eg.
+  {"method": "SUBSCRIBE", "params": [...]}, (None, [params]) otherwise"""
+  if isinstance(params, dict):
+    keys = [k for k, v in params.items() if isinstance(v, list)]
+    if len(keys) == 1:
+      return keys[0], params[keys[0]]
+  return None, [params]
+
+
+def merge_subscriptions(payloads: list[Any]) -> list[Any]:
+  """Fewest subscribe messages subscribing to the channels of `payloads`"""
+  merged: dict[bytes, Any] = {}
+  for params in payloads:
+    key, channels = channels_of(params)
+    if key is None:
+      merged.setdefault(orjson.dumps(params, option=ORJSON_OPTIONS), params)
+      continue
+    rest = {
+        k: v
+        for k, v in params.items() if k != key and k not in REQUEST_IDS
+    }
+    shape = orjson.dumps([key, rest], option=ORJSON_OPTIONS)
+    message = merged.setdefault(shape, {**params, key: []})
+    message[key].extend(c for c in channels if c not in message[key])
+  return list(merged.values())
+
+
+def channel_count(params: Any) -> int:
+  return len(channels_of(params)[1]) if params else 0
+
+
+class Subscription:
+  """A subscriber's channels on a shared socket"""
+  __slots__ = ("params", "channels", "on_message", "socket")
+
+  def __init__(self, params: Any, on_message: Callable[[Any], None]):
+    self.params = params
+    self.channels = channel_count(params)
+    self.on_message = on_message
+    self.socket: Optional["SharedSocket"] = None
+
+  async def close(self) -> None:
+    if self.socket is not None:
+      await self.socket.remove(self)
+
+
+class SharedSocket:
+  """Websocket carrying the channels of several subscriptions"""
+
+  def __init__(self,
+               url: str,
+               headers: Headers = (),
+               shared: bool = True,
+               max_retries: int = 3,
+               retry_cooldown: float = 5):
+    self.url, self.headers, self.shared = url, headers, shared
+    self.max_retries, self.retry_cooldown = max_retries, retry_cooldown
+    self.subscriptions: list[Subscription] = []
+    self.channels = 0
+    self.ws: Any = None
+    self.task: Optional[Task] = None
+    self.on_close: Optional[Callable[["SharedSocket"], None]] = None
+
+  def fits(self, sub: Subscription) -> bool:
+    return not self.subscriptions or self.channels + sub.channels <= WS_MAX_CHANNELS
+
+  async def add(self, sub: Subscription) -> None:
+    sub.socket = self
+    self.subscriptions.append(sub)
+    self.channels += sub.channels
+    if self.ws is not None and sub.params:
+      try:
+        await self.send([sub.params])
+      except Exception as e:  # subscribed again on reconnect
+        log_warn(f"Failed to subscribe to {self.url}: {e}")
+    if self.task is None:
+      self.task = create_task(self.run())
+
+  async def remove(self, sub: Subscription) -> None:
+    if sub not in self.subscriptions:
+      return
+    self.subscriptions.remove(sub)
+    self.channels -= sub.channels
+    sub.socket = None
+    if not self.subscriptions:
+      await self.close()
+
+  async def close(self) -> None:
+    if self.task is not None and not self.task.done():
+      self.task.cancel()
+    self.task = None
+    self._closed()
+
+  def _closed(self) -> None:
+    if self.on_close:
+      self.on_close(self)
+
+  async def send(self, payloads: list[Any]) -> None:
+    for message in merge_subscriptions(payloads):
+      await self.ws.send(orjson.dumps(message, option=ORJSON_OPTIONS))
+
+  def dispatch(self, raw: Any) -> None:
+    message = orjson.loads(raw)  # decoded once for every subscriber
+    for sub in tuple(self.subscriptions):
+      try:
+        sub.on_message(message)
+      except Exception as e:
+        log_warn(f"Failed to handle websocket data from {self.url}: {e}")
+
+  async def run(self) -> None:
+    """Connect, subscribe every channel and dispatch frames, reconnecting
+    and resubscribing after connection losses"""
+    retry_count, headers = 0, dict(self.headers) or None
+    try:
+      while self.subscriptions and retry_count <= self.max_retries:
+        try:
+          async with websockets.connect(self.url,
+                                        additional_headers=headers) as ws:
+            self.ws = ws
+            await self.send([s.params for s in self.subscriptions if s.params])
+            log_debug(f"Subscribed to {self.channels} channels on {self.url}"
+                      f" ({len(self.subscriptions)} subscribers)")
+            retry_count = 0
+            async for raw in ws:
+              self.dispatch(raw)
+          log_warn(f"{self.url} ws connection closed, reconnecting...")
+          await sleep(self.retry_cooldown)
+        except CancelledError:
+          raise
+        except Exception as e:
+          retry_count += 1
+          if retry_count > self.max_retries:
+            log_error(
+                f"Exceeded max retries ({self.max_retries}). Giving up on {self.url}: {e}"
+            )
+            break
+          log_error(
+              f"Connection error ({e}) occurred. Attempting to reconnect to {self.url} (retry {retry_count}/{self.max_retries})..."
+          )
+          await sleep(self.retry_cooldown * retry_count)
+        finally:
+          self.ws = None
+    finally:
+      if self.task is not None:  # not closed by its last subscriber
+        self.task = None
+        self._closed()
+
+
+class WsManager:
+  """Shared sockets by (url, auth headers), filled up to WS_MAX_CHANNELS"""
+
+  def __init__(self):
+    self.sockets: dict[tuple[str, Headers], list[SharedSocket]] = {}
+
+  async def subscribe(self,
+                      url: str,
+                      params: Any,
+                      on_message: Callable[[Any], None],
+                      headers: Optional[dict[str, str]] = None,
+                      shared: bool = True) -> Subscription:
+    """
+    Subscribe to `params` channels on a socket to `url`.
+
+    Args:
+      url: Websocket endpoint
+      params: Subscribe message (sent on every (re)connect), if any
+      on_message: Called with every decoded frame of the socket
+      headers: Auth headers, sockets are only shared by equal headers
+      shared: Whether the socket may carry other subscriptions
+
+    Returns:
+      The subscription, closed with `close()`
+    """
+    from .. import state
+    key = (url, tuple(sorted((headers or {}).items())))
+    sub = Subscription(params, on_message)
+    sockets = self.sockets.setdefault(key, [])
+    socket = next((s for s in sockets
+                   if s.shared and s.fits(sub)), None) if shared else None
+    if socket is None:
+      args = getattr(state, "args", None)
+      socket = SharedSocket(url, key[1], shared,
+                            getattr(args, "max_retries", 3),
+                            getattr(args, "retry_cooldown", 5))
+      socket.on_close = lambda s: self._discard(key, s)
+      sockets.append(socket)
+    await socket.add(sub)
+    return sub
+
+  def _discard(self, key: tuple[str, Headers], socket: SharedSocket) -> None:
+    sockets = self.sockets.get(key, [])
+    if socket in sockets:
+      sockets.remove(socket)
+    if not sockets:
+      self.sockets.pop(key, None)
+
+  async def close(self) -> None:
+    for sockets in list(self.sockets.values()):
+      for socket in list(sockets):
+        await socket.close()
+    self.sockets.clear()
+
+
+ws_manager = WsManager()
@@ -0,0 +1,105 @@
+"""Local JSON-RPC server standing in for chain RPC endpoints in tests."""
+import asyncio
+from typing import Any, Callable, Optional
+
+import orjson
+
+
+class RpcError(Exception):
+  """Raised by a method to answer a JSON-RPC error"""
+
+  def __init__(self, message: str, code: int = -32000):
+    super().__init__(message)
+    self.code = code
+
+
+NO_ANSWER = object()  # returned by a method whose call is left unanswered
+
+
+class RpcServer:
+  """
+  HTTP JSON-RPC endpoint (keep-alive, single and batch requests) serving
+  `methods`: callables of the request params, sync or async (returning
+  NO_ANSWER to leave a call out of its batch's answer). Batches are
+  answered with an error (as by endpoints not supporting them) if `batches`
+  is false.
+  """
+
+  def __init__(self,
+               methods: dict[str, Callable[..., Any]],
+               batches: bool = True):
+    self.methods = methods
+    self.batches = batches
+    self.requests: list[Any] = []  # request bodies, decoded
+    self.calls: list[tuple[str, Any]] = []  # (method, params)
+    self.url = ""
+    self._server: Any = None
+    self._writers: set[asyncio.StreamWriter] = set()
+
+  async def __aenter__(self) -> "RpcServer":
+    self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+    host, port = self._server.sockets[0].getsockname()[:2]
+    self.url = f"http://{host}:{port}"
+    return self
+
+  async def __aexit__(self, *exc) -> None:
+    self._server.close()
+    for writer in self._writers:  # keep-alive connections
+      writer.close()
+    await self._server.wait_closed()
+
+  async def _answer(self, request: dict) -> Optional[dict]:
+    method, params = request.get("method"), request.get("params")
+    self.calls.append((method, params))
+    answer: dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+    try:
+      if method not in self.methods:
+        raise RpcError(f"Method {method} not found", -32601)
+      result = self.methods[method](params)
+      if asyncio.iscoroutine(result):
+        result = await result
+      if result is NO_ANSWER:
+        return None
+      answer["result"] = result
+    except RpcError as e:
+      answer["error"] = {"code": e.code, "message": str(e)}
+    return answer
+
+  async def _serve(self, reader: asyncio.StreamReader,
+                   writer: asyncio.StreamWriter) -> None:
+    self._writers.add(writer)
+    try:
+      while line := await reader.readline():
+        if not line.strip():
+          continue
+        length = 0
+        while (header := await reader.readline()) not in (b"\r\n", b""):
+          name, _, value = header.decode().partition(":")
+          if name.strip().lower() == "content-length":
+            length = int(value)
+        body = orjson.loads(await reader.readexactly(length))
+        self.requests.append(body)
+        if isinstance(body, list) and not self.batches:
+          answer: Any = {
+              "jsonrpc": "2.0",
+              "id": None,
+              "error": {
+                  "code": -32600,
+                  "message": "batch requests unsupported"
+              }
+          }
+        elif isinstance(body, list):
+          answers = await asyncio.gather(*(self._answer(r) for r in body))
+          answer = [a for a in answers if a is not None]
+        else:
+          answer = await self._answer(body)
+        content = orjson.dumps(answer)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: %d\r\n\r\n%s" % (len(content), content))
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError,
+            asyncio.CancelledError):
+      pass  # client gone or server closed
+    finally:
+      self._writers.discard(writer)
+      writer.close()
@@ -78,6 +78,7 @@ class TestActionsLoad:
     """Test bulk loading with pagination."""
     with patch('src.actions.load.state') as mock_state:
       mock_state.tsdb.fetch_by_id = AsyncMock(return_value=None)
+      mock_state.tsdb.fetch_page = AsyncMock(side_effect=NotImplementedError)
       mock_state.tsdb.fetch = AsyncMock(
           return_value=(["id", "value"], [[1, 100], [2, 200], [3, 300]]))
 
@@ -88,6 +89,20 @@ class TestActionsLoad:
       assert result[1]["id"] == 3
       mock_state.tsdb.fetch.assert_called_once()
 
+  @pytest.mark.asyncio
+  async def test_load_resource_bulk_pushed_down(self):
+    """Test bulk loading fetches only offset + limit records."""
+    with patch('src.actions.load.state') as mock_state:
+      mock_state.tsdb.fetch_page = AsyncMock(
+          return_value=(["ts", "value"], [[3, 300], [2, 200], [1, 100]]))
+      mock_state.tsdb.fetch = AsyncMock()
+
+      result = await load_resource("test_table", limit=2, offset=1)
+
+      assert [r["value"] for r in result] == [200, 100]
+      mock_state.tsdb.fetch_page.assert_called_once_with("test_table", 3)
+      mock_state.tsdb.fetch.assert_not_called()
+
   @pytest.mark.asyncio
   async def test_load_resource_not_found(self):
     """Test that None is returned when a single resource is not found."""
@@ -121,3 +136,62 @@ class TestActionsImports:
 
     assert callable(load_resource)
     assert inspect.iscoroutinefunction(load_resource)
+
+
+class TestActionsLoadPage:
+  """Test keyset pagination of actions.load."""
+
+  def test_cursor_round_trip(self):
+    """Test cursors are opaque and decode to their keyset."""
+    from src.actions.load import encode_cursor, decode_cursor
+    key = (datetime(2024, 1, 1, tzinfo=timezone.utc), "u1")
+    cursor = encode_cursor(key)
+    assert "u1" not in cursor
+    assert decode_cursor(cursor) == key
+    assert decode_cursor(encode_cursor((42, None))) == (42, None)
+
+  def test_invalid_cursor(self):
+    """Test malformed cursors are rejected."""
+    from src.actions.load import decode_cursor
+    with pytest.raises(ValueError):
+      decode_cursor("not-a-cursor")
+
+  @pytest.mark.asyncio
+  async def test_load_page_next_cursor(self):
+    """Test the last record of a full page keys the next one."""
+    from src.actions.load import load_page, decode_cursor
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with patch('src.actions.load.state') as mock_state:
+      mock_state.tsdb.fetch_page = AsyncMock(
+          return_value=(["updated_at", "uid"], [[ts, "b"], [ts, "a"]]))
+      records, cursor = await load_page("users", limit=2)
+      assert records == [{
+          "updated_at": ts,
+          "uid": "b"
+      }, {
+          "updated_at": ts,
+          "uid": "a"
+      }]
+      assert decode_cursor(cursor) == (ts, "a")
+
+      mock_state.tsdb.fetch_page = AsyncMock(
+          return_value=(["updated_at", "uid"], [[ts, "0"]]))
+      records, next_cursor = await load_page("users", limit=2, cursor=cursor)
+      mock_state.tsdb.fetch_page.assert_called_once_with("users", 2, (ts, "a"))
+      assert next_cursor is None
+
+  @pytest.mark.asyncio
+  async def test_load_page_fallback(self):
+    """Test keyset slicing for adapters without fetch_page."""
+    from src.actions.load import load_page
+    rows = [[i // 2, f"u{i}"] for i in range(7)]
+    with patch('src.actions.load.state') as mock_state:
+      mock_state.tsdb.fetch_page = AsyncMock(side_effect=NotImplementedError)
+      mock_state.tsdb.fetch = AsyncMock(return_value=(["ts", "uid"], rows))
+      seen, cursor = [], None
+      while True:
+        records, cursor = await load_page("t", limit=3, cursor=cursor)
+        seen += [r["uid"] for r in records]
+        if not cursor:
+          break
+      assert seen == [f"u{i}" for i in reversed(range(7))]
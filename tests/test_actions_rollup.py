@@ -0,0 +1,147 @@
+"""Tests for materialized rollup tiers."""
+import pytest
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.actions import rollup
+from src.models.base import ResourceField
+from src.models.ingesters import TimeSeriesIngester
+from src.utils.date import SEC_BY_TF
+
+UTC = timezone.utc
+START = datetime(2024, 6, 1, 0, 0, tzinfo=UTC)
+
+
+class FakeTsdb:
+  """In-memory tables, aggregated with LAST per bucket and sorted DESC like the adapters"""
+
+  def __init__(self):
+    self.tables: dict[str, tuple[list[str], list[tuple]]] = {}
+    self.fetched: list[str] = []
+
+  async def insert(self, ing, table=""):
+    fields = ing.get_persistent_fields()
+    columns, rows = self.tables.setdefault(table or ing.name,
+                                           ([f.name for f in fields], []))
+    rows.append(tuple(f.value for f in fields))
+
+  async def fetch(self, table, from_date, to_date, interval, columns):
+    self.fetched.append(table)
+    all_columns, rows = self.tables.get(table, ([], []))
+    columns = columns or all_columns
+    idx = [all_columns.index(c) for c in columns]
+    step = SEC_BY_TF[interval]
+    buckets: dict[int, tuple] = {}
+    for row in rows:
+      if from_date <= row[0] <= to_date:
+        buckets[int(row[0].timestamp()) // step * step] = row
+    return columns, [
+        (datetime.fromtimestamp(b, UTC), ) + tuple(row[i] for i in idx[1:])
+        for b, row in sorted(buckets.items(), reverse=True)
+    ]
+
+
+def make_ingester() -> TimeSeriesIngester:
+  return TimeSeriesIngester(
+      name="feed",
+      interval="m1",
+      fields=[ResourceField(name="price", type="float64")])
+
+
+@pytest.fixture
+def env():
+  tsdb = FakeTsdb()
+  store: dict = {}
+
+  async def cache(name,
+                  value,
+                  expiry=0,
+                  raw_key=False,
+                  encoding="",
+                  pickled=False):
+    store[name] = value
+
+  async def get_cache(name, pickled=False, encoding="", raw_key=False):
+    return store.get(name)
+
+  async def get_coverage(table, tier):
+    return store.get(rollup.meta_key(table, tier))
+
+  rollup._accumulators.clear()
+  with patch.object(rollup, "state") as mock_state, \
+       patch.object(rollup, "cache", cache), \
+       patch.object(rollup, "get_cache", get_cache), \
+       patch.object(rollup, "get_coverage", get_coverage):
+    mock_state.tsdb = tsdb
+    mock_state.args.verbose = False
+    yield tsdb, store
+  rollup._accumulators.clear()
+
+
+async def ingest(tsdb, ing, minutes: range):
+  for m in minutes:
+    ing.ts = START + timedelta(minutes=m)
+    ing.price = float(m % 7 + m / 10)
+    await tsdb.insert(ing, "feed")
+    await rollup.update(ing, "feed")
+
+
+class TestRollup:
+
+  def test_select_tier(self):
+    assert rollup.select_tier("m5") == "m5"
+    assert rollup.select_tier("m30") == "m5"
+    assert rollup.select_tier("h4") == "h1"
+    assert rollup.select_tier("D3") == "D1"
+    assert rollup.select_tier("m1") is None
+
+  @pytest.mark.asyncio
+  async def test_closed_buckets_materialized(self, env):
+    tsdb, store = env
+    await ingest(tsdb, make_ingester(), range(0, 11))
+    columns, rows = tsdb.tables["feed.m5"]
+    assert columns == [
+        "ts", "price", "price_first", "price_min", "price_max", "price_mean"
+    ]
+    assert len(rows) == 2  # [0, 5) and [5, 10), [10, 15) still open
+    values = [m % 7 + m / 10 for m in range(5, 10)]
+    assert rows[1] == (START + timedelta(minutes=5), values[-1], values[0],
+                       min(values), max(values), sum(values) / len(values))
+    meta = store[rollup.meta_key("feed", "m5")]
+    assert meta["since"] == START.timestamp()
+    assert meta["until"] == (START + timedelta(minutes=10)).timestamp()
+    assert meta["columns"] == ["ts", "price"]
+
+  @pytest.mark.asyncio
+  async def test_fetch_reads_tier_like_raw(self, env):
+    tsdb, _ = env
+    await ingest(tsdb, make_ingester(), range(0, 24 * 60))
+    from_date = START + timedelta(hours=2, minutes=7)
+    to_date = START + timedelta(hours=23, minutes=41)
+    expected = await tsdb.fetch("feed", from_date, to_date, "h2", [])
+    tsdb.fetched.clear()
+    result = await rollup.fetch("feed", from_date, to_date, "h2", [])
+    assert result == expected
+    assert "feed.h1" in tsdb.fetched
+
+  @pytest.mark.asyncio
+  async def test_catch_up_after_restart(self, env):
+    tsdb, _ = env
+    ing = make_ingester()
+    await ingest(tsdb, ing, range(0, 7))
+    rollup._accumulators.clear()  # restart mid-bucket
+    for m in range(7, 12):  # missed while down
+      ing.ts = START + timedelta(minutes=m)
+      ing.price = float(m)
+      await tsdb.insert(ing, "feed")
+    await ingest(tsdb, ing, range(12, 16))
+    columns, rows = tsdb.tables["feed.m5"]
+    assert [r[0] for r in rows] == [
+        START, START + timedelta(minutes=5), START + timedelta(minutes=10)
+    ]
+    assert rows[1][1] == 9.0  # last, rebuilt from raw rows
+    assert rows[2][2] == 10.0  # first, rebuilt from raw rows
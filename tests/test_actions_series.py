@@ -0,0 +1,153 @@
+"""Tests for the in-process series store of transformer series operators."""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401  # settle import cycles
+from src.actions import series
+from src.models import Ingester, ResourceField
+
+tf = sys.modules["src.actions.transform"]
+
+T0 = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def expected(op: str, values: np.ndarray, alpha: float):
+  if op == "ewma":
+    e = values[0]
+    for v in values[1:]:
+      e += alpha * (v - e)
+    return e
+  if op == "pct_change":
+    return values[-1] / values[0] - 1
+  return getattr(np, op)(values)
+
+
+def make_ingester(value=None) -> Ingester:
+  return Ingester(name="px",
+                  interval="m1",
+                  fields=[
+                      ResourceField(name="ts", type="timestamp"),
+                      ResourceField(name="price", type="float64", value=value),
+                      ResourceField(name="avg",
+                                    type="float64",
+                                    transformers=["{price::mean(m5)}"]),
+                      ResourceField(name="dev",
+                                    type="float64",
+                                    value=value,
+                                    transformers=["{self} - {self::max(m5)}"]),
+                  ])
+
+
+@pytest.fixture
+def env():
+  """Empty store, a mocked TSDB and a clock set by `env.at`"""
+  series.clear()
+  clock = Mock(at=T0)
+  tsdb = Mock(fetch=AsyncMock(return_value=(["ts", "price"], [])))
+  with patch.object(series, "state", Mock(tsdb=tsdb)), \
+      patch.object(series, "now", lambda: clock.at), \
+      patch.object(tf, "state", Mock(args=Mock(verbose=False))):
+    clock.tsdb = tsdb
+    yield clock
+  series.clear()
+
+
+class TestSeries:
+
+  @pytest.mark.parametrize("op", series.ROLLING)
+  def test_rolling_matches_numpy(self, op):
+    rng = np.random.default_rng(7)
+    values = rng.uniform(50, 150, 300)
+    with patch.object(series, "CAPACITY", 64):
+      buf = series.Series(interval=60)
+      buf.push(0.0, values[0])
+      span = 20 * 60.0
+      alpha = series._alpha(span, 60)
+      w = buf.window(span, 0.0)
+      for i, value in enumerate(values[1:], 1):
+        buf.push(i * 60.0, value)
+        if i % 37 == 0 or i == len(values) - 1:
+          window = values[max(0, i - 19):i + 1]
+          if op == "ewma":  # runs over the whole history, decaying
+            window = values[:i + 1]
+          assert buf.window(span, i * 60.0) is w
+          assert w.stat(op) == pytest.approx(expected(op, window, alpha))
+      # the window outlives the buffer: its tail is evicted by capacity
+      long = buf.window(3600 * 10, len(values) * 60.0)
+      assert long.count == 64
+      assert long.stat("min") == values[-64:].min()
+
+  def test_window_empties(self):
+    buf = series.Series(interval=60)
+    for i in range(5):
+      buf.push(i * 60.0, float(i))
+    w = buf.window(120, 240.0)
+    assert w.stat("sum") == 3 + 4
+    buf.expire(10_000)
+    assert w.stat("mean") is None and w.stat("ewma") is None
+    buf.push(10_000, 2.0)
+    assert w.stat("pct_change") == 0.0
+    assert w.stat("max") == 2.0
+
+  @pytest.mark.asyncio
+  async def test_cold_start_seeds_from_tsdb(self, env):
+    ing = make_ingester()
+    rows = [(T0 - timedelta(minutes=m), 100.0 + m) for m in (6, 4, 2, 1)]
+    env.tsdb.fetch.return_value = (["ts", "price"], rows)
+    assert await series.value(ing, "price", "mean", "m5") == 102.0 + 1 / 3
+    env.tsdb.fetch.assert_awaited_once()
+
+    # fed by the store path from now on
+    for m in range(1, 4):
+      env.at = ing.last_ingested = T0 + timedelta(minutes=m)
+      ing.get_field("price").value = 200.0
+      series.update(ing)
+    assert await series.value(ing, "price", "max", "m5") == 200.0
+    assert await series.value(ing, "price", "min", "m5") == 101.0
+    assert await series.value(ing, "price", "median", "m5", np.median) == 200.0
+    assert env.tsdb.fetch.await_count == 1
+
+  @pytest.mark.asyncio
+  async def test_window_longer_than_buffer(self, env):
+    ing = make_ingester()
+    rows = [(T0 - timedelta(minutes=m), float(m)) for m in range(8)]
+    env.tsdb.fetch.return_value = (["ts", "price"], rows)
+    with patch.object(series, "CAPACITY", 4):
+      for _ in range(2):
+        assert await series.value(ing, "price", "sum", "m10") == sum(range(8))
+    assert env.tsdb.fetch.await_count == 2
+
+  @pytest.mark.asyncio
+  async def test_disabled(self, env):
+    with patch.object(series, "SERIES_STORE", False):
+      for _ in range(2):
+        assert await series.value(make_ingester(), "price", "sum",
+                                  "m5") is None
+    assert env.tsdb.fetch.await_count == 2
+    assert not series._buffers
+
+  @pytest.mark.asyncio
+  async def test_transformers(self, env):
+    ing = make_ingester(10.0)
+    assert await tf.transform_all(ing) == len(ing.fields)
+    assert ing.get_field("avg").value is None  # empty history
+    ing.get_field("avg").value = None
+
+    for m, price in enumerate((10.0, 14.0, 12.0), 1):
+      env.at = ing.last_ingested = T0 + timedelta(minutes=m)
+      ing.get_field("price").value = price
+      ing.get_field("dev").value = price
+      series.update(ing)
+    ing.get_field("dev").value = 11.0
+    await tf.transform_all(ing)
+    assert ing.get_field("avg").value == 12.0
+    assert ing.get_field("dev").value == 11.0 - 14.0
+    # a single cold start fetch per (ingester, field)
+    assert env.tsdb.fetch.await_count == 2
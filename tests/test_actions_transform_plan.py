@@ -0,0 +1,167 @@
+"""Tests for the compiled whole-ingester transformer plan."""
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401  # settle import cycles
+from src.models import Ingester, ResourceField
+
+# the module, shadowed on src.actions by its transform function
+tf = sys.modules["src.actions.transform"]
+
+CACHED = {"BTC.idx": 2.0, "ETH.idx": None}
+
+
+def make_ingester(name: str = "ing", **values) -> Ingester:
+  fields = [
+      ResourceField(name="ts", type="timestamp", value=None),
+      ResourceField(name="a", type="float64", value=values.get("a", 3.0)),
+      ResourceField(name="b",
+                    type="float64",
+                    value=values.get("b", 4.0),
+                    transformers=["{self} * 2", "{self} + {a}"]),
+      ResourceField(name="c",
+                    type="float64",
+                    value=values.get("c", 1.0),
+                    transformers=["{b} / {d}"]),
+      ResourceField(name="d",
+                    type="float64",
+                    value=values.get("d", 2.0),
+                    transformers=["{self} - 1"]),
+      ResourceField(name="e",
+                    type="float64",
+                    value=values.get("e", 5.0),
+                    transformers=["{self} * {BTC.idx}"]),
+      ResourceField(name="f",
+                    type="float64",
+                    value=values.get("f", 5.0),
+                    transformers=["{self} + {ETH.idx}"]),
+      ResourceField(name="g",
+                    type="float64",
+                    value=values.get("g", 1.0),
+                    transformers=["{missing} + 1"]),
+      ResourceField(name="h",
+                    type="float64",
+                    value=values.get("h", None),
+                    transformers=["{self} + 1"]),
+      ResourceField(name="i",
+                    type="string",
+                    value=values.get("i", "x"),
+                    transformers=["{self} / 2"]),
+      ResourceField(name="j",
+                    type="float64",
+                    value=values.get("j", 9.0),
+                    transformers=["round(sqrt({self}), 2)"]),
+  ]
+  return Ingester(name=name, fields=fields)
+
+
+async def cached_batch(refs):
+  return {ref: CACHED.get(ref) for ref in refs}
+
+
+async def legacy_transform_all(ing: Ingester) -> None:
+  """Field by field evaluation the plan must reproduce"""
+  for f in ing.fields:
+    if f.name not in tf.SYS_FIELDS:
+      await tf.transform(ing, f)
+
+
+@pytest.fixture
+def env():
+  batch = AsyncMock(side_effect=cached_batch)
+  with patch.object(tf, "get_cached_field_values_batch", batch), \
+      patch.object(tf, "state", Mock(args=Mock(verbose=False))):
+    yield batch
+
+
+class TestTransformPlan:
+
+  @pytest.mark.asyncio
+  async def test_matches_field_by_field(self, env):
+    for values in ({}, {"d": 1.0}, {"a": 1, "b": 2}, {"h": 1.5, "i": 4.0}):
+      expected, ing = make_ingester(**values), make_ingester(**values)
+      await legacy_transform_all(expected)
+      count = await tf.transform_all(ing)
+      assert ing.get_field_values() == expected.get_field_values()
+      assert count == len(ing.fields)
+
+    await tf.transform_all(ing := make_ingester())
+    values = ing.get_field_values()
+    assert values["b"] == 11.0  # chain: 4*2 + a
+    assert values["c"] == 5.5  # later field d read before its transform
+    assert values["e"] == 10.0
+    assert values["f"] is None  # unresolved cached reference
+    assert values["g"] == 1.0  # missing reference keeps the value
+    assert values["h"] is None
+    assert values["i"] == "x"  # execution error keeps the value
+
+  @pytest.mark.asyncio
+  async def test_cached_refs_fetched_once(self, env):
+    await tf.transform_all(make_ingester())
+    env.assert_awaited_once_with({"BTC.idx", "ETH.idx"})
+
+  @pytest.mark.asyncio
+  async def test_failed_fetch_nulls_fields(self, env):
+    env.side_effect = ConnectionError("down")
+    ing = make_ingester()
+    count = await tf.transform_all(ing)
+    assert ing.get_field("e").value is None
+    assert ing.get_field("f").value is None
+    assert count == len(ing.fields) - 2
+
+  def test_plan_shared_by_schema(self):
+    plan = tf.compile_plan(make_ingester("x"))
+    assert tf.compile_plan(make_ingester("y", a=7.0)) is plan
+    vectorized = [s.slot for s in plan.steps if s.reads is not None]
+    assert {plan.names[i]
+            for i in vectorized} == {"b", "c", "d", "e", "f", "h", "i"}
+
+  @pytest.mark.asyncio
+  @pytest.mark.parametrize("extra", [[], [{"a": 2, "b": 3}, {"h": 0.5}]])
+  async def test_batch_matches_scalar(self, env, extra):
+    # d == 0 divides by zero, scalar evaluation keeps c
+    specs = [{"a": float(n), "b": n / 3, "d": float(n % 3)} for n in range(40)]
+    specs += [{"b": float("inf")}] + extra
+    expected = [make_ingester(f"i{n}", **s) for n, s in enumerate(specs)]
+    for ing in expected:
+      await tf.transform_all(ing)
+    ings = [make_ingester(f"i{n}", **s) for n, s in enumerate(specs)]
+    with patch.object(tf.TransformPlan,
+                      "_run_vector",
+                      side_effect=tf.TransformPlan._run_vector,
+                      autospec=True) as vector:
+      counts = await tf.transform_batch(ings)
+    assert vector.called
+    assert counts == [len(ings[0].fields)] * len(ings)
+    for ing, exp in zip(ings, expected):
+      got, want = ing.get_field_values(), exp.get_field_values()
+      assert got == want
+      assert list(map(type, got.values())) == list(map(type, want.values()))
+
+  @pytest.mark.asyncio
+  async def test_batch_keeps_scalar_signed_zeros(self, env):
+    # numpy's pow of -0.0 keeps its sign, python's does not
+    def ingester(name: str, value: float) -> Ingester:
+      return Ingester(name=name,
+                      fields=[
+                          ResourceField(name="ts", type="timestamp"),
+                          ResourceField(
+                              name="k",
+                              type="float64",
+                              value=value,
+                              transformers=["-{self}", "{self} ** 0.5"])
+                      ])
+
+    values = [0.0, 4.0, 9.0]
+    expected = [ingester(f"i{n}", v) for n, v in enumerate(values)]
+    for ing in expected:
+      await tf.transform_all(ing)
+    ings = [ingester(f"i{n}", v) for n, v in enumerate(values)]
+    await tf.transform_batch(ings)
+    got = [str(ing.get_field("k").value) for ing in ings]
+    assert got == [str(ing.get_field("k").value) for ing in expected]
@@ -1,5 +1,7 @@
 """Tests for adapters.evm_rpc module."""
+import asyncio
 import pytest
+import pytest_asyncio
 import sys
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
@@ -19,7 +21,10 @@ EVM_AVAILABLE = all(
 # Only import if dependencies are available
 if EVM_AVAILABLE:
   from hexbytes import HexBytes
-  from src.adapters.evm_rpc import EvmRpcClient
+  from src.adapters.evm_rpc import (EvmRpcClient, LogWindows, oversized,
+                                    stream_logs)
+  from src.utils.http import _http_client
+  from tests.rpc_server import RpcError, RpcServer
 
 
 @pytest.mark.skipif(
@@ -599,3 +604,112 @@ class TestEvmRpcClient:
       result = await client.verify_transaction("tx_hash", "address")
 
       assert result is False
+
+
+def chain_logs(blocks: int, per_block: int, cap: int, delay_over: int = 0):
+  """eth_getLogs of a chain with `per_block` logs per block, answering
+  "too many results" past `cap` logs (and slowly past `delay_over` blocks)"""
+
+  async def get_logs(params):
+    lo, hi = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+    if (hi - lo + 1) * per_block > cap:
+      raise RpcError(f"query returned more than {cap} results")
+    if delay_over and hi - lo + 1 > delay_over:
+      await asyncio.sleep(1)
+    return [{
+        "blockNumber": hex(b),
+        "logIndex": hex(i)
+    } for b in range(lo,
+                     min(hi, blocks - 1) + 1) for i in range(per_block)]
+
+  return {"eth_getLogs": get_logs}
+
+
+@pytest_asyncio.fixture
+async def rpc_args():
+  with patch("src.state.args", create=True) as args:
+    args.ingestion_timeout = 5
+    yield args
+  await _http_client.close()
+
+
+@pytest.mark.skipif(not EVM_AVAILABLE,
+                    reason="EVM dependencies not available (eth_utils)")
+class TestLogWindows:
+  """Test the adaptive eth_getLogs windows."""
+
+  def test_oversized(self):
+    assert oversized(asyncio.TimeoutError()) == 0
+    assert oversized(Exception("query returned more than 10000 results")) == 0
+    assert oversized(
+        Exception("Log response size exceeded. this block range should work: "
+                  "[0x10, 0x4f]")) == 64
+    assert oversized(Exception("429 Too Many Requests")) is None
+    assert oversized(Exception("connection refused")) is None
+
+  def test_sizing(self):
+    windows = LogWindows(size=1000, max_size=4000, target=100)
+    assert windows.shrink(1000) == 500
+    assert windows.shrink(500, suggested=120) == 120
+    windows.observe(120, 400)  # dense: fit to the target
+    assert windows.size == 30
+    windows.observe(30, 0)  # empty: double
+    assert windows.size == 60
+    windows.observe(60, 10)  # sparse: grow towards the target
+    assert windows.size == 300
+    windows.observe(300, 1)
+    assert windows.size == 4000
+    windows.observe(100, 0)  # smaller than the current size (eg. chain head)
+    assert windows.size == 4000
+
+  @pytest.mark.asyncio
+  async def test_stream_logs_adapts(self, rpc_args):
+    async with RpcServer(chain_logs(1000, 5, 1000)) as a, \
+        RpcServer(chain_logs(1000, 5, 1000)) as b:
+      clients = [EvmRpcClient(a.url), EvmRpcClient(b.url)]
+      windows = LogWindows(size=2000, target=500)
+      seen = []
+      async for lo, hi, logs in stream_logs(clients, {"address": "0x1"},
+                                            0,
+                                            999,
+                                            windows,
+                                            concurrency=3):
+        assert len(logs) == (hi - lo + 1) * 5
+        seen.extend(int(log["blockNumber"], 16) for log in logs[::5])
+    assert sorted(seen) == list(range(1000))  # every block exactly once
+    assert windows.size <= 200
+    assert a.calls and b.calls  # windows spread across endpoints
+    assert a.calls[0][1][0]["address"] == "0x1"
+
+  @pytest.mark.asyncio
+  async def test_stream_logs_timeouts_and_retries(self, rpc_args):
+    methods = chain_logs(100, 1, 10**6, delay_over=25)
+    get_logs, failures = methods["eth_getLogs"], [1]
+
+    async def flaky(params):
+      if failures and params[0]["fromBlock"] == "0x0":
+        failures.pop()
+        raise RpcError("internal error")
+      return await get_logs(params)
+
+    methods["eth_getLogs"] = flaky
+    async with RpcServer(methods) as server:
+      windows = LogWindows(size=100, target=25)  # 1 log per block
+      blocks = []
+      async for lo, hi, logs in stream_logs([EvmRpcClient(server.url)], {},
+                                            0,
+                                            99,
+                                            windows,
+                                            timeout=0.3):
+        blocks.extend(range(lo, hi + 1))
+      assert sorted(blocks) == list(range(100))
+      assert windows.size == 25  # 100 and 50 blocks windows timed out
+
+      failures.extend([1] * 5)  # persistent failure
+      with pytest.raises(Exception, match="blocks 0-9"):
+        async for _ in stream_logs([EvmRpcClient(server.url)], {},
+                                   0,
+                                   9,
+                                   LogWindows(size=10),
+                                   max_retries=2):
+          pass
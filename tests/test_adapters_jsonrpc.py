@@ -0,0 +1,131 @@
+"""Tests for the batched and coalesced calls of adapters.jsonrpc."""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.adapters import jsonrpc
+from src.adapters.jsonrpc import JsonRpcClient, JsonRpcError
+from src.utils.http import _http_client
+from tests.rpc_server import NO_ANSWER, RpcError, RpcServer
+
+
+def square(params):
+  if params[0] % 7 == 0:
+    raise RpcError(f"{params[0]} is unlucky", -32001)
+  return params[0]**2
+
+
+def batch_sizes(server: RpcServer) -> list[int]:
+  return [len(r) if isinstance(r, list) else 1 for r in server.requests]
+
+
+@pytest_asyncio.fixture
+async def rpc_args():
+  with patch("src.state.args", create=True) as args:
+    args.ingestion_timeout = 5
+    yield args
+  await _http_client.close()
+  jsonrpc._unbatched.clear()
+
+
+class TestBatch:
+
+  @pytest.mark.asyncio
+  async def test_results_in_order(self, rpc_args):
+    async with RpcServer({"square": square}) as server:
+      client = JsonRpcClient(server.url, max_batch=4)
+      calls = [("square", [i]) for i in range(1, 11)]
+      results = await client.batch(calls, return_exceptions=True)
+      assert batch_sizes(server) == [4, 4, 2]
+      assert results[:6] == [1, 4, 9, 16, 25, 36]
+      assert isinstance(results[6], JsonRpcError)
+      assert results[6].code == -32001
+      assert results[7:] == [64, 81, 100]
+      with pytest.raises(JsonRpcError, match="7 is unlucky"):
+        await client.batch(calls[5:8])
+
+  @pytest.mark.asyncio
+  async def test_missing_answers(self, rpc_args):
+    methods = {"square": square, "lost": lambda params: NO_ANSWER}
+    async with RpcServer(methods) as server:
+      client = JsonRpcClient(server.url)
+      results = await client.batch([("square", [2]), ("lost", [])],
+                                   return_exceptions=True)
+      assert results[0] == 4
+      # not answered by the endpoint: not a JsonRpcError (failed over)
+      assert not isinstance(results[1], JsonRpcError)
+      assert "missing response" in str(results[1])
+
+  @pytest.mark.asyncio
+  async def test_unsupported_batches(self, rpc_args):
+    async with RpcServer({"square": square}, batches=False) as server:
+      client = JsonRpcClient(server.url)
+      assert await client.batch([("square", [2]), ("square", [3])]) == [4, 9]
+      assert await client.batch([("square", [4]), ("square", [5])]) == [16, 25]
+      # single calls once the endpoint is known not to support batches
+      assert batch_sizes(server) == [2, 1, 1, 1, 1]
+
+
+class TestCoalescing:
+
+  @pytest.mark.asyncio
+  async def test_gathered_calls_batched(self, rpc_args):
+    async with RpcServer({"square": square}) as server:
+      client = JsonRpcClient(server.url, coalesce=True, max_batch=50)
+      other = JsonRpcClient(server.url, coalesce=True, max_batch=50)
+      results = await asyncio.gather(*(c.call(
+          "square", [i]) for i, c in enumerate([client, other] * 60, 1)),
+                                     return_exceptions=True)
+      assert batch_sizes(server) == [50, 50, 20]
+      for i, result in enumerate(results, 1):
+        if i % 7:
+          assert result == i**2
+        else:  # only the failing calls raise
+          assert isinstance(result, JsonRpcError)
+
+  @pytest.mark.asyncio
+  async def test_coalesced_by_config(self, rpc_args):
+    async with RpcServer({"square": square}) as server:
+      client = JsonRpcClient(server.url, coalesce=True)
+      keyed = JsonRpcClient(server.url,
+                            headers={
+                                "Content-Type": "application/json",
+                                "X-API-KEY": "k"
+                            },
+                            coalesce=True)
+      alike = JsonRpcClient(server.url, coalesce=True)
+      await asyncio.gather(*(c.call("square", [i])
+                             for i, c in enumerate([client, keyed, alike], 1)))
+      # calls only batched with those of clients configured alike
+      batches = [[c["params"][0] for c in (r if isinstance(r, list) else [r])]
+                 for r in server.requests]
+      assert sorted(batches) == [[1, 3], [2]]
+
+  @pytest.mark.asyncio
+  async def test_single_call(self, rpc_args):
+    async with RpcServer({"square": square}) as server:
+      client = JsonRpcClient(server.url, coalesce=True)
+      assert await client.call("square", [3]) == 9
+      assert await client.call("square", [4]) == 16
+      assert server.requests == [{
+          "jsonrpc": "2.0",
+          "method": "square",
+          "params": [i],
+          "id": i - 2
+      } for i in (3, 4)]
+
+  @pytest.mark.asyncio
+  async def test_failed_request(self, rpc_args):
+    async with RpcServer({"square": square}) as server:
+      url = server.url
+    client = JsonRpcClient(url, coalesce=True)
+    results = await asyncio.gather(*(client.call("square", [i])
+                                     for i in range(1, 4)),
+                                   return_exceptions=True)
+    assert all("Failed to connect" in str(r) for r in results)
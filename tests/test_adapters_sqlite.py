@@ -257,3 +257,31 @@ class TestSQLiteAdapter:
       assert adapter.db == "new.db"
       mock_close.assert_called_once()
       mock_ensure.assert_called_once()
+
+
+class TestSQLiteKeysetPagination:
+  """Test keyset pagination against a real SQLite database."""
+
+  @pytest.mark.asyncio
+  async def test_fetch_page(self, tmp_path):
+    """Test pages follow (updated_at, uid) descending without overlap."""
+    adapter = SQLite(db=str(tmp_path / "pages.db"))
+    await adapter.ensure_connected()
+    await adapter._execute(
+        "CREATE TABLE users (uid TEXT, updated_at TEXT, name TEXT)")
+    rows = [(f"u{i:02}", f"2024-01-0{1 + i // 4}", f"n{i}") for i in range(10)]
+    await adapter._executemany("INSERT INTO users VALUES (?, ?, ?)", rows)
+
+    seen, after = [], None
+    while True:
+      columns, page = await adapter.fetch_page("users", 3, after)
+      assert columns == ["uid", "updated_at", "name"]
+      seen += [r[0] for r in page]
+      if len(page) < 3:
+        break
+      after = (page[-1][1], page[-1][0])
+    await adapter.close()
+
+    assert seen == [
+        r[0] for r in sorted(rows, key=lambda r: (r[1], r[0]), reverse=True)
+    ]
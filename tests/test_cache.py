@@ -1,4 +1,5 @@
 """Tests for src.cache module."""
+import asyncio
 import pytest
 import sys
 from pathlib import Path
@@ -9,6 +10,169 @@ import pickle
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src import cache
+from src.utils import codec
+
+
+class FakeRedis:
+  """Dict-backed subset of the redis.asyncio client"""
+
+  def __init__(self):
+    self.data: dict = {}
+    self.ttls: dict = {}
+    self.hashes: dict = {}
+    self.zsets: dict = {}
+    self.streams: dict = {}
+    self.groups: dict = {}
+    self.acked: list = []
+
+  def pipeline(self, transaction=True):
+    return FakePipeline(self)
+
+  async def setex(self, key, expiry, value):
+    self.data[key], self.ttls[key] = value, expiry
+    return True
+
+  async def set(self, key, value, ex=None, nx=False):
+    if nx and key in self.data:
+      return None
+    return await self.setex(key, ex, value)
+
+  async def get(self, key):
+    return self.data.get(key)
+
+  async def delete(self, *keys):
+    return sum(self.data.pop(k, None) is not None for k in keys)
+
+  async def exists(self, key):
+    return int(key in self.data or key in self.hashes)
+
+  async def ttl(self, key):
+    key = key.decode() if isinstance(key, bytes) else key
+    return self.ttls.get(key) or -1 if key in self.data else -2
+
+  async def expire(self, key, expiry):
+    return True
+
+  async def hset(self, key, mapping):
+    self.hashes.setdefault(key, {}).update(mapping)
+    return len(mapping)
+
+  async def hmget(self, key, fields):
+    return [self.hashes.get(key, {}).get(f) for f in fields]
+
+  async def hgetall(self, key):
+    return {
+        k.encode(): v if isinstance(v, bytes) else str(v).encode()
+        for k, v in self.hashes.get(key, {}).items()
+    }
+
+  async def hlen(self, key):
+    return len(self.hashes.get(key, {}))
+
+  async def hincrby(self, key, field, amount=1):
+    h = self.hashes.setdefault(key, {})
+    h[field] = h.get(field, 0) + amount
+    return h[field]
+
+  async def incr(self, key):
+    self.data[key] = self.data.get(key, 0) + 1
+    return self.data[key]
+
+  async def zadd(self, key, mapping):
+    self.zsets.setdefault(key, {}).update(mapping)
+    return len(mapping)
+
+  async def zrem(self, key, *members):
+    zset = self.zsets.get(key, {})
+    return sum(
+        zset.pop(m.decode() if isinstance(m, bytes) else m, None) is not None
+        for m in members)
+
+  async def zremrangebyscore(self, key, low, high):
+    zset = self.zsets.get(key, {})
+    expired = [m for m, score in zset.items() if score <= float(high)]
+    for m in expired:
+      del zset[m]
+    return len(expired)
+
+  async def zrange(self, key, start, stop):
+    zset = self.zsets.get(key, {})
+    return [m.encode() for m in sorted(zset, key=zset.get)]
+
+  async def xadd(self, key, fields, maxlen=None, approximate=True):
+    stream = self.streams.setdefault(key, [])
+    entry_id = f"{len(stream) + 1}-0".encode()
+    stream.append((entry_id, {k.encode(): v for k, v in fields.items()}))
+    return entry_id
+
+  def _after(self, key, last_id):
+    seq = int(last_id.split("-")[0]) if last_id != "$" else len(
+        self.streams.get(key, []))
+    return self.streams.get(key, [])[seq:]
+
+  async def xread(self, streams, count=None, block=None):
+    reply = [[k.encode(), self._after(k, i)[:count]]
+             for k, i in streams.items()]
+    return [r for r in reply if r[1]]
+
+  async def xrevrange(self, key, count=None):
+    return list(reversed(self.streams.get(key, [])))[:count]
+
+  async def xgroup_create(self, key, group, id="$", mkstream=False):
+    from redis.exceptions import ResponseError
+    if (key, group) in self.groups:
+      raise ResponseError("BUSYGROUP Consumer Group name already exists")
+    self.streams.setdefault(key, [])
+    self.groups[(key, group)] = f"{len(self.streams[key])}-0" if id == "$" \
+        else id
+
+  async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+    reply = []
+    for key in streams:
+      entries = self._after(key, self.groups[(key, group)])[:count]
+      if entries:
+        self.groups[(key, group)] = entries[-1][0].decode()
+        reply.append([key.encode(), entries])
+    return reply
+
+  async def xack(self, key, group, *ids):
+    self.acked.extend(ids)
+    return len(ids)
+
+  async def eval(self, script, numkeys, key, token):
+    if self.data.get(key) == token:
+      return await self.delete(key)
+    return 0
+
+  async def scan_iter(self, match, count=None):
+    from fnmatch import fnmatchcase
+    for key in list(self.data):
+      if fnmatchcase(key, match):
+        yield key.encode()
+
+
+class FakePipeline:
+  """Queues commands, executed in order against a FakeRedis"""
+
+  def __init__(self, redis: FakeRedis):
+    self.redis = redis
+    self.queued: list = []
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *exc):
+    return False
+
+  def __getattr__(self, name):
+    return lambda *args, **kwargs: self.queued.append((name, args, kwargs))
+
+  async def execute(self):
+    queued, self.queued = self.queued, []
+    return [
+        await getattr(self.redis, name)(*args, **kwargs)
+        for name, args, kwargs in queued
+    ]
 
 
 class TestCacheModule:
@@ -55,12 +219,14 @@ class TestCacheModule:
          patch('src.cache.log_debug') as mock_log_debug:
       mock_state.args.verbose = True
       mock_state.args.proc_id = "worker_1"
-      mock_state.redis.setex = AsyncMock(return_value=True)
+      mock_state.redis = FakeRedis()
 
       result = await cache.claim_task(mock_ingester, until=120)
 
       assert result is True
-      mock_state.redis.setex.assert_called_once()
+      assert mock_state.redis.data[cache.claim_key(mock_ingester)] == "worker_1"
+      assert "test_ingester:m1" in mock_state.redis.zsets[cache.index_key(
+          "claims")]
       mock_log_debug.assert_called_once()
 
   @pytest.mark.asyncio
@@ -137,15 +303,21 @@ class TestCacheModule:
   async def test_free_task_success(self):
     """Test successful task release."""
     mock_ingester = Mock()
+    mock_ingester.name = "test_ingester"
+    mock_ingester.interval = "m1"
 
     with patch('src.cache.state') as mock_state, \
          patch('src.cache.is_task_claimed', return_value=True):
       mock_state.args.proc_id = "worker_1"
-      mock_state.redis.get = AsyncMock(return_value=b"worker_1")
-      mock_state.redis.delete = AsyncMock(return_value=True)
+      mock_state.redis = FakeRedis()
+      await mock_state.redis.setex(cache.claim_key(mock_ingester), 60,
+                                   b"worker_1")
+      await mock_state.redis.zadd(cache.index_key("claims"),
+                                  {"test_ingester:m1": 1e12})
 
       result = await cache.free_task(mock_ingester)
       assert result is True
+      assert not mock_state.redis.zsets[cache.index_key("claims")]
 
   @pytest.mark.asyncio
   async def test_free_task_not_owned(self):
@@ -215,11 +387,11 @@ class TestCacheModule:
   async def test_cache_string_value(self):
     """Test caching string value."""
     with patch('src.cache.state') as mock_state:
-      mock_state.redis.setex = AsyncMock(return_value=True)
+      mock_state.redis = FakeRedis()
 
       result = await cache.cache("test_key", "test_value", expiry=3600)
       assert result is True
-      mock_state.redis.setex.assert_called_once()
+      assert mock_state.redis.data[cache.cache_key("test_key")] == "test_value"
 
   @pytest.mark.asyncio
   async def test_cache_pickled_value(self):
@@ -227,15 +399,14 @@ class TestCacheModule:
     test_data = {"key": "value", "number": 42}
 
     with patch('src.cache.state') as mock_state:
-      mock_state.redis.setex = AsyncMock(return_value=True)
+      mock_state.redis = FakeRedis()
 
       result = await cache.cache("test_key", test_data, pickled=True)
       assert result is True
 
       # Verify pickled data was passed
-      call_args = mock_state.redis.setex.call_args[0]
-      assert call_args[0] == f"{cache.NS}:cache:test_key"
-      assert isinstance(call_args[2], bytes)  # Should be pickled
+      value = mock_state.redis.data[f"{cache.NS}:cache:test_key"]
+      assert isinstance(value, bytes)  # Should be pickled
 
   @pytest.mark.asyncio
   async def test_cache_batch(self):
@@ -388,9 +559,7 @@ class TestCacheModule:
   @pytest.mark.asyncio
   async def test_get_active_instances(self):
     """Test getting active instances from monitoring data."""
-    mock_keys = [
-        b"chomp:cache:instance1.monitor", b"chomp:cache:resource1.monitor"
-    ]
+    monitors = ["instance1.monitor", "resource1.monitor"]
     mock_instance_data = {
         "instance_name": "instance1",
         "ts": "2024-01-01T00:00:00Z",
@@ -400,16 +569,21 @@ class TestCacheModule:
         "location": "New York, NY, USA"
     }
 
-    with patch('src.cache.state') as mock_state, \
-         patch('src.cache.get_cache') as mock_get_cache:
-      mock_state.redis.keys.return_value = mock_keys
-      mock_get_cache.return_value = mock_instance_data
+    with patch('src.cache.get_index', new_callable=AsyncMock,
+               return_value=monitors) as mock_index, \
+         patch('src.cache.get_cache_batch', new_callable=AsyncMock,
+               return_value={
+                   "instance1.monitor": mock_instance_data,
+                   "resource1.monitor": {"latency_ms": 1}
+               }):
 
       result = await cache.get_active_instances()
 
       assert "instance1" in result
       assert result["instance1"]["status"] == "active"
       assert result["instance1"]["cpu_usage"] == 25.5
+      assert "resource1" not in result
+      mock_index.assert_called_once_with("monitors")
 
   @pytest.mark.asyncio
   async def test_get_ingester_status(self):
@@ -461,12 +635,21 @@ class TestCacheModule:
   @pytest.mark.asyncio
   async def test_get_cached_resources(self):
     """Test getting cached resources."""
-    with patch('src.cache.state') as mock_state:
-      mock_state.redis.keys = AsyncMock(
-          return_value=[b"chomp:status:resource1", b"chomp:status:resource2"])
+    with patch('src.cache.state') as mock_state, \
+         patch('src.cache.now') as mock_now:
+      mock_now.return_value.timestamp.return_value = 1000.0
+      mock_state.redis = FakeRedis()
+      await mock_state.redis.set(cache.index_key("repaired"), 1)
+      await mock_state.redis.zadd(cache.index_key("resources"), {
+          "resource1": 2000.0,
+          "resource2": 3000.0,
+          "expired": 500.0
+      })
 
       result = await cache.get_cached_resources()
       assert result == ["resource1", "resource2"]
+      assert "expired" not in mock_state.redis.zsets[cache.index_key(
+          "resources")]
 
   @pytest.mark.asyncio
   async def test_topic_exist_true(self):
@@ -489,3 +672,413 @@ class TestCacheModule:
       result = await cache.topics_exist(["topic1", "topic3"])
       expected = {"topic1": True, "topic3": False}
       assert result == expected
+
+
+class FakePubSub:
+  """Pattern subscription fed from a queue"""
+
+  def __init__(self):
+    import asyncio
+    self.queue: asyncio.Queue = asyncio.Queue()
+
+  async def psubscribe(self, *patterns):
+    pass
+
+  async def listen(self):
+    while True:
+      yield await self.queue.get()
+
+  async def close(self):
+    pass
+
+
+@pytest.fixture
+def l1():
+  """Active L1 over a mocked Redis holding one m1 ingester value"""
+  store = {cache.cache_key("feed"): pickle.dumps({"ts": 1, "price": 1.0})}
+  running = Mock()
+  running.done.return_value = False
+  cache.clear_l1()
+  with patch('src.cache.state') as mock_state, \
+       patch.object(cache, "_l1_task", running), \
+       patch.object(cache, "get_resource_intervals",
+                    AsyncMock(return_value={"feed": 60})):
+    mock_state.redis.get = AsyncMock(side_effect=lambda k: store.get(k))
+    mock_state.redis.mget = AsyncMock(
+        side_effect=lambda keys: [store.get(k) for k in keys])
+    yield mock_state, store
+  cache.clear_l1()
+
+
+class TestCacheL1:
+  """Test the in-process L1 of resource values."""
+
+  @pytest.mark.asyncio
+  async def test_repeated_reads_served_in_process(self, l1):
+    mock_state, _ = l1
+    first = await cache.get_cache("feed", pickled=True)
+    first["quote"] = "USDC.idx"  # callers decorate what they read
+    second = await cache.get_cache("feed", pickled=True)
+    assert second == {"ts": 1, "price": 1.0}
+    assert mock_state.redis.get.call_count == 1
+
+  @pytest.mark.asyncio
+  async def test_unregistered_and_raw_keys_bypass(self, l1):
+    mock_state, store = l1
+    store[cache.cache_key("user:1")] = pickle.dumps({"uid": 1})
+    for _ in range(2):
+      await cache.get_cache("user:1", pickled=True)
+      await cache.get_cache(cache.cache_key("feed"), pickled=True, raw_key=True)
+    assert mock_state.redis.get.call_count == 4
+
+  @pytest.mark.asyncio
+  async def test_ttl_bounded_by_interval(self, l1):
+    mock_state, _ = l1
+    with patch.object(cache, "monotonic", return_value=1000.0):
+      await cache.get_cache("feed", pickled=True)
+    with patch.object(cache, "monotonic", return_value=1059.0):
+      await cache.get_cache("feed", pickled=True)
+    assert mock_state.redis.get.call_count == 1
+    with patch.object(cache, "monotonic", return_value=1061.0):
+      await cache.get_cache("feed", pickled=True)
+    assert mock_state.redis.get.call_count == 2
+
+  @pytest.mark.asyncio
+  async def test_batch_mixes_hits_and_misses(self, l1):
+    mock_state, store = l1
+    store[cache.cache_key("other")] = pickle.dumps({"ts": 2})
+    await cache.get_cache("feed", pickled=True)
+    result = await cache.get_cache_batch(["other", "missing", "feed"],
+                                         pickled=True)
+    assert list(result) == ["other", "feed"]
+    assert mock_state.redis.mget.call_args[0][0] == [
+        cache.cache_key("other"), cache.cache_key("missing")
+    ]
+
+  @pytest.mark.asyncio
+  async def test_stale_in_flight_read_not_kept(self, l1):
+    mock_state, store = l1
+
+    async def slow_get(key):
+      cache.l1_invalidate("feed")  # published while the GET is in flight
+      return store[key]
+
+    mock_state.redis.get = AsyncMock(side_effect=slow_get)
+    await cache.get_cache("feed", pickled=True)
+    assert "feed" not in cache._l1
+
+  @pytest.mark.asyncio
+  async def test_listener_refreshes_from_pub(self, l1):
+    import asyncio
+    mock_state, _ = l1
+    pubsub = FakePubSub()
+    mock_state.redis.redis.pubsub.return_value = pubsub
+    with patch.object(cache, "CACHE_L1", True), \
+         patch.object(cache, "_l1_task", None):
+      cache.start_l1()
+      await asyncio.sleep(0)
+      await cache.get_cache("feed", pickled=True)
+      await pubsub.queue.put({
+          "type": "pmessage",
+          "channel": f"{cache.NS}:feed".encode(),
+          "data": pickle.dumps({"ts": 2, "price": 2.0})
+      })
+      await asyncio.sleep(0)
+      assert await cache.get_cache("feed", pickled=True) == {
+          "ts": 2,
+          "price": 2.0
+      }
+      assert mock_state.redis.get.call_count == 1
+      await cache.stop_l1()
+      assert not cache.l1_active()
+
+
+class TestCacheFields:
+  """Test the field hash layout of ingester values."""
+
+  VALUES = {"ts": 1, "bid": 1.5, "ask": 1.6, "venue": "x"}
+
+  @pytest.mark.asyncio
+  async def test_cache_values_writes_blob_and_hash(self):
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "CACHE_HASH", True):
+      mock_state.redis = FakeRedis()
+      assert await cache.cache_values("feed", self.VALUES)
+    redis = mock_state.redis
+    fields = redis.hashes[cache.fields_key("feed")]
+    assert {k: codec.decode(v) for k, v in fields.items()} == self.VALUES
+    assert codec.decode(redis.data[cache.cache_key("feed")]) == self.VALUES
+    assert "feed" in redis.zsets[cache.index_key("resources")]
+
+  @pytest.mark.asyncio
+  async def test_cache_values_without_hash(self):
+    with patch('src.cache.cache', new_callable=AsyncMock,
+               return_value=True) as mock_cache, \
+         patch.object(cache, "CACHE_HASH", False):
+      await cache.cache_values("feed", self.VALUES)
+      mock_cache.assert_called_once()
+
+  @pytest.mark.asyncio
+  async def test_get_cache_fields_hmget(self):
+    redis = FakeRedis()
+    redis.hashes[cache.fields_key("feed")] = {
+        k: codec.encode(v)
+        for k, v in self.VALUES.items()
+    }
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "CACHE_HASH", True), \
+         patch('src.cache.get_cache_batch', new_callable=AsyncMock,
+               return_value={"legacy": {"bid": 2.0, "ask": 2.1}}) as blob:
+      mock_state.redis = redis
+      result = await cache.get_cache_fields({
+          "feed": ["bid", "missing"],
+          "legacy": ["bid"],
+      })
+    assert result == {
+        "feed": {
+            "bid": 1.5,
+            "missing": None
+        },
+        "legacy": {
+            "bid": 2.0
+        }
+    }
+    blob.assert_called_once_with(["legacy"], pickled=True)
+
+  @pytest.mark.asyncio
+  async def test_get_cache_fields_from_blob_when_disabled(self):
+    with patch.object(cache, "CACHE_HASH", False), \
+         patch('src.cache.get_cache_batch', new_callable=AsyncMock,
+               return_value={"feed": self.VALUES}):
+      result = await cache.get_cache_fields({"feed": ["ask"], "gone": ["x"]})
+    assert result == {"feed": {"ask": 1.6}}
+
+
+class TestDiscoveryIndex:
+  """Test the discovery indexes and their SCAN repair."""
+
+  @pytest.mark.asyncio
+  async def test_repair_index_from_scan(self):
+    redis = FakeRedis()
+    await redis.setex(cache.cache_key("feed"), 60, b"v")
+    await redis.setex(cache.cache_key("sys.a.ins.monitor"), 60, b"v")
+    await redis.setex(f"{cache.NS}:claim:feed:m1", 60, b"worker_1")
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = redis
+      assert await cache.get_cached_resources() == [
+          "feed", "sys.a.ins.monitor"
+      ]
+      assert await cache.get_index("monitors") == ["sys.a.ins.monitor"]
+      assert await cache.get_claimed_tasks() == ["feed:m1"]
+      # throttled until the repair flag expires, unless forced
+      await redis.zadd(cache.index_key("resources"), {"deleted": 1e12})
+      assert not await cache.repair_index()
+      assert await cache.repair_index(force=True)
+      assert "deleted" not in redis.zsets[cache.index_key("resources")]
+
+  @pytest.mark.asyncio
+  async def test_cache_maintains_index(self):
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = FakeRedis()
+      await mock_state.redis.set(cache.index_key("repaired"), 1)
+      await cache.cache_batch({"a": 1, "b.monitor": {"x": 1}}, expiry=60)
+      await cache.cache("registry", {}, raw_key=True)
+      assert await cache.get_cached_resources() == ["a", "b.monitor"]
+      assert await cache.get_index("monitors") == ["b.monitor"]
+
+
+class TestRegistry:
+  """Test the registry hashes and their incremental reads."""
+
+  def setup_method(self):
+    cache._registries.clear()
+
+  @pytest.mark.asyncio
+  async def test_concurrent_registrations(self):
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = FakeRedis()
+      assert all(await asyncio.gather(
+          *(cache.register_item("ingesters", f"ing{i}", {"interval": "s10"})
+            for i in range(5))))
+      registry = await cache.get_registry("ingesters")
+    assert sorted(registry) == [f"ing{i}" for i in range(5)]
+    assert registry["ing0"] == {"interval": "s10"}
+
+  @pytest.mark.asyncio
+  async def test_incremental_reads(self):
+    redis = FakeRedis()
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = redis
+      await cache.register_item("ingesters", "a", {"v": 1})
+      await cache.register_item("ingesters", "b", {"v": 1})
+      assert await cache.get_registry("ingesters") == {
+          "a": {
+              "v": 1
+          },
+          "b": {
+              "v": 1
+          }
+      }
+
+      with patch.object(redis, "hmget", wraps=redis.hmget) as hmget, \
+           patch.object(redis, "hgetall", wraps=redis.hgetall) as hgetall:
+        # unchanged: counter and size only
+        registry = await cache.get_registry("ingesters")
+        registry["a"]["v"] = 0  # callers own their copies
+        assert (await cache.get_registry("ingesters"))["a"] == {"v": 1}
+        hgetall.assert_not_called()
+
+        await cache.register_item("ingesters", "b", {"v": 2})
+        assert (await cache.get_registry("ingesters"))["b"] == {"v": 2}
+        hmget.assert_called_once_with(cache.registry_key("ingesters"), ["b"])
+
+  @pytest.mark.asyncio
+  async def test_legacy_registry(self):
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = FakeRedis()
+      await cache.cache(cache.registry_key("ingesters"), {"old": {}},
+                        pickled=True)
+      assert await cache.get_registry("ingesters") == {"old": {}}
+
+
+class TestCheckpoints:
+  """Test the persisted ingester progress cursors."""
+
+  @pytest.mark.asyncio
+  async def test_roundtrip(self):
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = FakeRedis()
+      assert await cache.get_checkpoints("logs") == {}
+      cursor = {"block": 100, "hash": "0xab", "gaps": [[1, 50]]}
+      assert await cache.set_checkpoints("logs", {"1:0x1:0xt": cursor})
+      await cache.set_checkpoints("logs", {"1:0x1:0xu": {"block": 7}})
+      assert await cache.get_checkpoints("logs") == {
+          "1:0x1:0xt": cursor,
+          "1:0x1:0xu": {
+              "block": 7
+          }
+      }
+      mock_state.redis.hgetall = AsyncMock(side_effect=ConnectionError())
+      assert await cache.get_checkpoints("logs") == {}
+
+
+class TestStreams:
+  """Test the Redis Streams transport."""
+
+  @pytest.mark.asyncio
+  async def test_pub_appends_to_streams(self):
+    redis = FakeRedis()
+    redis.publish = AsyncMock(return_value=1)
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "STREAMS", True):
+      mock_state.redis = redis
+      assert await cache.pub(["a", "b"], {"v": 1}) == [1, 1]
+      await cache.pub("a", {"v": 2})
+      # resume after the last seen id
+      assert await cache.read_streams({"a": "1-0", "b": "0"}) == [
+          ("a", "2-0", {"v": 2}), ("b", "1-0", {"v": 1})
+      ]
+    assert redis.publish.call_count == 3
+
+  @pytest.mark.asyncio
+  async def test_pub_without_streams(self):
+    redis = FakeRedis()
+    redis.publish = AsyncMock(return_value=1)
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "STREAMS", False):
+      mock_state.redis = redis
+      await cache.pub("a", {"v": 1})
+    assert not redis.streams
+
+  @pytest.mark.asyncio
+  async def test_consumer_group(self):
+    redis = FakeRedis()
+    redis.publish = AsyncMock(return_value=1)
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "STREAMS", True):
+      mock_state.redis = redis
+      await cache.pub("a", {"v": 0})  # before the group, not delivered
+      await cache.ensure_group(["a"], "g")
+      await cache.ensure_group(["a"], "g")  # idempotent
+      await cache.pub("a", {"v": 1})
+      entries = await cache.read_group("g", "c", ["a"])
+      assert entries == [("a", "2-0", {"v": 1})]
+      await cache.ack("g", entries)
+      assert await cache.read_group("g", "c", ["a"]) == []
+    assert redis.acked == ["2-0"]
+
+
+  @pytest.mark.asyncio
+  async def test_stream_heads(self):
+    redis = FakeRedis()
+    redis.publish = AsyncMock(return_value=1)
+    with patch('src.cache.state') as mock_state, \
+         patch.object(cache, "STREAMS", True):
+      mock_state.redis = redis
+      await cache.pub("a", {"v": 0})
+      heads = await cache.stream_heads(["a", "b"])
+      assert heads == {"a": "1-0", "b": "0-0"}
+      await cache.pub(["a", "b"], {"v": 1})
+      # every reader gets the entries published since its heads
+      for _ in range(2):
+        assert await cache.read_streams(heads) == [("a", "2-0", {
+            "v": 1
+        }), ("b", "1-0", {
+            "v": 1
+        })]
+
+
+class TestSingleFlightCache:
+  """Test get_or_set_cache miss coalescing."""
+
+  @pytest.mark.asyncio
+  async def test_concurrent_misses_fetch_once(self):
+    calls = []
+
+    async def fetch():
+      calls.append(1)
+      await asyncio.sleep(0.01)
+      return "payload"
+
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = FakeRedis()
+      # coroutines created eagerly, as http_api does
+      results = await asyncio.gather(
+          *[cache.get_or_set_cache("url", fetch(), 60) for _ in range(5)])
+      assert results == ["payload"] * 5
+      assert len(calls) == 1
+      assert mock_state.redis.data[cache.cache_key("url")] == "payload"
+      assert cache.lock_key("url") not in mock_state.redis.data  # released
+
+  @pytest.mark.asyncio
+  async def test_waits_for_cluster_peer(self):
+    redis = FakeRedis()
+    await redis.set(cache.lock_key("url"), "peer")
+
+    async def peer_fills():
+      await asyncio.sleep(0.05)
+      await redis.setex(cache.cache_key("url"), 60, b"from peer")
+
+    def fetch():
+      raise AssertionError("peer holds the lock")
+
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = redis
+      filler = asyncio.create_task(peer_fills())
+      assert await cache.get_or_set_cache("url", fetch) == "from peer"
+      await filler
+
+  @pytest.mark.asyncio
+  async def test_peer_lock_released_without_value(self):
+    redis = FakeRedis()
+    await redis.set(cache.lock_key("url"), "peer")
+
+    async def peer_fails():
+      await asyncio.sleep(0.03)
+      await redis.delete(cache.lock_key("url"))
+
+    with patch('src.cache.state') as mock_state:
+      mock_state.redis = redis
+      failing = asyncio.create_task(peer_fails())
+      assert await cache.get_or_set_cache("url", lambda: "own") == "own"
+      await failing
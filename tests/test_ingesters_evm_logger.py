@@ -1,5 +1,9 @@
 """Tests for EVM logger ingester module."""
+import asyncio
 import pytest
+import pytest_asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, patch, AsyncMock
 import sys
 import os
@@ -15,9 +19,36 @@ EVM_AVAILABLE = web3 is not None
 
 # Only import if dependencies are available
 if EVM_AVAILABLE:
+  from eth_abi import encode
+  from web3 import Web3
+  from src import server  # noqa: F401  # settle import cycles
   from src.ingesters.evm_logger import (parse_event_signature, decode_log_data,
                                         reorder_decoded_params, schedule)
   from src.models import Ingester, ResourceField
+  from src.proxies import Web3Proxy
+  from src.utils.http import _http_client
+  from tests.rpc_server import RpcError, RpcServer
+
+  TRANSFER = "Transfer(indexed address,indexed address,uint256)"
+  TRANSFER_HASH = "0x" + bytes(
+      Web3.keccak(text="Transfer(address,address,uint256)")).hex()
+  CONTRACT = "1:0x" + "11" * 20
+
+  def transfer_log(block: int, sender: str, amount: int) -> dict:
+    return {
+        "address":
+        CONTRACT[2:],
+        "blockNumber":
+        hex(block),
+        "blockTimestamp":
+        hex(1_700_000_000 + block),
+        "topics": [
+            TRANSFER_HASH, "0x" + encode(["address"], [sender]).hex(),
+            "0x" + encode(["address"], ["0x" + "22" * 20]).hex()
+        ],
+        "data":
+        "0x" + encode(["uint256"], [amount]).hex()
+    }
 
 
 @pytest.mark.skipif(not EVM_AVAILABLE,
@@ -129,9 +160,7 @@ class TestEVMLogger:
 
     mock_ingester.fields = [mock_field]
 
-    with patch('src.ingesters.evm_logger.ensure_claim_task', new_callable=AsyncMock), \
-         patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
-         patch('src.ingesters.evm_logger.transform_and_store', new_callable=AsyncMock), \
+    with patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
          patch('src.ingesters.evm_logger.state') as mock_state:
 
       mock_state.args.verbose = False
@@ -166,9 +195,7 @@ class TestEVMLogger:
 
     mock_ingester.fields = [mock_field1, mock_field2]
 
-    with patch('src.ingesters.evm_logger.ensure_claim_task', new_callable=AsyncMock), \
-         patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
-         patch('src.ingesters.evm_logger.transform_and_store', new_callable=AsyncMock), \
+    with patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
          patch('src.ingesters.evm_logger.state') as mock_state, \
          patch('src.ingesters.evm_logger.split_chain_addr') as mock_split:
 
@@ -195,9 +222,7 @@ class TestEVMLogger:
     mock_ingester.name = "test_evm_logger"
     mock_ingester.fields = []
 
-    with patch('src.ingesters.evm_logger.ensure_claim_task', new_callable=AsyncMock), \
-         patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
-         patch('src.ingesters.evm_logger.transform_and_store', new_callable=AsyncMock), \
+    with patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
          patch('src.ingesters.evm_logger.state') as mock_state:
 
       mock_state.args.verbose = False
@@ -223,6 +248,292 @@ class TestEVMLogger:
     assert callable(schedule)
 
 
+@pytest_asyncio.fixture
+async def chain():
+  """Local chain RPC with transfers at blocks 120, 150 and 250, answering
+  "too many results" past 50 blocks, forked (new hashes) past `fork`"""
+  head, fork, failing = [100], [10**9], set()
+  logs = {
+      120: [transfer_log(120, "0x" + "aa" * 20, 10**18)],
+      150: [transfer_log(150, "0x" + "bb" * 20, 2 * 10**18)],
+      250: [
+          transfer_log(250, "0x" + "cc" * 20, 3 * 10**18), {
+              **transfer_log(250, "0x" + "cc" * 20, 1), "topics":
+              ["0x" + "00" * 32]
+          }
+      ]
+  }
+
+  def block_hash(block: int) -> str:
+    return f"0x{block + (10**6 if block >= fork[0] else 0):064x}"
+
+  def get_logs(params):
+    lo, hi = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+    assert params[0]["topics"] == [[TRANSFER_HASH]]
+    if hi - lo >= 50:
+      raise RpcError("query returned more than 10000 results")
+    if any(lo <= b <= hi for b in failing):
+      raise RpcError("internal error")
+    return [log for b in range(lo, hi + 1) for log in logs.get(b, [])]
+
+  def get_block(params):
+    block = int(params[0], 16)
+    return {
+        "number": hex(block),
+        "hash": block_hash(block),
+        "timestamp": hex(1_700_000_000 + block)
+    }
+
+  async with RpcServer({
+      "eth_blockNumber": lambda _: hex(head[0]),
+      "eth_getLogs": get_logs,
+      "eth_getBlockByNumber": get_block
+  }) as rpc:
+    rpc.head, rpc.fork, rpc.logs, rpc.block_hash = head, fork, logs, block_hash
+    rpc.failing = failing
+    yield rpc
+  await _http_client.close()
+
+
+def transfers_ingester():
+  fields = [
+      ResourceField(name="ts", type="timestamp"),
+      ResourceField(name="sender",
+                    type="string",
+                    target=CONTRACT,
+                    selector=TRANSFER,
+                    transformers=["{self}[0]"]),
+      ResourceField(name="amount",
+                    target=CONTRACT,
+                    selector=TRANSFER,
+                    transformers=["{self}[2] / 1e18"]),
+  ]
+  ing = Mock(spec=Ingester)
+  ing.name, ing.interval, ing.fields = "transfers", "s20", fields
+  ing.pre_ingest = AsyncMock()
+  return ing
+
+
+@contextmanager
+def logger_env(chain, confirmations: int = 0, checkpoints: dict = {}):
+  """Patched runtime of the evm_logger, yielding its mocked state"""
+  with patch('src.ingesters.evm_logger.scheduler') as mock_scheduler, \
+       patch('src.ingesters.evm_logger.state') as mock_state, \
+       patch('src.ingesters.evm_logger.cache_values', new_callable=AsyncMock), \
+       patch('src.ingesters.evm_logger.pub', new_callable=AsyncMock) as pub, \
+       patch('src.ingesters.evm_logger.get_checkpoints',
+             AsyncMock(return_value=checkpoints)), \
+       patch('src.ingesters.evm_logger.set_checkpoints',
+             new_callable=AsyncMock) as set_checkpoints, \
+       patch('src.ingesters.evm_logger.CONFIRMATIONS', confirmations), \
+       patch.dict(os.environ, {"HTTP_RPCS_1": chain.url}), \
+       patch('src.state.args', create=True) as args:
+    args.ingestion_timeout = mock_state.args.ingestion_timeout = 5
+    mock_state.args.verbose = False
+    mock_state.args.max_retries = 2
+    mock_state.web3 = Web3Proxy()
+    mock_state.tsdb.insert_many = AsyncMock()
+    mock_state.tsdb.delete_range = AsyncMock()
+    mock_state.pub, mock_state.set_checkpoints = pub, set_checkpoints
+    mock_scheduler.add_ingester = AsyncMock(return_value=Mock())
+    mock_state.scheduler = mock_scheduler
+    yield mock_state
+
+
+def inserted(mock_state) -> list[tuple]:
+  return sorted(row for call in mock_state.tsdb.insert_many.call_args_list
+                for row in call.args[1])
+
+
+def stamp(*blocks: int) -> list[datetime]:
+  return [
+      datetime.fromtimestamp(1_700_000_000 + b, timezone.utc) for b in blocks
+  ]
+
+
+@pytest.mark.skipif(not EVM_AVAILABLE,
+                    reason="EVM dependencies not available (web3)")
+class TestEVMLogsPipeline:
+  """Test the async eth_getLogs pipeline against a local RPC."""
+
+  @pytest.mark.asyncio
+  async def test_events_streamed_to_insert_many(self, chain):
+    ing = transfers_ingester()
+    with logger_env(chain) as mock_state:
+      await schedule(ing)
+      ingest = mock_state.scheduler.add_ingester.call_args.kwargs["fn"]
+
+      await ingest(ing)  # tails from the current head
+      assert not mock_state.tsdb.insert_many.called
+
+      chain.head[0] = 300
+      await ingest(ing)
+      ts = stamp(120, 150, 250)
+      assert inserted(mock_state) == [(ts[0], "0x" + "aa" * 20, 1.0),
+                                      (ts[1], "0x" + "bb" * 20, 2.0),
+                                      (ts[2], "0x" + "cc" * 20, 3.0)]
+      # the latest event published, windows split under the RPC's cap
+      assert mock_state.pub.called and {
+          f.name: f.value
+          for f in ing.fields
+      } == {
+          "ts": ts[2],
+          "sender": "0x" + "cc" * 20,
+          "amount": 3.0
+      }
+      windows = [(int(p[0]["fromBlock"], 16), int(p[0]["toBlock"], 16))
+                 for m, p in chain.calls if m == "eth_getLogs"]
+      assert windows[0] == (101, 300)
+      assert min(hi - lo for lo, hi in windows) < 50
+      # checkpointed as the windows complete, not only at the head
+      key = f"{CONTRACT}:{TRANSFER_HASH}"
+      blocks = [
+          c.args[1][key]["block"]
+          for c in mock_state.set_checkpoints.call_args_list
+      ][1:]
+      assert len(blocks) > 1 and blocks == sorted(blocks)
+      assert blocks[-1] == 300
+
+      mock_state.tsdb.insert_many.reset_mock()
+      await ingest(ing)  # no new blocks
+      assert not mock_state.tsdb.insert_many.called
+
+  @pytest.mark.asyncio
+  async def test_windows_stored_ahead_of_failure(self, chain):
+    key = f"{CONTRACT}:{TRANSFER_HASH}"
+    ing = transfers_ingester()
+    with logger_env(chain) as mock_state:
+      await schedule(ing)
+      ingest = mock_state.scheduler.add_ingester.call_args.kwargs["fn"]
+      checkpoints = lambda: [
+          c.args[1][key] for c in mock_state.set_checkpoints.call_args_list
+      ]
+      await ingest(ing)
+
+      # the window of block 120 failing after the later ones are stored
+      chain.failing.add(120)
+      chain.head[0] = 300
+      await ingest(ing)
+      assert inserted(mock_state) == [(stamp(250)[0], "0x" + "cc" * 20, 3.0)]
+      assert checkpoints()[-1] == {
+          "block": 300,
+          "hash": "",
+          "gaps": [[101, 150]]
+      }
+
+      # only the failed window replayed
+      chain.failing.clear()
+      await ingest(ing)
+      for _ in range(300):
+        if not checkpoints()[-1]["gaps"]:
+          break
+        await asyncio.sleep(0.01)
+      ts = stamp(120, 150, 250)
+      assert inserted(mock_state) == [(ts[0], "0x" + "aa" * 20, 1.0),
+                                      (ts[1], "0x" + "bb" * 20, 2.0),
+                                      (ts[2], "0x" + "cc" * 20, 3.0)]
+
+  @pytest.mark.asyncio
+  async def test_tail_events_stamped_by_block(self, chain):
+    chain.logs[150].append(transfer_log(150, "0x" + "dd" * 20, 4 * 10**18))
+    for logs in chain.logs.values():  # timestamps fetched with the blocks
+      for i, log in enumerate(logs):
+        del log["blockTimestamp"]
+        log["logIndex"] = hex(i)
+    ing = transfers_ingester()
+    with logger_env(chain) as mock_state:
+      await schedule(ing)
+      ingest = mock_state.scheduler.add_ingester.call_args.kwargs["fn"]
+      await ingest(ing)
+      chain.head[0] = 300
+      await ingest(ing)
+      # events of a block kept distinct by their position in its second
+      ts = stamp(120, 150, 150, 250)
+      assert [row[0] for row in inserted(mock_state)
+              ] == [ts[0], ts[1], ts[2] + timedelta(milliseconds=1), ts[3]]
+
+  @pytest.mark.asyncio
+  async def test_sub_second_blocks_stamped_apart(self, chain):
+    # blocks 150 and 151 sharing a second, large log indexes
+    chain.logs[150][0]["logIndex"] = hex(1500)
+    chain.logs[151] = [{
+        **transfer_log(151, "0x" + "dd" * 20, 4 * 10**18), "blockTimestamp":
+        hex(1_700_000_150),
+        "logIndex":
+        hex(1500)
+    }]
+    ing = transfers_ingester()
+    with logger_env(chain) as mock_state:
+      await schedule(ing)
+      ingest = mock_state.scheduler.add_ingester.call_args.kwargs["fn"]
+      await ingest(ing)
+      chain.head[0] = 300
+      await ingest(ing)
+      ts = stamp(120, 150, 150, 250)
+      assert [row[0] for row in inserted(mock_state)
+              ] == [ts[0], ts[1], ts[2] + timedelta(milliseconds=1), ts[3]]
+
+  @pytest.mark.asyncio
+  async def test_backfill_from_checkpoint_and_reorg(self, chain):
+    for logs in chain.logs.values():  # timestamps fetched with the blocks
+      for log in logs:
+        del log["blockTimestamp"]
+    key = f"{CONTRACT}:{TRANSFER_HASH}"
+    stored = {key: {"block": 100, "hash": chain.block_hash(100), "gaps": []}}
+    chain.head[0] = 300
+    ing = transfers_ingester()
+
+    with logger_env(chain, confirmations=10, checkpoints=stored) as mock_state, \
+        patch('src.ingesters.evm_logger.BACKFILL_CHUNK', 60):
+      await schedule(ing)
+      ingest = mock_state.scheduler.add_ingester.call_args.kwargs["fn"]
+      checkpoints = lambda: [
+          c.args[1][key] for c in mock_state.set_checkpoints.call_args_list
+      ]
+
+      # 190 blocks behind the confirmed head: backfilled, tailing resumed
+      await ingest(ing)
+      assert checkpoints()[0] == {
+          "block": 290,
+          "hash": chain.block_hash(290),
+          "gaps": [[101, 290]]
+      }
+      for _ in range(300):
+        if not checkpoints()[-1]["gaps"]:
+          break
+        await asyncio.sleep(0.01)
+      # replayed and checkpointed in chunks of 60 blocks
+      assert [c["gaps"] for c in checkpoints()] == [[[101, 290]], [[161, 290]],
+                                                    [[221, 290]], [[281, 290]],
+                                                    []]
+      ts = stamp(120, 150, 250)
+      assert [row[:2]
+              for row in inserted(mock_state)] == [(ts[0], "0x" + "aa" * 20),
+                                                   (ts[1], "0x" + "bb" * 20),
+                                                   (ts[2], "0x" + "cc" * 20)]
+
+      # reorg past the confirmations: the tail rewinds and re-ingests
+      chain.fork[0] = 285
+      chain.logs[287] = [transfer_log(287, "0x" + "dd" * 20, 4 * 10**18)]
+      chain.head[0] = 305
+      mock_state.tsdb.insert_many.reset_mock()
+      await ingest(ing)
+      # the events stored past the rewind point deleted, then re-ingested
+      mock_state.tsdb.delete_range.assert_awaited_once_with(
+          "transfers",
+          stamp(281)[0])
+      assert inserted(mock_state) == [(stamp(287)[0], "0x" + "dd" * 20, 4.0)]
+      assert checkpoints()[-1] == {
+          "block": 295,
+          "hash": chain.block_hash(295),
+          "gaps": []
+      }
+      tails = [(int(p[0]["fromBlock"], 16), int(p[0]["toBlock"], 16))
+               for m, p in chain.calls
+               if m == "eth_getLogs" and int(p[0]["toBlock"], 16) > 290]
+      assert tails[0][0] == 281  # rewound 10 blocks
+
+
 # Integration tests that don't require full dependencies
 class TestEVMLoggerIntegration:
   """Integration tests for EVM logger module."""
@@ -4,12 +4,15 @@ from unittest.mock import Mock, patch, AsyncMock
 import sys
 import os
 import orjson
+from contextlib import asynccontextmanager
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+from src.ingesters import http_api
 from src.ingesters.http_api import fetch_json
 from src.utils import http
+from src.utils.reflexion import compile_selectors
 
 
 class TestHTTPIngester:
@@ -127,3 +130,59 @@ class TestHTTPIngester:
   # The following tests for `schedule` remain unchanged as they test logic
   # independent of the underlying HTTP client implementation details.
   # They mock `fetch_json` or other parts that are now covered above.
+
+
+class TestHTTPStreaming:
+  """Test the streaming mode of the HTTP API ingester."""
+
+  @pytest.mark.asyncio
+  async def test_streams_until_resolved(self):
+    """Test the body is read only until every selector is resolved."""
+    pytest.importorskip("ijson")
+    raw = orjson.dumps({
+        "code": "0",
+        "data": [{
+            "id": "BTC"
+        }],
+        "rest": [0] * 64
+    })
+    body = [raw[i:i + 8] for i in range(0, len(raw), 8)]
+    read: list[bytes] = []
+
+    async def aiter_bytes(size):
+      for chunk in body:
+        read.append(chunk)
+        yield chunk
+
+    @asynccontextmanager
+    async def stream(method, url):
+      yield Mock(status_code=200, aiter_bytes=aiter_bytes)
+
+    monitor = Mock()
+    plan = compile_selectors(((".code", "code"), ("data[0].id", "id")))
+    with patch.object(http_api, "stream", stream), \
+        patch.object(http_api, "state", Mock(args=Mock(verbose=False))):
+      values = await http_api.fetch_selected("https://api",
+                                             plan,
+                                             max_retries=1,
+                                             monitor=monitor)
+    assert values == ["0", "BTC"]
+    assert len(read) < len(body)
+    monitor.stop_timer.assert_called_once_with(sum(map(len, read)), 200)
+
+  @pytest.mark.asyncio
+  async def test_http_error(self):
+    """Test HTTP errors are retried then reported as None."""
+    pytest.importorskip("ijson")
+
+    @asynccontextmanager
+    async def stream(method, url):
+      yield Mock(status_code=503)
+
+    plan = compile_selectors(((".code", "code"), ))
+    with patch.object(http_api, "stream", stream), \
+        patch.object(http_api, "log_error") as log_error, \
+        patch.object(http_api, "state", Mock(args=Mock(verbose=False))):
+      assert await http_api.fetch_selected("https://api", plan,
+                                           max_retries=2) is None
+    assert log_error.call_count == 2
@@ -9,7 +9,7 @@ import asyncio
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.ingesters.processor import load_handler, schedule
+from src.ingesters.processor import consume_dependencies, load_handler, schedule
 
 
 class TestProcessorIngester:
@@ -408,6 +408,31 @@ def handler(c, inputs):
     finally:
       os.unlink(temp_file)
 
+  @pytest.mark.asyncio
+  async def test_consume_dependencies(self):
+    """Test dependency messages consumed through the processor's group."""
+    mock_ingester = Mock()
+    mock_ingester.name = "proc"
+    batches = [[("a", "1-0", {"v": 1}), ("a", "2-0", {"v": 2})],
+               [("b", "1-0", {"v": 3})], []]
+
+    module = sys.modules[consume_dependencies.__module__]
+    with patch.object(module, 'state') as mock_state, \
+         patch.object(module, 'ensure_group',
+                      new_callable=AsyncMock) as mock_group, \
+         patch.object(module, 'read_group', new_callable=AsyncMock,
+                      side_effect=batches) as mock_read, \
+         patch.object(module, 'ack', new_callable=AsyncMock) as mock_ack:
+      mock_state.args.proc_id = "worker_1"
+      result = await consume_dependencies(mock_ingester, ["a", "b"], 30)
+
+    assert result == {"a": {"v": 2}, "b": {"v": 3}}
+    mock_group.assert_called_once_with(["a", "b"], "processor:proc")
+    assert mock_ack.call_count == 2
+    # blocks while waiting for "b", drains without blocking once all published
+    assert mock_read.call_args_list[1].args[4] > 0
+    assert mock_read.call_args_list[2].args[4] is None
+
   def test_processor_imports(self):
     """Test that all necessary imports work correctly."""
     import src.ingesters.processor
@@ -12,7 +12,7 @@ import orjson
 import websockets
 
 from src.ingesters.ws_api import schedule
-from src.models import ing, ResourceField
+from src.models import Ingester as ing, ResourceField
 from src.utils.date import now
 
 
@@ -35,14 +35,24 @@ class TestWebSocketIngester:
     mock_field.target_id = "ws_field_id"
     mock_field.selector = "data.price"
     mock_field.params = {"subscribe": "ticker"}
+    mock_field.headers = {}
     mock_field.handler = Mock(return_value=None)
     mock_field.reducer = Mock(return_value=100.0)
+    mock_field.topic = ""
     mock_field.transformers = []
     mock_field.value = None
 
     mock.fields = [mock_field]
     return mock
 
+  @pytest.fixture
+  def mock_manager(self):
+    """Patch the shared socket manager, recording the subscriptions."""
+    with patch('src.ingesters.ws_api.ws_manager') as manager:
+      manager.subscribe = AsyncMock(return_value=Mock(socket=Mock(
+          task=Mock())))
+      yield manager
+
   @pytest.fixture
   def mock_field_no_handler(self):
     """Create a mock field without a handler."""
@@ -54,29 +64,34 @@ class TestWebSocketIngester:
     mock_field.params = None
     mock_field.handler = None
     mock_field.reducer = None
+    mock_field.topic = ""
     mock_field.transformers = []
     mock_field.value = None
     return mock_field
 
   @pytest.mark.asyncio
-  async def test_schedule_basic_setup(self, mock_ingester):
+  async def test_schedule_basic_setup(self, mock_ingester, mock_manager):
     """Test basic WebSocket ingester scheduling."""
-    with patch('src.ingesters.ws_api.gather') as mock_gather, \
-         patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
+    with patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
          patch('src.ingesters.ws_api.state') as mock_state:
 
       mock_state.args.verbose = False
       mock_state.args.max_retries = 3
       mock_state.args.retry_cooldown = 1
       mock_task = Mock()
-      mock_scheduler.add_ingester.return_value = mock_task
+      mock_scheduler.add_ingester = AsyncMock(return_value=mock_task)
 
       result = await schedule(mock_ingester)
 
-      assert len(result) == 1
-      assert result[0] == mock_task
+      # the socket tasks are returned along the ingester's
+      sub = mock_manager.subscribe.return_value
+      assert result == [mock_task, sub.socket.task]
       mock_scheduler.add_ingester.assert_called_once()
-      mock_gather.assert_called_once()
+      mock_manager.subscribe.assert_awaited_once()
+      assert mock_manager.subscribe.call_args.args[:2] == (
+          "ws://example.com/stream", {
+              "subscribe": "ticker"
+          })
 
   @pytest.mark.asyncio
   async def test_schedule_missing_handler_error(self, mock_ingester,
@@ -88,13 +103,13 @@ class TestWebSocketIngester:
       await schedule(mock_ingester)
 
   @pytest.mark.asyncio
-  async def test_schedule_string_handler_conversion(self, mock_ingester):
+  async def test_schedule_string_handler_conversion(self, mock_ingester,
+                                                    mock_manager):
     """Test conversion of string handlers to callable functions."""
     mock_ingester.fields[0].handler = "lambda x, y: x"
     mock_ingester.fields[0].reducer = "lambda x: 42"
 
     with patch('src.ingesters.ws_api.safe_eval') as mock_safe_eval, \
-         patch('src.ingesters.ws_api.gather'), \
          patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
          patch('src.ingesters.ws_api.state') as mock_state:
 
@@ -102,7 +117,7 @@ class TestWebSocketIngester:
       mock_state.args.max_retries = 3
       mock_state.args.retry_cooldown = 1
       mock_safe_eval.return_value = Mock()
-      mock_scheduler.add_ingester.return_value = Mock()
+      mock_scheduler.add_ingester = AsyncMock(return_value=Mock())
 
       await schedule(mock_ingester)
 
@@ -111,104 +126,66 @@ class TestWebSocketIngester:
 
   @pytest.mark.asyncio
   async def test_schedule_duplicate_subscription_prevention(
-      self, mock_ingester):
+      self, mock_ingester, mock_manager):
     """Test that duplicate subscriptions are prevented."""
     # Create two fields with same target_id
     field1 = Mock(spec=ResourceField)
     field1.target = "ws://example.com/stream"
     field1.target_id = "same_id"
+    field1.params = None
+    field1.headers = {}
     field1.selector = "data.price"
     field1.handler = Mock()
     field1.reducer = Mock()
+    field1.topic = ""
     field1.transformers = []
 
     field2 = Mock(spec=ResourceField)
     field2.target = "ws://example.com/stream"
     field2.target_id = "same_id"  # Same ID
+    field2.params = None
+    field2.headers = {}
     field2.selector = "data.volume"
     field2.handler = Mock()
     field2.reducer = Mock()
+    field2.topic = ""
     field2.transformers = []
 
     mock_ingester.fields = [field1, field2]
 
-    with patch('src.ingesters.ws_api.gather') as mock_gather, \
-         patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
+    with patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
          patch('src.ingesters.ws_api.state') as mock_state:
 
       mock_state.args.verbose = False
-      mock_scheduler.add_ingester.return_value = Mock()
+      mock_scheduler.add_ingester = AsyncMock(return_value=Mock())
 
       await schedule(mock_ingester)
 
-      # Should only create one subscription task despite two fields
-      mock_gather.assert_called_once()
-      args = mock_gather.call_args[0]
-      assert len(args) == 1  # Only one subscription task
+      # Should only subscribe once despite two fields
+      mock_manager.subscribe.assert_awaited_once()
 
   @pytest.mark.asyncio
-  async def test_websocket_subscription_success(self, mock_ingester):
+  async def test_websocket_subscription_success(self, mock_ingester,
+                                                mock_manager):
     """Test successful WebSocket subscription and data handling."""
-    mock_ws = AsyncMock()
-    mock_ws.state = websockets.protocol.State.OPEN
-    mock_ws.recv.side_effect = [
-        '{"data": {"price": 100.5}}', '{"data": {"price": 101.0}}',
-        websockets.exceptions.ConnectionClosedError(None, None)
-    ]
-
-    with patch('src.ingesters.ws_api.websockets.connect', return_value=mock_ws) as mock_connect, \
-         patch('src.ingesters.ws_api.orjson.dumps') as mock_dumps, \
-         patch('src.ingesters.ws_api.select_nested') as mock_select, \
+    with patch('src.ingesters.ws_api.scheduler', add_ingester=AsyncMock()), \
          patch('src.ingesters.ws_api.state') as mock_state, \
-         patch('src.ingesters.ws_api.log_debug'), \
-         patch('src.ingesters.ws_api.log_error'):
+         patch('src.ingesters.ws_api.log_debug'):
 
       mock_state.args.verbose = True
-      mock_state.args.max_retries = 1
-      mock_state.args.retry_cooldown = 0.1
-      mock_dumps.return_value = b'{"subscribe": "ticker"}'
-      mock_select.return_value = 100.5
-
-      # Extract the subscribe function from schedule
-      tasks = []
-      with patch('src.ingesters.ws_api.gather') as mock_gather:
-        mock_gather.side_effect = lambda *args: tasks.extend(args)
-        await schedule(mock_ingester)
-
-      # Simulate running one of the subscription tasks
-      if tasks:
-        # This would run the subscribe coroutine
-        # We can't easily test the inner function without significant refactoring
-        pass
-
-      mock_connect.assert_called()
-
-  @pytest.mark.asyncio
-  async def test_websocket_connection_retry(self, mock_ingester):
-    """Test WebSocket connection retry logic."""
-    _ = AsyncMock()
-
-    with patch('src.ingesters.ws_api.websockets.connect') as mock_connect, \
-         patch('src.ingesters.ws_api.sleep'), \
-         patch('src.ingesters.ws_api.state') as mock_state, \
-         patch('src.ingesters.ws_api.log_error'):
-
-      mock_state.args.max_retries = 2
-      mock_state.args.retry_cooldown = 0.1
-      mock_connect.side_effect = [
-          websockets.exceptions.ConnectionClosedError(None, None),
-          websockets.exceptions.ConnectionClosedError(None, None),
-          websockets.exceptions.ConnectionClosedError(None, None),
-      ]
+      await schedule(mock_ingester)
 
-      # Test the retry logic by extracting and running the subscription function
-      tasks = []
-      with patch('src.ingesters.ws_api.gather') as mock_gather:
-        mock_gather.side_effect = lambda *args: tasks.extend(args)
-        await schedule(mock_ingester)
+      url, params, on_message = mock_manager.subscribe.call_args.args
+      assert url == "ws://example.com/stream"
+      assert params == {"subscribe": "ticker"}
+      # untopiced fields keep a socket of their own
+      assert mock_manager.subscribe.call_args.kwargs["shared"] is False
+      on_message({"data": {"price": 100.5}})
+      on_message({"data": {"price": 101.0}})
+      on_message({"result": None, "id": 1})
 
-      # The actual retry testing would require running the inner coroutine
-      # which is complex due to the nested function structure
+      handler = mock_ingester.fields[0].handler
+      assert [c.args[0] for c in handler.call_args_list] == [100.5, 101.0]
 
   @pytest.mark.asyncio
   async def test_data_collection_and_reduction(self, mock_ingester):
@@ -297,8 +274,8 @@ class TestWebSocketIngester:
     mock_field = mock_ingester.fields[0]
     mock_field.params = {"subscribe": "ticker", "symbol": "BTC/USD"}
 
-    with patch('src.ingesters.ws_api.websockets.connect', return_value=mock_ws), \
-         patch('src.ingesters.ws_api.orjson.dumps') as mock_dumps:
+    with patch('src.utils.ws.websockets.connect', return_value=mock_ws), \
+         patch('src.utils.ws.orjson.dumps') as mock_dumps:
 
       mock_dumps.return_value = b'{"subscribe": "ticker", "symbol": "BTC/USD"}'
 
@@ -318,37 +295,42 @@ class TestWebSocketIngester:
     assert expected_hash == md5(f"{url}:{interval}".encode()).hexdigest()
 
   @pytest.mark.asyncio
-  async def test_multiple_fields_same_route(self, mock_ingester):
+  async def test_multiple_fields_same_route(self, mock_ingester, mock_manager):
     """Test handling multiple fields for the same WebSocket route."""
     field1 = Mock(spec=ResourceField)
     field1.target = "ws://example.com/stream"
     field1.target_id = "field1_id"
+    field1.params = None
+    field1.headers = {}
     field1.selector = "data.price"
     field1.handler = Mock()
     field1.reducer = Mock()
+    field1.topic = ""
     field1.transformers = []
 
     field2 = Mock(spec=ResourceField)
     field2.target = "ws://example.com/stream"  # Same URL
     field2.target_id = "field2_id"
+    field2.params = None
+    field2.headers = {}
     field2.selector = "data.volume"
     field2.handler = Mock()
     field2.reducer = Mock()
+    field2.topic = ""
     field2.transformers = []
 
     mock_ingester.fields = [field1, field2]
 
-    with patch('src.ingesters.ws_api.gather') as mock_gather, \
-         patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
+    with patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
          patch('src.ingesters.ws_api.state') as mock_state:
 
       mock_state.args.verbose = False
-      mock_scheduler.add_ingester.return_value = Mock()
+      mock_scheduler.add_ingester = AsyncMock(return_value=Mock())
 
       await schedule(mock_ingester)
 
-      # Should batch fields by route
-      mock_gather.assert_called_once()
+      # Should batch fields by route, a single subscription for both
+      mock_manager.subscribe.assert_awaited_once()
 
   @pytest.mark.asyncio
   async def test_websocket_closed_state_handling(self, mock_ingester):
@@ -356,8 +338,8 @@ class TestWebSocketIngester:
     mock_ws = AsyncMock()
     mock_ws.state = websockets.protocol.State.CLOSED
 
-    with patch('src.ingesters.ws_api.websockets.connect', return_value=mock_ws), \
-         patch('src.ingesters.ws_api.log_error'):
+    with patch('src.utils.ws.websockets.connect', return_value=mock_ws), \
+         patch('src.utils.ws.log_error'):
 
       # Should detect closed state and log error
       # This is part of the subscribe function logic
@@ -369,8 +351,8 @@ class TestWebSocketIngester:
     mock_ws = AsyncMock()
     mock_ws.recv.return_value = "invalid json"
 
-    with patch('src.ingesters.ws_api.websockets.connect', return_value=mock_ws), \
-         patch('src.ingesters.ws_api.orjson.loads', side_effect=orjson.JSONDecodeError("Invalid JSON")):
+    with patch('src.utils.ws.websockets.connect', return_value=mock_ws), \
+         patch('src.utils.ws.orjson.loads', side_effect=orjson.JSONDecodeError("Invalid JSON")):
 
       # Should handle JSON parsing errors gracefully
       # This is part of the subscribe function error handling
@@ -422,3 +404,127 @@ class TestWebSocketIngester:
       # Should handle invalid reducer strings gracefully
       await schedule(mock_ingester)
       # Should continue execution despite invalid reducer
+
+
+TRADES = [("btcusdt", 100, 1), ("ethusdt", 10, 5), ("btcusdt", 110, 3),
+          ("solusdt", 1, 1), ("xrpusdt", 1, 1)]
+
+
+def trade(stream: str, price: float, qty: float) -> dict:
+  return {"stream": stream, "data": {"p": str(price), "q": str(qty)}}
+
+
+class TestDispatcher:
+  """Test the topic routing and incremental reducers of the ws ingester."""
+
+  @pytest.fixture
+  def fields(self):
+    kw = {"target": "wss://example.com/stream", "selector": ".data.p"}
+    return [
+        ResourceField(name="btc_vwap",
+                      reducer="vwap(.data.q)",
+                      topic="stream=btcusdt@trade",
+                      **kw),
+        ResourceField(name="btc_volume",
+                      reducer="volume(.data.q)",
+                      topic="stream=btcusdt@trade",
+                      **kw),
+        ResourceField(name="btc_high",
+                      reducer="high",
+                      topic="stream=btcusdt@trade",
+                      **kw),
+        ResourceField(name="eth_last",
+                      reducer="last",
+                      topic="stream=ethusdt@trade",
+                      **kw),
+        ResourceField(name="trades", reducer="count", **kw),
+    ]
+
+  def test_routes_by_topic(self, fields):
+    """Test messages only reach the fields consuming their topic."""
+    from src.ingesters.ws_api import Dispatcher
+    handler = Mock()
+    fields.append(
+        ResourceField(name="eth_raw",
+                      target="wss://example.com/stream",
+                      selector=".data.p",
+                      handler=handler,
+                      topic="stream=ethusdt@trade"))
+    epochs = deque([{}])
+    dispatcher = Dispatcher(fields, epochs)
+    for stream, price, qty in TRADES:
+      dispatcher.dispatch(trade(f"{stream}@trade", price, qty))
+
+    btc = dispatcher.accumulators[("stream=btcusdt@trade", ".data.p",
+                                   ".data.q")]
+    assert btc.value("vwap") == (100 * 1 + 110 * 3) / 4
+    assert btc.value("volume") == 4
+    assert dispatcher.accumulators[("", ".data.p", "")].value("count") == 5
+    handler.assert_called_once_with("10", epochs)
+    # unrouted topics share a route
+    assert len(dispatcher.routes) == 3
+
+  @pytest.mark.asyncio
+  async def test_topics_sharing_selector(self):
+    """Test fields of different topics never share an accumulator."""
+    kw = {
+        "target": "wss://example.com/stream",
+        "selector": ".data.p",
+        "reducer": "vwap(.data.q)"
+    }
+    fields = [
+        ResourceField(name="btc", topic="stream=btcusdt@trade", **kw),
+        ResourceField(name="eth", topic="stream=ethusdt@trade", **kw),
+    ]
+    ingester = Mock(name="vwap_ingester",
+                    interval="s10",
+                    fields=fields,
+                    pre_ingest=AsyncMock(),
+                    post_ingest=AsyncMock())
+    with patch('src.ingesters.ws_api.ws_manager') as mock_manager, \
+         patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
+         patch('src.ingesters.ws_api.state'):
+      mock_manager.subscribe = AsyncMock()
+      mock_scheduler.add_ingester = AsyncMock()
+      await schedule(ingester)
+      on_message = mock_manager.subscribe.call_args.args[2]
+      on_message(trade("btcusdt@trade", 60000, 1))
+      on_message(trade("ethusdt@trade", 3000, 1))
+      await mock_scheduler.add_ingester.call_args.kwargs["fn"](ingester)
+
+    assert [f.value for f in fields] == [60000, 3000]
+
+  def test_invalid_topic(self):
+    """Test topics must be selector=value pairs."""
+    from src.ingesters.ws_api import Dispatcher
+    with pytest.raises(ValueError, match="Invalid topic"):
+      Dispatcher([ResourceField(name="x", reducer="last", topic="btcusdt")])
+
+  @pytest.mark.asyncio
+  async def test_reducers_read_on_tick(self, fields):
+    """Test the reducers are read then reset on the schedule tick."""
+    ingester = Mock(name="trades_ingester",
+                    interval="s10",
+                    fields=fields,
+                    pre_ingest=AsyncMock(),
+                    post_ingest=AsyncMock())
+    with patch('src.ingesters.ws_api.ws_manager') as mock_manager, \
+         patch('src.ingesters.ws_api.scheduler') as mock_scheduler, \
+         patch('src.ingesters.ws_api.state'):
+      mock_manager.subscribe = AsyncMock()
+      mock_scheduler.add_ingester = AsyncMock()
+      await schedule(ingester)
+      mock_manager.subscribe.assert_awaited_once()  # one for every topic
+      assert mock_manager.subscribe.call_args.kwargs["shared"] is False
+      on_message = mock_manager.subscribe.call_args.args[2]
+      for stream, price in (("btcusdt", 100), ("btcusdt", 120), ("ethusdt",
+                                                                 10)):
+        on_message(trade(f"{stream}@trade", price, 1))
+      ingest = mock_scheduler.add_ingester.call_args.kwargs["fn"]
+
+      await ingest(ingester)
+      assert [f.value for f in fields] == [110, 2, 120, 10, 3]
+      ingester.post_ingest.assert_awaited_once()
+
+      await ingest(ingester)  # empty epoch: nothing collected
+      ingester.post_ingest.assert_awaited_once()
@@ -1,6 +1,9 @@
 """Tests for src.proxies module."""
+import asyncio
 import pytest
+import pytest_asyncio
 import sys
+from time import monotonic
 from pathlib import Path
 from unittest.mock import AsyncMock, Mock, patch
 from os import environ as env
@@ -8,7 +11,10 @@ from os import environ as env
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.proxies import RedisProxy
+from src import proxies
+from src.proxies import RedisProxy, RpcEndpoint, Web3Proxy
+from src.utils.http import _http_client
+from tests.rpc_server import RpcServer
 
 
 class TestRedisProxy:
@@ -355,3 +361,150 @@ class TestRedisProxy:
     result = await proxy.pubsub.get_message()
     mock_pubsub.get_message.assert_called_once()
     assert result == {"type": "message", "data": b"test"}
+
+
+def solana(health_delay: float = 0, slot: int = 1, slot_delay: float = 0):
+  """Methods of a solana RPC answering after the given delays"""
+
+  async def get_health(params):
+    await asyncio.sleep(health_delay)
+    return "ok"
+
+  async def get_slot(params):
+    await asyncio.sleep(slot_delay)
+    return slot
+
+  return {"getHealth": get_health, "getSlot": get_slot, "sendTransaction": str}
+
+
+@pytest_asyncio.fixture
+async def rpc_args():
+  with patch("src.state.args", create=True) as args:
+    args.ingestion_timeout = 2
+    yield args
+  await _http_client.close()
+
+
+class TestRpcEndpoint:
+  """Test the health scoring and quarantine of pooled RPCs."""
+
+  def test_quarantine_backoff(self):
+    endpoint = RpcEndpoint("http://rpc", None, Mock(), "getHealth")
+    with patch.object(proxies, "RPC_MAX_FAILURES", 2), \
+         patch.object(proxies, "RPC_RECOVERY", 5):
+      endpoint.observe(0.1)
+      endpoint.observe(0.3, Exception("timeout"))
+      assert endpoint.available and endpoint.score() > endpoint.latency()
+      endpoint.observe(0.3, Exception("timeout"))
+      assert not endpoint.available
+      assert 4 < endpoint.quarantined_until - monotonic() <= 5
+      assert not endpoint.due(monotonic())
+      assert endpoint.due(endpoint.quarantined_until)
+      # failed recovery probe: quarantined twice as long
+      endpoint.observe(0.1, Exception("refused"))
+      assert 9 < endpoint.quarantined_until - monotonic() <= 10
+      endpoint.observe(0.1)  # recovered
+      assert endpoint.available and endpoint.strikes == 2
+      endpoint.observe(0.1)
+      assert endpoint.strikes == 0
+    assert endpoint.p95() == 0.1
+
+
+class TestWeb3Proxy:
+  """Test the pooled RPC clients of Web3Proxy."""
+
+  @pytest.mark.asyncio
+  async def test_routes_to_healthiest(self, rpc_args):
+    async with RpcServer(solana(health_delay=0.3)) as slow, \
+               RpcServer(solana()) as fast:
+      with patch.dict(env, {"HTTP_RPCS_SOLANA": f"{slow.url},{fast.url}"}):
+        proxy = Web3Proxy()
+        client = await proxy.client("solana")
+        assert client.endpoint == fast.url
+        assert len(slow.requests) == len(fast.requests) == 1  # warmed
+        # warm clients, no round trip per request
+        assert await proxy.client("solana") is client
+        assert len(fast.requests) == 1
+        assert [c.endpoint for c in await proxy.rpc_clients("solana")
+                ] == [fast.url, slow.url]
+
+  @pytest.mark.asyncio
+  async def test_spreads_near_equal(self, rpc_args):
+    servers = [RpcServer(solana()) for _ in range(3)]
+    async with servers[0] as a, servers[1] as b, servers[2] as c:
+      with patch.dict(env, {"HTTP_RPCS_SOLANA": f"{a.url},{b.url},{c.url}"}):
+        proxy = Web3Proxy()
+        pool = await proxy.pool("solana")
+        for endpoint, latency in zip(pool, (0.012, 0.010, 0.1)):
+          endpoint.latencies.clear()
+          endpoint.latencies.append(latency)
+        routed = [(await proxy.client("solana")).endpoint for _ in range(4)]
+        assert sorted(routed) == sorted([a.url, b.url] * 2)
+        # kept on the last one routed to
+        assert (await proxy.client("solana",
+                                   roll=False)).endpoint == routed[-1]
+
+  @pytest.mark.asyncio
+  async def test_evm_run_observed(self, rpc_args):
+    async with RpcServer({
+        "eth_blockNumber": lambda _: "0x10",
+        "eth_chainId": lambda _: "0x1"
+    }) as server:
+      # the real web3, test_auth_flow mocking its module at import time
+      with patch.dict(env, {"HTTP_RPCS_1": server.url}), \
+           patch.dict(sys.modules, {"web3": proxies.web3}):
+        proxy = Web3Proxy()
+        endpoint = (await proxy.pool(1))[0]
+        assert len(endpoint.latencies) == 1  # warmed
+
+        async def block_number(client):
+          # eg. Multicall, deriving its calls from the (sync) web3 provider
+          assert isinstance(client, proxies.web3.Web3)
+          assert client.provider.endpoint_uri == server.url
+          return await asyncio.to_thread(lambda: client.eth.block_number)
+
+        assert await proxy.run(1, block_number) == 16
+        assert len(endpoint.latencies) == 2
+
+        async def failing(client):
+          raise ConnectionError("unreachable")
+
+        with pytest.raises(ConnectionError):
+          await proxy.run(1, failing)
+        assert endpoint.failures == 1
+
+  @pytest.mark.asyncio
+  async def test_hedged_reads(self, rpc_args):
+    async with RpcServer(solana(slot=1, slot_delay=1)) as first, \
+               RpcServer(solana(health_delay=0.3, slot=2)) as second:
+      with patch.dict(env, {"HTTP_RPCS_SOLANA": f"{first.url},{second.url}"}), \
+           patch.object(proxies, "RPC_HEDGE_MIN", 0.02):
+        proxy = Web3Proxy()
+        assert await asyncio.wait_for(proxy.call("solana", "getSlot"),
+                                      0.5) == 2
+        assert ("getSlot", []) in first.calls
+        # writes are sent once
+        assert await proxy.call("solana", "sendTransaction",
+                                ["tx"]) == "['tx']"
+        assert ("sendTransaction", ["tx"]) not in second.calls
+
+  @pytest.mark.asyncio
+  async def test_quarantines_failing(self, rpc_args):
+    async with RpcServer(solana()) as live:
+      dead = "http://127.0.0.1:9"
+      with patch.dict(env, {"HTTP_RPCS_SOLANA": f"{dead},{live.url}"}), \
+           patch.object(proxies, "RPC_MAX_FAILURES", 1):
+        proxy = Web3Proxy()
+        assert (await proxy.client("solana")).endpoint == live.url
+        pool = await proxy.pool("solana")
+        assert [e.available for e in pool] == [False, True]
+        # failed over while the healthiest fails
+        pool[0].quarantined_until, pool[0].errors = 0, 0
+        assert await proxy.request("solana",
+                                   lambda c: c.get_slot(),
+                                   hedge=False) == 1
+        assert not pool[0].available
+
+        with patch.dict(env, {"HTTP_RPCS_SOLANA": dead}):
+          with pytest.raises(Exception, match="All RPCs failed"):
+            await Web3Proxy().client("solana")
@@ -0,0 +1,155 @@
+"""Tests for the bucket-aligned history cache."""
+import pytest
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import server  # noqa: F401  # load the app first to settle import cycles
+from src.actions import rollup
+from src.services import history_cache
+from src.utils.date import SEC_BY_TF
+
+UTC = timezone.utc
+NOW = datetime(2024, 6, 1, 12, 3, 27, tzinfo=UTC)
+
+
+class FakeTsdb:
+  """Raw points every 10s, aggregated with LAST per bucket and sorted DESC like the adapters"""
+
+  def __init__(self, start: datetime, end: datetime):
+    self.points = []
+    t = start
+    while t <= end:
+      self.points.append((t, t.timestamp() % 997))
+      t += timedelta(seconds=10)
+    self.calls: list[tuple[datetime, datetime]] = []
+
+  async def fetch(self, table, from_date, to_date, interval, columns):
+    self.calls.append((from_date, to_date))
+    step = SEC_BY_TF[interval]
+    buckets: dict[int, float] = {}
+    for ts, value in self.points:
+      if from_date <= ts <= to_date:
+        buckets[int(ts.timestamp()) // step * step] = value
+    rows = [(datetime.fromtimestamp(b, UTC), v)
+            for b, v in sorted(buckets.items(), reverse=True)]
+    return ["ts", "price"], rows
+
+
+@pytest.fixture
+def env():
+  store: dict = {}
+
+  async def get_cache_batch(names, pickled=False, encoding="", raw_key=False):
+    return {n: store[n] for n in names if n in store}
+
+  async def cache_batch(data,
+                        expiry=0,
+                        pickled=False,
+                        encoding="",
+                        raw_key=False):
+    store.update(data)
+
+  async def incr(key):
+    store[key] = store.get(key, 0) + 1
+    return store[key]
+
+  tsdb = FakeTsdb(NOW - timedelta(days=3), NOW)
+  history_cache.clear_l1()
+  with patch.object(history_cache, "state") as mock_state, \
+       patch.object(history_cache, "now", return_value=NOW), \
+       patch.object(history_cache, "get_cache_batch", get_cache_batch), \
+       patch.object(history_cache, "cache_batch", cache_batch), \
+       patch.object(rollup, "state", mock_state), \
+       patch.object(rollup, "ROLLUP", False):
+    mock_state.tsdb = tsdb
+    mock_state.args.verbose = False
+    mock_state.redis.get = AsyncMock(side_effect=lambda key: store.get(key))
+    mock_state.redis.incr = AsyncMock(side_effect=incr)
+    yield tsdb, store
+  history_cache.clear_l1()
+
+
+class TestHistoryCache:
+
+  def test_is_cacheable(self):
+    assert history_cache.is_cacheable("s10")
+    assert history_cache.is_cacheable("h4")
+    assert history_cache.is_cacheable("D1")
+    assert not history_cache.is_cacheable("D2")
+    assert not history_cache.is_cacheable("W1")
+
+  @pytest.mark.asyncio
+  async def test_matches_direct_fetch(self, env):
+    tsdb, store = env
+    from_date = datetime(2024, 5, 30, 0, 0, tzinfo=UTC)
+    expected = await tsdb.fetch("feed", from_date, NOW, "m5", [])
+    cols, rows = await history_cache.fetch("feed", from_date, NOW, "m5", [])
+    assert cols == ["ts", "price"]
+    assert rows == expected[1]
+    assert store  # settled segments written through
+
+  @pytest.mark.asyncio
+  async def test_only_tail_queried_when_warm(self, env):
+    tsdb, store = env
+    from_date = NOW - timedelta(days=2)
+    first = await history_cache.fetch("feed", from_date, NOW, "m5", [])
+    tsdb.calls.clear()
+    second = await history_cache.fetch("feed", from_date, NOW, "m5", [])
+    assert second == first
+    assert len(tsdb.calls) == 1
+    tail_start, _ = tsdb.calls[0]
+    span = SEC_BY_TF["m5"] * history_cache.SEGMENT_BUCKETS
+    assert NOW - tail_start <= timedelta(
+        seconds=span + history_cache.GRACE_SEC + SEC_BY_TF["m5"])
+
+  @pytest.mark.asyncio
+  async def test_redis_hit_after_l1_eviction(self, env):
+    tsdb, store = env
+    from_date = NOW - timedelta(days=2)
+    first = await history_cache.fetch("feed", from_date, NOW, "h1", [])
+    history_cache.clear_l1()
+    tsdb.calls.clear()
+    second = await history_cache.fetch("feed", from_date, NOW, "h1", [])
+    assert second == first
+    assert len(tsdb.calls) == 1
+
+  @pytest.mark.asyncio
+  async def test_late_write_invalidates(self, env):
+    tsdb, store = env
+    from_date = NOW - timedelta(days=2)
+    await history_cache.fetch("feed", from_date, NOW, "m5", [])
+
+    await history_cache.invalidate("feed", NOW - timedelta(seconds=10))
+    tsdb.calls.clear()
+    await history_cache.fetch("feed", from_date, NOW, "m5", [])
+    assert len(tsdb.calls) == 1  # open tail only: still cached
+
+    late = NOW - timedelta(days=1)
+    tsdb.points.append((late + timedelta(seconds=1), 12345.0))
+    await history_cache.invalidate("feed", late)
+    tsdb.calls.clear()
+    cols, rows = await history_cache.fetch("feed", from_date, NOW, "m5", [])
+    assert len(tsdb.calls) > 1  # settled segments refetched
+    assert rows == (await tsdb.fetch("feed", from_date, NOW, "m5", []))[1]
+    assert (datetime(2024, 5, 31, 12, 0, tzinfo=UTC), 12345.0) in rows
+
+  @pytest.mark.asyncio
+  async def test_uncacheable_interval_passthrough(self, env):
+    tsdb, store = env
+    await history_cache.fetch("feed", NOW - timedelta(days=3), NOW, "D2", [])
+    assert len(tsdb.calls) == 1
+    assert not store
+
+  @pytest.mark.asyncio
+  async def test_fetch_batch_combines_tables(self, env):
+    tsdb, _ = env
+    from_date = NOW - timedelta(days=1)
+    cols, rows = await history_cache.fetch_batch(["a", "b"], from_date, NOW,
+                                                 "m15", [])
+    _, single = await tsdb.fetch("a", from_date, NOW, "m15", [])
+    assert cols == ["ts", "price"]
+    assert rows == single + single
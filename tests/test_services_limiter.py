@@ -11,7 +11,11 @@ from unittest.mock import patch, Mock, AsyncMock
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.services.limiter import RateLimiter
+from redis.exceptions import NoScriptError
+
+from src.cache import NS
+from src.services import limiter
+from src.services.limiter import RateLimiter, SLIDING_WINDOW, SLIDING_WINDOW_SHA
 from src.models import User, RateLimitConfig
 
 
@@ -78,10 +82,9 @@ class TestOptimizedRateLimiter:
     whitelisted_user = User(uid="admin123", status="admin")
 
     with patch('src.services.limiter.state', self.mock_state):
-      err, result = await RateLimiter.check_and_increment(
-          whitelisted_user, "/schema", 1000)
+      result = await RateLimiter.check_and_increment(whitelisted_user,
+                                                     "/schema", 1000)
 
-      assert err == ""
       assert result["bypass"]
 
   @pytest.mark.asyncio
@@ -90,98 +93,245 @@ class TestOptimizedRateLimiter:
     blacklisted_user = User(uid="banned456")
 
     with patch('src.services.limiter.state', self.mock_state):
-      err, result = await RateLimiter.check_and_increment(
-          blacklisted_user, "/schema", 1000)
-
-      assert "blacklisted" in err
-      assert result == {}
+      with pytest.raises(PermissionError, match="blacklisted"):
+        await RateLimiter.check_and_increment(blacklisted_user, "/schema",
+                                              1000)
 
   @pytest.mark.asyncio
   async def test_check_and_increment_within_limits(self):
-    """Test successful request within limits."""
-    mock_redis = AsyncMock()
-    mock_pipeline = AsyncMock()
-
-    # Mock Redis responses - user is within limits
-    mock_pipeline.execute.side_effect = [
-        [
-            "5", "50", "500", "500000", "5000000", "50000000", "10", "100",
-            "1000"
-        ],  # current values
-        []  # increment results
+    """Test a single EVALSHA checks and increments every window."""
+    self.mock_state.redis = AsyncMock()
+    # remaining and reset (ms) per window
+    self.mock_state.redis.evalsha.return_value = [
+        1, 4, 30000, 49, 1800000, 499, 3600000, 499000, 30000, 4999000,
+        1800000, 49999000, 3600000, 9, 30000, 99, 1800000, 999, 3600000
     ]
 
-    mock_redis.pipeline.return_value.__aenter__.return_value = mock_pipeline
-    mock_redis.pipeline.return_value.__aexit__.return_value = None
-
-    self.mock_state.redis = mock_redis
-
     with patch('src.services.limiter.state', self.mock_state):
-      err, result = await RateLimiter.check_and_increment(
-          self.test_user, "/schema", 1000)
-
-      assert err == ""
-      assert not result["limited"]
-      assert "remaining" in result
+      result = await RateLimiter.check_and_increment(self.test_user, "/schema",
+                                                     1000)
+
+    assert not result["limited"]
+    assert result["remaining"].startswith("rpm=4;rph=49;rpd=499;spm=499000")
+    assert result["remaining"].endswith("ppm=9;pph=99;ppd=999")
+    assert "reset" in result
+
+    args = self.mock_state.redis.evalsha.await_args.args
+    assert args[0] == SLIDING_WINDOW_SHA
+    assert args[1] == 9
+    keys, argv = args[2:11], args[11:]
+    assert keys[0] == f"{NS}:limiter:rpm:test123"
+    assert argv[0] == 0  # not a dry run
+    assert argv[1:5] == (60000, 10, 1, 0)  # rpm: 1 request, lenient
+    assert argv[13:17] == (60000, 1000000, 1000, 0)  # spm: response bytes
+    assert argv[25:29] == (60000, 20, 1, 1)  # ppm: route points, strict
 
   @pytest.mark.asyncio
   async def test_check_and_increment_rate_limited(self):
     """Test rate limit exceeded scenario."""
-    mock_redis = AsyncMock()
-    mock_pipeline = AsyncMock()
-
-    # Mock Redis responses - user exceeds rpm limit (10)
-    mock_pipeline.execute.side_effect = [
-        [
-            "10", "90", "900", "900000", "9000000", "90000000", "19", "190",
-            "1900"
-        ],  # at limit
-        []
-    ]
-
-    mock_redis.pipeline.return_value.__aenter__.return_value = mock_pipeline
-    mock_redis.pipeline.return_value.__aexit__.return_value = None
-
-    self.mock_state.redis = mock_redis
+    self.mock_state.redis = AsyncMock()
+    # rpm (1st window) exceeded, retry in 12.3s
+    self.mock_state.redis.evalsha.return_value = [0, 1, 12300]
 
     with patch('src.services.limiter.state', self.mock_state):
-      err, result = await RateLimiter.check_and_increment(
-          self.test_user, "/schema", 1000)
+      result = await RateLimiter.check_and_increment(self.test_user, "/schema",
+                                                     1000)
 
-      assert "Rate limit exceeded" in err
-      assert result["limited"]
-      assert result["retry_after"] == 60  # rpm limit TTL
+    assert result["limited"]
+    assert result["exceeded"] == "rpm"
+    assert result["retry_after"] == 13
+    self.mock_state.redis.evalsha.assert_awaited_once()
 
   @pytest.mark.asyncio
   async def test_check_and_increment_points_limit(self):
     """Test points-based rate limiting."""
-    mock_redis = AsyncMock()
-    mock_pipeline = AsyncMock()
-
-    # Mock Redis responses - user exceeds ppm limit with high-point request
-    mock_pipeline.execute.side_effect = [
-        [
-            "5", "50", "500", "500000", "5000000", "50000000", "18", "180",
-            "1800"
-        ],  # close to ppm limit (20)
-        []
-    ]
+    self.mock_state.redis = AsyncMock()
+    self.mock_state.redis.evalsha.return_value = [0, 7, 400]
 
-    mock_redis.pipeline.return_value.__aenter__.return_value = mock_pipeline
-    mock_redis.pipeline.return_value.__aexit__.return_value = None
+    with patch('src.services.limiter.state', self.mock_state):
+      result = await RateLimiter.check_and_increment(self.test_user,
+                                                     "/history", 1000)
 
-    self.mock_state.redis = mock_redis
+    assert result["limited"]
+    assert result["exceeded"] == "ppm"
+    assert result["retry_after"] == 1
+    argv = self.mock_state.redis.evalsha.await_args.args[11:]
+    assert argv[25:29] == (60000, 20, 5, 1)  # /history costs 5 points
+
+  @pytest.mark.asyncio
+  async def test_check_and_increment_loads_script(self):
+    """Test the script is loaded once Redis reports it missing."""
+    self.mock_state.redis = AsyncMock()
+    self.mock_state.redis.evalsha.side_effect = [
+        NoScriptError("No matching script"), [1] + [1, 1000] * 9
+    ]
 
     with patch('src.services.limiter.state', self.mock_state):
-      err, result = await RateLimiter.check_and_increment(
-          self.test_user,
-          "/history",
-          1000  # /history costs 5 points, would exceed 20 limit
-      )
-
-      assert "Rate limit exceeded" in err
-      assert "ppm" in err
-      assert result["limited"]
+      result = await RateLimiter.check_and_increment(self.test_user, "/schema")
+
+    assert not result["limited"]
+    self.mock_state.redis.script_load.assert_awaited_once_with(SLIDING_WINDOW)
+    assert self.mock_state.redis.evalsha.await_count == 2
+
+  @pytest.mark.asyncio
+  async def test_get_user_limits_dry_run(self):
+    """Test limits are read through the script without counting."""
+    self.mock_state.redis = AsyncMock()
+    self.mock_state.redis.evalsha.return_value = [1] + [7, 5000] * 9
+
+    with patch('src.services.limiter.state', self.mock_state), \
+         patch('src.services.limiter.AuthService.get_user',
+               AsyncMock(return_value=self.test_user)):
+      limits = await RateLimiter.get_user_limits("test123")
+
+    assert limits["rpm"]["cap"] == 10
+    assert limits["rpm"]["remaining"] == 7
+    assert limits["ppd"]["ttl"] == 86400
+    argv = self.mock_state.redis.evalsha.await_args.args[11:]
+    assert argv[0] == 1
+    assert argv[3] == 0  # no increment
+
+
+class FakeWindows:
+  """Redis stand-in running the limiter script as plain (fixed) counters"""
+
+  def __init__(self):
+    self.counts: dict[str, int] = {}
+    self.calls = 0
+
+  def run(self, sha, numkeys, *args):
+    keys, argv = args[:numkeys], args[numkeys:]
+    mode, windows = argv[0], [argv[i:i + 4] for i in range(1, len(argv), 4)]
+    used = [self.counts.get(k, 0) for k in keys]
+    if mode == limiter.CHECK:
+      for i, (_, limit, inc, strict) in enumerate(windows):
+        if (strict and used[i] + inc > limit) or (not strict
+                                                  and used[i] >= limit):
+          return [0, i + 1, 1000]
+    res = [1]
+    for i, (key, (_, limit, inc, _)) in enumerate(zip(keys, windows)):
+      inc = 0 if mode == limiter.PEEK else inc
+      self.counts[key] = used[i] + inc
+      res += [max(limit - used[i] - inc, 0), 1000]
+    return res
+
+  async def evalsha(self, *args):
+    self.calls += 1
+    return self.run(*args)
+
+  def pipeline(self, transaction=True):
+    fake, queued = self, []
+
+    class Pipeline:
+
+      async def __aenter__(self):
+        return self
+
+      async def __aexit__(self, *exc):
+        return False
+
+      def evalsha(self, *args):
+        queued.append(args)
+
+      async def execute(self, raise_on_error=True):
+        fake.calls += 1
+        return [fake.run(*args) for args in queued]
+
+    return Pipeline()
+
+
+class TestLocalAdmission:
+  """Test the local token-bucket pre-admission."""
+
+  def setup_method(self):
+    self.state = Mock()
+    self.state.server_config = None
+    self.state.redis = FakeWindows()
+    self.user = User(uid="local1",
+                     rate_limits=RateLimitConfig(rpm=10,
+                                                 rph=100,
+                                                 rpd=1000,
+                                                 spm=10**6,
+                                                 sph=10**7,
+                                                 spd=10**8,
+                                                 ppm=100,
+                                                 pph=1000,
+                                                 ppd=10000),
+                     status="public")
+    RateLimiter._quotas.clear()
+
+  def count(self, name: str) -> int:
+    return self.state.redis.counts.get(f"{NS}:limiter:{name}:local1", 0)
+
+  @pytest.mark.asyncio
+  async def test_admits_locally_and_records_in_batches(self):
+    """Test one fetch admits requests locally, usage recorded on sync."""
+    with patch.object(limiter, 'state', self.state), \
+         patch.object(RateLimiter, 'start_sync'):
+      for _ in range(5):
+        result = await RateLimiter.admit(self.user, "/last", 100)
+        assert not result["limited"]
+      assert result["remaining"].startswith("rpm=5;")
+      assert self.state.redis.calls == 1  # the share fetch
+      assert self.count("rpm") == 0
+
+      await RateLimiter.stop_sync()
+
+    assert self.state.redis.calls == 2
+    assert self.count("rpm") == 5
+    assert self.count("spm") == 500
+    assert self.count("ppm") == 50  # 10 points per default route
+
+  @pytest.mark.asyncio
+  async def test_denies_past_share_without_hammering_redis(self):
+    """Test denials within the sync interval do not reach Redis."""
+    with patch.object(limiter, 'state', self.state), \
+         patch.object(RateLimiter, 'start_sync'):
+      results = [
+          await RateLimiter.admit(self.user, "/last") for _ in range(30)
+      ]
+      await RateLimiter.stop_sync()
+
+    assert sum(not r["limited"] for r in results) == 10
+    assert results[-1]["exceeded"] == "rpm"
+    assert results[-1]["retry_after"] >= 1
+    assert self.state.redis.calls == 2  # share fetch, final record
+    assert self.count("rpm") == 10
+
+  @pytest.mark.asyncio
+  async def test_worker_share(self):
+    """Test a worker past its share defers to Redis until the quota is spent."""
+    with patch.object(limiter, 'state', self.state), \
+         patch.object(limiter, 'WORKERS', 4), \
+         patch.object(RateLimiter, 'start_sync'):
+      results = [await RateLimiter.admit(self.user, "/last") for _ in range(3)]
+      # ppm share of 100 / 4 = 25 points, 10 per request: the third one
+      # checked in Redis (share fresh, not re-synced)
+      assert all(not r["limited"] for r in results)
+      assert self.state.redis.calls == 2
+      results = [
+          await RateLimiter.admit(self.user, "/last") for _ in range(10)
+      ]
+      # one CHECK per request past the share, denials then local
+      assert self.state.redis.calls == 2 + 7
+      await RateLimiter.stop_sync()
+
+    # the whole quota admitted before any denial
+    assert sum(not r["limited"] for r in results) == 7
+    assert results[-1]["limited"]
+    assert self.count("rpm") == 10 and self.count("ppm") == 100
+
+  @pytest.mark.asyncio
+  async def test_disabled_defers_to_redis(self):
+    """Test LIMITER_LOCAL=false checks every request in Redis."""
+    with patch.object(limiter, 'state', self.state), \
+         patch.object(limiter, 'LIMITER_LOCAL', False):
+      for _ in range(3):
+        await RateLimiter.admit(self.user, "/last")
+
+    assert self.state.redis.calls == 3
+    assert self.count("rpm") == 3
+    assert not RateLimiter._quotas
 
 
 class TestLimiterService:
@@ -1,9 +1,10 @@
 """Tests for loader module."""
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, Mock, patch
 import sys
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -604,6 +605,28 @@ class TestGetHistory:
       assert err == ""
       assert result == {"data": "formatted"}
 
+  @pytest.mark.asyncio
+  async def test_get_history_coalesces_bucket(self):
+    """Test concurrent queries up to the same bucket share one fetch."""
+    calls = []
+
+    async def fetch_batch(**kwargs):
+      calls.append(kwargs)
+      await asyncio.sleep(0.01)
+      return ["ts", "field1"], [[self.from_date, 100.0]]
+
+    to_date = datetime(2024, 1, 2, 0, 1, tzinfo=timezone.utc)
+    with patch('src.services.loader.history_cache.fetch_batch', fetch_batch), \
+         patch('src.services.loader.format_table', return_value={}):
+      # eg. dashboards polling up to `now()`
+      await asyncio.gather(
+          *(get_history(["resource1"], ["field1"], self.from_date, to_date +
+                        timedelta(microseconds=i), "m5") for i in range(3)))
+      assert len(calls) == 1
+      await get_history(["resource1"], ["field1"], self.from_date,
+                        to_date + timedelta(minutes=5), "m5")
+      assert len(calls) == 2
+
   @pytest.mark.asyncio
   async def test_get_history_no_data(self):
     """Test handling when no data found."""
@@ -814,6 +837,69 @@ class TestFormatTableAdvanced:
     assert isinstance(result, pl.DataFrame)
 
 
+@pytest.mark.skipif(not POLARS_AVAILABLE, reason="Dependencies not available")
+class TestJsonTable:
+  """Test column-native json:row/json:column serialization."""
+
+  @staticmethod
+  def legacy(df, orient):
+    import orjson
+    from src.server.responses import ORJSON_OPTIONS
+    from src.services.loader import _ts_to_ms
+    df = _ts_to_ms(df)
+    arr = df.to_numpy()
+    return orjson.dumps(
+        {
+            'columns': df.columns,
+            'types': [str(t).lower() for t in df.dtypes],
+            'data': (arr if orient == "row" else arr.T).tolist()
+        },
+        option=ORJSON_OPTIONS)
+
+  @pytest.mark.parametrize("fmt", ["json:row", "json:column"])
+  @pytest.mark.parametrize(
+      "data",
+      [
+          {
+              "ts": [datetime(2024, 1, 1, tzinfo=timezone.utc)] * 3,
+              "price": [1.5, None, float("nan")],
+              "volume": [1, None, 3],
+          },
+          {
+              "a": [1, 2, 3],
+              "b": [True, False, True]
+          },
+          {
+              "x": [float("inf"), -0.0, 1e21],
+              "y": [1e-7, 5e-324, 0.1]
+          },
+          {
+              "ts": [datetime(2024, 1, 1, tzinfo=timezone.utc)] * 3,
+              "sym": ["BTC", None, 'a"b\\c,\n'],
+              "price": [1.5, None, float("nan")],
+              "volume": [1, None, 3],
+              "live": [True, None, False],
+          },
+          {
+              "ts": [1, 2],
+              "b": [True, None]
+          },
+      ],
+      ids=["numeric", "int-bool", "float-edges", "mixed", "nullable-bool"])
+  def test_byte_compatible(self, data, fmt):
+    """Output is byte-equal to the former to_numpy().tolist() path."""
+    df = pl.DataFrame(data)
+    assert format_table(df, "polars", fmt) == self.legacy(
+        df, fmt.split(":")[1])
+
+  def test_float32_widened(self):
+    """Float32 values serialize like python floats, not shortest float32."""
+    df = pl.DataFrame({"f": pl.Series([1.1, 2.2], dtype=pl.Float32)})
+    for fmt in ("json:row", "json:column"):
+      assert format_table(df, "polars", fmt) == self.legacy(
+          df, fmt.split(":")[1])
+
+
 @pytest.mark.skipif(not POLARS_AVAILABLE, reason="Dependencies not available")
 class TestGetLastValuesAdvanced:
   """Test advanced get_last_values functionality."""
@@ -1018,3 +1104,77 @@ class TestGetSchemaAdvanced:
       # Should return the resource data directly for single resource
       assert "field1" in result
       assert "field2" in result
+
+
+@pytest.mark.skipif(not POLARS_AVAILABLE, reason="Dependencies not available")
+class TestStreamHistory:
+  """Test chunked /history streaming."""
+
+  def setup_method(self):
+    """Hourly rows over 10 days, newest first like the adapters."""
+    from datetime import timedelta
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    self.from_date = start
+    self.to_date = start + timedelta(days=10)
+    self.rows = [(start + timedelta(hours=h), float(h % 13) or None)
+                 for h in range(10 * 24 + 1)][::-1]
+
+  async def fake_fetch_batch(self, tables, from_date, to_date,
+                             aggregation_interval, columns):
+    return ["ts", "price"], [
+        r for r in self.rows if from_date <= r[0] <= to_date
+    ]
+
+  async def collect(self, format, chunk_buckets):
+    from src.services.loader import stream_history
+    with patch('src.services.loader.history_cache.fetch_batch',
+               self.fake_fetch_batch):
+      return b"".join([
+          chunk async for chunk in stream_history(["feed"], ["price"],
+                                                  self.from_date,
+                                                  self.to_date,
+                                                  "h1",
+                                                  format=format,
+                                                  chunk_buckets=chunk_buckets)
+      ])
+
+  @pytest.mark.asyncio
+  async def test_ndjson_matches_unchunked(self):
+    """Streamed chunks concatenate to the single-shot output."""
+    with patch('src.services.loader.history_cache.fetch_batch',
+               self.fake_fetch_batch):
+      expected = await get_history(["feed"], ["price"],
+                                   self.from_date,
+                                   self.to_date,
+                                   "h1",
+                                   format="ndjson")
+    assert await self.collect("ndjson", 17) == expected.encode()
+
+  @pytest.mark.asyncio
+  async def test_csv_single_header(self):
+    """CSV streams carry the header once."""
+    data = (await self.collect("csv", 24)).decode()
+    assert data.count("ts,price") == 1
+    assert len(data.strip().split("\n")) == len(self.rows) + 1
+
+  @pytest.mark.asyncio
+  async def test_arrow_ipc_stream(self):
+    """Arrow frames form one readable IPC stream."""
+    import pyarrow.ipc as pa_ipc
+    table = pa_ipc.open_stream(await self.collect("arrow", 50)).read_all()
+    assert table.num_rows == len(self.rows)
+    assert table.column_names == ["ts", "price"]
+
+  @pytest.mark.asyncio
+  async def test_no_data_raises(self):
+    """Empty ranges fail before the first byte."""
+    from fastapi import HTTPException
+    self.rows = []
+    with pytest.raises(HTTPException):
+      await self.collect("ndjson", 24)
+
+  def test_unsupported_format(self):
+    """Only streamable formats are accepted."""
+    from src.services.loader import StreamEncoder
+    with pytest.raises(ValueError):
+      StreamEncoder("parquet")
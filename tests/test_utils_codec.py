@@ -0,0 +1,116 @@
+"""Tests for the cache/pubsub payload codec."""
+import math
+import pickle
+import sys
+from datetime import date, datetime, time, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils import codec
+
+INGESTER_VALUES = {
+    "ts": datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc),
+    "bid": 67321.5,
+    "ask": 67322.25,
+    "volume": 1234,
+    "venue": "binance",
+    "live": True,
+    "spread": None,
+    "idx": {
+        "USDC": 1.0,
+        "USDT": 0.9998
+    },
+}
+
+
+class Opaque:
+
+  def __init__(self, x):
+    self.x = x
+
+  def __eq__(self, other):
+    return isinstance(other, Opaque) and other.x == self.x
+
+
+class TestCodec:
+
+  @pytest.mark.parametrize("name", ["orjson", "msgpack"])
+  def test_round_trip(self, name):
+    if name == "msgpack":
+      pytest.importorskip("msgpack")
+    values = [
+        INGESTER_VALUES,
+        {
+            "nan": float("nan"),
+            "inf": float("-inf"),
+            "rows": [(1, "a"), (2, None)]
+        },
+        {
+            "d": date(2024, 1, 1),
+            "t": time(12, 30),
+            "naive": datetime(2024, 1, 1)
+        },
+        (["ts", "price"], [(datetime(2024, 1, 1, tzinfo=timezone.utc), 1.5)]),
+        [1, "two", 3.0],
+        "plain",
+        42,
+    ]
+    for value in values:
+      payload = codec.encode(value, name)
+      assert payload[0] == codec.MAGIC
+      assert payload[2] == codec.CODECS[name]
+      decoded = codec.decode(payload)
+      if isinstance(value, dict) and "nan" in value:
+        assert math.isnan(decoded["nan"])
+        assert decoded["inf"] == float("-inf")
+        assert decoded["rows"] == value["rows"]
+      else:
+        assert decoded == value
+        assert type(decoded) is type(value)
+
+  def test_flat_values_untagged(self):
+    payload = codec.encode({"bid": 1.5, "venue": "x"}, "orjson")
+    assert payload[3] == 0
+    assert payload[4:] == b'{"bid":1.5,"venue":"x"}'
+
+  def test_numpy_values(self):
+    decoded = codec.decode(
+        codec.encode({
+            "f": np.float64(1.5),
+            "a": np.arange(3)
+        }, "orjson"))
+    assert decoded == {"f": 1.5, "a": [0, 1, 2]}
+
+  def test_tag_clash_falls_back_to_pickle(self):
+    value = {"$dt": "not a date"}
+    payload = codec.encode(value, "orjson")
+    assert payload[2] == codec.PICKLE
+    assert codec.decode(payload) == value
+
+  def test_unsupported_falls_back_to_pickle(self):
+    for value in ({"o": Opaque(1)}, {1: "int key"}, {"big": 2**70}):
+      payload = codec.encode(value, "orjson")
+      assert payload[2] == codec.PICKLE
+      assert codec.decode(payload) == value
+
+  def test_legacy_pickle_read(self):
+    assert codec.decode(pickle.dumps(INGESTER_VALUES)) == INGESTER_VALUES
+
+  def test_pickle_disabled(self):
+    with patch.object(codec, "PICKLE_ENABLED", False):
+      with pytest.raises(ValueError):
+        codec.decode(pickle.dumps(INGESTER_VALUES))
+      with pytest.raises(TypeError):
+        codec.encode({"o": Opaque(1)}, "orjson")
+      assert codec.decode(codec.encode(INGESTER_VALUES)) == INGESTER_VALUES
+
+  def test_newer_version_rejected(self):
+    payload = bytearray(codec.encode(INGESTER_VALUES, "orjson"))
+    payload[1] = codec.VERSION + 1
+    with pytest.raises(ValueError):
+      codec.decode(bytes(payload))
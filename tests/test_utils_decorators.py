@@ -0,0 +1,164 @@
+"""Tests for the caching and concurrency decorators."""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.decorators import SingleFlight, cache, cache_stats, single_flight
+
+
+class TestCache:
+
+  def test_ttl_expiry_on_monotonic_clock(self):
+    calls = []
+
+    @cache(ttl=10, maxsize=None)
+    def square(x):
+      calls.append(x)
+      return x * x
+
+    with patch('src.utils.decorators.monotonic', return_value=100.0) as clock:
+      assert square(2) == 4
+      assert square(2) == 4
+      clock.return_value = 109.0
+      assert square(2) == 4
+      assert square(3) == 9
+      clock.return_value = 110.0
+      assert square(2) == 4  # expired
+    assert calls == [2, 3, 2]
+    info = square.cache_info()
+    assert (info["hits"], info["misses"], info["expirations"]) == (2, 3, 1)
+
+  def test_expired_entries_dropped_on_write(self):
+
+    @cache(ttl=10, maxsize=None)
+    def ident(x):
+      return x
+
+    with patch('src.utils.decorators.monotonic', return_value=0.0) as clock:
+      for i in range(100):
+        ident(i)
+      clock.return_value = 20.0
+      ident("new")
+    info = ident.cache_info()
+    assert info["size"] == 1
+    assert info["expirations"] == 100
+
+  def test_lru_eviction(self):
+
+    @cache(ttl=-1, maxsize=2)
+    def ident(x):
+      return x
+
+    ident(1)
+    ident(2)
+    ident(1)  # 2 becomes least recently used
+    ident(3)
+    ident(1)
+    info = ident.cache_info()
+    assert info["evictions"] == 1
+    assert info["hits"] == 2
+    ident.cache_clear()
+    assert ident.cache_info()["size"] == 0
+
+  @pytest.mark.asyncio
+  async def test_async_single_flight(self):
+    calls = []
+
+    @cache(ttl=60)
+    async def fetch(x):
+      calls.append(x)
+      await asyncio.sleep(0.01)
+      return x
+
+    assert await asyncio.gather(*[fetch(1) for _ in range(4)]) == [1] * 4
+    assert await fetch(1) == 1
+    assert calls == [1]
+    info = fetch.cache_info()
+    assert (info["misses"], info["coalesced"], info["hits"]) == (4, 3, 1)
+    name = f"{fetch.__module__}.{fetch.__qualname__}"
+    assert cache_stats()[name]["size"] == 1
+
+  @pytest.mark.asyncio
+  async def test_exceptions_not_cached(self):
+    calls = []
+
+    @cache(ttl=60)
+    async def flaky():
+      calls.append(1)
+      if len(calls) == 1:
+        raise ValueError("first call fails")
+      return "ok"
+
+    with pytest.raises(ValueError):
+      await flaky()
+    assert await flaky() == "ok"
+
+
+class TestSingleFlight:
+
+  @pytest.mark.asyncio
+  async def test_concurrent_calls_coalesced(self):
+    flights, calls = SingleFlight(), []
+
+    async def fetch():
+      calls.append(1)
+      await asyncio.sleep(0.01)
+      return "value"
+
+    results = await asyncio.gather(*[flights.do("k", fetch) for _ in range(5)])
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert "k" not in flights
+    # settled calls are not cached
+    assert await flights.do("k", fetch) == "value"
+    assert len(calls) == 2
+
+  @pytest.mark.asyncio
+  async def test_exception_shared(self):
+    flights = SingleFlight()
+
+    async def fail():
+      await asyncio.sleep(0.01)
+      raise ValueError("upstream down")
+
+    results = await asyncio.gather(*[flights.do("k", fail) for _ in range(3)],
+                                   return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+  @pytest.mark.asyncio
+  async def test_leader_cancelled_follower_retries(self):
+    flights, calls = SingleFlight(), []
+
+    async def fetch():
+      calls.append(1)
+      await asyncio.sleep(0.05)
+      return len(calls)
+
+    leader = asyncio.create_task(flights.do("k", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("k", fetch))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await follower == 2
+    with pytest.raises(asyncio.CancelledError):
+      await leader
+
+  @pytest.mark.asyncio
+  async def test_decorator_keys_on_arguments(self):
+    calls = []
+
+    @single_flight()
+    async def load(name, fields):
+      calls.append(name)
+      await asyncio.sleep(0.01)
+      return f"{name}:{','.join(fields)}"
+
+    results = await asyncio.gather(load("a", ["x"]), load("a", ["x"]),
+                                   load("b", ["x"]))
+    assert results == ["a:x", "a:x", "b:x"]
+    assert sorted(calls) == ["a", "b"]
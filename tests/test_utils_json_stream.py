@@ -0,0 +1,102 @@
+"""Tests for the streaming selector extraction of src.utils.json_stream."""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("ijson")
+
+from src.utils import json_stream
+from src.utils.deps import MissingDependencyError, MockModule
+from src.utils.json_stream import SelectorStream, stream_selectable
+from src.utils.reflexion import compile_selectors
+
+DOC = {
+    "code":
+    "0",
+    "skipped": {
+        "deep": [[1, 2], {
+            "x": [3]
+        }]
+    },
+    "data": [{
+        "id": "BTC",
+        "last": 67000.5,
+        "book": [[67000, 1.5], [66999, 2]]
+    }, {
+        "id": "ETH",
+        "last": 3500.25,
+        "book": [[3500, 10]]
+    }],
+    "meta": {
+        "a": {
+            "v": 1
+        },
+        "b": {
+            "v": 2
+        }
+    },
+}
+RAW = orjson.dumps(DOC)
+
+
+def chunks(raw: bytes, size: int) -> list[bytes]:
+  return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def streamed(plan, raw: bytes, size: int = 1) -> list:
+  parser = SelectorStream(plan)
+  for chunk in chunks(raw, size):
+    if parser.feed(chunk):
+      break
+  return parser.close()
+
+
+class TestSelectorStream:
+
+  @pytest.mark.parametrize("size", [1, 7, len(RAW)])
+  def test_matches_plan(self, size):
+    plan = compile_selectors(
+        tuple((s, s) for s in (".code", "data[0].last", "data[1].book[0][1]",
+                               ".data.0.id", "meta.b.v", "missing.key",
+                               "data[5].last", "code[0]", ".data[1].book",
+                               ".meta", "data[*].id", ".meta.*.v")))
+    assert stream_selectable(plan)
+    assert streamed(plan, RAW, size) == plan.select(DOC)
+
+  def test_stops_early(self):
+    plan = compile_selectors(((".code", "code"), (".skipped.deep[1].x", "x")))
+    # the rest of the document (here, garbage) is never parsed
+    raw = RAW[:RAW.index(b'"data"')] + b"}garbage" * 32
+    assert streamed(plan, raw, 16) == ["0", [3]]
+    parser = SelectorStream(plan)
+    assert parser.feed(raw[:RAW.index(b'"data"')])
+
+  def test_missing_keys_resolve_at_container_end(self):
+    plan = compile_selectors(((".meta.c", "c"), (".meta.a.v", "v")))
+    parser = SelectorStream(plan)
+    end = RAW.index(b'"meta"')
+    assert not parser.feed(RAW[:end])
+    assert parser.feed(RAW[end:]) and parser.close() == [None, 1]
+
+  def test_truncated_document(self):
+    plan = compile_selectors(((".meta.z", "z"), ))
+    parser = SelectorStream(plan)
+    parser.feed(RAW[:-10])
+    with pytest.raises(Exception):
+      parser.close()
+
+  def test_root_selectors_not_streamed(self):
+    assert not stream_selectable(compile_selectors(((".", "all"), )))
+    assert not stream_selectable(
+        compile_selectors(((".code", "code"), ("root", "all"))))
+
+  def test_missing_ijson(self):
+    plan = compile_selectors(((".code", "code"), ))
+    with patch.object(json_stream, "ijson", MockModule()), \
+         pytest.raises(MissingDependencyError, match=r"chomp\[stream\]"):
+      SelectorStream(plan)
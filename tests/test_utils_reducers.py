@@ -0,0 +1,50 @@
+"""Tests for the incremental stream reducers of src.utils.reducers."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.reducers import Accumulator, parse_reducer
+
+
+class TestReducers:
+
+  def test_parse_reducer(self):
+    assert parse_reducer("last") == ("last", "")
+    assert parse_reducer(" vwap( .data.q ) ") == ("vwap", ".data.q")
+    assert parse_reducer("lambda epochs: epochs[0]['p']") is None
+    assert parse_reducer("median") is None
+    assert parse_reducer(len) is None
+
+  def test_matches_numpy(self):
+    rng = np.random.default_rng(3)
+    prices, qties = rng.uniform(90, 110, 500), rng.uniform(0, 5, 500)
+    acc = Accumulator()
+    for p, q in zip(prices, qties):
+      assert acc.add(str(p), q)
+    assert acc.value("count") == 500
+    assert acc.value("open") == prices[0]
+    assert acc.value("close") == acc.value("last") == prices[-1]
+    assert acc.value("high") == prices.max()
+    assert acc.value("low") == prices.min()
+    assert acc.value("sum") == pytest.approx(prices.sum())
+    assert acc.value("mean") == pytest.approx(prices.mean())
+    assert acc.value("volume") == pytest.approx(qties.sum())
+    assert acc.value("vwap") == pytest.approx(np.average(prices,
+                                                         weights=qties))
+
+  def test_epochs(self):
+    acc = Accumulator()
+    assert not acc.add(None) and not acc.add("n/a") and not acc.add(1, None)
+    acc.add(2.0)
+    acc.reset()
+    # only `last` carries over epochs
+    assert acc.value("last") == 2.0 and acc.value("count") == 0
+    assert acc.value("close") is None and acc.value("vwap") is None
+    acc.add(3.0, 0)
+    assert acc.value("vwap") is None and acc.value("open") == 3.0
+    with pytest.raises(ValueError):
+      acc.value("median")
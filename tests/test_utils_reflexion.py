@@ -0,0 +1,93 @@
+"""Tests for the compiled field selectors of src.utils.reflexion."""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils import reflexion
+from src.utils.reflexion import compile_selectors, parse_selector, select_nested
+
+DOC = {
+    "code":
+    "0",
+    "data": [{
+        "id": "BTC",
+        "last": 67000.5,
+        "book": [[67000, 1.5], [66999, 2]]
+    }, {
+        "id": "ETH",
+        "last": 3500.25,
+        "book": [[3500, 10]]
+    }],
+    "meta": {
+        "a": {
+            "v": 1
+        },
+        "b": {
+            "v": 2
+        }
+    },
+}
+
+
+class TestSelectors:
+
+  def test_parse_selector(self):
+    key, index, each = reflexion.KEY, reflexion.INDEX, reflexion.EACH
+    assert parse_selector("root") == parse_selector(".") == ()
+    assert parse_selector(".data[0].book[1][0]") == (
+        (key, "data"),
+        (index, 0, "data"),
+        (key, "book"),
+        (index, 1, "book"),
+        (key, None),
+        (index, 0, None),
+    )
+    assert parse_selector("data[*].*") == ((key, "data"), (each, ), (each, ))
+
+  def test_plan_matches_select_nested(self):
+    selectors = [
+        None, "root", ".code", "data[0].last", "data[1].book[0][1]",
+        ".data.0.id", "meta.b.v", "missing.key", "data[5].last", "code[0]"
+    ]
+    plan = compile_selectors(
+        tuple((s, f"f{i}") for i, s in enumerate(selectors)))
+    expected = [DOC, DOC, "0", 67000.5, 10, "BTC", 2, None, None, None]
+    assert plan.select(DOC) == expected
+    assert [select_nested(s, DOC) for s in selectors] == expected
+
+  def test_wildcards(self):
+    plan = compile_selectors((
+        (".data[*].id", "ids"),
+        (".data[*].book[0][0]", "best"),
+        (".data[*].missing", "none"),
+        (".meta.*.v", "values"),
+        (".code[*]", "scalar"),
+    ))
+    assert plan.select(DOC) == [["BTC", "ETH"], [67000, 3500], [None, None],
+                                [1, 2], None]
+
+  def test_shared_prefix_walked_once(self):
+    plan = compile_selectors(
+        ((".data[0].last", "last"), (".data[0].id", "id"), (".code", "code")))
+    data = plan.root.children[(reflexion.KEY, "data")]
+    assert len(plan.root.children) == 2
+    assert len(data.children) == 1 and data.indices == [0, 1]
+    assert compile_selectors(((".data[0].last", "last"), (".data[0].id", "id"),
+                              (".code", "code"))) is plan
+
+  def test_missing_logged_per_field(self):
+    plan = compile_selectors(((".x.a", "a"), (".x.b", "b"), (".code", "c")))
+    with patch.object(reflexion, "log_warn") as log_warn:
+      assert plan.select(DOC) == [None, None, "0"]
+    logged = [c.args[0] for c in log_warn.call_args_list]
+    assert logged == [
+        "Key not found in a dict: x", "Key not found in b dict: x"
+    ]
+
+  def test_invalid_selector(self):
+    with patch.object(reflexion, "log_error") as log_error:
+      assert select_nested(123, DOC) is None  # type: ignore[arg-type]
+    log_error.assert_called_once_with(
+        "Invalid selector. Please use a valid path string")
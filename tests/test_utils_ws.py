@@ -0,0 +1,185 @@
+"""Tests for the shared websocket connections of src.utils.ws."""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import orjson
+import pytest
+import pytest_asyncio
+from websockets.asyncio.server import serve
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils import ws
+from src.utils.ws import WsManager, SharedSocket, merge_subscriptions
+
+
+async def until(condition, timeout: float = 3.0):
+  """Wait for `condition()` to hold"""
+  for _ in range(int(timeout / 0.01)):
+    if condition():
+      return
+    await asyncio.sleep(0.01)
+  raise TimeoutError("condition not met")
+
+
+class Server:
+  """Local websocket endpoint recording connections and received messages"""
+
+  def __init__(self):
+    self.connections: list = []
+    self.received: list[list] = []  # per connection
+
+  async def handler(self, conn):
+    self.connections.append(conn)
+    self.received.append(messages := [])
+    async for raw in conn:
+      messages.append(orjson.loads(raw))
+
+  async def broadcast(self, message: dict):
+    for conn in self.connections:
+      try:
+        await conn.send(orjson.dumps(message))
+      except Exception:
+        pass  # closed
+
+
+@pytest_asyncio.fixture
+async def server():
+  endpoint = Server()
+  async with serve(endpoint.handler, "127.0.0.1", 0) as srv:
+    port = srv.sockets[0].getsockname()[1]
+    endpoint.url = f"ws://127.0.0.1:{port}"
+    yield endpoint
+
+
+@pytest_asyncio.fixture
+async def manager():
+  mgr = WsManager()
+  yield mgr
+  await mgr.close()
+
+
+def binance(*streams: str, id: int = 1) -> dict:
+  return {"method": "SUBSCRIBE", "params": list(streams), "id": id}
+
+
+class TestMerge:
+
+  def test_merge_subscriptions(self):
+    okx = {"op": "subscribe", "args": [{"channel": "tickers", "instId": "A"}]}
+    okx_b = {
+        "op": "subscribe",
+        "args": [{
+            "channel": "tickers",
+            "instId": "B"
+        }]
+    }
+    merged = merge_subscriptions([
+        binance("a@trade", id=1),
+        binance("b@trade", "a@trade", id=2), okx, okx_b, okx, "ping", "ping", {
+            "method": "UNSUBSCRIBE",
+            "params": ["c@trade"]
+        }
+    ])
+    assert merged == [
+        binance("a@trade", "b@trade", id=1),
+        {
+            "op": "subscribe",
+            "args": okx["args"] + okx_b["args"]
+        },
+        "ping",
+        {
+            "method": "UNSUBSCRIBE",
+            "params": ["c@trade"]
+        },
+    ]
+
+
+class TestSharedSockets:
+
+  @pytest.mark.asyncio
+  async def test_one_socket_per_endpoint(self, server, manager):
+    seen_a, seen_b = [], []
+    a = await manager.subscribe(server.url, binance("a@trade"), seen_a.append)
+    b = await manager.subscribe(server.url, binance("b@trade", id=7),
+                                seen_b.append)
+    assert a.socket is b.socket
+    await until(lambda: server.received and server.received[0])
+    # subscribe messages merged into one
+    assert server.received == [[binance("a@trade", "b@trade")]]
+
+    # frames decoded once and demultiplexed to every subscriber
+    await server.broadcast({"stream": "a@trade", "p": "1"})
+    await until(lambda: seen_a and seen_b)
+    assert seen_a == seen_b == [{"stream": "a@trade", "p": "1"}]
+
+    # late subscriptions are sent on the live socket
+    await manager.subscribe(server.url, binance("c@trade"), lambda m: None)
+    await until(lambda: len(server.received[0]) == 2)
+    assert server.received[0][1] == binance("c@trade")
+    assert len(server.connections) == 1
+
+  @pytest.mark.asyncio
+  async def test_channel_cap_and_auth(self, server, manager):
+    with patch.object(ws, "WS_MAX_CHANNELS", 3):
+      subs = [
+          await manager.subscribe(server.url, binance(f"{i}a", f"{i}b"),
+                                  lambda m: None) for i in range(3)
+      ]
+      authed = await manager.subscribe(server.url,
+                                       binance("x"),
+                                       lambda m: None,
+                                       headers={"X-API-KEY": "k"})
+      dedicated = await manager.subscribe(server.url,
+                                          binance("y"),
+                                          lambda m: None,
+                                          shared=False)
+      shared = await manager.subscribe(server.url, binance("z"),
+                                       lambda m: None)
+    sockets = {id(s.socket) for s in subs}
+    assert len(sockets) == 3  # 2 channels each, 3 at most per socket
+    assert id(authed.socket) not in sockets
+    assert id(dedicated.socket) not in sockets | {id(authed.socket)}
+    assert shared.socket is subs[0].socket
+    await until(lambda: len(server.connections) == 5)
+    auth = [c.request.headers.get("X-API-KEY") for c in server.connections]
+    assert auth.count("k") == 1
+
+  @pytest.mark.asyncio
+  async def test_reconnect_resubscribes(self, server, manager):
+    seen = []
+    with patch("src.state.args", create=True) as args:
+      args.max_retries, args.retry_cooldown = 3, 0
+      await manager.subscribe(server.url, binance("a@trade"), seen.append)
+      await manager.subscribe(server.url, binance("b@trade"), seen.append)
+    await until(lambda: server.received and server.received[0])
+    await server.connections[0].close()
+    await until(lambda: len(server.received) == 2 and server.received[1])
+    assert server.received[1] == [binance("a@trade", "b@trade")]
+    await server.broadcast({"p": 2})
+    await until(lambda: seen == [{"p": 2}, {"p": 2}])
+
+  @pytest.mark.asyncio
+  async def test_last_subscriber_closes_socket(self, server, manager):
+    a = await manager.subscribe(server.url, binance("a"), lambda m: None)
+    b = await manager.subscribe(server.url, binance("b"), lambda m: None)
+    socket = a.socket
+    await until(lambda: server.connections)
+    await a.close()
+    assert socket.task is not None and manager.sockets
+    await b.close()
+    assert socket.task is None and not manager.sockets
+    await until(lambda: server.connections[0].state.name == "CLOSED")
+
+  @pytest.mark.asyncio
+  async def test_gives_up(self, manager):
+    socket = SharedSocket("ws://127.0.0.1:9", max_retries=2, retry_cooldown=0)
+    closed = []
+    socket.on_close = closed.append
+    with patch.object(ws, "log_error") as log_error:
+      await socket.add(ws.Subscription(binance("a"), lambda m: None))
+      await until(lambda: closed)
+    assert closed == [socket] and socket.task is None
+    assert log_error.call_count == 3